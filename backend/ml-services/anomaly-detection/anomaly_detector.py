@@ -2,20 +2,30 @@
 """
 Phase 4 Anomaly Detection Service
 Uses Isolation Forest (supervised ML) to detect anomalies in Prometheus metrics.
-Runs every 5 minutes to compute anomaly scores and push to Prometheus.
+Runs every 5 minutes to compute anomaly scores, exposed on /metrics and
+optionally remote-written to Prometheus.
 """
 
+import argparse
 import os
 import sys
 import time
 import logging
 import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
 import requests
+from requests.adapters import HTTPAdapter
 import numpy as np
 from sklearn.ensemble import IsolationForest
-from prometheus_client import Counter, Gauge, CollectorRegistry, push_to_gateway
+
+from batch_fit import ParallelFitter
+from detector_daemon import AnomalyDaemon
+from engines import EngineStore
+from model_store import ModelStore
+from multivariate import MultivariateDetector
+from score_export import RemoteWriteClient, score_timeseries
+from series_cache import SeriesCache, SeriesKey, series_id, series_key
 
 # Setup logging
 logging.basicConfig(
@@ -24,16 +34,144 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Samples of one series as columns: (int64 timestamps, float64 values)
+Series = Tuple[np.ndarray, np.ndarray]
+
+
+def parse_matrix(result: List[Dict]) -> Dict[SeriesKey, Series]:
+    """
+    Parse a Prometheus range query `result` into columnar arrays per series
+
+    Each series' [[timestamp, "value"], ...] pairs are converted in one
+    numpy pass instead of building a dict per sample. Samples that don't
+    parse are dropped.
+    """
+    parsed: Dict[SeriesKey, Series] = {}
+    for series in result:
+        samples = series.get('values') or []
+        if not samples:
+            continue
+        try:
+            columns = np.array(samples, dtype=str).astype(np.float64).reshape(-1, 2)
+        except ValueError:
+            rows = []
+            for timestamp, value in samples:
+                try:
+                    rows.append((float(timestamp), float(value)))
+                except (ValueError, TypeError):
+                    continue
+            columns = np.array(rows, dtype=np.float64).reshape(-1, 2)
+        key = series_key(series.get('metric', {}))
+        timestamps, values = columns[:, 0].astype(np.int64), columns[:, 1]
+        if key in parsed:
+            # Same label set twice (e.g. a query mixing metric names)
+            timestamps = np.concatenate([parsed[key][0], timestamps])
+            values = np.concatenate([parsed[key][1], values])
+        parsed[key] = (timestamps, values)
+    return parsed
+
+
+def combine_series(series: Dict[SeriesKey, Series]) -> Series:
+    """One series per metric: the mean of all its series at each timestamp"""
+    if len(series) == 1:
+        return next(iter(series.values()))
+    timestamps = np.concatenate([ts for ts, _ in series.values()])
+    values = np.concatenate([v for _, v in series.values()])
+    grid, index = np.unique(timestamps, return_inverse=True)
+    return grid, np.bincount(index, weights=values) / np.bincount(index)
+
+
 class AnomalyDetector:
     """Detects anomalies in Prometheus metrics using Isolation Forest"""
 
-    def __init__(self, prometheus_url: str = "http://localhost:9090"):
+    # Each score looks at the last 24 hours of 5-minute samples
+    LOOKBACK_SECONDS = 24 * 3600
+    STEP_SECONDS = 300
+    # Older scored points (a backlog after an outage) aren't remote-written
+    REMOTE_WRITE_MAX_AGE = 3600
+
+    def __init__(
+        self,
+        prometheus_url: str = "http://localhost:9090",
+        query_timeout: float = 10.0,
+        run_deadline: float = 60.0,
+        max_concurrency: int = 8,
+        cache_dir: Optional[str] = None,
+        model_dir: Optional[str] = None,
+        refit_interval: float = 6 * 3600,
+        drift_threshold: float = 3.0,
+        multivariate: bool = False,
+        engine: str = 'isolation_forest',
+        fit_workers: int = 1,
+        fit_memory_mb: float = 2048,
+        remote_write: Optional[RemoteWriteClient] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            prometheus_url: Prometheus base URL
+            query_timeout: Per-query timeout in seconds (connect and read)
+            run_deadline: Wall-clock budget for all queries of one run, in seconds
+            max_concurrency: Queries in flight at once (and pooled connections)
+            cache_dir: Directory for the on-disk series cache; None fetches the
+                full window on every run
+            model_dir: Directory to persist fitted per-metric models in; None
+                keeps them in memory only
+            refit_interval: Max age of a metric's model in seconds before it is
+                refit (0 refits on every run)
+            drift_threshold: Shift of the recent mean, in training standard
+                deviations, that forces an early refit
+            multivariate: Also score all metrics jointly and attribute joint
+                anomalies to the metrics driving them
+            engine: Per-metric detector: 'isolation_forest', or one of the
+                streaming engines in engines.ENGINES ('ewma', 'mad', 'hst')
+            fit_workers: Worker processes for fitting many series' forests
+                at once (1 fits them in this process)
+            fit_memory_mb: Memory cap of all fit workers together
+            remote_write: Also ship every scored point to Prometheus remote write
+            clock: Source of the current Unix time
+        """
         self.prometheus_url = prometheus_url
-        self.isolation_forest = IsolationForest(
-            contamination=0.1,  # Expect 10% anomalies
-            random_state=42,
-            n_estimators=100
-        )
+        self.query_timeout = query_timeout
+        self.run_deadline = run_deadline
+        self.max_concurrency = max_concurrency
+        self.clock = clock
+        # Twice the window, so a longer outage still leaves the older half cached
+        self.series_cache = SeriesCache(
+            cache_dir, capacity=2 * self.LOOKBACK_SECONDS // self.STEP_SECONDS
+        ) if cache_dir else None
+        self.points_fetched: Dict[str, int] = {}
+        # Latest score of every series, per metric name
+        self.series_scores: Dict[str, Dict[SeriesKey, float]] = {}
+        # (timestamps, scores) of every point scored in the last run
+        self.score_history: Dict[str, Dict[SeriesKey, Series]] = {}
+        self.remote_write = remote_write
+
+        # One keep-alive connection pool shared by all queries and runs
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.last_run_stats: Dict = {}
+        self.isolation_forest = self.new_isolation_forest()
+        # Fitted forest (or streaming engine) per metric; between refits
+        # only new points are scored
+        self.fitter = ParallelFitter(fit_workers, fit_memory_mb) if fit_workers > 1 else None
+        if engine == 'isolation_forest':
+            self.model_store = ModelStore(
+                self.new_isolation_forest,
+                model_dir=model_dir,
+                refit_interval=refit_interval,
+                drift_threshold=drift_threshold,
+                fitter=self.fitter,
+            )
+        else:
+            self.model_store = EngineStore(engine)
+        self.refits: Dict[str, str] = {}
+        self.multivariate_detector = MultivariateDetector(
+            self.new_isolation_forest, refit_interval=refit_interval
+        ) if multivariate else None
+        self.last_joint: Optional[Dict] = None
         
         # Metrics to monitor for anomalies
         self.metrics_to_monitor = [
@@ -69,45 +207,62 @@ class AnomalyDetector:
             }
         ]
 
-    def query_prometheus(self, query: str, start_time: str, end_time: str, step: str = '5m') -> List[Dict]:
+    @staticmethod
+    def new_isolation_forest() -> IsolationForest:
+        return IsolationForest(
+            contamination=0.1,  # Expect 10% anomalies
+            random_state=42,
+            n_estimators=100
+        )
+
+    def query_prometheus(
+        self,
+        query: str,
+        start_time: str,
+        end_time: str,
+        step: str = '5m',
+        timeout: Optional[float] = None,
+    ) -> Dict[SeriesKey, Series]:
         """
         Query Prometheus API for metric data over time range
-        Returns list of (timestamp, value) tuples
+        Returns (timestamps, values) arrays per series label set
         """
         try:
-            params = {
-                'query': query,
-                'start': start_time,
-                'end': end_time,
-                'step': step
-            }
-            response = requests.get(
-                f'{self.prometheus_url}/api/v1/query_range',
-                params=params,
-                timeout=30
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            if data['status'] != 'success':
-                logger.error(f"Prometheus query failed: {data.get('error', 'Unknown error')}")
-                return []
-            
-            results = []
-            for series in data.get('data', {}).get('result', []):
-                for timestamp, value in series.get('values', []):
-                    try:
-                        results.append({
-                            'timestamp': int(timestamp),
-                            'value': float(value)
-                        })
-                    except (ValueError, TypeError):
-                        continue
-            
-            return results
+            return self.query_range(query, start_time, end_time, step, timeout)
         except Exception as e:
             logger.error(f"Error querying Prometheus: {e}")
-            return []
+            return {}
+
+    def query_range(
+        self,
+        query: str,
+        start_time: str,
+        end_time: str,
+        step: str = '5m',
+        timeout: Optional[float] = None,
+    ) -> Dict[SeriesKey, Series]:
+        """
+        Like query_prometheus, but raises on failure instead of returning {}
+        (so an outage can't be mistaken for an empty range)
+        """
+        params = {
+            'query': query,
+            'start': start_time,
+            'end': end_time,
+            'step': step
+        }
+        response = self.session.get(
+            f'{self.prometheus_url}/api/v1/query_range',
+            params=params,
+            timeout=timeout or self.query_timeout
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        if data['status'] != 'success':
+            raise RuntimeError(f"Prometheus query failed: {data.get('error', 'Unknown error')}")
+        
+        return parse_matrix(data.get('data', {}).get('result', []))
 
     def detect_anomalies(self, values: np.ndarray) -> Tuple[np.ndarray, float]:
         """
@@ -147,113 +302,345 @@ class AnomalyDetector:
             logger.error(f"Error in anomaly detection: {e}")
             return np.ones(len(values)), 0.0
 
-    def process_metric(self, metric_config: Dict) -> Tuple[str, float]:
+    def window(self) -> Tuple[int, int]:
         """
-        Process single metric and return (metric_name, anomaly_score)
+        (start, end) Unix timestamps of the current lookback window
+        
+        Aligned to the step grid so samples keep the same timestamps from
+        run to run (and line up with cached ones and across metrics)
         """
-        metric_name = metric_config['name']
-        query = metric_config['query']
-        window = metric_config['window']
-        threshold = metric_config['threshold']
+        end_ts = int(self.clock()) // self.STEP_SECONDS * self.STEP_SECONDS
+        return end_ts - self.LOOKBACK_SECONDS, end_ts
+
+    def fetch_metric(self, metric_config: Dict, timeout: Optional[float] = None) -> Dict[SeriesKey, Series]:
+        """
+        Fetch the last 24 hours of 5-minute samples of every series of one metric
+        """
+        step = self.STEP_SECONDS
+        start_ts, end_ts = self.window()
         
-        try:
-            # Determine time range (last N hours)
-            hours = 24  # Look at last 24 hours of data
-            end_time = datetime.utcnow()
-            start_time = end_time - timedelta(hours=hours)
-            
-            end_ts = int(end_time.timestamp())
-            start_ts = int(start_time.timestamp())
-            
-            logger.info(f"Processing metric: {metric_name}")
-            
-            # Query prometheus
-            data_points = self.query_prometheus(
-                query=query,
+        logger.info(f"Processing metric: {metric_config['name']}")
+        
+        if self.series_cache is None:
+            series = self.query_prometheus(
+                query=metric_config['query'],
                 start_time=str(start_ts),
                 end_time=str(end_ts),
-                step='5m'
+                step=f'{step}s',
+                timeout=timeout
             )
-            
-            if not data_points:
+            self.points_fetched[metric_config['name']] = sum(ts.size for ts, _ in series.values())
+            return series
+        
+        return self.fetch_cached(metric_config, start_ts, end_ts, timeout)
+
+    def fetch_cached(
+        self,
+        metric_config: Dict,
+        start_ts: int,
+        end_ts: int,
+        timeout: Optional[float] = None,
+    ) -> Dict[SeriesKey, Series]:
+        """
+        Fetch only the samples newer than the metric's cache, merge them in
+        and return the cached window of every live series
+        
+        The newest cached sample is fetched again: it may have been
+        evaluated before the last scrape of its step arrived. Series missing
+        from that fetch have stopped reporting and are left out.
+        """
+        step = self.STEP_SECONDS
+        ring = self.series_cache.ring(metric_config['query'], step)
+        gap_start = start_ts
+        if ring.last_ts is not None and ring.last_ts >= start_ts:
+            gap_start = ring.last_ts
+        
+        try:
+            fetched = self.query_range(
+                query=metric_config['query'],
+                start_time=str(gap_start),
+                end_time=str(end_ts),
+                step=f'{step}s',
+                timeout=timeout
+            )
+        except Exception as e:
+            # Don't score a stale window as if it were current
+            logger.error(f"Error querying Prometheus: {e}")
+            return {}
+        
+        self.points_fetched[metric_config['name']] = sum(ts.size for ts, _ in fetched.values())
+        ring.write(fetched)
+        ring.prune(start_ts)
+        grid, values, present = ring.read(start_ts, end_ts)
+        return {
+            labels: (grid[present[row]], values[row, present[row]])
+            for row, labels in enumerate(ring.series)
+            if labels in fetched
+        }
+
+    def score_metric(self, metric_config: Dict, series: Dict[SeriesKey, Series]) -> Dict[SeriesKey, float]:
+        """
+        Anomaly score of the latest sample of every fetched series of one metric
+        """
+        return self.score_all({metric_config['name']: series})[metric_config['name']]
+
+    def score_all(self, fetched: Dict[str, Dict[SeriesKey, Series]]) -> Dict[str, Dict[SeriesKey, float]]:
+        """
+        Anomaly score of the latest sample of every fetched series
+        
+        All series of all metrics go to the model store as one batch, so
+        refits are fitted together (in parallel with fit_workers > 1) and
+        streaming engines advance equal-length series in one vectorized
+        step.
+        """
+        scores: Dict[str, Dict[SeriesKey, float]] = {}
+        self.score_history = {}
+        batch: Dict[str, Series] = {}
+        owners: Dict[str, Tuple[str, SeriesKey]] = {}
+        for metric_name, series in fetched.items():
+            scores[metric_name] = {}
+            self.score_history[metric_name] = {}
+            if not series:
                 logger.warning(f"No data for metric {metric_name}")
-                return metric_name, 0.0
-            
-            # Extract values
-            values = np.array([dp['value'] for dp in data_points])
-            
-            # Handle NaN/Inf
-            values = np.nan_to_num(values, nan=0.0, posinf=1e6, neginf=0.0)
-            
-            # Detect anomalies
-            predictions, anomaly_score = self.detect_anomalies(values)
-            
-            logger.info(f"{metric_name}: anomaly_score={anomaly_score:.3f}")
-            
-            return metric_name, anomaly_score
+                continue
+            for labels, (timestamps, values) in series.items():
+                # Handle NaN/Inf
+                values = np.nan_to_num(values, nan=0.0, posinf=1e6, neginf=0.0)
+                if len(values) < 10:
+                    predictions, scores[metric_name][labels] = self.detect_anomalies(values)
+                    if len(values):
+                        self.score_history[metric_name][labels] = (
+                            timestamps[-1:], np.array([scores[metric_name][labels]])
+                        )
+                    continue
+                name = series_id(metric_name, labels)
+                batch[name] = (timestamps, values)
+                owners[name] = (metric_name, labels)
+        
+        # Refit what is due, otherwise score only the points since the last run
+        try:
+            results = self.model_store.score_batch(batch, self.clock())
+        except Exception as e:
+            logger.error(f"Error scoring {len(batch)} series: {e}")
+            results = {name: (0.0, None) for name in batch}
+        refit_counts = dict.fromkeys(scores, 0)
+        for name, (anomaly_score, refit_reason) in results.items():
+            metric_name, labels = owners[name]
+            scores[metric_name][labels] = anomaly_score
+            if name in self.model_store.scored:
+                self.score_history[metric_name][labels] = self.model_store.scored[name]
+            if refit_reason:
+                self.refits[name] = refit_reason
+                refit_counts[metric_name] += 1
+            logger.debug(f"{name}: anomaly_score={anomaly_score:.3f}"
+                         + (f" (refit: {refit_reason})" if refit_reason else ""))
+        
+        for metric_name, metric_scores in scores.items():
+            if metric_scores:
+                logger.info(f"{metric_name}: {len(metric_scores)} series, max anomaly_score="
+                            f"{max(metric_scores.values()):.3f}"
+                            + (f", {refit_counts[metric_name]} refit" if refit_counts[metric_name] else ""))
+        return scores
+
+    def process_metric(self, metric_config: Dict) -> Tuple[str, float]:
+        """
+        Process single metric and return (metric_name, anomaly_score)
+        """
+        metric_name = metric_config['name']
+        
+        try:
+            scores = self.score_metric(metric_config, self.fetch_metric(metric_config))
+            return metric_name, max(scores.values(), default=0.0)
         except Exception as e:
             logger.error(f"Error processing metric {metric_name}: {e}")
             return metric_name, 0.0
 
+    def fetch_all(self) -> Tuple[Dict[str, Dict[SeriesKey, Series]], List[str]]:
+        """
+        Fetch every monitored metric concurrently under the run deadline
+        
+        Each query's timeout is capped by the time left in the run, so the
+        run takes as long as its slowest query (at most `run_deadline`)
+        rather than the sum of all queries.
+        
+        Returns:
+            - series per metric name that finished in time
+            - names of metrics whose query was still running at the deadline
+        """
+        deadline = time.monotonic() + self.run_deadline
+        self.points_fetched = {}
+        
+        def fetch(metric_config: Dict) -> Optional[Dict[SeriesKey, Series]]:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            series = self.fetch_metric(metric_config, timeout=min(self.query_timeout, remaining))
+            if not series and time.monotonic() >= deadline:
+                return None  # cut off by the run deadline, not an empty series
+            return series
+        
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.max_concurrency, len(self.metrics_to_monitor)) or 1,
+            thread_name_prefix='prometheus-query'
+        )
+        futures = {
+            executor.submit(fetch, metric_config): metric_config['name']
+            for metric_config in self.metrics_to_monitor
+        }
+        done, not_done = wait(futures, timeout=self.run_deadline)
+        # Don't wait for stragglers; their own timeouts end them shortly
+        executor.shutdown(wait=False, cancel_futures=True)
+        
+        fetched = {}
+        timed_out = [futures[future] for future in not_done]
+        for future in done:
+            try:
+                series = future.result()
+            except Exception as e:
+                logger.error(f"Error fetching metric {futures[future]}: {e}")
+                series = {}
+            if series is None:
+                timed_out.append(futures[future])
+            else:
+                fetched[futures[future]] = series
+        timed_out.sort()
+        for metric_name in timed_out:
+            logger.error(f"Query for {metric_name} missed the {self.run_deadline}s run deadline")
+        return fetched, timed_out
+
     def run(self):
         """Main detection loop - runs once per invocation"""
         logger.info("Starting anomaly detection run...")
+        start = time.monotonic()
         
-        # Initialize metrics for tracking
-        anomaly_scores = {}
+        # Fetch all metrics concurrently, then score all their series in one batch
+        fetched, timed_out = self.fetch_all()
+        self.refits = {}
+        fetch_seconds = time.monotonic() - start
+        self.series_scores = self.score_all({
+            metric_config['name']: fetched.get(metric_config['name'], {})
+            for metric_config in self.metrics_to_monitor
+        })
+        score_seconds = time.monotonic() - start - fetch_seconds
+        series_scored = sum(len(scores) for scores in self.series_scores.values())
+        # A metric scores as its worst series
+        anomaly_scores = {
+            metric_name: max(scores.values(), default=0.0)
+            for metric_name, scores in self.series_scores.items()
+        }
         
-        # Process each metric
-        for metric_config in self.metrics_to_monitor:
-            metric_name, score = self.process_metric(metric_config)
-            anomaly_scores[metric_name] = score
+        if self.multivariate_detector is not None:
+            self.last_joint = self.score_joint(fetched)
+        
+        self.last_run_stats = {
+            'fetch_seconds': round(fetch_seconds, 3),
+            'run_seconds': round(time.monotonic() - start, 3),
+            'timed_out': timed_out,
+            'score_seconds': round(score_seconds, 3),
+            'points_fetched': sum(self.points_fetched.values()),
+            'series': series_scored,
+            'series_per_second': round(series_scored / score_seconds, 1) if score_seconds > 0 else None,
+            'refits': self.refits,
+        }
+        logger.info(f"Run stats: {self.last_run_stats}")
         
-        # Push results to Prometheus via remote write or exposition format
         logger.info(f"Anomaly scores: {json.dumps(anomaly_scores, indent=2)}")
         
-        # Push to Prometheus pushgateway if available
-        if os.getenv('PROMETHEUS_PUSHGATEWAY_URL'):
-            self.push_metrics(anomaly_scores)
-        else:
-            # Otherwise, just log (in Docker, volumes can capture logs)
-            logger.info(f"Metrics ready for push: {anomaly_scores}")
+        # Latest scores are served on /metrics by the daemon; remote write
+        # also gets every point scored in between, with its own timestamp
+        if self.remote_write is not None:
+            self.remote_write.enqueue(score_timeseries(
+                self.score_history, self.last_joint, since=self.window()[1] - self.REMOTE_WRITE_MAX_AGE
+            ))
         
         return anomaly_scores
 
-    def push_metrics(self, anomaly_scores: Dict[str, float]):
-        """Push anomaly scores to Prometheus Pushgateway"""
+    def score_joint(self, fetched: Dict[str, Dict[SeriesKey, Series]]) -> Optional[Dict]:
+        """
+        Joint anomaly score of all fetched metrics at the latest timestamp,
+        with each metric's share of it (metrics with several series join
+        as their mean)
+        """
+        series = {}
+        for metric_name, metric_series in fetched.items():
+            if metric_series:
+                timestamps, values = combine_series(metric_series)
+                series[metric_name] = (timestamps, np.nan_to_num(values, nan=0.0, posinf=1e6, neginf=0.0))
+        start_ts, end_ts = self.window()
         try:
-            gateway_url = os.getenv('PROMETHEUS_PUSHGATEWAY_URL', 'http://localhost:9091')
-            registry = CollectorRegistry()
-            
-            # Create gauge for each metric
-            anomaly_gauge = Gauge(
-                'anomaly_score',
-                'Anomaly score (0-1, higher = more anomalous)',
-                labelnames=['metric_name'],
-                registry=registry
+            joint = self.multivariate_detector.score(
+                series, start_ts, end_ts, self.STEP_SECONDS, self.clock()
             )
-            
-            for metric_name, score in anomaly_scores.items():
-                anomaly_gauge.labels(metric_name=metric_name).set(score)
-            
-            # Push to gateway
-            push_to_gateway(
-                gateway_url,
-                job='anomaly_detector',
-                registry=registry
-            )
-            logger.info(f"Metrics pushed to {gateway_url}")
         except Exception as e:
-            logger.error(f"Error pushing metrics to gateway: {e}")
+            logger.error(f"Error in multivariate anomaly detection: {e}")
+            return None
+        if joint is None:
+            return None
+        
+        drivers = sorted(joint['contributions'].items(), key=lambda item: -item[1])
+        logger.info(
+            f"Joint anomaly_score={joint['score']:.3f}, driven by "
+            + ', '.join(f"{name} ({share:.0%})" for name, share in drivers[:3] if share > 0)
+        )
+        return joint
 
+    def close(self) -> None:
+        """Release the connection pool, any fit worker processes and the remote-write sender"""
+        self.session.close()
+        if self.fitter is not None:
+            self.fitter.close()
+        if self.remote_write is not None:
+            self.remote_write.close()
 
-def main():
-    """Entry point"""
+
+def detector_from_env() -> AnomalyDetector:
+    """AnomalyDetector configured from environment variables"""
     prometheus_url = os.getenv('PROMETHEUS_URL', 'http://localhost:9090')
+    remote_write_url = os.getenv('ANOMALY_REMOTE_WRITE_URL')
     
     logger.info(f"Anomaly Detector starting (Prometheus: {prometheus_url})")
     
-    detector = AnomalyDetector(prometheus_url=prometheus_url)
+    return AnomalyDetector(
+        prometheus_url=prometheus_url,
+        query_timeout=float(os.getenv('PROMETHEUS_QUERY_TIMEOUT', '10')),
+        run_deadline=float(os.getenv('ANOMALY_RUN_DEADLINE', '60')),
+        max_concurrency=int(os.getenv('ANOMALY_MAX_CONCURRENCY', '8')),
+        # Empty disables the cache
+        cache_dir=os.getenv('ANOMALY_CACHE_DIR', 'cache') or None,
+        model_dir=os.getenv('ANOMALY_MODEL_DIR', 'models') or None,
+        refit_interval=float(os.getenv('ANOMALY_REFIT_INTERVAL', str(6 * 3600))),
+        drift_threshold=float(os.getenv('ANOMALY_DRIFT_THRESHOLD', '3.0')),
+        multivariate=os.getenv('ANOMALY_MULTIVARIATE', '').lower() in ('1', 'true', 'yes'),
+        engine=os.getenv('ANOMALY_ENGINE', 'isolation_forest'),
+        fit_workers=int(os.getenv('ANOMALY_FIT_WORKERS', str(os.cpu_count() or 1))),
+        fit_memory_mb=float(os.getenv('ANOMALY_FIT_MEMORY_MB', '2048')),
+        # e.g. http://prometheus:9090/api/v1/write (needs --web.enable-remote-write-receiver)
+        remote_write=RemoteWriteClient(remote_write_url) if remote_write_url else None,
+    )
+
+
+def main(argv=None):
+    """Entry point: one run, or a long-running daemon with --daemon"""
+    parser = argparse.ArgumentParser(description='Prometheus metric anomaly detector')
+    parser.add_argument('--daemon', action='store_true',
+                        default=os.getenv('ANOMALY_DAEMON', '').lower() in ('1', 'true', 'yes'),
+                        help='Keep running on an interval and serve /health and /metrics')
+    parser.add_argument('--interval', type=float,
+                        default=float(os.getenv('CHECK_INTERVAL', '300')),
+                        help='Seconds between run starts in daemon mode')
+    parser.add_argument('--jitter', type=float, default=float(os.getenv('ANOMALY_JITTER', '0.1')),
+                        help='Max random offset of each run start, as a fraction of the interval')
+    parser.add_argument('--port', type=int, default=int(os.getenv('ANOMALY_HTTP_PORT', '8000')))
+    args = parser.parse_args(argv)
+    
+    detector = detector_from_env()
+    
+    if args.daemon:
+        daemon = AnomalyDaemon(detector, interval=args.interval, jitter=args.jitter, port=args.port)
+        daemon.install_signal_handlers()
+        daemon.serve_forever()
+        return daemon.last_scores
+    
     anomaly_scores = detector.run()
     
     logger.info("Anomaly detection run complete")
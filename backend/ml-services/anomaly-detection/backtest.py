@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Offline backtest of the anomaly detector engines
+Replays recorded metric dumps through any detector engine as the detector
+would have scored them run by run, and checks the alerts against labeled
+incident windows: precision, recall and detection delay, plus scoring
+throughput. Each point of a parameter grid is replayed in its own worker
+process. Nothing is fetched; the dumps are the only input.
+
+Usage:
+    python backtest.py dumps/ --incidents incidents.json
+    python backtest.py dumps/errors_total.json --incidents incidents.json --engines ewma mad \\
+        --grid alpha=0.2,0.3 rate=0.2,0.3 threshold=0.6,0.7,0.8
+    python backtest.py metrics.parquet --incidents incidents.json --engines isolation_forest \\
+        --grid contamination=0.05,0.1 n_estimators=50,100 --run-every 12 --json results.json
+
+Dumps (files, or directories of *.json and *.parquet):
+    .json     A query_range response ({"status": ..., "data": {"result": [...]}}), its
+              bare result list, or {metric name: either of those}
+    .parquet  One row per sample: `timestamp` (Unix seconds or a timestamp
+              column), `value`, an optional `metric` column and one column per label
+    The metric of a single-query dump is its file name without the extension.
+
+Incidents (JSON list; times as Unix seconds or ISO 8601):
+    [{"start": "2024-05-01T10:00:00Z", "end": "2024-05-01T10:40:00Z",
+      "metric": "errors_total", "labels": {"pod": "b"}}]
+    `metric` and `labels` are optional and narrow down which series are
+    expected to alert.
+"""
+
+import argparse
+import inspect
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.base import clone
+
+from anomaly_detector import AnomalyDetector, Series, parse_matrix
+from engines import ALERT_SCORE, ENGINES, EngineStore
+from model_store import ModelStore
+from series_cache import SeriesKey, series_id
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pq = None
+
+STEP = AnomalyDetector.STEP_SECONDS
+LOOKBACK = AnomalyDetector.LOOKBACK_SECONDS
+# Shorter windows go through detect_anomalies() in the detector; not replayed
+MIN_POINTS = 10
+# ModelStore arguments; every other isolation_forest parameter goes to the forest
+STORE_PARAMS = ('refit_interval', 'drift_threshold', 'drift_window')
+
+# Dumps by metric name, then by series labels
+Dumps = Dict[str, Dict[SeriesKey, Series]]
+
+
+def load_json(path: str) -> Dumps:
+    with open(path) as f:
+        dump = json.load(f)
+    if isinstance(dump, list) or 'data' in dump or 'status' in dump:
+        dump = {metric_name_of(path): dump}
+    loaded = {}
+    for metric_name, response in dump.items():
+        if isinstance(response, dict) and response.get('status', 'success') != 'success':
+            raise ValueError(f"{path}: {metric_name} is a failed query ({response.get('error')})")
+        result = response if isinstance(response, list) else response.get('data', {}).get('result', [])
+        loaded[metric_name] = parse_matrix(result)
+    return loaded
+
+
+def load_parquet(path: str) -> Dumps:
+    if pq is None:
+        raise RuntimeError("Reading Parquet dumps needs pyarrow (pip install pyarrow)")
+    table = pq.read_table(path)
+    missing = {'timestamp', 'value'} - set(table.column_names)
+    if missing:
+        raise ValueError(f"{path}: missing column(s) {', '.join(sorted(missing))}")
+    timestamps = table.column('timestamp').to_numpy()
+    if np.issubdtype(timestamps.dtype, np.datetime64):
+        timestamps = timestamps.astype('datetime64[s]').astype(np.int64)
+    else:
+        timestamps = np.asarray(timestamps, dtype=np.float64).astype(np.int64)
+    values = np.asarray(table.column('value').to_numpy(zero_copy_only=False), dtype=np.float64)
+    metrics = table.column('metric').to_pylist() if 'metric' in table.column_names else None
+    labels = [name for name in table.column_names if name not in ('timestamp', 'value', 'metric')]
+    columns = [table.column(name).to_pylist() for name in labels]
+
+    # Number each distinct (metric, labels) row, then split the samples by it
+    ids: Dict[Tuple, int] = {}
+    rows = zip(metrics or itertools.repeat(metric_name_of(path)), *columns)
+    series = np.fromiter((ids.setdefault(row, len(ids)) for row in rows), dtype=np.int64, count=len(values))
+    order = np.argsort(series, kind='stable')
+    bounds = np.cumsum(np.bincount(series, minlength=len(ids)))[:-1]
+    loaded: Dumps = {}
+    for (metric_name, *label_values), idx in zip(ids, np.split(order, bounds)):
+        # Prometheus leaves out empty labels
+        key = tuple(sorted((name, str(value)) for name, value in zip(labels, label_values) if value not in (None, '')))
+        loaded.setdefault(metric_name, {})[key] = (timestamps[idx], values[idx])
+    return loaded
+
+
+def metric_name_of(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def load_dumps(paths: List[str]) -> Dumps:
+    """
+    Every series of every dump, sorted by time with one sample per timestamp
+    (series found in several dumps are merged; the later dump wins on overlap)
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.endswith(('.json', '.parquet'))
+            )
+        else:
+            files.append(path)
+    merged: Dict[str, Dict[SeriesKey, List[Series]]] = {}
+    for path in files:
+        dump = load_parquet(path) if path.endswith('.parquet') else load_json(path)
+        for metric_name, series in dump.items():
+            for key, samples in series.items():
+                merged.setdefault(metric_name, {}).setdefault(key, []).append(samples)
+
+    dumps: Dumps = {}
+    for metric_name, series in merged.items():
+        dumps[metric_name] = {}
+        for key, parts in series.items():
+            timestamps = np.concatenate([ts for ts, _ in parts])
+            values = np.concatenate([v for _, v in parts])
+            # Last occurrence of each timestamp
+            order = np.argsort(timestamps, kind='stable')[::-1]
+            unique, first = np.unique(timestamps[order], return_index=True)
+            dumps[metric_name][key] = (unique, values[order][first])
+    return dumps
+
+
+def parse_time(value) -> float:
+    """Unix seconds from a number or an ISO 8601 string (UTC unless it says otherwise)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def load_incidents(path: str) -> List[Dict]:
+    with open(path) as f:
+        incidents = json.load(f)
+    return [
+        {
+            **incident,
+            'start': parse_time(incident['start']),
+            'end': parse_time(incident.get('end', incident['start'])),
+            'labels': incident.get('labels') or {},
+        }
+        for incident in incidents
+    ]
+
+
+def engine_params(engine: str) -> set:
+    """Names of the parameters an engine can be tuned with"""
+    if engine == 'isolation_forest':
+        return set(AnomalyDetector.new_isolation_forest().get_params()) | set(STORE_PARAMS)
+    return set(inspect.signature(ENGINES[engine]).parameters)
+
+
+def make_store(engine: str, params: Dict):
+    """The detector's store for `engine`, with `params` over the detector's defaults"""
+    if engine != 'isolation_forest':
+        return EngineStore(engine, **params)
+    forest = AnomalyDetector.new_isolation_forest().set_params(
+        **{name: value for name, value in params.items() if name not in STORE_PARAMS}
+    )
+    return ModelStore(partial(clone, forest), **{name: params[name] for name in STORE_PARAMS if name in params})
+
+
+def replay(engine: str, params: Dict, series: Dict[str, Series], run_every: int = 1) -> Dict:
+    """
+    Score the series run by run, as the detector would have
+
+    A run happens every `run_every` steps once the first full lookback
+    window is available, and scores each series' window ending then (series
+    with fewer than MIN_POINTS points in it are left out). Between runs the
+    stores only score new points, so a longer stride scores the same points
+    with fewer, larger calls; only the Isolation Forest's refit timing
+    depends on it.
+
+    Returns:
+        {'scores': per series, aligned with its timestamps (NaN = never scored),
+         'points': points scored, 'cpu_seconds': time spent scoring them}
+    """
+    store = make_store(engine, params)
+    series = {
+        name: (timestamps, np.nan_to_num(values, nan=0.0, posinf=1e6, neginf=0.0))
+        for name, (timestamps, values) in series.items()
+        if len(timestamps)
+    }
+    scores = {name: np.full(len(timestamps), np.nan) for name, (timestamps, _) in series.items()}
+    if not series:
+        return {'scores': scores, 'points': 0, 'cpu_seconds': 0.0}
+    first = min(int(timestamps[0]) for timestamps, _ in series.values())
+    last = max(int(timestamps[-1]) for timestamps, _ in series.values())
+    runs = np.arange(first + LOOKBACK, last + run_every * STEP, run_every * STEP)
+    runs[-1:] = np.minimum(runs[-1:], last)
+
+    cpu = 0.0
+    for end in runs:
+        batch = {}
+        for name, (timestamps, values) in series.items():
+            lo = np.searchsorted(timestamps, end - LOOKBACK, side='left')
+            hi = np.searchsorted(timestamps, end, side='right')
+            if hi - lo >= MIN_POINTS:
+                batch[name] = (timestamps[lo:hi], values[lo:hi])
+        if not batch:
+            continue
+        start = time.process_time()
+        store.score_batch(batch, float(end))
+        cpu += time.process_time() - start
+        for name, (timestamps, new_scores) in store.scored.items():
+            scores[name][np.searchsorted(series[name][0], timestamps)] = new_scores
+    points = sum(int((~np.isnan(s)).sum()) for s in scores.values())
+    return {'scores': scores, 'points': points, 'cpu_seconds': cpu}
+
+
+def evaluate(
+    series: Dict[str, Tuple[str, SeriesKey, np.ndarray]],
+    scores: Dict[str, np.ndarray],
+    incidents: List[Dict],
+    threshold: float = ALERT_SCORE,
+    grace: float = 1800,
+) -> Dict:
+    """
+    Alerts (runs of consecutive points scoring over `threshold` on one
+    series) against incident windows
+
+    An incident applies to the series of its `metric` (any, if unset)
+    whose labels include its `labels`. It is detected when one of them
+    alerts between its start and `grace` seconds after its end, with the
+    first such point giving the detection delay. An alert is true when any
+    of its points falls in such a window of an incident that applies to its
+    series. Incidents without any scored point of an applicable series in
+    their window are skipped.
+
+    Args:
+        series: (metric name, labels, timestamps) per series name
+        scores: Scores aligned with the timestamps, NaN where not scored
+    """
+    first_alert = [None] * len(incidents)
+    covered = [False] * len(incidents)
+    alerts = true_alerts = 0
+    for name, (metric_name, key, timestamps) in series.items():
+        score = scores[name]
+        scored = ~np.isnan(score)
+        alerting = np.where(scored, score, 0.0) > threshold
+        expected = np.zeros(len(timestamps), dtype=bool)
+        labels = dict(key)
+        for i, incident in enumerate(incidents):
+            if incident.get('metric') not in (None, metric_name):
+                continue
+            if any(labels.get(label) != value for label, value in incident['labels'].items()):
+                continue
+            window = (timestamps >= incident['start']) & (timestamps <= incident['end'] + grace)
+            covered[i] = covered[i] or bool((window & scored).any())
+            hits = timestamps[window & alerting]
+            if hits.size and (first_alert[i] is None or hits[0] < first_alert[i]):
+                first_alert[i] = int(hits[0])
+            expected |= window
+        # Number the alerts; an alert is true if any of its points was expected
+        onsets = alerting & ~np.concatenate([[False], alerting[:-1]])
+        alert_ids = np.cumsum(onsets)[alerting]
+        alerts += int(onsets.sum())
+        true_alerts += len(np.unique(alert_ids[expected[alerting]]))
+
+    counted = [i for i, c in enumerate(covered) if c]
+    delays = [(first_alert[i] - incidents[i]['start']) / 60 for i in counted if first_alert[i] is not None]
+    precision = true_alerts / alerts if alerts else None
+    recall = len(delays) / len(counted) if counted else None
+    f1 = 2 * precision * recall / (precision + recall) if precision and recall else 0.0
+    return {
+        'threshold': threshold,
+        'incidents': len(counted),
+        'skipped_incidents': len(incidents) - len(counted),
+        'detected': len(delays),
+        'alerts': alerts,
+        'false_alerts': alerts - true_alerts,
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'median_delay_minutes': float(np.median(delays)) if delays else None,
+        'max_delay_minutes': float(max(delays)) if delays else None,
+    }
+
+
+def parse_grid(specs: List[str]) -> Dict[str, List]:
+    """{'alpha': [0.2, 0.3]} from ['alpha=0.2,0.3']"""
+    grid = {}
+    for spec in specs:
+        name, sep, values = spec.partition('=')
+        if not sep or not values:
+            raise ValueError(f"Grid entries look like name=value1,value2 (got '{spec}')")
+        grid[name] = [parse_value(value) for value in values.split(',')]
+    return grid
+
+
+def parse_value(value: str):
+    for parse in (int, float):
+        try:
+            return parse(value)
+        except ValueError:
+            pass
+    return {'none': None, 'true': True, 'false': False}.get(value.lower(), value)
+
+
+def grid_tasks(engines: List[str], grid: Dict[str, List]) -> List[Tuple[str, Dict]]:
+    """
+    (engine, params) for every combination of the grid values an engine
+    accepts (it keeps its defaults for the rest)
+
+    Raises:
+        ValueError: If a grid parameter applies to none of the engines
+    """
+    unknown = set(grid) - set().union(*(engine_params(engine) for engine in engines))
+    if unknown:
+        raise ValueError(f"No engine among {', '.join(engines)} takes {', '.join(sorted(unknown))}")
+    tasks = []
+    for engine in engines:
+        names = sorted(set(grid) & engine_params(engine))
+        for values in itertools.product(*(grid[name] for name in names)):
+            tasks.append((engine, dict(zip(names, values))))
+    return tasks
+
+
+_series: Dict[str, Series] = {}
+
+
+def _init_worker(series: Dict[str, Series]) -> None:
+    # Shipped once per worker rather than with every task
+    global _series
+    _series = series
+
+
+def _replay_task(engine: str, params: Dict, run_every: int) -> Dict:
+    return replay(engine, params, _series, run_every)
+
+
+def backtest(
+    dumps: Dumps,
+    incidents: List[Dict],
+    engines: List[str],
+    grid: Optional[Dict[str, List]] = None,
+    run_every: int = 1,
+    workers: int = 1,
+    grace: float = 1800,
+) -> List[Dict]:
+    """
+    Replay the dumps once per engine and parameter combination (in
+    parallel with `workers` > 1) and evaluate each replay at every
+    `threshold` in the grid
+
+    Returns:
+        One row per (engine, params, threshold)
+    """
+    grid = dict(grid or {})
+    thresholds = grid.pop('threshold', [ALERT_SCORE])
+    series = {
+        series_id(metric_name, key): samples
+        for metric_name, by_key in dumps.items()
+        for key, samples in by_key.items()
+    }
+    meta = {
+        series_id(metric_name, key): (metric_name, key, timestamps)
+        for metric_name, by_key in dumps.items()
+        for key, (timestamps, _) in by_key.items()
+    }
+    tasks = grid_tasks(engines, grid)
+
+    if workers > 1 and len(tasks) > 1:
+        # spawn, as in batch_fit: no inherited threads or locks
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(tasks)), mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(series,),
+        ) as pool:
+            replays = list(pool.map(_replay_task, *zip(*tasks), itertools.repeat(run_every)))
+    else:
+        replays = [replay(engine, params, series, run_every) for engine, params in tasks]
+
+    rows = []
+    for (engine, params), result in zip(tasks, replays):
+        for threshold in thresholds:
+            rows.append({
+                'engine': engine,
+                'params': params,
+                **evaluate(meta, result['scores'], incidents, threshold, grace),
+                'points': result['points'],
+                'cpu_seconds': result['cpu_seconds'],
+                'points_per_second': result['points'] / result['cpu_seconds'] if result['cpu_seconds'] else None,
+            })
+    return rows
+
+
+def print_report(rows: List[Dict]) -> None:
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else '-'
+
+    print(f"\n{'engine':<18} {'params':<36} {'thresh':>6} {'precision':>9} {'recall':>7} {'f1':>5} "
+          f"{'detected':>9} {'false':>6} {'delay(min)':>10} {'points/s':>9}")
+    for row in sorted(rows, key=lambda r: (r['engine'], -r['f1'])):
+        params = ' '.join(f'{name}={value}' for name, value in row['params'].items()) or 'defaults'
+        print(f"{row['engine']:<18} {params:<36} {row['threshold']:>6.2f} {fmt(row['precision'], '.2f'):>9} "
+              f"{fmt(row['recall'], '.2f'):>7} {row['f1']:>5.2f} {row['detected']:>4}/{row['incidents']:<4} "
+              f"{row['false_alerts']:>6} {fmt(row['median_delay_minutes'], '.0f'):>10} "
+              f"{fmt(row['points_per_second'], '.0f'):>9}")
+    skipped = max((row['skipped_incidents'] for row in rows), default=0)
+    if skipped:
+        print(f"\n{skipped} incident(s) had no scored data for the series they apply to and were skipped")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Backtest detector engines on recorded metric dumps')
+    parser.add_argument('dumps', nargs='+', help='Prometheus JSON or Parquet dumps, or directories of them')
+    parser.add_argument('--incidents', default=None, help='JSON list of labeled incident windows')
+    parser.add_argument('--engines', nargs='+', choices=['isolation_forest', *sorted(ENGINES)],
+                        default=['isolation_forest', *sorted(ENGINES)])
+    parser.add_argument('--grid', nargs='*', default=[], metavar='NAME=V1,V2',
+                        help='Parameter values to try, e.g. contamination=0.05,0.1 threshold=0.6,0.7')
+    parser.add_argument('--run-every', type=int, default=1,
+                        help='Steps between replayed runs (1 = every 5 minutes, as deployed)')
+    parser.add_argument('--grace', type=float, default=30,
+                        help='Minutes after an incident ends during which alerts still count')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes across grid points')
+    parser.add_argument('--json', default=None, help='Also write the results here')
+    args = parser.parse_args(argv)
+
+    try:
+        grid = parse_grid(args.grid)
+        grid_tasks(args.engines, {name: values for name, values in grid.items() if name != 'threshold'})
+    except ValueError as e:
+        parser.error(str(e))
+    if args.run_every < 1:
+        parser.error('--run-every must be at least 1')
+
+    dumps = load_dumps(args.dumps)
+    incidents = load_incidents(args.incidents) if args.incidents else []
+    print(f"Replaying {sum(len(s) for s in dumps.values())} series of {len(dumps)} metric(s) "
+          f"against {len(incidents)} incident(s)")
+    rows = backtest(dumps, incidents, args.engines, grid, args.run_every, args.workers, args.grace * 60)
+    print_report(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': rows}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Parallel model fitting for the anomaly detector
+Fits the Isolation Forests of many series in a pool of worker processes,
+with equal-length series shipped as stacked 2-D arrays and the pool sized to
+stay under a memory cap.
+"""
+
+import logging
+import math
+import multiprocessing
+import pickle
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from model_store import MetricModel, fit_model
+
+logger = logging.getLogger(__name__)
+
+# Resident size of an idle worker (interpreter, numpy, scikit-learn)
+WORKER_BYTES = 200 * 2 ** 20
+# Size of one fitted default forest until a real one has been measured
+DEFAULT_MODEL_BYTES = 2 * 2 ** 20
+
+
+def fit_chunk(
+    model_factory: Callable,
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    now: float,
+    drift_window: int,
+) -> List[MetricModel]:
+    """Worker task: fit one model per row of stacked (S, T) series"""
+    return [
+        fit_model(model_factory, ts, v, now, drift_window)
+        for ts, v in zip(timestamps, values)
+    ]
+
+
+def stack_by_length(
+    batch: Dict[str, Tuple[np.ndarray, np.ndarray]],
+) -> Dict[int, Tuple[List[str], np.ndarray, np.ndarray]]:
+    """
+    Group series by length and stack each group into 2-D arrays
+
+    Returns:
+        length -> (names, timestamps (S, T), values (S, T))
+    """
+    groups: Dict[int, List[str]] = {}
+    for name, (timestamps, _) in batch.items():
+        groups.setdefault(len(timestamps), []).append(name)
+    return {
+        length: (
+            names,
+            np.vstack([batch[name][0] for name in names]),
+            np.vstack([batch[name][1] for name in names]),
+        )
+        for length, names in groups.items()
+    }
+
+
+class ParallelFitter:
+    """
+    Fits many series' models across a process pool under a memory cap
+
+    Workers each hold their chunk's fitted models until they are sent
+    back, so the cap bounds workers x (WORKER_BYTES + chunk x model size).
+    The pool is sized once from the cap; chunks are made small enough to
+    fit and at most one per worker is in flight. A model's size is measured
+    from the first one fitted. When the cap leaves room for fewer than two
+    workers, or only one series needs fitting, models are fitted in this
+    process instead.
+
+    The pool is started lazily and reused across runs (spawned workers pay
+    the scikit-learn import once); call close() when done.
+    """
+
+    def __init__(self, workers: int, memory_limit_mb: float = 2048):
+        """
+        Args:
+            workers: Max worker processes (e.g. os.cpu_count())
+            memory_limit_mb: Memory budget of all workers together
+        """
+        self.workers = workers
+        self.memory_limit = memory_limit_mb * 2 ** 20
+        self.model_bytes: Optional[int] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_size = 0
+
+    def plan(self, series: int) -> Tuple[int, int]:
+        """(workers, series per chunk) for fitting `series` models; 0 workers = inline"""
+        model_bytes = self.model_bytes or DEFAULT_MODEL_BYTES
+        affordable = int(self.memory_limit // (WORKER_BYTES + model_bytes))
+        workers = min(self.workers, affordable, series)
+        if workers < 2:
+            return 0, series
+        per_worker = int((self.memory_limit / workers - WORKER_BYTES) // model_bytes)
+        # Several chunks per worker so a slow one doesn't hold up the rest
+        chunk = max(1, min(per_worker, math.ceil(series / (4 * workers))))
+        return workers, chunk
+
+    def _measure(self, model: MetricModel) -> None:
+        if self.model_bytes is None:
+            self.model_bytes = len(pickle.dumps(model))
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Sized from the cap alone, so idle workers never exceed it either
+            affordable = int(self.memory_limit // (WORKER_BYTES + (self.model_bytes or DEFAULT_MODEL_BYTES)))
+            self._pool_size = max(2, min(self.workers, affordable))
+            # spawn, not fork: the daemon forks from a process with live threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._pool_size, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._pool
+
+    def fit(
+        self,
+        model_factory: Callable,
+        batch: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        now: float,
+        drift_window: int = 12,
+    ) -> Dict[str, MetricModel]:
+        """Fitted model per series name"""
+        if not batch:
+            return {}
+        if self.model_bytes is None:
+            # Fit one inline first to size the chunks
+            name = next(iter(batch))
+            model = fit_model(model_factory, *batch[name], now, drift_window)
+            self._measure(model)
+            rest = {other: series for other, series in batch.items() if other != name}
+            return {name: model, **self.fit(model_factory, rest, now, drift_window)}
+
+        workers, chunk = self.plan(len(batch))
+        if workers == 0:
+            return {
+                name: fit_model(model_factory, timestamps, values, now, drift_window)
+                for name, (timestamps, values) in batch.items()
+            }
+
+        tasks = [
+            (names[i:i + chunk], timestamps[i:i + chunk], values[i:i + chunk])
+            for names, timestamps, values in stack_by_length(batch).values()
+            for i in range(0, len(names), chunk)
+        ]
+        pool = self._get_pool()
+        workers = min(workers, self._pool_size)
+        models: Dict[str, MetricModel] = {}
+        pending = {}
+        broken = False
+        while tasks or pending:
+            if broken and not pending:
+                names, timestamps, values = tasks.pop()
+                models.update(zip(names, fit_chunk(model_factory, timestamps, values, now, drift_window)))
+                continue
+            while tasks and not broken and len(pending) < workers:
+                names, timestamps, values = tasks.pop()
+                future = pool.submit(fit_chunk, model_factory, timestamps, values, now, drift_window)
+                pending[future] = (names, timestamps, values)
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                names, timestamps, values = pending.pop(future)
+                try:
+                    fitted = future.result()
+                except Exception as e:
+                    # e.g. a worker killed by the OOM killer: finish in this
+                    # process and start a fresh pool next time
+                    if not broken:
+                        logger.error(f"Parallel model fit failed ({e}); fitting the rest inline")
+                        broken = True
+                    fitted = fit_chunk(model_factory, timestamps, values, now, drift_window)
+                models.update(zip(names, fitted))
+        if broken:
+            self.close()
+        return models
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Batch scoring scale benchmark
+Scores a growing number of synthetic series (as per-pod or per-tool label
+sets expand a query) through the batch path and reports run time and series/s
+for the run that fits every model and for steady-state runs after it.
+
+Usage:
+    python benchmark_batch.py
+    python benchmark_batch.py --series 100 1000 5000 --engines ewma mad
+    python benchmark_batch.py --engines isolation_forest --series 200 --workers 4 --memory-mb 1024
+    python benchmark_batch.py --json results.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from anomaly_detector import AnomalyDetector
+from batch_fit import ParallelFitter
+from engines import ENGINES, EngineStore
+from model_store import ModelStore
+
+STEP = AnomalyDetector.STEP_SECONDS
+WINDOW = AnomalyDetector.LOOKBACK_SECONDS // STEP + 1
+# Room for this many steady-state runs after the first
+EXTRA_POINTS = 16
+
+
+def synthetic_batch(series: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    """
+    `series` daily-seasonal series with their own level and noise, one
+    window plus EXTRA_POINTS more each, on a shared grid
+
+    Returns:
+        {'timestamps': (T,), 'values': (S, T), 'names': [...]}
+    """
+    rng = np.random.default_rng(seed)
+    points = WINDOW + EXTRA_POINTS
+    t = np.arange(points)
+    level = rng.uniform(1.0, 1000.0, (series, 1))
+    noise = rng.uniform(0.01, 0.1, (series, 1))
+    values = level * (1 + 0.05 * np.sin(2 * np.pi * t / WINDOW) + noise * rng.standard_normal((series, points)))
+    return {
+        'timestamps': 1_700_000_000 // STEP * STEP + STEP * t,
+        'values': values,
+        'names': [f'metric{{pod="pod-{i}"}}' for i in range(series)],
+    }
+
+
+def make_store(engine: str, workers: int, memory_mb: float):
+    if engine == 'isolation_forest':
+        fitter = ParallelFitter(workers, memory_mb) if workers > 1 else None
+        # Refits only when due, as in the detector
+        return ModelStore(AnomalyDetector.new_isolation_forest, fitter=fitter)
+    return EngineStore(engine)
+
+
+def run_scale(engine: str, series: int, runs: int, workers: int, memory_mb: float) -> Dict:
+    """Time one run that fits every series' model, then `runs` steady-state runs"""
+    data = synthetic_batch(series)
+    timestamps, values = data['timestamps'], data['values']
+    store = make_store(engine, workers, memory_mb)
+    now = float(timestamps[WINDOW - 1])
+
+    def batch(end: int) -> Dict:
+        lo = end - WINDOW
+        return {name: (timestamps[lo:end], values[i, lo:end]) for i, name in enumerate(data['names'])}
+
+    start = time.perf_counter()
+    store.score_batch(batch(WINDOW), now)
+    first = time.perf_counter() - start
+
+    steady = []
+    for run in range(1, runs + 1):
+        window = batch(WINDOW + run)
+        start = time.perf_counter()
+        store.score_batch(window, now + run * STEP)
+        steady.append(time.perf_counter() - start)
+    if getattr(store, 'fitter', None) is not None:
+        store.fitter.close()
+
+    steady_seconds = float(np.median(steady)) if steady else None
+    return {
+        'engine': engine,
+        'series': series,
+        'workers': workers if engine == 'isolation_forest' else 1,
+        'first_run_seconds': first,
+        'first_run_series_per_second': series / first,
+        'steady_run_seconds': steady_seconds,
+        'steady_series_per_second': series / steady_seconds if steady_seconds else None,
+        # Includes finished fit workers
+        'max_rss_mb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                       + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024,
+    }
+
+
+def print_report(rows: List[Dict]) -> None:
+    print(f"\n{'engine':<18} {'series':>7} {'workers':>8} {'first run (s)':>14} {'series/s':>10} "
+          f"{'steady run (s)':>15} {'series/s':>10} {'max rss (MB)':>13}")
+    for row in rows:
+        steady = f"{row['steady_run_seconds']:.3f}" if row['steady_run_seconds'] is not None else '-'
+        rate = f"{row['steady_series_per_second']:.0f}" if row['steady_series_per_second'] else '-'
+        print(f"{row['engine']:<18} {row['series']:>7} {row['workers']:>8} {row['first_run_seconds']:>14.3f} "
+              f"{row['first_run_series_per_second']:>10.0f} {steady:>15} {rate:>10} {row['max_rss_mb']:>13.0f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Measure batch scoring throughput as the series count grows')
+    parser.add_argument('--engines', nargs='+', choices=['isolation_forest', *sorted(ENGINES)],
+                        default=['isolation_forest', 'ewma', 'mad'])
+    parser.add_argument('--series', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--runs', type=int, default=3, choices=range(0, EXTRA_POINTS + 1), metavar='0-16',
+                        help='Steady-state runs after the first')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Fit worker processes (Isolation Forest only)')
+    parser.add_argument('--memory-mb', type=float, default=2048, help='Memory cap of the fit workers')
+    parser.add_argument('--json', default=None, help='Also write the results here')
+    args = parser.parse_args(argv)
+
+    rows = [
+        run_scale(engine, series, args.runs, args.workers, args.memory_mb)
+        for engine in args.engines
+        for series in args.series
+    ]
+    print_report(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': rows}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
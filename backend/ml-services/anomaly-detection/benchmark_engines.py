@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Detector engine benchmark
+Streams synthetic metric series with injected anomalies through each engine,
+one 5-minute point per run, and compares detection delay, false alarms and
+CPU cost per point against the Isolation Forest path.
+
+Usage:
+    python benchmark_engines.py
+    python benchmark_engines.py --engines ewma mad --points 4032 --magnitude 5
+    python benchmark_engines.py --engines isolation_forest_refit --points 600   # pre-model-store path (slow)
+    python benchmark_engines.py --json results.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from anomaly_detector import AnomalyDetector
+from engines import ENGINES, ALERT_SCORE, EngineStore
+from model_store import ModelStore
+
+STEP = AnomalyDetector.STEP_SECONDS
+WINDOW = AnomalyDetector.LOOKBACK_SECONDS // STEP + 1
+ANOMALY_KINDS = ('spike', 'shift', 'drop')
+
+
+def synthetic_series(points: int, magnitude: float, seed: int, every: int = 250,
+                     shift_length: int = 36) -> Dict:
+    """
+    Daily-seasonal series (noise std 1) with an anomaly every `every` points
+    after the first day: alternately a one-point spike, a level shift up
+    lasting `shift_length` points and a one-point drop, `magnitude` noise
+    standard deviations from normal
+
+    Returns:
+        {'timestamps', 'values', 'anomalies': [{'kind', 'start', 'end'}]}
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(points)
+    values = 100.0 + 5.0 * np.sin(2 * np.pi * t / WINDOW) + rng.normal(0.0, 1.0, points)
+    anomalies = []
+    for i, start in enumerate(range(WINDOW + every // 2, points - shift_length, every)):
+        kind = ANOMALY_KINDS[i % len(ANOMALY_KINDS)]
+        end = start + (shift_length if kind == 'shift' else 1)
+        values[start:end] += -magnitude if kind == 'drop' else magnitude
+        anomalies.append({'kind': kind, 'start': start, 'end': end})
+    timestamps = 1_700_000_000 // STEP * STEP + STEP * t
+    return {'timestamps': timestamps, 'values': values, 'anomalies': anomalies}
+
+
+class RefitEveryRun:
+    """The pre-model-store path: refit a forest on the full window every run"""
+
+    def __init__(self):
+        self.detector = AnomalyDetector()
+
+    def score(self, name, timestamps, values, now):
+        return self.detector.detect_anomalies(values)[1], 'refit'
+
+
+def make_store(engine: str):
+    if engine == 'isolation_forest':
+        return ModelStore(AnomalyDetector.new_isolation_forest)
+    if engine == 'isolation_forest_refit':
+        return RefitEveryRun()
+    return EngineStore(engine)
+
+
+def stream(engine: str, series: Dict) -> Dict:
+    """
+    Score every point after the first window as if one run happened per point
+
+    Returns:
+        scores per point (NaN during the first window) and CPU seconds spent
+        scoring them
+    """
+    timestamps, values = series['timestamps'], series['values']
+    store = make_store(engine)
+    scores = np.full(len(values), np.nan)
+    cpu = 0.0
+    for i in range(WINDOW - 1, len(values)):
+        lo = i - WINDOW + 1
+        start = time.process_time()
+        scores[i], _ = store.score('metric', timestamps[lo:i + 1], values[lo:i + 1], float(timestamps[i]))
+        cpu += time.process_time() - start
+    return {'scores': scores, 'cpu_seconds': cpu}
+
+
+def evaluate(scores: np.ndarray, anomalies: List[Dict], threshold: float, max_delay: int) -> Dict:
+    """
+    Detection delay per anomaly (points from onset to the first score over
+    threshold, within max_delay) and false alarm rate on all other points
+    """
+    expected = np.zeros(len(scores), dtype=bool)
+    delays: List[Optional[int]] = []
+    for anomaly in anomalies:
+        start = anomaly['start']
+        stop = min(len(scores), max(anomaly['end'], start + max_delay + 1))
+        expected[start:stop] = True
+        hits = np.flatnonzero(scores[start:stop] > threshold)
+        delays.append(int(hits[0]) if hits.size else None)
+    scored = ~np.isnan(scores)
+    normal = scored & ~expected
+    detected = [d for d in delays if d is not None]
+    return {
+        'anomalies': len(anomalies),
+        'detected': len(detected),
+        'by_kind': {
+            kind: sum(1 for a, d in zip(anomalies, delays) if a['kind'] == kind and d is not None)
+            for kind in ANOMALY_KINDS
+        },
+        'median_delay_points': float(np.median(detected)) if detected else None,
+        'false_alarm_rate': float((scores[normal] > threshold).mean()) if normal.any() else 0.0,
+    }
+
+
+def run_benchmark(engines: List[str], points: int, magnitude: float, seeds: List[int],
+                  threshold: float = ALERT_SCORE, max_delay: int = 6) -> List[Dict]:
+    rows = []
+    for engine in engines:
+        totals = {'anomalies': 0, 'detected': 0, 'by_kind': dict.fromkeys(ANOMALY_KINDS, 0)}
+        delays, false_alarms, cpu, scored = [], [], 0.0, 0
+        for seed in seeds:
+            series = synthetic_series(points, magnitude, seed)
+            result = stream(engine, series)
+            metrics = evaluate(result['scores'], series['anomalies'], threshold, max_delay)
+            totals['anomalies'] += metrics['anomalies']
+            totals['detected'] += metrics['detected']
+            for kind, count in metrics['by_kind'].items():
+                totals['by_kind'][kind] += count
+            if metrics['median_delay_points'] is not None:
+                delays.append(metrics['median_delay_points'])
+            false_alarms.append(metrics['false_alarm_rate'])
+            cpu += result['cpu_seconds']
+            scored += int((~np.isnan(result['scores'])).sum())
+        rows.append({
+            'engine': engine,
+            **totals,
+            'median_delay_minutes': float(np.median(delays)) * STEP / 60 if delays else None,
+            'false_alarm_rate': float(np.mean(false_alarms)),
+            'cpu_us_per_point': cpu / scored * 1e6,
+        })
+    return rows
+
+
+def print_report(rows: List[Dict]) -> None:
+    print(f"\n{'engine':<24} {'detected':>9} {'spike':>6} {'shift':>6} {'drop':>6} "
+          f"{'delay(min)':>11} {'false alarms':>13} {'cpu us/pt':>10}")
+    for row in rows:
+        delay = f"{row['median_delay_minutes']:.0f}" if row['median_delay_minutes'] is not None else '-'
+        kinds = row['by_kind']
+        print(f"{row['engine']:<24} {row['detected']:>4}/{row['anomalies']:<4} {kinds['spike']:>6} "
+              f"{kinds['shift']:>6} {kinds['drop']:>6} {delay:>11} {row['false_alarm_rate']:>12.2%} "
+              f"{row['cpu_us_per_point']:>10.1f}")
+
+
+def main(argv=None) -> int:
+    choices = ['isolation_forest', 'isolation_forest_refit', *sorted(ENGINES)]
+    parser = argparse.ArgumentParser(description='Compare anomaly detector engines on synthetic series')
+    parser.add_argument('--engines', nargs='+', choices=choices,
+                        default=['isolation_forest', *sorted(ENGINES)])
+    parser.add_argument('--points', type=int, default=2016, help='Points per series (2016 = one week)')
+    parser.add_argument('--magnitude', type=float, default=6.0, help='Anomaly size in noise standard deviations')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--threshold', type=float, default=ALERT_SCORE)
+    parser.add_argument('--max-delay', type=int, default=6, help='Points after onset that still count as detected')
+    parser.add_argument('--json', default=None, help='Also write the results here')
+    args = parser.parse_args(argv)
+
+    rows = run_benchmark(args.engines, args.points, args.magnitude, args.seeds, args.threshold, args.max_delay)
+    print_report(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': rows}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Long-running anomaly detection daemon
+Keeps one warm AnomalyDetector (imports, connection pool, series cache) and
+runs it on a jittered interval, serving /health and /metrics between runs.
+/metrics carries the latest anomaly scores for Prometheus to scrape.
+"""
+
+import json
+import logging
+import random
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, generate_latest
+
+from score_export import ScoreCollector
+
+logger = logging.getLogger(__name__)
+
+
+class AnomalyDaemon:
+    """
+    Runs a detector every `interval` seconds until stopped
+
+    Runs are scheduled at a fixed rate, each start offset by up to
+    `jitter` x interval so replicas drift apart instead of hitting
+    Prometheus together. A run that overruns its slot is followed
+    immediately by the next one; runs never overlap.
+    """
+
+    def __init__(
+        self,
+        detector,
+        interval: float = 300.0,
+        jitter: float = 0.1,
+        host: str = '0.0.0.0',
+        port: int = 8000,
+        stale_after: Optional[float] = None,
+    ):
+        """
+        Args:
+            detector: AnomalyDetector to run (kept for the daemon's lifetime)
+            interval: Seconds between run starts
+            jitter: Max random offset of each start, as a fraction of interval
+            host: Bind address of the HTTP server
+            port: HTTP port (0 picks a free one)
+            stale_after: /health reports unhealthy when the last successful
+                run is older than this (default 3 intervals)
+        """
+        self.detector = detector
+        self.interval = interval
+        self.jitter = jitter
+        self.stale_after = stale_after or 3 * interval
+        self.started_at = time.time()
+        self.last_success: Optional[float] = None
+        self.last_scores: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._signalled = False
+        self._run_lock = threading.Lock()
+
+        self.registry = CollectorRegistry()
+        self.runs = Counter(
+            'anomaly_detector_runs_total', 'Detection runs by outcome',
+            labelnames=['status'], registry=self.registry
+        )
+        self.run_seconds = Gauge(
+            'anomaly_detector_run_duration_seconds', 'Duration of the last run',
+            registry=self.registry
+        )
+        self.fetch_seconds = Gauge(
+            'anomaly_detector_fetch_duration_seconds', 'Prometheus fetch time of the last run',
+            registry=self.registry
+        )
+        self.points_fetched = Gauge(
+            'anomaly_detector_points_fetched', 'Samples fetched from Prometheus in the last run',
+            registry=self.registry
+        )
+        self.series_scored = Gauge(
+            'anomaly_detector_series_scored', 'Series scored in the last run',
+            registry=self.registry
+        )
+        self.series_per_second = Gauge(
+            'anomaly_detector_scoring_series_per_second', 'Scoring throughput of the last run',
+            registry=self.registry
+        )
+        self.timed_out = Gauge(
+            'anomaly_detector_timed_out_queries', 'Queries cut off by the run deadline in the last run',
+            registry=self.registry
+        )
+        self.model_refits = Counter(
+            'anomaly_detector_model_refits_total', 'Per-series model refits by reason',
+            labelnames=['reason'], registry=self.registry
+        )
+        self.last_success_time = Gauge(
+            'anomaly_detector_last_success_timestamp_seconds', 'Unix time of the last successful run',
+            registry=self.registry
+        )
+        # anomaly_score and friends, read from the detector at scrape time
+        self.registry.register(ScoreCollector(detector))
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._server_thread = threading.Thread(
+            target=self.server.serve_forever, name='daemon-http', daemon=True
+        )
+
+    def _handler(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    self._send(200, CONTENT_TYPE_LATEST, generate_latest(daemon.registry))
+                elif self.path == '/health':
+                    health = daemon.health()
+                    code = 200 if health['status'] != 'unhealthy' else 503
+                    self._send(code, 'application/json', json.dumps(health).encode())
+                else:
+                    self._send(404, 'text/plain', b'not found\n')
+
+            def _send(self, code: int, content_type: str, body: bytes):
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def health(self) -> Dict:
+        """Status for /health: starting until the first run, unhealthy once stale"""
+        now = time.time()
+        if self.last_success is None:
+            stale = now - self.started_at > self.stale_after
+            status = 'unhealthy' if stale else 'starting'
+        elif now - self.last_success > self.stale_after:
+            status = 'unhealthy'
+        else:
+            status = 'healthy'
+        return {
+            'status': status,
+            'service': 'anomaly-detection',
+            'last_success': self.last_success,
+            'last_run': self.detector.last_run_stats,
+            'scores': self.last_scores,
+            'joint': self.detector.last_joint,
+        }
+
+    def run_once(self) -> Optional[Dict[str, float]]:
+        """One detection run; errors are logged and counted, never raised"""
+        with self._run_lock:
+            try:
+                scores = self.detector.run()
+            except Exception as e:
+                logger.error(f"Anomaly detection run failed: {e}")
+                self.runs.labels(status='error').inc()
+                return None
+
+            stats = self.detector.last_run_stats
+            self.runs.labels(status='success').inc()
+            self.run_seconds.set(stats.get('run_seconds', 0.0))
+            self.fetch_seconds.set(stats.get('fetch_seconds', 0.0))
+            self.points_fetched.set(stats.get('points_fetched', 0))
+            self.series_scored.set(stats.get('series', 0))
+            self.series_per_second.set(stats.get('series_per_second') or 0.0)
+            self.timed_out.set(len(stats.get('timed_out', [])))
+            for reason in stats.get('refits', {}).values():
+                self.model_refits.labels(reason=reason).inc()
+            self.last_success = time.time()
+            self.last_success_time.set(self.last_success)
+            self.last_scores = scores
+            return scores
+
+    def next_delay(self, run_started: float) -> float:
+        """Seconds to wait after a run that started at `run_started` (monotonic)"""
+        offset = random.uniform(-self.jitter, self.jitter) * self.interval
+        return max(0.0, run_started + self.interval + offset - time.monotonic())
+
+    def start_server(self) -> None:
+        self._server_thread.start()
+        logger.info(f"Daemon serving /health and /metrics on port {self.port}")
+
+    def serve_forever(self) -> None:
+        """Run on schedule until stop() (or SIGTERM via install_signal_handlers)"""
+        if not self._server_thread.is_alive():
+            self.start_server()
+        logger.info(f"Anomaly daemon started (interval {self.interval}s, jitter {self.jitter:.0%})")
+        try:
+            while not self.stopping:
+                run_started = time.monotonic()
+                self.run_once()
+                self._sleep(self.next_delay(run_started))
+        finally:
+            self.shutdown()
+
+    @property
+    def stopping(self) -> bool:
+        return self._signalled or self._stop.is_set()
+
+    def _sleep(self, seconds: float) -> None:
+        # Short slices: a signal that lands on another thread only runs its
+        # Python handler once the main thread wakes up
+        deadline = time.monotonic() + seconds
+        while not self.stopping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self._stop.wait(min(remaining, 1.0))
+
+    def stop(self) -> None:
+        """Ask the loop to exit; a run in progress is allowed to finish"""
+        self._stop.set()
+
+    def shutdown(self) -> None:
+        if self._signalled:
+            logger.info("Received SIGTERM/SIGINT; stopped after the current run")
+        self._stop.set()
+        # Wait for a run still in progress (e.g. stop() from another thread)
+        with self._run_lock:
+            if self._server_thread.is_alive():
+                self.server.shutdown()
+            self.server.server_close()
+            self.detector.close()
+        logger.info("Anomaly daemon stopped")
+
+    def install_signal_handlers(self) -> None:
+        """Stop gracefully on SIGTERM/SIGINT (main thread only)"""
+        def handle(signum, frame):
+            # Only a flag: Event.set() here could deadlock on the lock the
+            # interrupted main thread may be holding inside Event.wait()
+            self._signalled = True
+
+        signal.signal(signal.SIGTERM, handle)
+        signal.signal(signal.SIGINT, handle)
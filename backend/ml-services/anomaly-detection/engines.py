@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Streaming anomaly detector engines
+O(1)-per-point alternatives to the Isolation Forest path: EWMA z-score, robust
+median/MAD and half-space trees, all scoring on the same 0-1 scale.
+"""
+
+import logging
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# |z| that maps to the alerting threshold (anomaly_score > 0.7)
+Z_AT_THRESHOLD = 4.0
+ALERT_SCORE = 0.7
+# Below this many series per group, numpy's per-call overhead outweighs
+# vectorizing across them (measured crossover for ewma and mad)
+VECTORIZE_MIN_SERIES = 8
+
+
+def z_to_score(z: float, z_at_threshold: float = Z_AT_THRESHOLD) -> float:
+    """
+    Map a z-score to an anomaly score in [0, 1)
+
+    1 - exp(-c z^2), with c chosen so |z| = z_at_threshold scores 0.7:
+    z = 2 -> 0.26, 3 -> 0.49, 4 -> 0.70, 5 -> 0.85, 6 -> 0.93
+    """
+    c = -math.log(1 - ALERT_SCORE) / z_at_threshold ** 2
+    return 1.0 - math.exp(-c * z * z)
+
+
+def z_to_scores(z: np.ndarray, z_at_threshold=Z_AT_THRESHOLD) -> np.ndarray:
+    """z_to_score for arrays (z_at_threshold may be per element)"""
+    c = -np.log(1 - ALERT_SCORE) / np.square(z_at_threshold)
+    return 1.0 - np.exp(-c * np.square(z))
+
+
+class DetectorEngine:
+    """
+    Streaming detector for one metric
+
+    `update()` consumes new points in arrival order and returns one anomaly
+    score per point (0.0 to 1.0, higher = more anomalous), the same scale
+    as the Isolation Forest path. State stays constant-size however long
+    the stream runs. Points seen during warm-up score 0.0.
+    """
+
+    name = ''
+
+    def update(self, values: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    @classmethod
+    def update_batch(cls, engines: List['DetectorEngine'], values: np.ndarray) -> np.ndarray:
+        """
+        Feed row i of `values` (S, T) to engines[i]; returns scores (S, T)
+
+        Engines that can, override this to advance all S series with one
+        vectorized operation per point instead of S Python-level ones.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if not engines:
+            return np.zeros(values.shape)
+        return np.vstack([engine.update(row) for engine, row in zip(engines, values)])
+
+
+class EWMAEngine(DetectorEngine):
+    """
+    z-score of each point against an exponentially weighted forecast
+
+    The level follows the series quickly (`alpha`) so daily trends don't
+    count as deviations; the variance of the one-step-ahead residuals is
+    averaged slowly (`beta`). Residuals are clipped at `z_at_threshold`
+    standard deviations before they enter the variance, so one outlier
+    doesn't mask the ones after it.
+    """
+
+    name = 'ewma'
+
+    def __init__(self, alpha: float = 0.3, beta: float = 0.05, warmup: int = 10,
+                 z_at_threshold: float = Z_AT_THRESHOLD):
+        self.alpha = alpha
+        self.beta = beta
+        self.warmup = warmup
+        self.z_at_threshold = z_at_threshold
+        self.level: Optional[float] = None
+        self.var = 0.0
+        self.n = 0
+
+    def update(self, values: np.ndarray) -> np.ndarray:
+        scores = np.zeros(len(values))
+        for i, x in enumerate(np.asarray(values, dtype=np.float64)):
+            if self.level is None:
+                self.level = x
+                self.n = 1
+                continue
+            residual = x - self.level
+            std = math.sqrt(self.var)
+            if self.n >= self.warmup:
+                z = residual / std if std > 0 else (0.0 if residual == 0 else math.inf)
+                scores[i] = z_to_score(z, self.z_at_threshold)
+            if self.n < self.warmup or std == 0:
+                clipped = residual
+            else:
+                clipped = max(-self.z_at_threshold * std, min(self.z_at_threshold * std, residual))
+            # Plain mean of squares during warm-up, then exponential
+            weight = max(self.beta, 1.0 / self.n)
+            self.var += weight * (clipped * clipped - self.var)
+            self.level += self.alpha * residual
+            self.n += 1
+        return scores
+
+    @classmethod
+    def update_batch(cls, engines: List['EWMAEngine'], values: np.ndarray) -> np.ndarray:
+        """update() across series: state is gathered into arrays, stepped once per point and written back"""
+        values = np.asarray(values, dtype=np.float64)
+        scores = np.zeros(values.shape)
+        if values.shape[1] == 0:
+            return scores
+        fresh = np.array([engine.level is None for engine in engines], dtype=bool)
+        # Engines that haven't seen a point yet start from their first one
+        for i in np.flatnonzero(fresh):
+            engines[i].level, engines[i].n = float(values[i, 0]), 1
+        for rows, start in ((np.flatnonzero(fresh), 1), (np.flatnonzero(~fresh), 0)):
+            if rows.size:
+                scores[rows, start:] = cls._advance([engines[i] for i in rows], values[rows, start:])
+        return scores
+
+    @staticmethod
+    def _advance(engines: List['EWMAEngine'], values: np.ndarray) -> np.ndarray:
+        level = np.array([e.level for e in engines])
+        var = np.array([e.var for e in engines])
+        n = np.array([e.n for e in engines], dtype=np.float64)
+        alpha, beta, warmup, z_at = (
+            np.array([getattr(e, attr) for e in engines], dtype=np.float64)
+            for attr in ('alpha', 'beta', 'warmup', 'z_at_threshold')
+        )
+        scores = np.zeros(values.shape)
+        for t in range(values.shape[1]):
+            residual = values[:, t] - level
+            std = np.sqrt(var)
+            warm = n >= warmup
+            with np.errstate(divide='ignore', invalid='ignore'):
+                z = np.where(std > 0, residual / std, np.where(residual == 0, 0.0, np.inf))
+            scores[:, t] = np.where(warm, z_to_scores(z, z_at), 0.0)
+            limit = z_at * std
+            clipped = np.where(warm & (std > 0), np.clip(residual, -limit, limit), residual)
+            weight = np.maximum(beta, 1.0 / n)
+            var += weight * (clipped * clipped - var)
+            level += alpha * residual
+            n += 1
+        for engine, lv, vr, count in zip(engines, level, var, n):
+            engine.level, engine.var, engine.n = float(lv), float(vr), int(count)
+        return scores
+
+
+class RobustMADEngine(DetectorEngine):
+    """
+    Robust z-score 0.6745 (x - median) / MAD with streaming estimates
+
+    The median steps `rate` x MAD towards each point and the MAD is scaled
+    up or down by (1 + `mad_rate`): both converge on the running median and
+    MAD, while any single point moves them by a bounded step. That way
+    outliers don't mask the ones that follow. The median's fast rate lets
+    it keep up with daily trends.
+    """
+
+    name = 'mad'
+
+    def __init__(self, rate: float = 0.3, mad_rate: float = 0.05, warmup: int = 20,
+                 z_at_threshold: float = Z_AT_THRESHOLD):
+        self.rate = rate
+        self.mad_rate = mad_rate
+        self.warmup = warmup
+        self.z_at_threshold = z_at_threshold
+        self._buffer: List[float] = []
+        self.median: Optional[float] = None
+        self.mad = 0.0
+
+    def _floor(self) -> float:
+        return 1e-6 * max(1.0, abs(self.median))
+
+    def update(self, values: np.ndarray) -> np.ndarray:
+        scores = np.zeros(len(values))
+        for i, x in enumerate(np.asarray(values, dtype=np.float64)):
+            if self.median is None:
+                self._buffer.append(x)
+                if len(self._buffer) >= self.warmup:
+                    self._start(np.array(self._buffer))
+                continue
+            deviation = x - self.median
+            scores[i] = z_to_score(0.6745 * deviation / self.mad, self.z_at_threshold)
+            if abs(deviation) > self.mad:
+                self.mad *= 1 + self.mad_rate
+            else:
+                self.mad = max(self.mad / (1 + self.mad_rate), self._floor())
+            self.median += self.rate * self.mad * np.sign(deviation)
+        return scores
+
+    def _start(self, warm: np.ndarray) -> None:
+        self.median = float(np.median(warm))
+        # MAD of successive differences / sqrt(2): robust to a trend in the warm-up
+        self.mad = max(float(np.median(np.abs(np.diff(warm)))) / math.sqrt(2), self._floor())
+        self._buffer = []
+
+    @classmethod
+    def update_batch(cls, engines: List['RobustMADEngine'], values: np.ndarray) -> np.ndarray:
+        """update() across series: state is gathered into arrays, stepped once per point and written back"""
+        values = np.asarray(values, dtype=np.float64)
+        scores = np.zeros(values.shape)
+        ready = np.flatnonzero([engine.median is not None for engine in engines])
+        # New engines whose whole warm-up is in this batch start together,
+        # the rest of the warming ones go one by one
+        starting: Dict[int, List[int]] = {}
+        for i, engine in enumerate(engines):
+            if engine.median is not None:
+                continue
+            if not engine._buffer and values.shape[1] >= engine.warmup:
+                starting.setdefault(engine.warmup, []).append(i)
+            else:
+                scores[i] = engine.update(values[i])
+        for warmup, rows in starting.items():
+            for i in rows:
+                engines[i]._start(values[i, :warmup])
+            scores[np.ix_(rows, range(warmup, values.shape[1]))] = cls._advance(
+                [engines[i] for i in rows], values[rows, warmup:]
+            )
+        if ready.size:
+            scores[ready] = cls._advance([engines[i] for i in ready], values[ready])
+        return scores
+
+    @staticmethod
+    def _advance(engines: List['RobustMADEngine'], values: np.ndarray) -> np.ndarray:
+        median = np.array([e.median for e in engines])
+        mad = np.array([e.mad for e in engines])
+        rate, mad_rate, z_at = (
+            np.array([getattr(e, attr) for e in engines], dtype=np.float64)
+            for attr in ('rate', 'mad_rate', 'z_at_threshold')
+        )
+        scores = np.zeros(values.shape)
+        for t in range(values.shape[1]):
+            deviation = values[:, t] - median
+            scores[:, t] = z_to_scores(0.6745 * deviation / mad, z_at)
+            floor = 1e-6 * np.maximum(1.0, np.abs(median))
+            mad = np.where(np.abs(deviation) > mad, mad * (1 + mad_rate), np.maximum(mad / (1 + mad_rate), floor))
+            median += rate * mad * np.sign(deviation)
+        for engine, md, spread in zip(engines, median, mad):
+            engine.median, engine.mad = float(md), float(spread)
+        return scores
+
+
+class HalfSpaceTreesEngine(DetectorEngine):
+    """
+    Streaming half-space trees (Tan, Ting & Liu, 2011) for a 1-D series
+
+    Each tree halves a randomly perturbed workspace around the warm-up
+    range down to `depth`, and counts how many points of the reference
+    window (the previous `window` points) fell in each node. A point's raw
+    score is, per tree, mass x 2^depth of the first node on its path whose
+    mass is below `size_limit`. Sparse regions score low.
+    The masses are swapped in every `window` points. In one dimension a
+    point's path is just the binary expansion of its leaf index, so an
+    update is a few vectorized operations over the trees.
+
+    Raw scores are proportional to local density, so they are compared
+    with the median raw score of the reference window's own points
+    (recomputed once per window swap, amortized O(1) per point). The
+    density ratio is turned into a z-score as if the series were Gaussian,
+    z^2 = -2 ln(raw / median), and scored like the z-score engines: a
+    point as dense as usual scores 0, one in an empty region 1.0.
+
+    With `detrend_alpha` set, the trees see each point's residual from a
+    fast EWMA level rather than its value. A spike that stays within the
+    daily range is still far out in the residual distribution.
+    """
+
+    name = 'hst'
+
+    def __init__(self, n_trees: int = 25, depth: int = 8, window: int = 288,
+                 size_limit: float = 3.0, seed: int = 42,
+                 detrend_alpha: Optional[float] = 0.3,
+                 z_at_threshold: float = Z_AT_THRESHOLD):
+        self.n_trees = n_trees
+        self.depth = depth
+        self.window = window
+        # The paper's 0.1 x window stops too high up the tree to tell an
+        # empty region from a merely thin one in 1-D
+        self.size_limit = size_limit
+        self.z_at_threshold = z_at_threshold
+        self.detrend_alpha = detrend_alpha
+        self.level: Optional[float] = None
+        self.rng = np.random.default_rng(seed)
+        self._buffer: List[float] = []
+        self.lo = self.hi = 0.0
+        self.work_lo: Optional[np.ndarray] = None
+        self.work_width: Optional[np.ndarray] = None
+        nodes = 2 ** (depth + 1)
+        self.reference = np.zeros((n_trees, nodes))
+        self.latest = np.zeros((n_trees, nodes))
+        self.count = 0
+        self._levels = np.arange(depth + 1)
+        self._rows = np.arange(n_trees)[:, None]
+        self._window_values: List[float] = []
+        self.typical = 0.0
+
+    def _build(self, warm: np.ndarray) -> None:
+        self.lo, self.hi = float(warm.min()), float(warm.max())
+        # Per-tree workspace [s - r, s + r] with s ~ U(0, 1), r = 2 max(s, 1 - s)
+        # in units of the warm-up range, so every tree covers it twice over
+        s = self.rng.uniform(size=self.n_trees)
+        r = 2 * np.maximum(s, 1 - s)
+        self.work_lo = s - r
+        self.work_width = 2 * r
+
+    def _path(self, x: float) -> np.ndarray:
+        """Heap index of the node at every depth on x's path, per tree (T, depth + 1)"""
+        span = self.hi - self.lo or 1.0
+        u = (x - self.lo) / span
+        leaves = np.clip(
+            ((u - self.work_lo) / self.work_width * 2 ** self.depth).astype(np.int64),
+            0, 2 ** self.depth - 1
+        )
+        return (1 << self._levels) + (leaves[:, None] >> (self.depth - self._levels))
+
+    def _raw(self, path: np.ndarray) -> float:
+        mass = self.reference[self._rows, path]
+        below = mass < self.size_limit
+        level = np.where(below.any(axis=1), below.argmax(axis=1), self.depth)
+        return float((mass[self._rows[:, 0], level] * 2.0 ** level).sum())
+
+    def _swap(self) -> None:
+        self.reference, self.latest = self.latest, np.zeros_like(self.latest)
+        self.typical = float(np.median([self._raw(self._path(x)) for x in self._window_values]))
+        self._window_values = []
+        self.count = 0
+
+    def update(self, values: np.ndarray) -> np.ndarray:
+        scores = np.zeros(len(values))
+        for i, x in enumerate(np.asarray(values, dtype=np.float64)):
+            if self.detrend_alpha is not None:
+                if self.level is None:
+                    self.level = x
+                x, self.level = x - self.level, self.level + self.detrend_alpha * (x - self.level)
+            if self.work_lo is None:
+                self._buffer.append(x)
+                if len(self._buffer) < self.window:
+                    continue
+                self._build(np.array(self._buffer))
+                for warm in self._buffer:
+                    self.latest[self._rows, self._path(warm)] += 1
+                self._window_values, self._buffer = self._buffer, []
+                self._swap()
+                continue
+            path = self._path(x)
+            if self.typical > 0:
+                ratio = self._raw(path) / self.typical
+                if ratio < 1:
+                    z = math.sqrt(-2 * math.log(ratio)) if ratio > 0 else math.inf
+                    scores[i] = z_to_score(z, self.z_at_threshold)
+            self.latest[self._rows, path] += 1
+            self._window_values.append(x)
+            self.count += 1
+            if self.count >= self.window:
+                self._swap()
+        return scores
+
+
+ENGINES = {engine.name: engine for engine in (EWMAEngine, RobustMADEngine, HalfSpaceTreesEngine)}
+
+
+class EngineStore:
+    """
+    One streaming engine per metric, fed only the points it has not seen
+
+    Drop-in for ModelStore: the first call for a metric warms a new engine
+    up on the whole window (reported as a 'missing' refit), later calls
+    cost O(new points).
+    """
+
+    def __init__(self, engine: str, **params):
+        """
+        Raises:
+            ValueError: If `engine` is not one of ENGINES
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown detector engine '{engine}' (choose from {', '.join(sorted(ENGINES))})")
+        self.engine = engine
+        self.params = params
+        self._streams: Dict[str, Tuple[DetectorEngine, Optional[int], float]] = {}
+        # (timestamps, scores) of the points scored by the last score_batch()
+        self.scored: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def score(
+        self,
+        name: str,
+        timestamps: np.ndarray,
+        values: np.ndarray,
+        now: float,
+    ) -> Tuple[float, Optional[str]]:
+        """
+        Anomaly score of a metric's latest point
+
+        Returns:
+            - anomaly score of the newest point
+            - 'missing' when the metric's engine was just created, else None
+        """
+        reason = None
+        if name not in self._streams:
+            self._streams[name] = (ENGINES[self.engine](**self.params), None, 0.0)
+            reason = 'missing'
+        engine, last_ts, last_score = self._streams[name]
+
+        new = timestamps > last_ts if last_ts is not None else np.ones(len(timestamps), dtype=bool)
+        if new.any():
+            scores = engine.update(values[new])
+            last_ts, last_score = int(timestamps[new][-1]), float(scores[-1])
+            self._streams[name] = (engine, last_ts, last_score)
+        return last_score, reason
+
+    def score_batch(
+        self,
+        batch: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        now: float,
+    ) -> Dict[str, Tuple[float, Optional[str]]]:
+        """
+        Like score() for many series at once
+
+        Series with the same number of new points are stacked into one
+        (S, T) array and advanced together by the engine's update_batch
+        (groups smaller than VECTORIZE_MIN_SERIES go one by one).
+
+        Returns:
+            (score, 'missing' or None) per series name
+        """
+        results: Dict[str, Tuple[float, Optional[str]]] = {}
+        reasons: Dict[str, Optional[str]] = {}
+        self.scored = {}
+        groups: Dict[int, List[Tuple[str, np.ndarray, np.ndarray]]] = {}
+        for name, (timestamps, values) in batch.items():
+            reasons[name] = None
+            if name not in self._streams:
+                self._streams[name] = (ENGINES[self.engine](**self.params), None, 0.0)
+                reasons[name] = 'missing'
+            _, last_ts, last_score = self._streams[name]
+            new = timestamps > last_ts if last_ts is not None else np.ones(len(timestamps), dtype=bool)
+            if not new.any():
+                results[name] = (last_score, reasons[name])
+                continue
+            groups.setdefault(int(new.sum()), []).append((name, timestamps[new], values[new]))
+
+        for members in groups.values():
+            engines = [self._streams[name][0] for name, _, _ in members]
+            engine_type = ENGINES[self.engine] if len(members) >= VECTORIZE_MIN_SERIES else DetectorEngine
+            scores = engine_type.update_batch(engines, np.vstack([values for _, _, values in members]))
+            for (name, timestamps, _), engine, row in zip(members, engines, scores):
+                self._streams[name] = (engine, int(timestamps[-1]), float(row[-1]))
+                results[name] = (float(row[-1]), reasons[name])
+                # A new engine's warm-up window isn't news; only its latest point is
+                self.scored[name] = (timestamps, row) if reasons[name] is None else (timestamps[-1:], row[-1:])
+        return results
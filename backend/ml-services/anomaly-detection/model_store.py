@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Per-metric model store for the anomaly detector
+Fits one Isolation Forest per metric, refits it on a schedule or when the
+series drifts, persists it with joblib and otherwise only scores new points.
+"""
+
+import hashlib
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.ensemble import IsolationForest
+
+logger = logging.getLogger(__name__)
+
+# Bump when MetricModel fields change meaning
+MODEL_FORMAT_VERSION = 1
+# Names usable as file names as they are; others (series ids carry label
+# values) are hashed
+SAFE_NAME = re.compile(r'[A-Za-z0-9_.:-]{1,128}')
+
+
+@dataclass
+class MetricModel:
+    """
+    A fitted forest plus what is needed to score new points on the scale
+    of its training window
+    """
+
+    forest: IsolationForest
+    raw_min: float  # score_samples range over the training window
+    raw_max: float
+    level: float  # mean of the last drift_window training points
+    std: float  # std of the whole training window
+    fitted_at: float
+    last_ts: int  # newest timestamp scored
+    last_score: float
+
+    def score(self, values: np.ndarray) -> np.ndarray:
+        """
+        Anomaly scores (0.0 to 1.0, higher = more anomalous) of new values
+
+        Normalized with the training window's raw score range, so the point
+        that was the most anomalous at fit time scores 1.0; values more
+        extreme than anything in the training window are clipped to 1.0.
+        """
+        raw = self.forest.score_samples(values.reshape(-1, 1))
+        if self.raw_max <= self.raw_min:
+            return np.zeros_like(raw)
+        return np.clip(1 - (raw - self.raw_min) / (self.raw_max - self.raw_min), 0.0, 1.0)
+
+    def drift(self, values: np.ndarray) -> float:
+        """Shift of the mean of `values` from the fit-time level, in training std units"""
+        if values.size == 0:
+            return 0.0
+        return abs(float(values.mean()) - self.level) / max(self.std, 1e-9)
+
+
+def fit_model(
+    model_factory: Callable[[], IsolationForest],
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    now: float,
+    drift_window: int = 12,
+) -> MetricModel:
+    """Fit a model on one series' window and score the window's latest point"""
+    forest = model_factory()
+    X = values.reshape(-1, 1)
+    forest.fit(X)
+    raw = forest.score_samples(X)
+    raw_min, raw_max = float(raw.min()), float(raw.max())
+    if raw_max > raw_min:
+        latest = 1 - (raw[-1] - raw_min) / (raw_max - raw_min)
+    else:
+        latest = 0.0
+    return MetricModel(
+        forest=forest,
+        raw_min=raw_min,
+        raw_max=raw_max,
+        level=float(values[-drift_window:].mean()),
+        std=float(values.std()),
+        fitted_at=now,
+        last_ts=int(timestamps[-1]),
+        last_score=float(latest),
+    )
+
+
+class ModelStore:
+    """
+    Fitted models by metric (or series) name, kept in memory and optionally on disk
+
+    A metric is refit on its full window when it has no model, when its
+    model is older than `refit_interval`, or when the mean of its last
+    `drift_window` points has moved more than `drift_threshold` training
+    standard deviations since the fit. Comparing with the level at fit time
+    rather than the window mean means a level shift triggers one refit, not
+    one per run until the shift fills the window. In between, only points
+    newer than the last scored timestamp go through the forest.
+    """
+
+    def __init__(
+        self,
+        model_factory: Callable[[], IsolationForest],
+        model_dir: Optional[str] = None,
+        refit_interval: float = 6 * 3600,
+        drift_threshold: float = 3.0,
+        drift_window: int = 12,
+        fitter=None,
+    ):
+        """
+        Args:
+            model_factory: Builds an unfitted forest (must be picklable when
+                a fitter with worker processes is used)
+            model_dir: Directory to persist models in; None keeps them in memory only
+            refit_interval: Max model age in seconds (0 refits on every run)
+            drift_threshold: Mean shift, in training std units, that forces a refit
+            drift_window: Number of most recent points checked for drift
+            fitter: batch_fit.ParallelFitter to fit many models at once;
+                None fits them one by one in this process
+        """
+        self.model_factory = model_factory
+        self.fitter = fitter
+        self.model_dir = model_dir
+        self.refit_interval = refit_interval
+        self.drift_threshold = drift_threshold
+        self.drift_window = drift_window
+        self._models: Dict[str, MetricModel] = {}
+        # (timestamps, scores) of the points scored by the last score_batch()
+        self.scored: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        if model_dir:
+            os.makedirs(model_dir, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        if not SAFE_NAME.fullmatch(name):
+            name = hashlib.sha256(name.encode()).hexdigest()[:16]
+        return os.path.join(self.model_dir, f'{name}.joblib')
+
+    def get(self, name: str) -> Optional[MetricModel]:
+        """Model for a metric from memory, else from disk"""
+        if name in self._models:
+            return self._models[name]
+        if not self.model_dir or not os.path.exists(self._path(name)):
+            return None
+        try:
+            saved = joblib.load(self._path(name))
+        except Exception as e:
+            logger.warning(f"Could not load model for {name}: {e}")
+            return None
+        if saved.get('version') != MODEL_FORMAT_VERSION or saved.get('sklearn') != sklearn.__version__:
+            logger.info(f"Stored model for {name} is from another version; refitting")
+            return None
+        self._models[name] = saved['model']
+        return saved['model']
+
+    def save(self, name: str, model: MetricModel) -> None:
+        if not self.model_dir:
+            return
+        tmp = self._path(name) + '.tmp'
+        try:
+            joblib.dump(
+                {'version': MODEL_FORMAT_VERSION, 'sklearn': sklearn.__version__, 'model': model},
+                tmp
+            )
+            os.replace(tmp, self._path(name))
+        except Exception as e:
+            logger.warning(f"Could not save model for {name}: {e}")
+
+    def fit(self, name: str, timestamps: np.ndarray, values: np.ndarray, now: float) -> MetricModel:
+        """Fit a metric's model on its window and score the window's latest point"""
+        return self.fit_many({name: (timestamps, values)}, now)[name]
+
+    def fit_many(self, batch: Dict[str, Tuple[np.ndarray, np.ndarray]], now: float) -> Dict[str, MetricModel]:
+        """Fit, keep and save the models of many series, in parallel if a fitter is set"""
+        if self.fitter is not None and len(batch) > 1:
+            models = self.fitter.fit(self.model_factory, batch, now, self.drift_window)
+        else:
+            models = {
+                name: fit_model(self.model_factory, timestamps, values, now, self.drift_window)
+                for name, (timestamps, values) in batch.items()
+            }
+        for name, model in models.items():
+            self._models[name] = model
+            self.save(name, model)
+        return models
+
+    def refit_reason(self, model: Optional[MetricModel], values: np.ndarray, now: float) -> Optional[str]:
+        if model is None:
+            return 'missing'
+        if now - model.fitted_at >= self.refit_interval:
+            return 'age'
+        if model.drift(values[-self.drift_window:]) > self.drift_threshold:
+            return 'drift'
+        return None
+
+    def score(
+        self,
+        name: str,
+        timestamps: np.ndarray,
+        values: np.ndarray,
+        now: float,
+    ) -> Tuple[float, Optional[str]]:
+        """
+        Anomaly score of a metric's latest point, refitting if needed
+
+        Returns:
+            - anomaly score of the newest point
+            - why the model was refit, or None if only new points were scored
+        """
+        return self.score_batch({name: (timestamps, values)}, now)[name]
+
+    def score_batch(
+        self,
+        batch: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        now: float,
+    ) -> Dict[str, Tuple[float, Optional[str]]]:
+        """
+        Like score() for many series at once: all refits due are fitted
+        together (see fit_many), the rest only score their new points.
+        Every point scored is kept in `scored`; a refit scores only the
+        newest one.
+
+        Returns:
+            (score, refit reason) per series name
+        """
+        results: Dict[str, Tuple[float, Optional[str]]] = {}
+        due: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        reasons: Dict[str, str] = {}
+        self.scored = {}
+        for name, (timestamps, values) in batch.items():
+            model = self.get(name)
+            reason = self.refit_reason(model, values, now)
+            if reason is not None:
+                due[name], reasons[name] = (timestamps, values), reason
+                continue
+            new = timestamps > model.last_ts
+            if new.any():
+                scores = model.score(values[new])
+                model.last_ts = int(timestamps[new][-1])
+                model.last_score = float(scores[-1])
+                self.scored[name] = (timestamps[new], scores)
+            results[name] = (model.last_score, None)
+
+        for name, model in self.fit_many(due, now).items():
+            results[name] = (model.last_score, reasons[name])
+            self.scored[name] = (np.array([model.last_ts]), np.array([model.last_score]))
+        return results
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Multivariate anomaly detection across correlated metrics
+Aligns all monitored series on one timestamp grid, scores joint anomalies with
+a single Isolation Forest and attributes each one to the contributing metrics.
+"""
+
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+logger = logging.getLogger(__name__)
+
+# Per-metric feature block, in column order
+METRIC_FEATURES = ('value', 'delta', 'rolling_mean', 'rolling_std')
+
+
+def align_series(
+    series: Dict[str, Tuple[np.ndarray, np.ndarray]],
+    start_ts: int,
+    end_ts: int,
+    step: int,
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Put every series on the shared grid start_ts, start_ts + step, ..., end_ts
+
+    Missing samples are carried forward from the previous one; samples
+    missing before a series' first value take its median. Series with no
+    samples in the window are dropped.
+
+    Returns:
+        - grid timestamps (T,)
+        - values (T, M), one column per kept metric
+        - names of the kept metrics, in column order
+    """
+    grid = np.arange(start_ts, end_ts + 1, step, dtype=np.int64)
+    names, columns = [], []
+    for name, (timestamps, values) in sorted(series.items()):
+        column = np.full(grid.size, np.nan)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        on_grid = (timestamps >= start_ts) & (timestamps <= end_ts) & ((timestamps - start_ts) % step == 0)
+        column[(timestamps[on_grid] - start_ts) // step] = np.asarray(values, dtype=np.float64)[on_grid]
+        present = ~np.isnan(column)
+        if not present.any():
+            logger.warning(f"No samples for {name} in the multivariate window; leaving it out")
+            continue
+        # Forward fill: index of the last present sample at or before each row
+        last = np.maximum.accumulate(np.where(present, np.arange(grid.size), -1))
+        column = np.where(last >= 0, column[np.maximum(last, 0)], np.nanmedian(column))
+        names.append(name)
+        columns.append(column)
+    matrix = np.column_stack(columns) if columns else np.empty((grid.size, 0))
+    return grid, matrix, names
+
+
+def rolling_mean_std(matrix: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Trailing mean and std over up to `window` rows, for all columns at once"""
+    rows = matrix.shape[0]
+    padded = np.vstack([np.zeros((1, matrix.shape[1])), matrix])
+    sums = np.cumsum(padded, axis=0)
+    squares = np.cumsum(padded ** 2, axis=0)
+    hi = np.arange(1, rows + 1)
+    lo = np.maximum(0, hi - window)
+    n = (hi - lo)[:, None]
+    mean = (sums[hi] - sums[lo]) / n
+    var = (squares[hi] - squares[lo]) / n - mean ** 2
+    return mean, np.sqrt(np.maximum(var, 0.0))
+
+
+def build_features(grid: np.ndarray, matrix: np.ndarray, window: int = 12) -> np.ndarray:
+    """
+    Feature matrix (T, 4 x M + 2): per metric its value, first difference and
+    trailing rolling mean/std, then hour of day as a point on the unit circle
+
+    Columns are grouped per metric (see METRIC_FEATURES), so metric j owns
+    columns [4j, 4j + 4).
+    """
+    delta = np.vstack([np.zeros((1, matrix.shape[1])), np.diff(matrix, axis=0)])
+    mean, std = rolling_mean_std(matrix, window)
+    # (T, M, 4) -> (T, 4M), keeping each metric's features adjacent
+    blocks = np.stack([matrix, delta, mean, std], axis=2).reshape(matrix.shape[0], -1)
+    hours = (grid % 86400) / 3600.0
+    angle = 2 * np.pi * hours / 24.0
+    return np.column_stack([blocks, np.sin(angle), np.cos(angle)])
+
+
+class MultivariateDetector:
+    """
+    One Isolation Forest over all metrics' features, refit on a schedule
+
+    Features are robust-standardized (median/MAD of the training window),
+    so a standardized value of 0 is "typical". A metric's contribution to
+    a joint anomaly is its share of the row's squared standardized
+    deviation, summed over its feature block. (Ablation, i.e. resetting a
+    block to 0 and rescoring, credits every metric with ordinary noise too,
+    so quiet metrics took large shares.)
+    """
+
+    def __init__(
+        self,
+        model_factory: Callable[[], IsolationForest],
+        rolling_window: int = 12,
+        refit_interval: float = 6 * 3600,
+    ):
+        self.model_factory = model_factory
+        self.rolling_window = rolling_window
+        self.refit_interval = refit_interval
+        self.forest: Optional[IsolationForest] = None
+        self.metrics: List[str] = []
+        self.center: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        self.raw_min = 0.0
+        self.raw_max = 0.0
+        self.fitted_at = 0.0
+
+    def _normalize(self, raw: np.ndarray) -> np.ndarray:
+        if self.raw_max <= self.raw_min:
+            return np.zeros_like(raw)
+        return np.clip(1 - (raw - self.raw_min) / (self.raw_max - self.raw_min), 0.0, 1.0)
+
+    def fit(self, features: np.ndarray, metrics: List[str], now: float) -> None:
+        self.center = np.median(features, axis=0)
+        mad = np.median(np.abs(features - self.center), axis=0) * 1.4826
+        std = features.std(axis=0)
+        # MAD is 0 for mostly-constant columns; fall back to std, then 1
+        self.scale = np.where(mad > 0, mad, np.where(std > 0, std, 1.0))
+        X = (features - self.center) / self.scale
+        self.forest = self.model_factory()
+        self.forest.fit(X)
+        raw = self.forest.score_samples(X)
+        self.raw_min, self.raw_max = float(raw.min()), float(raw.max())
+        self.metrics = list(metrics)
+        self.fitted_at = now
+
+    def attribute(self, row: np.ndarray) -> Dict[str, float]:
+        """Share of a standardized row's deviation owed to each metric"""
+        width = len(METRIC_FEATURES)
+        blocks = row[:width * len(self.metrics)].reshape(len(self.metrics), width)
+        deviation = (blocks ** 2).sum(axis=1)
+        total = deviation.sum()
+        if total <= 0:
+            return {name: 0.0 for name in self.metrics}
+        return {name: float(share) for name, share in zip(self.metrics, deviation / total)}
+
+    def score(
+        self,
+        series: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        start_ts: int,
+        end_ts: int,
+        step: int,
+        now: float,
+    ) -> Optional[Dict]:
+        """
+        Joint anomaly score of the latest grid point, with attribution
+
+        Returns:
+            {'score', 'timestamp', 'contributions': {metric: share}, 'refit'},
+            or None if fewer than two metrics have data
+        """
+        grid, matrix, metrics = align_series(series, start_ts, end_ts, step)
+        if len(metrics) < 2:
+            logger.warning("Multivariate mode needs at least two metrics with data")
+            return None
+        features = build_features(grid, matrix, self.rolling_window)
+
+        refit = None
+        if self.forest is None:
+            refit = 'missing'
+        elif metrics != self.metrics:
+            refit = 'metrics_changed'
+        elif now - self.fitted_at >= self.refit_interval:
+            refit = 'age'
+        if refit:
+            self.fit(features, metrics, now)
+
+        # Only the newest row is scored between refits
+        row = (features[-1] - self.center) / self.scale
+        score = float(self._normalize(self.forest.score_samples(row[None, :]))[0])
+        return {
+            'score': score,
+            'timestamp': int(grid[-1]),
+            'contributions': self.attribute(row),
+            'refit': refit,
+        }
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Anomaly score export
+Exposes the latest scores of every series at scrape time and optionally ships
+every scored point, with its sample timestamp, to a Prometheus remote-write
+endpoint in batched, snappy-compressed protobuf requests.
+"""
+
+import logging
+import queue
+import struct
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import requests
+from prometheus_client.core import Metric
+
+from series_cache import SeriesKey, series_labels
+
+try:
+    import snappy
+except ImportError:  # pragma: no cover - optional dependency
+    snappy = None
+
+logger = logging.getLogger(__name__)
+
+# One remote-write time series: (labels including __name__, ms timestamps, values)
+TimeSeries = Tuple[Dict[str, str], np.ndarray, np.ndarray]
+# Remote-written metrics get their own names: written into the Prometheus that
+# also scrapes /metrics, 5-minute-old points would land behind the scraped
+# samples of the same series and be rejected as out of order
+HISTORY_SUFFIX = '_history'
+
+
+class ScoreCollector:
+    """
+    prometheus_client collector for the detector's latest scores
+
+    Reads the detector's state when scraped, so nothing is rebuilt per run
+    and a series that stops reporting simply disappears from the output.
+    """
+
+    def __init__(self, detector):
+        self.detector = detector
+
+    def collect(self) -> Iterator[Metric]:
+        scores = Metric('anomaly_score', 'Anomaly score (0-1, higher = more anomalous)', 'gauge')
+        for metric_name, series_scores in self.detector.series_scores.items():
+            # A metric without data still reports 0.0
+            for key, score in (series_scores or {(): 0.0}).items():
+                scores.add_sample('anomaly_score', {'metric_name': metric_name, **series_labels(key)}, score)
+        yield scores
+
+        joint = self.detector.last_joint
+        if joint is not None:
+            joint_score = Metric('anomaly_joint_score', 'Joint anomaly score across all monitored metrics (0-1)',
+                                 'gauge')
+            joint_score.add_sample('anomaly_joint_score', {}, joint['score'])
+            yield joint_score
+            contributions = Metric('anomaly_joint_contribution', "Metric's share of the joint anomaly score (0-1)",
+                                   'gauge')
+            for metric_name, share in joint['contributions'].items():
+                contributions.add_sample('anomaly_joint_contribution', {'metric_name': metric_name}, share)
+            yield contributions
+
+        remote_write = getattr(self.detector, 'remote_write', None)
+        if remote_write is not None:
+            samples = Metric('anomaly_detector_remote_write_samples', 'Score samples by remote-write outcome',
+                             'counter')
+            for status, count in sorted(remote_write.stats.items()):
+                samples.add_sample('anomaly_detector_remote_write_samples_total', {'status': status}, count)
+            yield samples
+
+
+def score_timeseries(
+    score_history: Dict[str, Dict[SeriesKey, Tuple[np.ndarray, np.ndarray]]],
+    joint: Optional[Dict] = None,
+    since: Optional[int] = None,
+) -> List[TimeSeries]:
+    """
+    Remote-write series for every point scored in a run, named like the
+    scraped metrics plus HISTORY_SUFFIX (e.g. anomaly_score_history)
+
+    Args:
+        score_history: (timestamps in seconds, scores) per series, per metric name
+        joint: Multivariate result of the run, if any
+        since: Leave out points older than this Unix time (e.g. a backlog
+            scored after an outage, which Prometheus would reject as out of
+            bounds, failing the whole request)
+    """
+    series: List[TimeSeries] = []
+    name = 'anomaly_score' + HISTORY_SUFFIX
+    for metric_name, by_series in score_history.items():
+        for key, (timestamps, scores) in by_series.items():
+            if since is not None:
+                recent = np.asarray(timestamps) >= since
+                timestamps, scores = np.asarray(timestamps)[recent], np.asarray(scores)[recent]
+            if len(timestamps):
+                labels = {'__name__': name, 'metric_name': metric_name, **series_labels(key)}
+                series.append((labels, np.asarray(timestamps, dtype=np.int64) * 1000, np.asarray(scores)))
+    if joint is not None:
+        ts = np.array([joint['timestamp'] * 1000], dtype=np.int64)
+        series.append(({'__name__': 'anomaly_joint_score' + HISTORY_SUFFIX}, ts, np.array([joint['score']])))
+        for metric_name, share in joint['contributions'].items():
+            labels = {'__name__': 'anomaly_joint_contribution' + HISTORY_SUFFIX, 'metric_name': metric_name}
+            series.append((labels, ts, np.array([share])))
+    return series
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    """Length-delimited protobuf field"""
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def encode_write_request(series: List[TimeSeries]) -> bytes:
+    """
+    prometheus.WriteRequest protobuf (remote-write 1.0), encoded by hand
+
+    WriteRequest {repeated TimeSeries timeseries = 1}
+    TimeSeries {repeated Label labels = 1; repeated Sample samples = 2}
+    Label {string name = 1; string value = 2}
+    Sample {double value = 1; int64 timestamp = 2}  (milliseconds)
+    """
+    out = bytearray()
+    for labels, timestamps, values in series:
+        body = bytearray()
+        # Labels must be sorted by name
+        for name, value in sorted(labels.items()):
+            body += _field(1, _field(1, name.encode()) + _field(2, str(value).encode()))
+        for ts, value in zip(timestamps, values):
+            # Sample.value is field 1, wire type 1 (64-bit); timestamp field 2, varint
+            sample = b'\x09' + struct.pack('<d', float(value)) + b'\x10' + _varint(int(ts))
+            body += _field(2, sample)
+        out += _field(1, bytes(body))
+    return bytes(out)
+
+
+def snappy_compress(data: bytes) -> bytes:
+    """
+    Snappy block format (what remote write expects, not the framed format)
+
+    Uses python-snappy when installed, otherwise a pure-Python greedy
+    compressor: 4-byte hash matches within 64 KiB, emitted as 2-byte-offset
+    copies.
+    """
+    if snappy is not None:
+        return snappy.compress(data)
+    out = bytearray(_varint(len(data)))
+    table: Dict[bytes, int] = {}
+    literal_start = i = 0
+    end = len(data) - 4
+    while i <= end:
+        key = data[i:i + 4]
+        candidate = table.get(key)
+        table[key] = i
+        if candidate is None or i - candidate > 0xffff:
+            i += 1
+            continue
+        length = 4
+        while i + length < len(data) and data[candidate + length] == data[i + length]:
+            length += 1
+        _emit_literal(out, data[literal_start:i])
+        offset = i - candidate
+        remaining = length
+        while remaining > 0:
+            # A copy with a 2-byte offset covers 1 to 64 bytes
+            chunk = min(remaining, 64)
+            out.append((chunk - 1) << 2 | 2)
+            out += struct.pack('<H', offset)
+            remaining -= chunk
+        i += length
+        literal_start = i
+    _emit_literal(out, data[literal_start:])
+    return bytes(out)
+
+
+def _emit_literal(out: bytearray, literal: bytes) -> None:
+    if not literal:
+        return
+    n = len(literal) - 1
+    if n < 60:
+        out.append(n << 2)
+    else:
+        size = (n.bit_length() + 7) // 8
+        out.append((59 + size) << 2)
+        out += n.to_bytes(size, 'little')
+    out += literal
+
+
+class RemoteWriteClient:
+    """
+    Ships score series to a Prometheus remote-write endpoint
+
+    enqueue() returns at once; a background thread packs queued series
+    into requests of at most `max_samples_per_send` samples and POSTs them,
+    retrying 5xx/429 responses and connection errors with exponential
+    backoff (other 4xx are dropped, as Prometheus does). When the queue is
+    full, the oldest run's series are dropped rather than blocking a run.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_samples_per_send: int = 2000,
+        max_queued_runs: int = 100,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+    ):
+        """
+        Args:
+            url: Remote-write endpoint, e.g. http://prometheus:9090/api/v1/write
+            max_samples_per_send: Samples per request
+            max_queued_runs: Runs' worth of series held while the endpoint is slow or down
+            timeout: Per-request timeout in seconds
+            max_retries: Retries per request after the first attempt
+            backoff: First retry delay in seconds, doubled on each retry
+        """
+        self.url = url
+        self.max_samples_per_send = max_samples_per_send
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.stats = {'sent': 0, 'failed': 0, 'dropped': 0}
+        self.session = requests.Session()
+        self._queue: 'queue.Queue[Optional[List[TimeSeries]]]' = queue.Queue(maxsize=max_queued_runs)
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='remote-write', daemon=True)
+        self._thread.start()
+
+    def enqueue(self, series: List[TimeSeries]) -> None:
+        if not series:
+            return
+        while True:
+            try:
+                self._queue.put_nowait(series)
+                return
+            except queue.Full:
+                try:
+                    oldest = self._queue.get_nowait()
+                except queue.Empty:
+                    continue
+                self._queue.task_done()
+                if oldest is not None:
+                    self.stats['dropped'] += sum(len(ts) for _, ts, _ in oldest)
+                    logger.warning("Remote-write queue full; dropped the oldest run's scores")
+
+    def batches(self, series: List[TimeSeries]) -> Iterator[List[TimeSeries]]:
+        """
+        Pack series into requests of max_samples_per_send samples (the last
+        one possibly fewer), splitting a series across requests where needed;
+        requests are sent in order, so each series' samples stay in order
+        """
+        batch: List[TimeSeries] = []
+        room = self.max_samples_per_send
+        for labels, timestamps, values in series:
+            start = 0
+            while start < len(timestamps):
+                end = start + room
+                batch.append((labels, timestamps[start:end], values[start:end]))
+                room -= len(timestamps[start:end])
+                start = end
+                if room == 0:
+                    yield batch
+                    batch, room = [], self.max_samples_per_send
+        if batch:
+            yield batch
+
+    def send(self, series: List[TimeSeries]) -> bool:
+        """POST one batch; True if the endpoint accepted it"""
+        samples = sum(len(ts) for _, ts, _ in series)
+        body = snappy_compress(encode_write_request(series))
+        headers = {
+            'Content-Encoding': 'snappy',
+            'Content-Type': 'application/x-protobuf',
+            'User-Agent': 'caredroid-anomaly-detector',
+            'X-Prometheus-Remote-Write-Version': '0.1.0',
+        }
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+                if response.status_code < 300:
+                    self.stats['sent'] += samples
+                    return True
+                if response.status_code < 500 and response.status_code != 429:
+                    logger.error(f"Remote write rejected ({response.status_code}): {response.text[:200]}")
+                    break
+                error = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+            if attempt < self.max_retries:
+                logger.warning(f"Remote write failed ({error}); retrying in {delay:.1f}s")
+                # Closing cuts the waits short, not the retries
+                self._closing.wait(delay)
+                delay *= 2
+        self.stats['failed'] += samples
+        return False
+
+    def _run(self) -> None:
+        while True:
+            series = self._queue.get()
+            try:
+                if series is None:
+                    return
+                for batch in self.batches(series):
+                    try:
+                        self.send(batch)
+                    except Exception as e:
+                        logger.error(f"Remote write failed: {e}")
+                        self.stats['failed'] += sum(len(ts) for _, ts, _ in batch)
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until everything enqueued so far has been sent (or given up on)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._queue.unfinished_tasks == 0:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Send what is queued (within `timeout`), then stop the sender thread"""
+        self._closing.set()
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.error("Remote-write queue still full at shutdown; unsent scores are lost")
+        self._thread.join(timeout)
+        self.session.close()
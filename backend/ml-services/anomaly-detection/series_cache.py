@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+On-disk time-series cache for the anomaly detector
+Keeps recent samples of each Prometheus range query in a memory-mapped numpy
+ring buffer so each run only fetches the points added since the last one.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_DTYPE = np.dtype([('ts', '<i8'), ('value', '<f8')])
+EMPTY_TS = -1
+# Bump when the file layout changes; older caches are rebuilt
+CACHE_FORMAT_VERSION = 2
+
+# A series is identified by its sorted (label, value) pairs
+SeriesKey = Tuple[Tuple[str, str], ...]
+
+
+def series_key(labels: Dict[str, str]) -> SeriesKey:
+    """Hashable, order-independent key of a Prometheus label set"""
+    return tuple(sorted((str(name), str(value)) for name, value in labels.items()))
+
+
+def series_labels(key: SeriesKey) -> Dict[str, str]:
+    """
+    Labels of a series as they can be re-exported next to `metric_name`
+
+    Reserved (`__`-prefixed) labels such as `__name__` are dropped, and a
+    series' own `metric_name` label becomes `exported_metric_name`, as
+    Prometheus does for clashing labels on scrape.
+    """
+    return {
+        ('exported_metric_name' if name == 'metric_name' else name): value
+        for name, value in key
+        if not name.startswith('__')
+    }
+
+
+def series_id(metric_name: str, key: SeriesKey) -> str:
+    """Selector-style name of one series of a metric, e.g. errors_total{pod="a"}"""
+    labels = series_labels(key)
+    if not labels:
+        return metric_name
+    return metric_name + '{' + ','.join(f'{name}="{value}"' for name, value in sorted(labels.items())) + '}'
+
+
+class SeriesRing:
+    """
+    Fixed-size rings of (timestamp, value) samples on a regular step grid,
+    one row per series returned by a query
+
+    A sample at timestamp t lives in column (t // step) % capacity of its
+    series' row, so writing is idempotent (re-fetched samples overwrite
+    themselves), old samples are evicted implicitly once the ring wraps,
+    and reading a window is one vectorized lookup of the expected
+    timestamps across all rows. A slot only counts for a timestamp when its
+    stored `ts` matches, which also makes missing samples (gaps in
+    Prometheus data) show up as absent.
+    """
+
+    def __init__(self, path: str, step: int, capacity: int):
+        self.path = path
+        self.step = step
+        self.capacity = capacity
+        self.meta_path = path + '.json'
+        self.meta = self._load_meta()
+        if self.meta is None:
+            self.meta = {
+                'version': CACHE_FORMAT_VERSION, 'step': step, 'capacity': capacity,
+                'last_ts': None, 'series': [],
+            }
+            self.samples = self._allocate(0)
+            self._flush()
+        else:
+            self.samples = np.load(path, mmap_mode='r+')
+        self._rows: Dict[SeriesKey, int] = {
+            tuple(tuple(pair) for pair in labels): row for row, labels in enumerate(self.meta['series'])
+        }
+
+    def _load_meta(self) -> Optional[Dict]:
+        """Existing metadata if it matches this layout, else None (rebuild)"""
+        if not (os.path.exists(self.path) and os.path.exists(self.meta_path)):
+            return None
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        layout = (meta.get('version'), meta.get('step'), meta.get('capacity'))
+        if layout != (CACHE_FORMAT_VERSION, self.step, self.capacity):
+            logger.info(f"Series cache {self.path} has a different layout; rebuilding")
+            return None
+        return meta
+
+    def _allocate(self, rows: int) -> np.memmap:
+        # np.memmap can't be zero-sized; keep at least one (unused) row
+        samples = np.lib.format.open_memmap(
+            self.path, mode='w+', dtype=SAMPLE_DTYPE, shape=(max(rows, 1), self.capacity)
+        )
+        samples['ts'] = EMPTY_TS
+        return samples
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        """Newest timestamp fetched for the query (any series)"""
+        return self.meta['last_ts']
+
+    @property
+    def series(self) -> List[SeriesKey]:
+        return list(self._rows)
+
+    def row(self, labels: SeriesKey) -> int:
+        """Row of a series, adding one (and growing the file) for a new series"""
+        if labels in self._rows:
+            return self._rows[labels]
+        row = len(self._rows)
+        if row >= self.samples.shape[0]:
+            old = np.array(self.samples)
+            del self.samples
+            # Double so that N new series cost O(log N) copies
+            self.samples = self._allocate(max(2 * old.shape[0], row + 1))
+            self.samples[:old.shape[0]] = old
+        self._rows[labels] = row
+        self.meta['series'].append([list(pair) for pair in labels])
+        return row
+
+    def write(self, batch: Dict[SeriesKey, Tuple[np.ndarray, np.ndarray]]) -> int:
+        """
+        Merge samples of any number of series into the ring
+
+        Returns:
+            Number of samples written
+        """
+        written = 0
+        newest = self.meta['last_ts']
+        for labels, (timestamps, values) in batch.items():
+            timestamps = np.asarray(timestamps, dtype=np.int64)
+            values = np.asarray(values, dtype=np.float64)
+            # Only grid-aligned samples have a slot
+            aligned = timestamps % self.step == 0
+            timestamps, values = timestamps[aligned], values[aligned]
+            if timestamps.size == 0:
+                continue
+            row = self.row(labels)
+            slots = (timestamps // self.step) % self.capacity
+            self.samples['ts'][row, slots] = timestamps
+            self.samples['value'][row, slots] = values
+            written += int(timestamps.size)
+            if newest is None or timestamps.max() > newest:
+                newest = int(timestamps.max())
+        self.meta['last_ts'] = newest
+        self._flush()
+        return written
+
+    def read(self, start: int, end: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Cached samples with start <= ts <= end for every series
+
+        Returns:
+            - grid timestamps (T,), oldest first
+            - values (S, T) in `series` order, NaN where a sample is missing
+            - present (S, T), False where a sample is missing (NaN values
+              can also be genuine Prometheus samples)
+        """
+        first = -(-start // self.step) * self.step
+        grid = np.arange(first, end + 1, self.step, dtype=np.int64)
+        if grid.size > self.capacity:
+            grid = grid[-self.capacity:]
+        slots = (grid // self.step) % self.capacity
+        window = self.samples[:len(self._rows), slots]
+        present = window['ts'] == grid
+        return grid, np.where(present, window['value'], np.nan), present
+
+    def prune(self, before: int) -> int:
+        """
+        Forget series with no cached sample at or after `before`, so label
+        churn (e.g. pod names) doesn't grow the file forever
+
+        Returns:
+            Number of series dropped
+        """
+        rows = len(self._rows)
+        keep = (self.samples['ts'][:rows] >= before).any(axis=1)
+        if keep.all():
+            return 0
+        kept = np.array(self.samples[:rows][keep])
+        del self.samples
+        self.samples = self._allocate(kept.shape[0])
+        self.samples[:kept.shape[0]] = kept
+        series = [labels for labels, k in zip(self.series, keep) if k]
+        self._rows = {labels: row for row, labels in enumerate(series)}
+        self.meta['series'] = [[list(pair) for pair in labels] for labels in series]
+        self._flush()
+        return int(rows - keep.sum())
+
+    def _flush(self) -> None:
+        # Samples first, then metadata: a crash in between only makes the
+        # next run re-fetch a few points
+        self.samples.flush()
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_path)
+
+
+class SeriesCache:
+    """Directory of SeriesRings, one per (query, step)"""
+
+    def __init__(self, cache_dir: str, capacity: int):
+        self.cache_dir = cache_dir
+        self.capacity = capacity
+        self._rings: Dict[str, SeriesRing] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(query: str, step: int) -> str:
+        return hashlib.sha256(f'{step}\0{query}'.encode()).hexdigest()[:16]
+
+    def ring(self, query: str, step: int) -> SeriesRing:
+        key = self.key(query, step)
+        if key not in self._rings:
+            path = os.path.join(self.cache_dir, f'{key}.npy')
+            self._rings[key] = SeriesRing(path, step, self.capacity)
+        return self._rings[key]
+
+    def info(self) -> List[Dict]:
+        return [
+            {'key': key, 'path': ring.path, 'last_ts': ring.last_ts, 'series': len(ring.series)}
+            for key, ring in sorted(self._rings.items())
+        ]
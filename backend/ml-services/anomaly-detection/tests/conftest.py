@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pytest
+
+
+class StubPrometheus:
+    """
+    Minimal Prometheus HTTP API (query_range) on a local port
+
+    Each query returns one series with a sample every `step` seconds over
+    [start, end], whose value depends only on the query, labels and
+    timestamp (as with a real TSDB, overlapping ranges agree); `delays` maps
+    a query string to seconds to sleep before answering, and `series` maps a
+    query to the series it returns instead, as a list of (labels, generator)
+    pairs where generator maps timestamps to values (None: generated ones).
+    """
+
+    def __init__(self):
+        self.delays = {}
+        self.series = {}
+        self.requests = []
+        self.connections = set()
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                with stub._lock:
+                    stub.requests.append({"path": url.path, **params})
+                    stub.connections.add(self.client_address)
+                time.sleep(stub.delays.get(params.get("query"), 0.0))
+                body = json.dumps(stub.query_range(params)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def query_range(self, params):
+        start, end = float(params["start"]), float(params["end"])
+        step = parse_step(params.get("step", "300"))
+        timestamps = np.arange(np.ceil(start / step) * step, end + step / 2, step)
+        result = []
+        for labels, generator in self.series.get(params["query"], [({}, None)]):
+            if generator is not None:
+                values = generator(timestamps)
+            else:
+                seed = abs(hash((params["query"], *sorted(labels.items())))) % 1000
+                noise = np.sin(timestamps * 12.9898 + seed) * 43758.5453 % 1.0
+                values = 100.0 + 5.0 * np.sin(timestamps / 3600.0) + 10.0 * noise
+            result.append({
+                "metric": {"__name__": params["query"], **labels},
+                "values": [[float(t), str(v)] for t, v in zip(timestamps, values)],
+            })
+        return {
+            "status": "success",
+            "data": {"resultType": "matrix", "result": result},
+        }
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def parse_step(step):
+    units = {"s": 1, "m": 60, "h": 3600}
+    if step[-1] in units:
+        return float(step[:-1]) * units[step[-1]]
+    return float(step)
+
+
+@pytest.fixture
+def prometheus():
+    stub = StubPrometheus().start()
+    yield stub
+    stub.stop()
@@ -0,0 +1,93 @@
+import numpy as np
+from prometheus_client import CollectorRegistry, generate_latest
+
+from anomaly_detector import AnomalyDetector, parse_matrix
+from score_export import ScoreCollector
+
+
+def test_run_scores_every_metric(prometheus):
+    detector = AnomalyDetector(prometheus.url)
+    scores = detector.run()
+    assert set(scores) == {m["name"] for m in detector.metrics_to_monitor}
+    assert all(0.0 <= score <= 1.0 for score in scores.values())
+    assert len(prometheus.requests) == len(detector.metrics_to_monitor)
+
+
+def test_run_time_is_bounded_by_slowest_query(prometheus):
+    detector = AnomalyDetector(prometheus.url)
+    for metric in detector.metrics_to_monitor:
+        prometheus.delays[metric["query"]] = 0.3
+
+    detector.run()
+
+    # Sequential fetching would take 5 x 0.3 s
+    assert detector.last_run_stats["fetch_seconds"] < 0.9
+    assert detector.last_run_stats["timed_out"] == []
+
+
+def test_run_deadline_abandons_slow_queries(prometheus):
+    detector = AnomalyDetector(prometheus.url, query_timeout=5.0, run_deadline=0.5)
+    slow = detector.metrics_to_monitor[0]
+    prometheus.delays[slow["query"]] = 2.0
+
+    scores = detector.run()
+
+    assert detector.last_run_stats["fetch_seconds"] < 1.0
+    assert detector.last_run_stats["timed_out"] == [slow["name"]]
+    assert scores[slow["name"]] == 0.0
+
+
+def test_per_query_timeout(prometheus):
+    detector = AnomalyDetector(prometheus.url, query_timeout=0.2, run_deadline=5.0)
+    prometheus.delays[detector.metrics_to_monitor[1]["query"]] = 1.0
+
+    detector.run()
+    assert detector.last_run_stats["fetch_seconds"] < 0.8
+
+
+def test_connections_are_reused_across_runs(prometheus):
+    detector = AnomalyDetector(prometheus.url, max_concurrency=2)
+    detector.run()
+    detector.run()
+    assert len(prometheus.requests) == 2 * len(detector.metrics_to_monitor)
+    assert len(prometheus.connections) <= 2
+
+
+def test_parse_matrix_is_columnar_per_series():
+    result = [
+        {"metric": {"__name__": "up", "pod": "a"}, "values": [[1.0, "1"], [2.0, "NaN"], [3.0, "+Inf"]]},
+        {"metric": {"pod": "b", "__name__": "up"}, "values": [[1.0, "2"], [2.0, "oops"]]},
+        {"metric": {"pod": "c"}, "values": []},
+    ]
+    parsed = parse_matrix(result)
+    assert list(parsed) == [(("__name__", "up"), ("pod", "a")), (("__name__", "up"), ("pod", "b"))]
+    timestamps, values = parsed[(("__name__", "up"), ("pod", "a"))]
+    assert timestamps.dtype == np.int64 and list(timestamps) == [1, 2, 3]
+    assert values[0] == 1.0 and np.isnan(values[1]) and np.isinf(values[2])
+    # Unparseable samples are dropped, not the series
+    assert list(parsed[(("__name__", "up"), ("pod", "b"))][1]) == [2.0]
+
+
+def test_series_are_scored_and_published_with_their_labels(prometheus):
+    detector = AnomalyDetector(prometheus.url)
+    query = detector.metrics_to_monitor[2]["query"]
+    spike = lambda ts: np.where(ts == ts[-1], 50.0, 1.0 + 0.01 * np.sin(ts))
+    prometheus.series[query] = [
+        ({"pod": "a", "metric_name": "x"}, None),
+        ({"pod": "b"}, spike),
+    ]
+    registry = CollectorRegistry()
+    registry.register(ScoreCollector(detector))
+
+    scores = detector.run()
+
+    by_pod = {dict(key)["pod"]: score for key, score in detector.series_scores["errors_total"].items()}
+    assert by_pod["b"] > 0.9 and by_pod["b"] > by_pod["a"]
+    # The metric reports its worst series
+    assert scores["errors_total"] == by_pod["b"]
+    assert 'errors_total{pod="b"}' in detector.refits
+
+    exposition = generate_latest(registry).decode()
+    assert f'anomaly_score{{exported_metric_name="x",metric_name="errors_total",pod="a"}} {by_pod["a"]}' in exposition
+    assert f'anomaly_score{{metric_name="errors_total",pod="b"}} {by_pod["b"]}' in exposition
+    assert 'anomaly_score{metric_name="intent_classification_confidence"}' in exposition
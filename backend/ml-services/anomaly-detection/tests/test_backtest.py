@@ -0,0 +1,137 @@
+import json
+
+import numpy as np
+import pytest
+
+from backtest import backtest, evaluate, grid_tasks, load_dumps, load_incidents, parse_grid, replay
+from benchmark_engines import synthetic_series
+
+STEP = 300
+
+
+def write_dump(path, series):
+    """query_range response with one result per (labels, timestamps, values)"""
+    result = [
+        {"metric": {"__name__": "errors_total", **labels}, "values": [[int(t), str(v)] for t, v in zip(ts, values)]}
+        for labels, ts, values in series
+    ]
+    path.write_text(json.dumps({"status": "success", "data": {"resultType": "matrix", "result": result}}))
+
+
+def test_json_dumps_are_merged_per_series(tmp_path):
+    ts = 1_700_000_000 + STEP * np.arange(6)
+    write_dump(tmp_path / "errors_total.json", [({"pod": "a"}, ts[:4], [1, 2, 3, 4])])
+    (tmp_path / "more.json").write_text(json.dumps({"errors_total": [
+        {"metric": {"__name__": "errors_total", "pod": "a"}, "values": [[int(t), "9"] for t in ts[3:]]},
+    ]}))
+
+    dumps = load_dumps([str(tmp_path)])
+    [(key, (timestamps, values))] = dumps["errors_total"].items()
+    assert dict(key) == {"__name__": "errors_total", "pod": "a"}
+    # Sorted, one sample per timestamp, the later dump winning the overlap
+    assert list(timestamps) == list(ts) and list(values) == [1, 2, 3, 9, 9, 9]
+
+
+def test_parquet_dumps_are_split_by_labels(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pa.table({
+        "timestamp": [300, 600, 300, 600],
+        "value": [1.0, 2.0, 3.0, None],
+        "metric": ["errors_total"] * 4,
+        "pod": ["a", "a", "b", "b"],
+        "zone": [None, None, "eu", "eu"],
+    })
+    pq.write_table(table, tmp_path / "dump.parquet")
+
+    dumps = load_dumps([str(tmp_path / "dump.parquet")])
+    series = {dict(key)["pod"]: (key, values) for key, (_, values) in dumps["errors_total"].items()}
+    assert series["a"][0] == (("pod", "a"),)
+    assert series["b"][0] == (("pod", "b"), ("zone", "eu"))
+    assert list(series["a"][1]) == [1.0, 2.0] and np.isnan(series["b"][1][1])
+
+
+def test_incident_times_accept_iso_and_unix(tmp_path):
+    path = tmp_path / "incidents.json"
+    path.write_text(json.dumps([{"start": "2023-11-14T22:13:20Z", "end": 1_700_000_600}]))
+    [incident] = load_incidents(str(path))
+    assert incident["start"] == 1_700_000_000 and incident["end"] == 1_700_000_600 and incident["labels"] == {}
+
+
+def test_evaluate_matches_alerts_to_incident_windows():
+    ts = np.arange(20) * STEP
+    scores = np.zeros(20)
+    scores[:3] = np.nan  # not scored yet
+    scores[[5, 6, 12, 18]] = 0.9
+    series = {
+        'm{pod="a"}': ("m", (("pod", "a"),), ts),
+        'm{pod="b"}': ("m", (("pod", "b"),), ts),
+    }
+    incidents = [
+        {"start": 4 * STEP, "end": 5 * STEP, "labels": {"pod": "a"}},  # alert 5-6, one step late
+        {"start": 10 * STEP, "end": 10 * STEP, "labels": {"pod": "a"}},  # alert 12, within the grace period
+        {"start": 0, "end": 0, "labels": {"pod": "a"}},  # nothing scored by the end of its grace period
+        {"start": 15 * STEP, "end": 16 * STEP, "labels": {"pod": "b"}},  # missed: b never alerts
+    ]
+    result = evaluate(series, {'m{pod="a"}': scores, 'm{pod="b"}': np.zeros(20)}, incidents, 0.7, grace=2 * STEP)
+
+    assert (result["incidents"], result["skipped_incidents"], result["detected"]) == (3, 1, 2)
+    # Alerts 5-6 and 12 are true; 18 isn't (b's incident doesn't apply to a)
+    assert (result["alerts"], result["false_alerts"]) == (3, 1)
+    assert result["precision"] == pytest.approx(2 / 3) and result["recall"] == pytest.approx(2 / 3)
+    assert result["median_delay_minutes"] == 7.5 and result["max_delay_minutes"] == 10
+
+
+def test_replay_stride_does_not_change_streaming_scores():
+    data = synthetic_series(700, 6.0, seed=0)
+    series = {"m": (data["timestamps"], data["values"])}
+    every_run = replay("ewma", {}, series, run_every=1)
+    hourly = replay("ewma", {}, series, run_every=12)
+
+    scored = ~np.isnan(every_run["scores"]["m"])
+    # Scoring starts with the first full day and covers every point after it
+    assert scored.sum() == 700 - 288 == every_run["points"]
+    np.testing.assert_allclose(hourly["scores"]["m"], every_run["scores"]["m"])
+
+
+def test_grid_applies_each_parameter_to_the_engines_that_take_it():
+    grid = parse_grid(["alpha=0.2,0.3", "n_estimators=50", "contamination=auto"])
+    assert grid == {"alpha": [0.2, 0.3], "n_estimators": [50], "contamination": ["auto"]}
+    assert grid_tasks(["ewma", "isolation_forest", "mad"], grid) == [
+        ("ewma", {"alpha": 0.2}),
+        ("ewma", {"alpha": 0.3}),
+        ("isolation_forest", {"contamination": "auto", "n_estimators": 50}),
+        ("mad", {}),
+    ]
+    with pytest.raises(ValueError, match="alpha"):
+        grid_tasks(["mad"], {"alpha": [0.2]})
+
+
+def test_backtest_runs_the_grid_in_parallel(tmp_path):
+    data = synthetic_series(1000, 6.0, seed=1)
+    ts = data["timestamps"]
+    write_dump(tmp_path / "errors_total.json", [
+        ({"pod": "a"}, ts, data["values"]),
+        ({"pod": "b"}, ts, 100.0 + np.random.default_rng(0).normal(0.0, 1.0, len(ts))),
+    ])
+    incidents = [
+        {"start": int(ts[a["start"]]), "end": int(ts[a["end"] - 1]), "labels": {"pod": "a"}}
+        for a in data["anomalies"]
+    ]
+    dumps = load_dumps([str(tmp_path)])
+    grid = {"alpha": [0.2, 0.3], "threshold": [0.6, 0.7]}
+
+    parallel = backtest(dumps, incidents, ["ewma", "mad"], grid, run_every=6, workers=2)
+    inline = backtest(dumps, incidents, ["ewma", "mad"], grid, run_every=6, workers=1)
+
+    assert [(r["engine"], r["params"], r["threshold"]) for r in parallel] == [
+        ("ewma", {"alpha": 0.2}, 0.6), ("ewma", {"alpha": 0.2}, 0.7),
+        ("ewma", {"alpha": 0.3}, 0.6), ("ewma", {"alpha": 0.3}, 0.7),
+        ("mad", {}, 0.6), ("mad", {}, 0.7),
+    ]
+    timing = ("cpu_seconds", "points_per_second")
+    strip = lambda rows: [{k: v for k, v in row.items() if k not in timing} for row in rows]
+    assert strip(parallel) == strip(inline)
+    best = max(parallel, key=lambda r: r["f1"])
+    assert best["recall"] == 1.0 and best["precision"] > 0.5
+    assert all(row["points"] == 2 * (1000 - 288) and row["points_per_second"] > 0 for row in parallel)
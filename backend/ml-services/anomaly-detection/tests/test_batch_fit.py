@@ -0,0 +1,58 @@
+import numpy as np
+
+from anomaly_detector import AnomalyDetector
+from batch_fit import WORKER_BYTES, ParallelFitter, stack_by_length
+from model_store import ModelStore
+
+STEP = 300
+NOW = 1_700_000_000 // STEP * STEP
+
+
+def batch(series=6, n=289):
+    rng = np.random.default_rng(0)
+    timestamps = NOW - STEP * np.arange(n)[::-1]
+    return {f'm{{pod="{i}"}}': (timestamps, rng.normal(100.0 * (i + 1), 5.0, n)) for i in range(series)}
+
+
+def test_equal_length_series_are_stacked():
+    series = {**batch(3), "short": (np.arange(10), np.ones(10))}
+    groups = stack_by_length(series)
+    names, timestamps, values = groups[289]
+    assert len(names) == 3 and values.shape == (3, 289) and timestamps.shape == (3, 289)
+    assert groups[10][0] == ["short"]
+
+
+def test_plan_stays_under_the_memory_cap():
+    fitter = ParallelFitter(workers=8, memory_limit_mb=1024)
+    fitter.model_bytes = 2 * 2 ** 20
+    workers, chunk = fitter.plan(10_000)
+    assert workers == 5  # 1 GiB buys five 200 MiB workers with room for a couple of models each
+    assert workers * (WORKER_BYTES + chunk * fitter.model_bytes) <= fitter.memory_limit
+    # Too small for two workers, or too few series: fit in-process
+    assert ParallelFitter(workers=8, memory_limit_mb=300).plan(100)[0] == 0
+    assert fitter.plan(1)[0] == 0
+
+
+def test_parallel_fit_matches_inline_fit():
+    series = batch()
+    inline = ModelStore(AnomalyDetector.new_isolation_forest)
+    fitter = ParallelFitter(workers=2, memory_limit_mb=1024)
+    parallel = ModelStore(AnomalyDetector.new_isolation_forest, fitter=fitter)
+    try:
+        expected = inline.score_batch(series, NOW)
+        assert parallel.score_batch(series, NOW) == expected
+        assert fitter._pool is not None  # the workers did fit them
+        assert {reason for _, reason in expected.values()} == {"missing"}
+    finally:
+        fitter.close()
+
+
+def test_run_reports_throughput(prometheus):
+    detector = AnomalyDetector(prometheus.url)
+    query = detector.metrics_to_monitor[0]["query"]
+    prometheus.series[query] = [({"pod": str(i)}, None) for i in range(20)]
+    detector.run()
+    stats = detector.last_run_stats
+    assert stats["series"] == 24
+    assert stats["series_per_second"] > 0
+    assert len(detector.refits) == 24
@@ -0,0 +1,110 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from anomaly_detector import AnomalyDetector
+from detector_daemon import AnomalyDaemon
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_daemon_runs_on_interval_and_serves_health_and_metrics(prometheus, tmp_path):
+    detector = AnomalyDetector(prometheus.url, cache_dir=str(tmp_path))
+    daemon = AnomalyDaemon(detector, interval=0.2, jitter=0.0, host='127.0.0.1', port=0)
+    base = f"http://127.0.0.1:{daemon.port}"
+    thread = threading.Thread(target=daemon.serve_forever)
+    thread.start()
+    try:
+        assert wait_for(lambda: len(prometheus.requests) >= 3 * len(detector.metrics_to_monitor))
+
+        health = requests.get(f"{base}/health").json()
+        assert health["status"] == "healthy"
+        assert set(health["scores"]) == {m["name"] for m in detector.metrics_to_monitor}
+
+        metrics = requests.get(f"{base}/metrics").text
+        assert 'anomaly_detector_runs_total{status="success"}' in metrics
+        assert "anomaly_detector_run_duration_seconds" in metrics
+        # Scores are scraped from the daemon, not pushed
+        for name in health["scores"]:
+            assert f'anomaly_score{{metric_name="{name}"}}' in metrics
+
+        # The warm detector keeps its cache: later runs only refresh the newest sample
+        assert detector.last_run_stats["points_fetched"] <= 2 * len(detector.metrics_to_monitor)
+        assert requests.get(f"{base}/nope").status_code == 404
+    finally:
+        daemon.stop()
+        thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_health_is_unhealthy_when_runs_go_stale(prometheus):
+    daemon = AnomalyDaemon(AnomalyDetector(prometheus.url), interval=60, host='127.0.0.1', port=0)
+    try:
+        assert daemon.health()["status"] == "starting"
+        daemon.run_once()
+        assert daemon.health()["status"] == "healthy"
+        daemon.last_success -= daemon.stale_after + 1
+        assert daemon.health()["status"] == "unhealthy"
+    finally:
+        daemon.shutdown()
+
+
+def test_next_delay_applies_jitter_and_catches_up(prometheus):
+    daemon = AnomalyDaemon(AnomalyDetector(prometheus.url), interval=100, jitter=0.1,
+                           host='127.0.0.1', port=0)
+    try:
+        now = time.monotonic()
+        delays = [daemon.next_delay(now) for _ in range(200)]
+        assert all(89 <= d <= 110 for d in delays)
+        assert max(delays) - min(delays) > 5
+        # A run that overran its slot is followed immediately
+        assert daemon.next_delay(now - 500) == 0.0
+    finally:
+        daemon.shutdown()
+
+
+def test_sigterm_stops_daemon_gracefully(prometheus, tmp_path):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = {
+        **os.environ,
+        "PROMETHEUS_URL": prometheus.url,
+        "ANOMALY_CACHE_DIR": str(tmp_path / "cache"),
+        "ANOMALY_MODEL_DIR": str(tmp_path / "models"),
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "anomaly_detector.py", "--daemon", "--interval", "60", "--port", str(port)],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    try:
+        def healthy():
+            try:
+                return requests.get(f"http://127.0.0.1:{port}/health").json()["status"] == "healthy"
+            except requests.ConnectionError:
+                return False
+
+        assert wait_for(healthy, timeout=30)
+        proc.send_signal(signal.SIGTERM)
+        output, _ = proc.communicate(timeout=10)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+    assert proc.returncode == 0
+    assert "Anomaly daemon stopped" in output
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from anomaly_detector import AnomalyDetector
+from benchmark_engines import run_benchmark, synthetic_series
+from engines import ENGINES, EngineStore, z_to_score
+
+
+def seasonal(n=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    return 100.0 + 5.0 * np.sin(2 * np.pi * t / 289) + rng.normal(0.0, 1.0, n)
+
+
+def test_z_to_score_is_calibrated_to_the_alert_threshold():
+    assert z_to_score(0.0) == 0.0
+    assert abs(z_to_score(4.0) - 0.7) < 1e-12
+    assert z_to_score(-6.0) == z_to_score(6.0) > 0.9
+    assert z_to_score(np.inf) == 1.0
+
+
+@pytest.mark.parametrize("engine", sorted(ENGINES))
+def test_engine_flags_spikes_but_not_seasonal_noise(engine):
+    values = seasonal()
+    values[1200] += 10.0
+    values[1300] -= 10.0
+    scores = ENGINES[engine]().update(values)
+
+    assert scores.shape == values.shape
+    assert scores[1200] > 0.7
+    assert scores[1300] > 0.7 or engine == "hst"  # a one-sided residual density is coarser
+    normal = np.delete(scores, [1200, 1201, 1300, 1301])[400:]
+    assert (normal > 0.7).mean() < 0.01
+    assert ((0.0 <= scores) & (scores <= 1.0)).all()
+
+
+@pytest.mark.parametrize("engine", sorted(ENGINES))
+def test_engine_state_carries_across_updates(engine):
+    values = seasonal(800)
+    whole = ENGINES[engine]().update(values)
+    chunked = ENGINES[engine]()
+    parts = [chunked.update(chunk) for chunk in np.split(values, [1, 300, 301, 555])]
+    assert np.allclose(np.concatenate(parts), whole)
+
+
+def test_engine_store_feeds_only_new_points():
+    store = EngineStore("ewma")
+    values = seasonal(400)
+    timestamps = 300 * np.arange(400)
+
+    fed = []
+    score, reason = store.score("m", timestamps[:289], values[:289], 0)
+    assert reason == "missing"
+    engine = store._streams["m"][0]
+    update = engine.update
+    engine.update = lambda v: fed.append(len(v)) or update(v)
+
+    assert store.score("m", timestamps[1:290], values[1:290], 0)[1] is None
+    assert store.score("m", timestamps[1:290], values[1:290], 0)[1] is None
+    assert fed == [1]
+
+    with pytest.raises(ValueError):
+        EngineStore("prophet")
+
+
+def test_detector_with_streaming_engine(prometheus):
+    now = [1_700_000_000.0]
+    detector = AnomalyDetector(prometheus.url, engine="mad", clock=lambda: now[0])
+    detector.run()
+    assert set(detector.last_run_stats["refits"].values()) == {"missing"}
+    now[0] += 300
+    scores = detector.run()
+    assert detector.last_run_stats["refits"] == {}
+    assert all(0.0 <= score <= 1.0 for score in scores.values())
+
+
+def test_benchmark_compares_engines_with_isolation_forest():
+    series = synthetic_series(800, 8.0, seed=0)
+    assert [a["kind"] for a in series["anomalies"]] == ["spike", "shift"]
+
+    rows = {row["engine"]: row for row in run_benchmark(["isolation_forest", "ewma"], 800, 8.0, [0])}
+    assert rows["ewma"]["detected"] == 2
+    assert rows["ewma"]["cpu_us_per_point"] < rows["isolation_forest"]["cpu_us_per_point"]
+    assert 0.0 <= rows["isolation_forest"]["false_alarm_rate"] <= 1.0
+
+
+@pytest.mark.parametrize("name", ["ewma", "mad", "hst"])
+def test_batch_update_matches_one_series_at_a_time(name):
+    make = lambda: ENGINES[name](window=100) if name == "hst" else ENGINES[name]()
+    values = np.vstack([seasonal(400, seed) * (1 + seed) for seed in range(6)])
+    values[2, 350] += 40.0
+    # The last three series join after 50 points, so the batch mixes
+    # engines at different warm-up stages
+    expected = np.vstack([make().update(row) for row in values[:3]]
+                         + [np.concatenate([np.zeros(50), make().update(row[50:])]) for row in values[3:]])
+
+    engines = [make() for _ in values]
+    got = np.zeros(values.shape)
+    got[:3, :50] = ENGINES[name].update_batch(engines[:3], values[:3, :50])
+    for start in range(50, 400, 70):
+        got[:, start:start + 70] = ENGINES[name].update_batch(engines, values[:, start:start + 70])
+    np.testing.assert_allclose(got, expected, rtol=1e-12, atol=1e-12)
+
+
+def test_engine_store_scores_a_batch_like_single_series():
+    batch = {f"s{i}": (300 * np.arange(289), seasonal(289, i)) for i in range(20)}
+    single, batched = EngineStore("mad"), EngineStore("mad")
+    for step in range(3):
+        window = {name: (ts + 300 * step, v + step) for name, (ts, v) in batch.items()}
+        results = batched.score_batch(window, 0)
+        for name, (ts, v) in window.items():
+            assert results[name] == pytest.approx(single.score(name, ts, v, 0), abs=1e-12)
@@ -0,0 +1,90 @@
+import numpy as np
+
+from anomaly_detector import AnomalyDetector
+from model_store import ModelStore
+
+STEP = 300
+NOW = 1_700_000_000 // STEP * STEP
+
+
+def window(n=288, seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = NOW - STEP * np.arange(n)[::-1]
+    return timestamps, rng.normal(100.0, 5.0, n)
+
+
+def new_store(**kwargs):
+    return ModelStore(AnomalyDetector.new_isolation_forest, **kwargs)
+
+
+def test_fit_matches_full_window_detection():
+    timestamps, values = window()
+    score, reason = new_store().score("m", timestamps, values, NOW)
+    _, expected = AnomalyDetector().detect_anomalies(values)
+    assert reason == "missing"
+    assert score == expected
+
+
+def test_only_new_points_are_scored_between_refits():
+    store = new_store()
+    timestamps, values = window()
+    store.score("m", timestamps, values, NOW)
+
+    forest = store.get("m").forest
+    scored = []
+    score_samples = forest.score_samples
+    forest.score_samples = lambda X: scored.append(len(X)) or score_samples(X)
+
+    timestamps = np.append(timestamps[1:], NOW + STEP)
+    values = np.append(values[1:], 100.0)
+    score, reason = store.score("m", timestamps, values, NOW + STEP)
+    assert reason is None
+    assert scored == [1]
+    assert 0.0 <= score < 0.7
+
+    # A spike far outside the training window scores as anomalous
+    timestamps = np.append(timestamps[1:], NOW + 2 * STEP)
+    values = np.append(values[1:], 160.0)
+    score, reason = store.score("m", timestamps, values, NOW + 2 * STEP)
+    assert reason is None
+    assert score > 0.9
+
+    # No new points: the last score stands without touching the forest
+    assert store.score("m", timestamps, values, NOW + 2 * STEP) == (score, None)
+    assert scored == [1, 1]
+
+
+def test_refit_on_age_and_drift():
+    store = new_store(refit_interval=3600)
+    timestamps, values = window()
+    store.score("m", timestamps, values, NOW)
+    assert store.score("m", timestamps, values, NOW + 3600)[1] == "age"
+
+    shifted = values.copy()
+    shifted[-12:] += 50.0  # level shift over the last hour
+    assert store.score("m", timestamps, shifted, NOW + 3700)[1] == "drift"
+    # The refit model has absorbed the shift
+    assert store.score("m", timestamps, shifted, NOW + 3800)[1] is None
+
+
+def test_models_persist_across_restarts(tmp_path):
+    timestamps, values = window()
+    score, _ = new_store(model_dir=str(tmp_path)).score("m", timestamps, values, NOW)
+
+    restarted = new_store(model_dir=str(tmp_path))
+    assert restarted.score("m", timestamps, values, NOW + STEP) == (score, None)
+    assert restarted.get("m").fitted_at == NOW
+
+
+def test_detector_refits_once_then_scores_incrementally(prometheus, tmp_path):
+    now = [float(NOW)]
+    detector = AnomalyDetector(prometheus.url, cache_dir=str(tmp_path / "cache"),
+                               model_dir=str(tmp_path / "models"), clock=lambda: now[0])
+    detector.run()
+    assert set(detector.last_run_stats["refits"].values()) == {"missing"}
+
+    now[0] += STEP
+    scores = detector.run()
+    assert detector.last_run_stats["refits"] == {}
+    assert all(0.0 <= score <= 1.0 for score in scores.values())
+    assert len(list((tmp_path / "models").glob("*.joblib"))) == len(detector.metrics_to_monitor)
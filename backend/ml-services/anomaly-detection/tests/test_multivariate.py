@@ -0,0 +1,94 @@
+import numpy as np
+
+from anomaly_detector import AnomalyDetector
+from multivariate import MultivariateDetector, align_series, build_features, rolling_mean_std
+
+STEP = 300
+NOW = 1_700_000_000 // STEP * STEP
+START = NOW - 24 * 3600
+
+
+def correlated_series(n=289, seed=0, incident=False):
+    """Load drives latency up and confidence down; `incident` spikes one and drops the other at the last point"""
+    rng = np.random.default_rng(seed)
+    timestamps = START + STEP * np.arange(n)
+    load = np.sin(np.arange(n) / 20.0)
+    latency = 0.5 + 0.2 * load + rng.normal(0, 0.01, n)
+    confidence = 0.9 - 0.05 * load + rng.normal(0, 0.005, n)
+    errors = 0.01 + rng.normal(0, 0.001, n)
+    if incident:
+        latency[-1] += 0.2
+        confidence[-1] -= 0.08
+    return {
+        "latency": (timestamps, latency),
+        "confidence": (timestamps, confidence),
+        "errors": (timestamps, errors),
+    }
+
+
+def test_align_series_fills_gaps_and_drops_empty_series():
+    timestamps = START + STEP * np.array([1, 2, 5])
+    grid, matrix, names = align_series(
+        {"a": (timestamps, np.array([1.0, 2.0, 5.0])), "b": (np.array([], dtype=np.int64), np.array([]))},
+        START, START + 6 * STEP, STEP,
+    )
+    assert names == ["a"]
+    assert list(grid) == list(START + STEP * np.arange(7))
+    # Leading gap takes the median, later gaps carry the last value forward
+    assert list(matrix[:, 0]) == [2.0, 1.0, 2.0, 2.0, 2.0, 5.0, 5.0]
+
+
+def test_features_are_vectorized_rolling_stats():
+    rng = np.random.default_rng(1)
+    matrix = rng.normal(size=(50, 3))
+    mean, std = rolling_mean_std(matrix, 12)
+    for t in (0, 5, 11, 30, 49):
+        chunk = matrix[max(0, t - 11):t + 1]
+        assert np.allclose(mean[t], chunk.mean(axis=0))
+        assert np.allclose(std[t], chunk.std(axis=0))
+
+    grid = START + STEP * np.arange(50)
+    features = build_features(grid, matrix)
+    assert features.shape == (50, 4 * 3 + 2)
+    assert np.allclose(features[:, 4], matrix[:, 1])  # metric 1's block starts at column 4
+    assert np.allclose(features[1:, 1], np.diff(matrix[:, 0]))
+
+
+def test_joint_anomaly_is_attributed_to_contributing_metrics():
+    detector = MultivariateDetector(AnomalyDetector.new_isolation_forest)
+    normal = detector.score(correlated_series(), START, NOW, STEP, NOW)
+    assert normal["refit"] == "missing"
+    assert normal["score"] < 0.7
+
+    joint = detector.score(correlated_series(incident=True), START, NOW, STEP, NOW + STEP)
+    assert joint["refit"] is None
+    assert joint["score"] > max(0.7, normal["score"])
+    contributions = joint["contributions"]
+    assert abs(sum(contributions.values()) - 1.0) < 1e-9
+    assert contributions["errors"] < 0.05
+
+
+def test_refit_when_metric_set_changes():
+    detector = MultivariateDetector(AnomalyDetector.new_isolation_forest)
+    series = correlated_series()
+    detector.score(series, START, NOW, STEP, NOW)
+    del series["errors"]
+    assert detector.score(series, START, NOW, STEP, NOW)["refit"] == "metrics_changed"
+    del series["confidence"]
+    assert detector.score(series, START, NOW, STEP, NOW) is None
+
+
+def test_detector_multivariate_mode(prometheus):
+    detector = AnomalyDetector(prometheus.url, multivariate=True, clock=lambda: float(NOW))
+    scores = detector.run()
+    assert set(scores) == {m["name"] for m in detector.metrics_to_monitor}
+    joint = detector.last_joint
+    assert 0.0 <= joint["score"] <= 1.0
+    assert joint["timestamp"] == NOW
+    assert set(joint["contributions"]) == set(scores)
+
+
+def test_multivariate_mode_is_off_by_default(prometheus):
+    detector = AnomalyDetector(prometheus.url)
+    detector.run()
+    assert detector.last_joint is None
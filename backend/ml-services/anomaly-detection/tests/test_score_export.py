@@ -0,0 +1,254 @@
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+from prometheus_client import CollectorRegistry
+
+from anomaly_detector import AnomalyDetector
+from score_export import RemoteWriteClient, ScoreCollector, score_timeseries, snappy_compress
+
+
+def read_varint(data, i):
+    n = shift = 0
+    while True:
+        byte = data[i]
+        n |= (byte & 0x7f) << shift
+        shift += 7
+        i += 1
+        if byte < 0x80:
+            return n, i
+
+
+def snappy_decompress(data):
+    """Snappy block format decoder (literals and all three copy kinds)"""
+    length, i = read_varint(data, 0)
+    out = bytearray()
+    while i < len(data):
+        tag = data[i]
+        i += 1
+        kind = tag & 3
+        if kind == 0:
+            n = tag >> 2
+            if n >= 60:
+                size = n - 59
+                n = int.from_bytes(data[i:i + size], "little")
+                i += size
+            out += data[i:i + n + 1]
+            i += n + 1
+            continue
+        if kind == 1:
+            n, offset = 4 + (tag >> 2 & 7), (tag >> 5) << 8 | data[i]
+            i += 1
+        elif kind == 2:
+            n, offset = (tag >> 2) + 1, struct.unpack("<H", data[i:i + 2])[0]
+            i += 2
+        else:
+            n, offset = (tag >> 2) + 1, struct.unpack("<I", data[i:i + 4])[0]
+            i += 4
+        for _ in range(n):
+            out.append(out[-offset])
+    assert len(out) == length
+    return bytes(out)
+
+
+def fields(data):
+    """(field number, value) pairs of a protobuf message"""
+    i = 0
+    while i < len(data):
+        key, i = read_varint(data, i)
+        number, wire = key >> 3, key & 7
+        if wire == 0:
+            value, i = read_varint(data, i)
+        elif wire == 1:
+            value, i = data[i:i + 8], i + 8
+        elif wire == 2:
+            size, i = read_varint(data, i)
+            value, i = data[i:i + size], i + size
+        else:
+            raise ValueError(f"unexpected wire type {wire}")
+        yield number, value
+
+
+def decode_write_request(data):
+    """[(labels, [(timestamp ms, value)])] of a prometheus.WriteRequest"""
+    series = []
+    for _, ts_message in fields(data):
+        labels, samples = {}, []
+        for number, value in fields(ts_message):
+            if number == 1:
+                label = dict(fields(value))
+                labels[label[1].decode()] = label[2].decode()
+            elif number == 2:
+                sample = dict(fields(value))
+                samples.append((sample.get(2, 0), struct.unpack("<d", sample[1])[0]))
+        series.append((labels, samples))
+    return series
+
+
+class StubReceiver:
+    """
+    Remote-write endpoint that decodes each request; `statuses` are answered
+    in order, then 204, or 400 when a sample is older than the newest one
+    already stored for its series (as Prometheus rejects out-of-order samples)
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.statuses = []
+        self.latest = {}  # newest ms timestamp per label set
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                series = decode_write_request(snappy_decompress(body))
+                stub.requests.append({"headers": dict(self.headers), "series": series})
+                status = stub.statuses.pop(0) if stub.statuses else stub.append(series)
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/v1/write"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def append(self, series, now_ms=None):
+        """Store samples (or one sample per series at `now_ms`, like a scrape); the HTTP status"""
+        samples = {
+            frozenset(labels.items()): [t for t, _ in points] if now_ms is None else [now_ms]
+            for labels, points in series
+        }
+        for key, timestamps in samples.items():
+            if timestamps and timestamps[0] < self.latest.get(key, timestamps[0]):
+                return 400
+        for key, timestamps in samples.items():
+            if timestamps:
+                self.latest[key] = timestamps[-1]
+        return 204
+
+
+@pytest.fixture
+def receiver():
+    stub = StubReceiver()
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
+
+
+def test_snappy_round_trip():
+    rng = np.random.default_rng(0)
+    for data in [b"", b"abc", b"a" * 1000, rng.bytes(5000), b"anomaly_score" * 300 + rng.bytes(100)]:
+        assert snappy_decompress(snappy_compress(data)) == data
+    assert len(snappy_compress(b"anomaly_score" * 300)) < 300
+
+
+def test_remote_write_ships_labels_timestamps_and_values(receiver):
+    client = RemoteWriteClient(receiver.url)
+    client.enqueue([
+        ({"__name__": "anomaly_score", "metric_name": "errors_total", "pod": "a"},
+         np.array([1_700_000_000_000, 1_700_000_300_000]), np.array([0.25, 0.75])),
+    ])
+    assert client.flush(5)
+    client.close()
+
+    [request] = receiver.requests
+    assert request["headers"]["Content-Encoding"] == "snappy"
+    assert request["headers"]["X-Prometheus-Remote-Write-Version"] == "0.1.0"
+    [(labels, samples)] = request["series"]
+    assert labels == {"__name__": "anomaly_score", "metric_name": "errors_total", "pod": "a"}
+    assert samples == [(1_700_000_000_000, 0.25), (1_700_000_300_000, 0.75)]
+    assert client.stats == {"sent": 2, "failed": 0, "dropped": 0}
+
+
+def test_remote_write_batches_by_sample_count(receiver):
+    client = RemoteWriteClient(receiver.url, max_samples_per_send=100)
+    ts = np.arange(60, dtype=np.int64) * 300_000
+    client.enqueue([({"__name__": "anomaly_score", "pod": str(i)}, ts, np.full(60, 0.5)) for i in range(5)])
+    assert client.flush(5)
+    client.close()
+
+    assert [sum(len(s) for _, s in r["series"]) for r in receiver.requests] == [100, 100, 100]
+    # Every point arrives exactly once, in order within its series
+    by_pod = {}
+    for request in receiver.requests:
+        for labels, samples in request["series"]:
+            by_pod.setdefault(labels["pod"], []).extend(t for t, _ in samples)
+    assert by_pod == {str(i): list(ts) for i in range(5)}
+
+
+def test_remote_write_retries_server_errors_and_drops_rejected_batches(receiver):
+    client = RemoteWriteClient(receiver.url, max_samples_per_send=1, backoff=0.01)
+    receiver.statuses = [500, 503, 204, 400]
+    client.enqueue([({"__name__": "anomaly_score"}, np.array([1000, 2000]), np.array([0.1, 0.2]))])
+    assert client.flush(5)
+    client.close()
+
+    # 500 and 503 retried until accepted; the 400 isn't retried
+    assert len(receiver.requests) == 4
+    assert client.stats == {"sent": 1, "failed": 1, "dropped": 0}
+
+
+def test_detector_remote_writes_every_scored_point(prometheus, receiver):
+    clock = [1_700_000_000.0]
+    detector = AnomalyDetector(prometheus.url, remote_write=RemoteWriteClient(receiver.url),
+                               clock=lambda: clock[0], engine="ewma")
+    detector.run()
+    clock[0] += 3 * AnomalyDetector.STEP_SECONDS
+    detector.run()
+    assert detector.remote_write.flush(5)
+    detector.close()
+
+    first, second = receiver.requests
+    names = {m["name"] for m in detector.metrics_to_monitor}
+    assert {labels["metric_name"] for labels, _ in first["series"]} == names
+    # The first run reports its latest point; the next one each point since
+    end_ts = int(clock[0]) // AnomalyDetector.STEP_SECONDS * AnomalyDetector.STEP_SECONDS
+    for labels, samples in second["series"]:
+        assert labels["__name__"] == "anomaly_score_history"
+        assert [t for t, _ in samples] == [(end_ts - k * AnomalyDetector.STEP_SECONDS) * 1000 for k in (2, 1, 0)]
+        [latest] = detector.series_scores[labels["metric_name"]].values()
+        assert samples[-1][1] == latest
+
+
+def test_score_timeseries_leaves_out_old_points():
+    history = {"errors_total": {(("pod", "a"),): (np.array([100, 200, 300]), np.array([0.1, 0.2, 0.3]))}}
+    [(labels, ts, values)] = score_timeseries(history, since=200)
+    assert labels == {"__name__": "anomaly_score_history", "metric_name": "errors_total", "pod": "a"}
+    assert list(ts) == [200_000, 300_000] and list(values) == [0.2, 0.3]
+
+
+def scraped(registry):
+    """(labels incl. __name__, [(None, value)]) per sample, as a scrape of /metrics would store them"""
+    return [
+        ({"__name__": sample.name, **sample.labels}, [(None, sample.value)])
+        for family in registry.collect()
+        for sample in family.samples
+    ]
+
+
+def test_scraped_and_remote_written_scores_can_share_a_prometheus(prometheus, receiver):
+    clock = [1_700_000_000.0]
+    detector = AnomalyDetector(prometheus.url, remote_write=RemoteWriteClient(receiver.url),
+                               clock=lambda: clock[0], engine="ewma", multivariate=True)
+    registry = CollectorRegistry()
+    registry.register(ScoreCollector(detector))
+    for _ in range(2):
+        detector.run()
+        assert detector.remote_write.flush(5)
+        # Prometheus scrapes /metrics 30 s later, then every 30 s until the next run
+        for offset in range(30, 300, 30):
+            assert receiver.append(scraped(registry), now_ms=int(clock[0] + offset) * 1000) == 204
+        clock[0] += AnomalyDetector.STEP_SECONDS
+    detector.close()
+
+    # The next run's history, timestamped on the 5-minute grid, still lands
+    # behind those scrapes only on series of its own
+    assert detector.remote_write.stats["failed"] == 0
+    written = {labels["__name__"] for request in receiver.requests for labels, _ in request["series"]}
+    assert written == {"anomaly_score_history", "anomaly_joint_score_history", "anomaly_joint_contribution_history"}
@@ -0,0 +1,117 @@
+import numpy as np
+
+from anomaly_detector import AnomalyDetector
+from series_cache import SeriesCache
+
+STEP = 300
+NOW = 1_700_000_000 // STEP * STEP
+
+
+A = (("pod", "a"),)
+B = (("pod", "b"),)
+
+
+def test_ring_merges_idempotently_and_evicts(tmp_path):
+    ring = SeriesCache(str(tmp_path), capacity=10).ring("up", STEP)
+    ts = NOW + STEP * np.arange(8)
+    ring.write({A: (ts, np.arange(8.0))})
+    ring.write({A: (ts[-2:], np.array([60.0, 70.0]))})  # overlapping re-fetch
+    grid, values, present = ring.read(NOW, NOW + 7 * STEP)
+    assert list(grid) == list(ts)
+    assert list(values[0]) == [0, 1, 2, 3, 4, 5, 60, 70]
+    assert present.all()
+    assert ring.last_ts == ts[-1]
+
+    # Wrapping past capacity overwrites the oldest slots
+    later = NOW + STEP * np.arange(8, 13)
+    ring.write({A: (later, np.full(5, 9.0))})
+    grid, _, present = ring.read(NOW, NOW + 12 * STEP)
+    assert list(grid[present[0]]) == list(NOW + STEP * np.arange(3, 13))
+
+
+def test_ring_keeps_one_row_per_series(tmp_path):
+    ring = SeriesCache(str(tmp_path), capacity=10).ring("up", STEP)
+    ts = NOW + STEP * np.arange(4)
+    ring.write({A: (ts, np.ones(4))})
+    # A new series grows the file; one with a gap reads as missing there
+    ring.write({B: (ts[[0, 1, 3]], np.array([2.0, 2.0, np.nan]))})
+    assert ring.series == [A, B]
+    _, values, present = ring.read(NOW, NOW + 3 * STEP)
+    assert values.shape == (2, 4)
+    assert list(present[1]) == [True, True, False, True]
+    # A NaN sample is still a sample
+    assert np.isnan(values[1, 3])
+
+    # Series with nothing left in the window are forgotten
+    ring.write({B: (NOW + STEP * np.arange(4, 8), np.ones(4))})
+    assert ring.prune(NOW + 5 * STEP) == 1
+    assert ring.series == [B]
+    assert list(ring.read(NOW, NOW + 7 * STEP)[2][0]) == [True, True, False] + [True] * 5
+
+
+def test_ring_persists_across_processes(tmp_path):
+    ring = SeriesCache(str(tmp_path), capacity=10).ring("up", STEP)
+    ring.write({A: (NOW + STEP * np.arange(3), np.array([1.0, 2.0, 3.0])), B: (NOW + STEP * np.arange(3), np.zeros(3))})
+
+    reopened = SeriesCache(str(tmp_path), capacity=10).ring("up", STEP)
+    assert reopened.last_ts == NOW + 2 * STEP
+    assert reopened.series == [A, B]
+    assert list(reopened.read(NOW, NOW + 2 * STEP)[1][0]) == [1.0, 2.0, 3.0]
+
+    # A different layout starts over instead of misreading the file
+    resized = SeriesCache(str(tmp_path), capacity=20).ring("up", STEP)
+    assert resized.last_ts is None
+    assert resized.read(NOW, NOW + 2 * STEP)[1].shape == (0, 3)
+
+
+def test_second_run_fetches_only_the_gap(prometheus, tmp_path):
+    now = [float(NOW)]
+    # Refit every run so both score exactly the window they fetched
+    detector = AnomalyDetector(prometheus.url, cache_dir=str(tmp_path), refit_interval=0,
+                               clock=lambda: now[0])
+    uncached = AnomalyDetector(prometheus.url, refit_interval=0, clock=lambda: now[0])
+    window = AnomalyDetector.LOOKBACK_SECONDS // STEP + 1
+
+    detector.run()
+    assert detector.last_run_stats["points_fetched"] == 5 * window
+
+    now[0] += STEP
+    scores = detector.run()
+    # The new sample plus a refresh of the newest cached one
+    assert detector.last_run_stats["points_fetched"] == 5 * 2
+    assert all(int(r["end"]) - int(r["start"]) == STEP for r in prometheus.requests[-5:])
+
+    # Same window, same scores as a full fetch
+    assert scores == uncached.run()
+
+
+def test_cache_survives_restart_and_outage(prometheus, tmp_path):
+    now = [float(NOW)]
+    AnomalyDetector(prometheus.url, cache_dir=str(tmp_path), clock=lambda: now[0]).run()
+
+    # A restarted process picks up the cache left on disk
+    now[0] += 3 * STEP
+    detector = AnomalyDetector(prometheus.url, cache_dir=str(tmp_path), clock=lambda: now[0])
+    detector.run()
+    assert detector.last_run_stats["points_fetched"] == 5 * 4
+
+    # With Prometheus down the cached window is not scored as current
+    detector.prometheus_url = "http://127.0.0.1:1"
+    now[0] += STEP
+    assert set(detector.run().values()) == {0.0}
+
+
+def test_series_that_stop_reporting_are_not_scored(prometheus, tmp_path):
+    now = [float(NOW)]
+    detector = AnomalyDetector(prometheus.url, cache_dir=str(tmp_path), clock=lambda: now[0])
+    query = detector.metrics_to_monitor[2]["query"]
+    prometheus.series[query] = [({"pod": "a"}, None), ({"pod": "b"}, None)]
+    detector.run()
+    assert len(detector.series_scores["errors_total"]) == 2
+
+    # pod b is gone; its cached window is no longer current
+    prometheus.series[query] = [({"pod": "a"}, None)]
+    now[0] += STEP
+    detector.run()
+    assert [dict(key)["pod"] for key in detector.series_scores["errors_total"]] == ["a"]
+    assert detector.last_run_stats["points_fetched"] == 5 * 2
@@ -7,14 +7,27 @@ import logging
 import os
 import time
 from contextlib import asynccontextmanager
-from typing import List, Optional
+from typing import List, Literal, Optional
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, Header, HTTPException, status
 from fastapi.responses import JSONResponse
+from prometheus_client import make_asgi_app
 from pydantic import BaseModel, Field
 
-from config import SERVICE_CONFIG, LOGGING_CONFIG, INTENT_CLASSES
+from config import (
+    GRPC_CONFIG,
+    INTENT_CLASSES,
+    LOGGING_CONFIG,
+    SCHEDULER_CONFIG,
+    SERVICE_CONFIG,
+    TRACE_CONFIG,
+)
+from metrics import DEADLINE_EXPIRED
 from model import NLUModel
+from scheduler import DeadlineExceeded, InferenceScheduler, deadline_from_headers
+from serialization import negotiate, pack_batch_compact, render
+from trace_recorder import TraceRecorder
+from utils import encode_array_b64
 
 # Setup logging
 logging.basicConfig(**LOGGING_CONFIG)
@@ -23,6 +36,16 @@ logger = logging.getLogger(__name__)
 # Global model instance
 nlu_model: Optional[NLUModel] = None
 
+# Shared micro-batching scheduler (REST + gRPC); None means direct model calls
+scheduler: Optional[InferenceScheduler] = None
+
+# Scheduler whose inference thread owns the model (REST's, or gRPC's own);
+# unbatched calls run there too. None means calls run on the event loop.
+model_scheduler: Optional[InferenceScheduler] = None
+
+# PHI-free arrival trace for load replay; None when NLU_TRACE_ENABLED is off
+trace_recorder: Optional[TraceRecorder] = None
+
 
 # ============================================================================
 # Models (Request/Response)
@@ -43,18 +66,66 @@ class PredictResponse(BaseModel):
     key_terms: List[str]
     latency_ms: float
     model_version: str
+    source: str = "classifier"
+    embedding: Optional[List[float]] = None
 
 
 class BatchPredictRequest(BaseModel):
     """Batch prediction request"""
     texts: List[str] = Field(..., min_items=1, max_items=100)
+    compact: bool = False  # Columnar results with float16-packed probabilities
 
 
 class BatchPredictResponse(BaseModel):
     """Batch prediction response"""
-    results: List[dict]
+    results: Optional[List[dict]] = None
+    compact: Optional[dict] = None
+    processing_time_ms: float
+    batch_size: int
+
+
+class EmbedRequest(BaseModel):
+    """Sentence embedding request"""
+    texts: List[str] = Field(..., min_items=1, max_items=100)
+    dtype: Literal["float32", "float16", "int8"] = "float32"
+    encoding: Literal["json", "base64"] = "json"
+    normalize: bool = True
+
+
+class EmbedResponse(BaseModel):
+    """Sentence embedding response"""
+    embeddings: Optional[List[List[float]]] = None
+    embeddings_b64: Optional[List[str]] = None
+    scales: Optional[List[float]] = None
+    dim: int
+    dtype: str
     processing_time_ms: float
     batch_size: int
+    model_version: str
+
+
+class SimilarRequest(BaseModel):
+    """Nearest labeled example lookup request"""
+    texts: List[str] = Field(..., min_items=1, max_items=100)
+    k: int = Field(5, ge=1, le=50)
+
+
+class SimilarResponse(BaseModel):
+    """Nearest labeled examples per input text"""
+    results: List[List[dict]]
+    processing_time_ms: float
+
+
+class AddExamplesRequest(BaseModel):
+    """Labeled examples to insert into the intent index"""
+    texts: List[str] = Field(..., min_items=1, max_items=100)
+    intents: List[str] = Field(..., min_items=1, max_items=100)
+
+
+class AddExamplesResponse(BaseModel):
+    """Intent index insertion result"""
+    added: int
+    index_size: int
 
 
 class HealthCheckResponse(BaseModel):
@@ -76,7 +147,7 @@ startup_time: float = 0
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage startup and shutdown events"""
-    global startup_time, nlu_model
+    global startup_time, nlu_model, scheduler, model_scheduler, trace_recorder
     
     startup_time = time.time()
     logger.info("NLU Service starting...")
@@ -89,9 +160,46 @@ async def lifespan(app: FastAPI):
         logger.error(f"Failed to initialize model: {str(e)}")
         raise
     
+    if SCHEDULER_CONFIG["enabled"]:
+        scheduler = InferenceScheduler(nlu_model)
+        await scheduler.start()
+    
+    if TRACE_CONFIG["enabled"]:
+        # Every worker runs this lifespan (however uvicorn was started), so
+        # each always gets its own file; read_traces() merges them
+        if not TRACE_CONFIG["salt"]:
+            logger.warning("NLU_TRACE_SALT is unset; trace hashes will not match across worker files")
+        trace_recorder = TraceRecorder(
+            tokenizer_provider=lambda: nlu_model.tokenizer, per_process=True
+        )
+        trace_recorder.start()
+    
+    # gRPC always batches; it shares the REST scheduler when that is enabled
+    grpc_server = None
+    grpc_scheduler = scheduler
+    if GRPC_CONFIG["enabled"]:
+        from grpc_server import start_grpc_server
+        
+        if grpc_scheduler is None:
+            grpc_scheduler = InferenceScheduler(nlu_model)
+            await grpc_scheduler.start()
+        grpc_server, _ = await start_grpc_server(grpc_scheduler)
+    model_scheduler = grpc_scheduler
+    
     yield
     
     # Cleanup on shutdown
+    model_scheduler = None
+    if grpc_server:
+        await grpc_server.stop(grace=5)
+    if grpc_scheduler is not None and grpc_scheduler is not scheduler:
+        await grpc_scheduler.stop()
+    if scheduler:
+        await scheduler.stop()
+        scheduler = None
+    if trace_recorder:
+        trace_recorder.stop()
+        trace_recorder = None
     if nlu_model:
         nlu_model.unload()
         logger.info("NLU Service shutdown complete")
@@ -108,6 +216,52 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Prometheus scrape endpoint
+app.mount("/metrics", make_asgi_app())
+
+
+def resolve_deadline(
+    timeout_ms: Optional[str], deadline_epoch_ms: Optional[str]
+) -> Optional[float]:
+    """
+    Turn deadline headers into a monotonic deadline, rejecting expired requests
+    
+    Args:
+        timeout_ms: X-Request-Timeout-Ms header (remaining budget)
+        deadline_epoch_ms: X-Request-Deadline header (absolute Unix ms)
+        
+    Returns:
+        time.monotonic() deadline, or None if the caller sent neither header
+        
+    Raises:
+        HTTPException: 400 for malformed headers, 504 if already expired
+    """
+    try:
+        deadline = deadline_from_headers(timeout_ms, deadline_epoch_ms)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Deadline headers must be numeric milliseconds",
+        )
+    if deadline is not None and time.monotonic() >= deadline:
+        DEADLINE_EXPIRED.labels(stage="arrival").inc()
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Deadline exceeded before inference",
+        )
+    return deadline
+
+
+async def run_model(fn, *args, **kwargs):
+    """
+    Call the model outside the scheduler's batches (embeddings, index
+    lookups, unscheduled predictions) on its inference thread, so the
+    model is never called concurrently and the event loop is not blocked
+    """
+    if model_scheduler is None:
+        return fn(*args, **kwargs)
+    return await model_scheduler.run_exclusive(fn, *args, **kwargs)
+
 
 # ============================================================================
 # API Endpoints
@@ -141,28 +295,47 @@ async def health_check():
 
 
 @app.post("/predict", response_model=PredictResponse)
-async def predict(request: PredictRequest):
+async def predict(
+    request: PredictRequest,
+    accept: Optional[str] = Header(None),
+    x_request_timeout_ms: Optional[str] = Header(None),
+    x_request_deadline: Optional[str] = Header(None),
+):
     """
     Predict intent for a single text
     
     Args:
         request: PredictRequest with clinical text
+        accept: Accept header; application/msgpack selects MessagePack,
+            application/json selects the orjson encoder
+        x_request_timeout_ms: Caller's remaining budget in milliseconds
+        x_request_deadline: Caller's absolute deadline (Unix epoch ms)
         
     Returns:
         PredictResponse with predicted intent and confidence
         
     Raises:
-        HTTPException: If prediction fails
+        HTTPException: If prediction fails (504 when the deadline passes first)
     """
+    if trace_recorder is not None:
+        trace_recorder.record("predict", [request.text], x_request_timeout_ms)
+    deadline = resolve_deadline(x_request_timeout_ms, x_request_deadline)
     try:
         # Ensure model is loaded
         if not nlu_model.loaded:
-            nlu_model.load()
+            await run_model(nlu_model.load)
         
-        # Get prediction
-        result = nlu_model.predict(request.text)
+        # Get prediction (embeddings need the single-text path)
+        if scheduler is not None and not request.include_embeddings:
+            result = await scheduler.submit(request.text, deadline=deadline)
+        else:
+            result = await run_model(
+                nlu_model.predict,
+                request.text,
+                include_embeddings=request.include_embeddings or None,
+            )
         
-        return PredictResponse(
+        response = PredictResponse(
             intent=result["intent"],
             confidence=result["confidence"],
             label_id=result["label_id"],
@@ -170,7 +343,16 @@ async def predict(request: PredictRequest):
             key_terms=result.get("key_terms", []),
             latency_ms=result["latency_ms"],
             model_version=result.get("model_version", "unknown"),
+            source=result.get("source", "classifier"),
+            embedding=result.get("embedding"),
         )
+        
+        wire_format = negotiate(accept)
+        if wire_format:
+            return render(response.model_dump(), wire_format)
+        return response
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
     except Exception as e:
         logger.error(f"Prediction failed: {str(e)}")
         raise HTTPException(
@@ -180,42 +362,177 @@ async def predict(request: PredictRequest):
 
 
 @app.post("/batch-predict", response_model=BatchPredictResponse)
-async def batch_predict(request: BatchPredictRequest):
+async def batch_predict(
+    request: BatchPredictRequest,
+    accept: Optional[str] = Header(None),
+    x_request_timeout_ms: Optional[str] = Header(None),
+    x_request_deadline: Optional[str] = Header(None),
+):
     """
     Batch predict intents for multiple texts
     
     Args:
         request: BatchPredictRequest with list of texts
+        accept: Accept header; application/msgpack selects MessagePack,
+            application/json selects the orjson encoder. Negotiated formats
+            skip pydantic response validation.
+        x_request_timeout_ms: Caller's remaining budget in milliseconds
+        x_request_deadline: Caller's absolute deadline (Unix epoch ms)
         
     Returns:
         BatchPredictResponse with predictions for all texts
         
     Raises:
-        HTTPException: If batch prediction fails
+        HTTPException: If batch prediction fails (504 when the deadline passes first)
     """
+    if trace_recorder is not None:
+        trace_recorder.record("batch-predict", request.texts, x_request_timeout_ms)
+    deadline = resolve_deadline(x_request_timeout_ms, x_request_deadline)
     try:
         if len(request.texts) == 0:
             raise ValueError("Empty text list")
         
         # Ensure model is loaded
         if not nlu_model.loaded:
-            nlu_model.load()
+            await run_model(nlu_model.load)
         
         # Get batch prediction
         start_time = time.time()
-        results = nlu_model.predict_batch(request.texts)
+        if scheduler is not None:
+            results = await scheduler.submit_many(request.texts, deadline=deadline)
+        else:
+            results = await run_model(nlu_model.predict_batch, request.texts)
+        elapsed = (time.time() - start_time) * 1000
+        
+        wire_format = negotiate(accept)
+        content = {
+            "processing_time_ms": round(elapsed, 2),
+            "batch_size": len(request.texts),
+        }
+        if request.compact:
+            content["compact"] = pack_batch_compact(results, binary=wire_format == "msgpack")
+        else:
+            content["results"] = results
+        
+        if wire_format:
+            return render(content, wire_format)
+        return BatchPredictResponse(**content)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch prediction failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Batch prediction failed: {str(e)}",
+        )
+
+
+@app.post("/embed", response_model=EmbedResponse)
+async def embed(request: EmbedRequest):
+    """
+    Compute pooled sentence embeddings with the classifier encoder
+    
+    Args:
+        request: EmbedRequest with texts and output dtype/encoding
+        
+    Returns:
+        EmbedResponse with one embedding per input text
+        
+    Raises:
+        HTTPException: If embedding fails
+    """
+    try:
+        # Ensure model is loaded
+        if not nlu_model.loaded:
+            await run_model(nlu_model.load)
+        
+        start_time = time.time()
+        result = await run_model(
+            nlu_model.embed_batch,
+            request.texts,
+            dtype=request.dtype,
+            normalize=request.normalize,
+        )
         elapsed = (time.time() - start_time) * 1000
         
-        return BatchPredictResponse(
-            results=results,
+        embeddings = result["embeddings"]
+        scales = result["scales"]
+        
+        return EmbedResponse(
+            embeddings=embeddings.tolist() if request.encoding == "json" else None,
+            embeddings_b64=(
+                [encode_array_b64(row) for row in embeddings]
+                if request.encoding == "base64" else None
+            ),
+            scales=scales.tolist() if scales is not None else None,
+            dim=result["dim"],
+            dtype=result["dtype"],
             processing_time_ms=round(elapsed, 2),
             batch_size=len(request.texts),
+            model_version=nlu_model.model_version,
         )
     except Exception as e:
-        logger.error(f"Batch prediction failed: {str(e)}")
+        logger.error(f"Embedding failed: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Batch prediction failed: {str(e)}",
+            detail=f"Embedding failed: {str(e)}",
+        )
+
+
+@app.post("/similar", response_model=SimilarResponse)
+async def similar(request: SimilarRequest):
+    """
+    Find the nearest labeled examples in the intent index
+    
+    Args:
+        request: SimilarRequest with texts and number of neighbors
+        
+    Returns:
+        SimilarResponse with neighbors (text, intent, similarity) per text
+        
+    Raises:
+        HTTPException: 400 if no index is loaded, 500 on failure
+    """
+    try:
+        start_time = time.time()
+        results = await run_model(nlu_model.find_similar, request.texts, k=request.k)
+        elapsed = (time.time() - start_time) * 1000
+        
+        return SimilarResponse(results=results, processing_time_ms=round(elapsed, 2))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Similarity search failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Similarity search failed: {str(e)}",
+        )
+
+
+@app.post("/similar/examples", response_model=AddExamplesResponse)
+async def add_similar_examples(request: AddExamplesRequest):
+    """
+    Incrementally insert labeled examples into the intent index
+    
+    Args:
+        request: AddExamplesRequest with parallel texts/intents lists
+        
+    Returns:
+        AddExamplesResponse with the new index size
+        
+    Raises:
+        HTTPException: 400 on unknown intents or if no index is loaded, 500 on failure
+    """
+    try:
+        index_size = await run_model(nlu_model.add_examples, request.texts, request.intents)
+        return AddExamplesResponse(added=len(request.texts), index_size=index_size)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Adding examples failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Adding examples failed: {str(e)}",
         )
 
 
@@ -223,7 +540,12 @@ async def batch_predict(request: BatchPredictRequest):
 async def model_info():
     """Get detailed model information"""
     try:
-        return nlu_model.get_model_info()
+        info = nlu_model.get_model_info()
+        if scheduler is not None:
+            info["scheduler"] = scheduler.get_stats()
+        if trace_recorder is not None:
+            info["trace"] = trace_recorder.get_stats()
+        return info
     except Exception as e:
         logger.error(f"Failed to get model info: {str(e)}")
         raise HTTPException(
@@ -273,6 +595,12 @@ if __name__ == "__main__":
     
     logger.info(f"Starting NLU service on {SERVICE_CONFIG['host']}:{SERVICE_CONFIG['port']}")
     
+    # Workers are spawned with this environment, so they share one trace salt
+    if TRACE_CONFIG["enabled"] and not TRACE_CONFIG["salt"]:
+        import secrets
+        
+        os.environ["NLU_TRACE_SALT"] = secrets.token_hex(32)
+    
     uvicorn.run(
         "app:app",
         host=SERVICE_CONFIG["host"],
@@ -0,0 +1,334 @@
+"""
+Adaptive Batch Controller
+Tunes inference batch size and per-batch token budget online so that
+measured forward-pass latency tracks a target p95
+
+Usage:
+    python batch_controller.py simulate --target-p95-ms 50 --steps 2000
+    python batch_controller.py padding --model-path ./models/best_model --size 512
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from config import ADAPTIVE_BATCH_CONFIG, INFERENCE_CONFIG, MODEL_CONFIG, MODEL_PATHS
+
+
+def plan_batches(
+    lengths: List[int],
+    batch_size: int,
+    token_budget: Optional[int] = None,
+    sort_by_length: bool = True,
+) -> List[List[int]]:
+    """
+    Group sequence indices into inference batches
+
+    Sorting by length first keeps similar lengths together, so one long
+    note no longer forces a batch of short queries to pad to its length.
+    Callers restore input order from the returned indices.
+
+    Args:
+        lengths: Token count per sequence (after truncation)
+        batch_size: Maximum rows per batch
+        token_budget: Maximum padded tokens (rows * longest) per batch;
+            None disables the budget. A single row is always allowed.
+        sort_by_length: Pack in ascending length order instead of input order
+
+    Returns:
+        Lists of indices into `lengths`
+    """
+    if sort_by_length:
+        order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    else:
+        order = list(range(len(lengths)))
+
+    batches: List[List[int]] = []
+    current: List[int] = []
+    longest = 0
+    for idx in order:
+        new_longest = max(longest, lengths[idx])
+        if current and (
+            len(current) + 1 > batch_size
+            or (token_budget is not None and (len(current) + 1) * new_longest > token_budget)
+        ):
+            batches.append(current)
+            current, new_longest = [], lengths[idx]
+        current.append(idx)
+        longest = new_longest
+    if current:
+        batches.append(current)
+    return batches
+
+
+def padding_stats(lengths: List[int], plan: List[List[int]]) -> Dict:
+    """Real vs padded token counts for a batch plan"""
+    real = sum(lengths)
+    padded = sum(len(batch) * max(lengths[i] for i in batch) for batch in plan)
+    return {
+        "real_tokens": real,
+        "padded_tokens": padded,
+        "padding_waste": round(1 - real / padded, 4) if padded else 0.0,
+    }
+
+
+class AdaptiveBatchController:
+    """
+    AIMD controller over (batch_size, token_budget)
+
+    A batch costs roughly `rows * longest_sequence` padded tokens, so the
+    token budget is the main knob: under one budget, batches of short texts
+    hold many rows and batches of long texts hold few. `batch_size` caps
+    rows independently (short texts would otherwise produce huge batches).
+
+    Every `adjust_every` observed batches the p95 of the recent window is
+    compared with the target: above it both limits shrink multiplicatively,
+    comfortably below it (under `headroom` * target) they grow additively.
+    """
+
+    def __init__(
+        self,
+        target_p95_ms: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        min_batch_size: int = 1,
+        max_batch_size: Optional[int] = None,
+        min_token_budget: Optional[int] = None,
+        max_token_budget: Optional[int] = None,
+        window: Optional[int] = None,
+        adjust_every: Optional[int] = None,
+        decrease_factor: float = 0.8,
+        headroom: float = 0.8,
+    ):
+        config = ADAPTIVE_BATCH_CONFIG
+        self.target_p95_ms = target_p95_ms or config["target_p95_ms"]
+        self.max_batch_size = max_batch_size or config["max_batch_size"]
+        self.min_batch_size = min_batch_size
+        self.batch_size = batch_size or INFERENCE_CONFIG["batch_size"]
+        self.max_token_budget = max_token_budget or config["max_token_budget"]
+        # One full-length row must always fit
+        self.min_token_budget = min_token_budget or MODEL_CONFIG["max_length"]
+        self.token_budget = token_budget or INFERENCE_CONFIG["token_budget"] or self.max_token_budget
+        self.token_step = max(self.min_token_budget // 4, 1)
+        self.adjust_every = adjust_every or config["adjust_every"]
+        self.decrease_factor = decrease_factor
+        self.headroom = headroom
+
+        self._latencies = deque(maxlen=window or config["window"])
+        self._since_adjust = 0
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "increases": 0, "decreases": 0}
+        self._clamp()
+
+    def plan(self, lengths: List[int], sort_by_length: bool = True) -> List[List[int]]:
+        """Group sequence indices into batches under the current limits (see plan_batches)"""
+        with self._lock:
+            batch_size, token_budget = self.batch_size, self.token_budget
+        return plan_batches(lengths, batch_size, token_budget, sort_by_length)
+
+    def observe(self, rows: int, padded_tokens: int, latency_ms: float) -> None:
+        """Record one batch's forward-pass latency and adjust limits when due"""
+        with self._lock:
+            self._latencies.append(latency_ms)
+            self.stats["batches"] += 1
+            self._since_adjust += 1
+            if self._since_adjust < self.adjust_every:
+                return
+            self._since_adjust = 0
+
+            p95 = float(np.percentile(self._latencies, 95))
+            if p95 > self.target_p95_ms:
+                self.token_budget = int(self.token_budget * self.decrease_factor)
+                self.batch_size = int(self.batch_size * self.decrease_factor)
+                self.stats["decreases"] += 1
+                # Old samples describe the previous limits
+                self._latencies.clear()
+            elif p95 < self.target_p95_ms * self.headroom:
+                self.token_budget += self.token_step
+                self.batch_size += 1
+                self.stats["increases"] += 1
+            self._clamp()
+
+    def _clamp(self) -> None:
+        self.batch_size = int(min(max(self.batch_size, self.min_batch_size), self.max_batch_size))
+        self.token_budget = int(
+            min(max(self.token_budget, self.min_token_budget), self.max_token_budget)
+        )
+
+    def p95_ms(self) -> Optional[float]:
+        with self._lock:
+            if not self._latencies:
+                return None
+            return round(float(np.percentile(self._latencies, 95)), 2)
+
+    def get_state(self) -> Dict:
+        """Controller state for /model-info"""
+        p95 = self.p95_ms()
+        return {
+            "batch_size": self.batch_size,
+            "token_budget": self.token_budget,
+            "target_p95_ms": self.target_p95_ms,
+            "observed_p95_ms": p95,
+            "window_size": len(self._latencies),
+            **self.stats,
+        }
+
+
+def simulate(
+    controller: AdaptiveBatchController,
+    latency_ms: Callable[[int, int], float],
+    sample_length: Callable[[], int],
+    steps: int,
+    request_size: int = 64,
+) -> List[Dict]:
+    """
+    Drive a controller with synthetic traffic
+
+    Args:
+        controller: Controller under test
+        latency_ms: Cost model (rows, padded_tokens) -> milliseconds
+        sample_length: Draws one sequence length
+        steps: Number of predict_batch calls to simulate
+        request_size: Texts per predict_batch call
+
+    Returns:
+        One record per simulated batch (rows, padded_tokens, latency_ms,
+        batch_size, token_budget after observing it)
+    """
+    history = []
+    for _ in range(steps):
+        lengths = [sample_length() for _ in range(request_size)]
+        for indices in controller.plan(lengths):
+            rows = len(indices)
+            padded = rows * max(lengths[i] for i in indices)
+            latency = latency_ms(rows, padded)
+            controller.observe(rows, padded, latency)
+            history.append({
+                "rows": rows,
+                "padded_tokens": padded,
+                "latency_ms": latency,
+                "batch_size": controller.batch_size,
+                "token_budget": controller.token_budget,
+            })
+    return history
+
+
+def mixed_length_corpus(texts: List[str], size: int, long_fraction: float, seed: int = 0) -> List[str]:
+    """
+    Short queries interleaved with long clinical notes
+
+    Long notes are built by joining ~40 random queries (a few hundred
+    tokens), roughly matching pasted notes seen next to one-line queries.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        if rng.random() < long_fraction:
+            corpus.append(". ".join(rng.choice(texts) for _ in range(40)))
+        else:
+            corpus.append(rng.choice(texts))
+    return corpus
+
+
+def compare_padding(model, texts: List[str], repeats: int = 3) -> List[Dict]:
+    """
+    Padding waste and throughput of fixed-count slices vs length-grouped batches
+
+    Both strategies run through the same tokenization, padding and forward
+    path of a loaded NLUModel; only the batch plan differs.
+    """
+    encodings = model.tokenizer(texts, max_length=MODEL_CONFIG["max_length"], truncation=True)
+    lengths = [len(ids) for ids in encodings["input_ids"]]
+    batch_size = INFERENCE_CONFIG["batch_size"]
+    if model.batch_controller is not None:
+        token_budget = model.batch_controller.token_budget
+    else:
+        token_budget = INFERENCE_CONFIG["token_budget"] or None
+    plans = {
+        "fixed slices": plan_batches(lengths, batch_size, sort_by_length=False),
+        "sorted + token budget": plan_batches(lengths, batch_size, token_budget),
+    }
+
+    report = []
+    for name, plan in plans.items():
+        elapsed = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for indices in plan:
+                inputs = model._pad_encodings(encodings, indices, lengths)
+                model._predict_batch_internal([texts[i] for i in indices], inputs)
+            elapsed.append(time.perf_counter() - start)
+        best = min(elapsed)
+        report.append({
+            "strategy": name,
+            "batches": len(plan),
+            **padding_stats(lengths, plan),
+            "seconds": round(best, 3),
+            "texts_per_second": round(len(texts) / best, 1),
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adaptive batching simulation and padding benchmark")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sim = subparsers.add_parser("simulate", help="Drive the controller with a synthetic cost model")
+    sim.add_argument("--target-p95-ms", type=float, default=50.0)
+    sim.add_argument("--steps", type=int, default=2000)
+    sim.add_argument("--ms-per-token", type=float, default=0.02)
+    sim.add_argument("--overhead-ms", type=float, default=2.0)
+    sim.add_argument("--seed", type=int, default=0)
+
+    pad = subparsers.add_parser("padding", help="Fixed slices vs length-grouped batches on a real model")
+    pad.add_argument("--model-path", default=None)
+    pad.add_argument("--data", default=MODEL_PATHS["test_data"])
+    pad.add_argument("--size", type=int, default=512)
+    pad.add_argument("--long-fraction", type=float, default=0.05)
+    pad.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "padding":
+        from model import NLUModel
+
+        with open(args.data) as f:
+            queries = [json.loads(line)["text"] for line in f if line.strip()]
+        model = NLUModel(args.model_path)
+        model.load()
+        corpus = mixed_length_corpus(queries, args.size, args.long_fraction)
+        print(f"\n{'strategy':<24} {'batches':>7} {'padded':>9} {'waste':>6} {'texts/s':>9}")
+        for row in compare_padding(model, corpus, args.repeats):
+            print(
+                f"{row['strategy']:<24} {row['batches']:>7} {row['padded_tokens']:>9} "
+                f"{row['padding_waste']:>6.1%} {row['texts_per_second']:>9.1f}"
+            )
+        return
+
+    rng = random.Random(args.seed)
+
+    def latency(rows: int, padded_tokens: int) -> float:
+        return (args.overhead_ms + args.ms_per_token * padded_tokens) * rng.uniform(0.9, 1.3)
+
+    for name, sampler in {
+        "short (8-32 tokens)": lambda: rng.randint(8, 32),
+        "long (128-512 tokens)": lambda: rng.randint(128, 512),
+    }.items():
+        controller = AdaptiveBatchController(target_p95_ms=args.target_p95_ms)
+        history = simulate(controller, latency, sampler, args.steps)
+        tail = history[len(history) // 2:]
+        p95 = np.percentile([h["latency_ms"] for h in tail], 95)
+        mean_rows = np.mean([h["rows"] for h in tail])
+        print(
+            f"{name:<24} p95={p95:6.1f}ms mean_rows={mean_rows:5.1f} "
+            f"batch_size={controller.batch_size} token_budget={controller.token_budget}"
+        )
+
+
+if __name__ == "__main__":
+    main()
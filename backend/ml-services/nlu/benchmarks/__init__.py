@@ -0,0 +1,4 @@
+"""
+NLU Performance Benchmarks
+Offline micro/end-to-end benchmarks with stored JSON baselines
+"""
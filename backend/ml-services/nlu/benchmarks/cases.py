@@ -0,0 +1,215 @@
+"""
+Benchmark Cases
+Tokenization, forward pass, post-processing, subcategory detection, cache
+hits and the in-process ASGI app, all against the tiny offline model
+"""
+
+import asyncio
+import json
+import random
+import tempfile
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+import torch
+
+from benchmarks.harness import Benchmark
+from benchmarks.tiny_model import DATA_DIR, build_tiny_model
+from config import MODEL_CONFIG
+
+FORWARD_LENGTHS = (16, 64, 256)
+FORWARD_BATCH_SIZES = (1, 8, 32)
+TOKENIZE_BATCH_SIZE = 32
+ASGI_BATCH_SIZE = 8
+
+
+class BenchmarkContext:
+    """Lazily built shared state: tiny model, corpus and a scratch directory"""
+
+    def __init__(self, work_dir: str = None):
+        self._tmp = None
+        if work_dir is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="nlu-bench-")
+            work_dir = self._tmp.name
+        self.work_dir = Path(work_dir)
+        self._model = None
+        self._texts = None
+        self._cleanups: List[Callable[[], None]] = []
+
+    @property
+    def model_dir(self) -> Path:
+        return self.work_dir / "tiny_model"
+
+    @property
+    def model(self):
+        if self._model is None:
+            from model import NLUModel
+
+            build_tiny_model(self.model_dir)
+            self._model = NLUModel(model_path=str(self.model_dir))
+            self._model.load()
+        return self._model
+
+    @property
+    def texts(self) -> List[str]:
+        if self._texts is None:
+            with open(DATA_DIR / "test.jsonl") as f:
+                self._texts = [json.loads(line)["text"] for line in f if line.strip()]
+        return self._texts
+
+    def random_inputs(self, batch_size: int, length: int) -> dict:
+        """Fixed-length token ids (CLS ... SEP), so forward cost depends only on shape"""
+        tokenizer = self.model.tokenizer
+        generator = torch.Generator().manual_seed(batch_size * 1000 + length)
+        input_ids = torch.randint(5, tokenizer.vocab_size, (batch_size, length), generator=generator)
+        input_ids[:, 0] = tokenizer.cls_token_id
+        input_ids[:, -1] = tokenizer.sep_token_id
+        return {
+            "input_ids": input_ids.to(self.model.device),
+            "attention_mask": torch.ones_like(input_ids).to(self.model.device),
+            "token_type_ids": torch.zeros_like(input_ids).to(self.model.device),
+        }
+
+    def add_cleanup(self, fn: Callable[[], None]) -> None:
+        """Run `fn` on close(), after cleanups registered later"""
+        self._cleanups.append(fn)
+
+    def close(self) -> None:
+        try:
+            while self._cleanups:
+                self._cleanups.pop()()
+        finally:
+            if self._tmp is not None:
+                self._tmp.cleanup()
+
+
+def _tokenize_single(ctx: BenchmarkContext) -> Callable:
+    tokenizer, text = ctx.model.tokenizer, ctx.texts[0]
+    return lambda: tokenizer(text, max_length=MODEL_CONFIG["max_length"], truncation=True)
+
+
+def _tokenize_batch(ctx: BenchmarkContext) -> Callable:
+    model = ctx.model
+    texts = [ctx.texts[i % len(ctx.texts)] for i in range(TOKENIZE_BATCH_SIZE)]
+    return lambda: model._tokenize_batch(texts)
+
+
+def _forward(batch_size: int, length: int) -> Callable[[BenchmarkContext], Callable]:
+    def setup(ctx: BenchmarkContext) -> Callable:
+        model = ctx.model
+        inputs = ctx.random_inputs(batch_size, length)
+
+        def run():
+            with torch.no_grad():
+                model._forward(inputs, include_embeddings=False)
+
+        return run
+
+    return setup
+
+
+def _format_prediction(ctx: BenchmarkContext) -> Callable:
+    model = ctx.model
+    rng = np.random.default_rng(0)
+    rows = [(text, rng.normal(size=MODEL_CONFIG["num_labels"]).astype(np.float32)) for text in ctx.texts[:32]]
+
+    def run():
+        for text, logits in rows:
+            model._format_prediction(text, logits)
+
+    return run
+
+
+def _detect_subcategory(ctx: BenchmarkContext) -> Callable:
+    model = ctx.model
+    # Mostly misses (the worst case: every keyword list is scanned) plus real emergencies
+    texts = ctx.texts[:24] + [
+        "Patient with crushing chest pain radiating to the left arm",
+        "Possible stroke, facial droop and slurred speech",
+        "Suspected sepsis with hypotension",
+        "Anaphylaxis after penicillin",
+    ] * 2
+    logits = np.zeros(MODEL_CONFIG["num_labels"], dtype=np.float32)
+
+    def run():
+        for text in texts:
+            model._detect_subcategory(text, logits)
+
+    return run
+
+
+def _dataset_cache_hit(ctx: BenchmarkContext) -> Callable:
+    from dataset_cache import load_or_build
+
+    tokenizer = ctx.model.tokenizer
+    cache_dir = str(ctx.work_dir / "dataset_cache")
+    data_file = str(DATA_DIR / "test.jsonl")
+    load_or_build(data_file, tokenizer, cache_dir=cache_dir)  # populate
+    return lambda: load_or_build(data_file, tokenizer, cache_dir=cache_dir)
+
+
+def _asgi(path: str, payload_fn: Callable[[BenchmarkContext], dict]) -> Callable[[BenchmarkContext], Callable]:
+    def setup(ctx: BenchmarkContext) -> Callable:
+        import httpx
+
+        import app as app_module
+
+        # Direct model calls (no scheduler window), lifespan skipped; the
+        # app's globals are put back when the context closes
+        previous = (app_module.nlu_model, app_module.scheduler, app_module.model_scheduler)
+        app_module.nlu_model, app_module.scheduler, app_module.model_scheduler = ctx.model, None, None
+        loop = asyncio.new_event_loop()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app_module.app), base_url="http://bench"
+        )
+
+        def teardown():
+            try:
+                loop.run_until_complete(client.aclose())
+                loop.close()
+            finally:
+                app_module.nlu_model, app_module.scheduler, app_module.model_scheduler = previous
+
+        ctx.add_cleanup(teardown)
+        payload = payload_fn(ctx)
+
+        def run():
+            response = loop.run_until_complete(client.post(path, json=payload))
+            response.raise_for_status()
+
+        return run
+
+    return setup
+
+
+def default_benchmarks(ctx: BenchmarkContext) -> List[Benchmark]:
+    """Every case in the suite, bound to one context"""
+    def bind(setup):
+        return lambda: setup(ctx)
+
+    cases = [
+        Benchmark("tokenize.single", "tokenize", bind(_tokenize_single)),
+        Benchmark(f"tokenize.batch{TOKENIZE_BATCH_SIZE}", "tokenize", bind(_tokenize_batch)),
+    ]
+    for length in FORWARD_LENGTHS:
+        for batch_size in FORWARD_BATCH_SIZES:
+            cases.append(Benchmark(
+                f"forward.len{length}.bs{batch_size}", "forward", bind(_forward(batch_size, length))
+            ))
+    cases += [
+        Benchmark("postprocess.format_prediction.x32", "postprocess", bind(_format_prediction)),
+        Benchmark("postprocess.detect_subcategory.x32", "postprocess", bind(_detect_subcategory)),
+        Benchmark("cache.dataset_hit", "cache", bind(_dataset_cache_hit)),
+        Benchmark(
+            "asgi.predict", "asgi",
+            bind(_asgi("/predict", lambda c: {"text": c.texts[0]})),
+        ),
+        Benchmark(
+            f"asgi.batch_predict.bs{ASGI_BATCH_SIZE}", "asgi",
+            bind(_asgi("/batch-predict", lambda c: {
+                "texts": random.Random(0).sample(c.texts, ASGI_BATCH_SIZE)
+            })),
+        ),
+    ]
+    return cases
@@ -0,0 +1,211 @@
+"""
+Benchmark Harness
+Timing loop, JSON baselines and statistical regression checks shared by all
+benchmark cases
+"""
+
+import json
+import os
+import platform
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+from scipy.stats import mannwhitneyu
+
+# Bump when the baseline file layout changes
+BASELINE_SCHEMA_VERSION = 1
+
+
+@dataclass
+class Benchmark:
+    """One named case; `setup` returns the zero-argument callable to time"""
+
+    name: str
+    group: str
+    setup: Callable[[], Callable[[], object]]
+
+
+def calibrate(fn: Callable[[], object], warmup: int = 3, min_sample_ms: float = 5.0) -> int:
+    """
+    Warm `fn` up and return how many calls make one sample
+
+    Fast calls are repeated inside each sample until one sample lasts at
+    least `min_sample_ms`, so timer resolution never dominates.
+    """
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter_ns()
+    fn()
+    single_ms = (time.perf_counter_ns() - start) / 1e6
+    return max(1, int(min_sample_ms / max(single_ms, 1e-6)))
+
+
+def sample(fn: Callable[[], object], inner: int) -> float:
+    """Mean milliseconds per call over `inner` back-to-back calls"""
+    start = time.perf_counter_ns()
+    for _ in range(inner):
+        fn()
+    return (time.perf_counter_ns() - start) / 1e6 / inner
+
+
+def measure(
+    fn: Callable[[], object],
+    samples: int = 30,
+    warmup: int = 3,
+    min_sample_ms: float = 5.0,
+) -> Dict:
+    """
+    Time one callable into `samples` per-call measurements
+
+    Returns:
+        Summary dict with per-call samples (ms), median, p95, mean, stdev
+        and the inner loop count
+    """
+    inner = calibrate(fn, warmup, min_sample_ms)
+    return summarize([sample(fn, inner) for _ in range(samples)], inner)
+
+
+def summarize(samples_ms: List[float], inner: int = 1) -> Dict:
+    """Median/p95/mean/stdev of per-call timings in milliseconds"""
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "median_ms": round(float(np.median(values)), 6),
+        "p95_ms": round(float(np.percentile(values, 95)), 6),
+        "mean_ms": round(float(values.mean()), 6),
+        "stdev_ms": round(float(values.std(ddof=1)) if values.size > 1 else 0.0, 6),
+        "inner_loops": inner,
+        "samples_ms": [round(float(v), 6) for v in values],
+    }
+
+
+def environment_info() -> Dict:
+    """Machine context stored with a baseline; numbers only compare on like hardware"""
+    return {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+    }
+
+
+# Fields that must match for a baseline's numbers to be comparable
+COMPARABLE_ENVIRONMENT = ("python", "torch", "processor", "cpu_count", "torch_threads")
+
+
+def environment_mismatches(baseline: Dict, current: Dict) -> List[str]:
+    """Human-readable differences between two environment_info() dicts"""
+    return [
+        f"{key}: baseline {baseline.get(key)!r}, current {current.get(key)!r}"
+        for key in COMPARABLE_ENVIRONMENT
+        if baseline.get(key) != current.get(key)
+    ]
+
+
+def compare(
+    current: Dict,
+    baseline: Dict,
+    tolerance: float = 0.10,
+    alpha: float = 0.01,
+) -> List[Dict]:
+    """
+    Compare a run against a baseline, case by case
+
+    A case regresses only when both hold: its median is more than
+    `tolerance` slower than the baseline median, and a one-sided
+    Mann-Whitney U test says the current samples are larger with
+    p < `alpha`. The first condition ignores differences too small to
+    matter, the second ignores differences explained by noise.
+
+    Args:
+        current: Run document ({"results": {name: summary}})
+        baseline: Baseline document in the same layout
+        tolerance: Allowed relative slowdown of the median
+        alpha: Significance level of the rank test
+
+    Returns:
+        One row per case present in both documents, with status
+        "regression", "improvement" or "ok"; cases missing from the
+        baseline are reported as "new"
+    """
+    rows = []
+    before = baseline.get("results", {})
+    for name, now in current.get("results", {}).items():
+        old = before.get(name)
+        if old is None:
+            rows.append({"name": name, "status": "new", "current_ms": now["median_ms"]})
+            continue
+
+        change = (now["median_ms"] - old["median_ms"]) / old["median_ms"]
+        slower_p = mannwhitneyu(now["samples_ms"], old["samples_ms"], alternative="greater").pvalue
+        faster_p = mannwhitneyu(now["samples_ms"], old["samples_ms"], alternative="less").pvalue
+        if change > tolerance and slower_p < alpha:
+            status = "regression"
+        elif change < -tolerance and faster_p < alpha:
+            status = "improvement"
+        else:
+            status = "ok"
+        rows.append({
+            "name": name,
+            "status": status,
+            "baseline_ms": old["median_ms"],
+            "current_ms": now["median_ms"],
+            "change": round(change, 4),
+            "p_value": float(slower_p if change >= 0 else faster_p),
+        })
+    return rows
+
+
+def run_benchmarks(
+    benchmarks: List[Benchmark],
+    samples: int = 30,
+    warmup: int = 3,
+    min_sample_ms: float = 5.0,
+    log: Optional[Callable[[str], None]] = None,
+    seed: int = 0,
+) -> Dict:
+    """
+    Set up and measure every case; returns a run document
+
+    Samples are taken in rounds, one per case per round in shuffled order,
+    so a transient slowdown of the machine spreads over all cases instead
+    of landing on whichever case happened to be running.
+    """
+    rng = random.Random(seed)
+    fns = {bench.name: bench.setup() for bench in benchmarks}
+    inner = {name: calibrate(fn, warmup, min_sample_ms) for name, fn in fns.items()}
+    values: Dict[str, List[float]] = {name: [] for name in fns}
+    order = list(fns)
+    for _ in range(samples):
+        rng.shuffle(order)
+        for name in order:
+            values[name].append(sample(fns[name], inner[name]))
+
+    results = {}
+    for bench in benchmarks:
+        summary = summarize(values[bench.name], inner[bench.name])
+        results[bench.name] = {"group": bench.group, **summary}
+        if log:
+            log(f"{bench.name:<44} median {summary['median_ms']:10.4f} ms  p95 {summary['p95_ms']:10.4f} ms")
+    return {
+        "schema_version": BASELINE_SCHEMA_VERSION,
+        "environment": environment_info(),
+        "settings": {"samples": samples, "warmup": warmup, "min_sample_ms": min_sample_ms},
+        "results": results,
+    }
+
+
+def save(document: Dict, path: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+
+
+def load(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,117 @@
+"""
+NLU Benchmark Runner
+Runs the offline benchmark suite and compares it with a stored JSON baseline;
+exits non-zero on a statistically significant slowdown, and refuses to
+compare against a baseline recorded in a different environment (python,
+torch, processor, CPU/thread count) unless --allow-env-mismatch is given
+
+Usage:
+    python -m benchmarks.run                          # run + compare with the default baseline
+    python -m benchmarks.run --update-baseline        # run and overwrite the baseline
+    python -m benchmarks.run --filter forward --samples 50
+    python -m benchmarks.run --output run.json --no-compare
+    python -m benchmarks.run --allow-env-mismatch     # compare anyway, with a warning
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+import torch
+
+from benchmarks.cases import BenchmarkContext, default_benchmarks
+from benchmarks.harness import compare, environment_mismatches, load, run_benchmarks, save
+
+DEFAULT_BASELINE = str(Path(__file__).resolve().parent / "baselines" / "default.json")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="NLU offline benchmark suite")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run as the baseline")
+    parser.add_argument("--no-compare", action="store_true")
+    parser.add_argument("--output", default=None, help="Also write this run's JSON here")
+    parser.add_argument("--filter", nargs="*", default=None, help="Only cases whose name contains one of these")
+    parser.add_argument("--list", action="store_true", help="List case names and exit")
+    parser.add_argument("--samples", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--min-sample-ms", type=float, default=5.0)
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative median slowdown")
+    parser.add_argument("--alpha", type=float, default=0.01, help="Significance level of the rank test")
+    parser.add_argument("--threads", type=int, default=1, help="torch intra-op threads (pinned for stable numbers)")
+    parser.add_argument(
+        "--allow-env-mismatch", action="store_true",
+        help="Compare even if the baseline was recorded in a different environment",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    torch.manual_seed(0)
+    previous_threads = torch.get_num_threads()
+    torch.set_num_threads(args.threads)
+
+    ctx = BenchmarkContext()
+    try:
+        benchmarks = default_benchmarks(ctx)
+        if args.filter:
+            benchmarks = [b for b in benchmarks if any(f in b.name for f in args.filter)]
+        if args.list:
+            for bench in benchmarks:
+                print(bench.name)
+            return 0
+        document = run_benchmarks(
+            benchmarks, args.samples, args.warmup, args.min_sample_ms, log=print
+        )
+    finally:
+        ctx.close()
+        torch.set_num_threads(previous_threads)
+
+    if args.output:
+        save(document, args.output)
+    if args.update_baseline:
+        if args.filter and os.path.exists(args.baseline):
+            # Partial run: only replace the cases that were measured
+            merged = load(args.baseline)
+            merged["results"].update(document["results"])
+            merged["environment"] = document["environment"]
+            document = merged
+        save(document, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if args.no_compare:
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline first")
+        return 0
+
+    baseline = load(args.baseline)
+    mismatches = environment_mismatches(baseline.get("environment", {}), document["environment"])
+    if mismatches:
+        print("Baseline was recorded in a different environment:")
+        for mismatch in mismatches:
+            print(f"  {mismatch}")
+        if not args.allow_env_mismatch:
+            print("Re-record it here with --update-baseline, or pass --allow-env-mismatch")
+            return 2
+        print("Warning: comparing anyway (--allow-env-mismatch)")
+    rows = compare(document, baseline, args.tolerance, args.alpha)
+    print(f"\n{'case':<44} {'baseline':>11} {'current':>11} {'change':>8} {'p':>8}  status")
+    for row in rows:
+        if row["status"] == "new":
+            print(f"{row['name']:<44} {'-':>11} {row['current_ms']:>11.4f} {'':>8} {'':>8}  new")
+            continue
+        print(
+            f"{row['name']:<44} {row['baseline_ms']:>11.4f} {row['current_ms']:>11.4f} "
+            f"{row['change']:>+8.1%} {row['p_value']:>8.1e}  {row['status']}"
+        )
+    regressions = [row["name"] for row in rows if row["status"] == "regression"]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
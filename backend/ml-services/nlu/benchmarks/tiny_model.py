@@ -0,0 +1,45 @@
+"""
+Tiny NLU Model
+Randomly-initialized BERT classifier with a vocab built from data/*.jsonl,
+used by tests and benchmarks so neither needs network access
+"""
+
+import json
+from pathlib import Path
+
+import torch
+from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+from config import MODEL_CONFIG
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+
+
+def build_tiny_model(output_dir: Path) -> Path:
+    """Save a tiny randomly-initialized BERT classifier with a vocab built from data/*.jsonl"""
+    words = set()
+    for path in DATA_DIR.glob("*.jsonl"):
+        for line in path.read_text().splitlines():
+            if line.strip():
+                words.update(json.loads(line)["text"].lower().replace("?", " ").split())
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    vocab_file = output_dir / "vocab.txt"
+    vocab_file.write_text("\n".join(SPECIAL_TOKENS + sorted(words)))
+
+    tokenizer = BertTokenizerFast(vocab_file=str(vocab_file))
+    tokenizer.save_pretrained(str(output_dir))
+
+    config = BertConfig(
+        vocab_size=tokenizer.vocab_size,
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        max_position_embeddings=MODEL_CONFIG["max_length"],
+        num_labels=MODEL_CONFIG["num_labels"],
+    )
+    torch.manual_seed(0)
+    BertForSequenceClassification(config).save_pretrained(str(output_dir))
+    return output_dir
@@ -30,9 +30,13 @@ TRAINING_CONFIG = {
     "seed": 42,
     "early_stopping_patience": 3,
     "early_stopping_threshold": 0.01,
-    "gradient_accumulation_steps": 1,
-    "use_amp": True,  # Automatic Mixed Precision
+    "gradient_accumulation_steps": int(os.getenv("NLU_GRADIENT_ACCUMULATION_STEPS", "1")),
+    "use_amp": os.getenv("NLU_USE_AMP", "true").lower() == "true",  # fp16 on CUDA
+    # bf16 autocast on CPU; opt-in, it is usually slower than fp32 without AMX/AVX512-BF16
+    "cpu_bf16": os.getenv("NLU_CPU_BF16", "false").lower() == "true",
     "num_workers": int(os.getenv("NLU_NUM_WORKERS", "4")),
+    # CPU data-parallel processes (torch DDP, gloo backend); 1 = single process
+    "num_processes": int(os.getenv("NLU_TRAIN_PROCESSES", "1")),
 }
 
 # Inference Configuration
@@ -41,6 +45,34 @@ INFERENCE_CONFIG = {
     "use_gpu": os.getenv("NLU_USE_GPU", "true").lower() == "true",
     "num_workers": int(os.getenv("NLU_INFERENCE_WORKERS", "4")),
     "confidence_threshold": float(os.getenv("NLU_CONFIDENCE_THRESHOLD", "0.5")),
+    # Group batch-predict texts by token length to cut padding
+    "sort_by_length": os.getenv("NLU_SORT_BY_LENGTH", "true").lower() == "true",
+    # Padded-token cap per batch (0 = none); adaptive batching starts from it
+    "token_budget": int(os.getenv("NLU_INFERENCE_TOKEN_BUDGET", "8192")),
+    # "dynamic" = int8 weights for Linear layers (CPU only); "none" = full precision
+    "quantization": os.getenv("NLU_QUANTIZATION", "none").lower(),
+}
+
+# Adaptive Batching (predict_batch/embed_batch batch size and token budget)
+ADAPTIVE_BATCH_CONFIG = {
+    "enabled": os.getenv("NLU_ADAPTIVE_BATCHING", "true").lower() == "true",
+    "target_p95_ms": float(os.getenv("NLU_BATCH_TARGET_P95_MS", "50")),
+    "max_batch_size": int(os.getenv("NLU_BATCH_MAX_SIZE", "128")),
+    # Ceiling for the tuned padded-token budget (rows * longest sequence);
+    # tuning starts from INFERENCE_CONFIG["token_budget"]
+    "max_token_budget": int(os.getenv("NLU_BATCH_MAX_TOKEN_BUDGET", "65536")),
+    "window": 50,        # Recent batches used for the p95 estimate
+    "adjust_every": 10,  # Batches between adjustments
+}
+
+# Request Scheduler Configuration (dynamic micro-batching shared by REST and gRPC)
+SCHEDULER_CONFIG = {
+    "enabled": os.getenv("NLU_SCHEDULER_ENABLED", "true").lower() == "true",
+    "max_batch_size": int(os.getenv("NLU_SCHEDULER_MAX_BATCH_SIZE", INFERENCE_CONFIG["batch_size"])),
+    "max_wait_ms": float(os.getenv("NLU_SCHEDULER_MAX_WAIT_MS", "10")),  # routine lane
+    # Likely-emergency texts (EMERGENCY_SUBCATEGORIES keywords) get their own lane
+    "priority_lanes": os.getenv("NLU_SCHEDULER_PRIORITY_LANES", "true").lower() == "true",
+    "emergency_max_wait_ms": float(os.getenv("NLU_SCHEDULER_EMERGENCY_MAX_WAIT_MS", "1")),
 }
 
 # Service Configuration
@@ -52,6 +84,15 @@ SERVICE_CONFIG = {
     "log_level": os.getenv("NLU_LOG_LEVEL", "info"),
 }
 
+# gRPC Configuration (HTTP/2 interface alongside the REST API)
+GRPC_CONFIG = {
+    "enabled": os.getenv("NLU_GRPC_ENABLED", "false").lower() == "true",
+    "host": os.getenv("NLU_GRPC_HOST", "0.0.0.0"),
+    "port": int(os.getenv("NLU_GRPC_PORT", "50051")),
+    "max_concurrent_streams": int(os.getenv("NLU_GRPC_MAX_STREAMS", "100")),
+    "keepalive_time_ms": 30000,
+}
+
 # Intent Configuration
 INTENT_CLASSES: List[str] = [
     "emergency",          # 0: Critical patient conditions
@@ -84,6 +125,14 @@ MODEL_PATHS = {
     "validation_data": os.getenv("NLU_VALIDATION_DATA", "./data/val.jsonl"),
     "test_data": os.getenv("NLU_TEST_DATA", "./data/test.jsonl"),
     "metrics_output": os.getenv("NLU_METRICS_OUTPUT", "./metrics.json"),
+    "throughput_output": os.getenv("NLU_THROUGHPUT_OUTPUT", "./throughput.json"),
+}
+
+# Pre-tokenized dataset cache (memory-mapped Arrow, keyed on data + tokenizer + max_length)
+DATA_CACHE_CONFIG = {
+    "enabled": os.getenv("NLU_DATA_CACHE_ENABLED", "true").lower() == "true",
+    "cache_dir": os.getenv("NLU_DATA_CACHE_DIR", "./data/cache"),
+    "chunk_size": int(os.getenv("NLU_DATA_CACHE_CHUNK_SIZE", "10000")),  # Lines tokenized per chunk
 }
 
 # Feature Extraction
@@ -91,6 +140,35 @@ FEATURE_CONFIG = {
     "extract_embeddings": False,  # Return token embeddings (disable for speed)
     "extract_attention": False,   # Return attention weights (disable for speed)
     "return_logits": True,        # Return raw logits for confidence scoring
+    "embedding_pooling": os.getenv("NLU_EMBEDDING_POOLING", "mean"),  # "mean" or "cls"
+    "embedding_dtype": os.getenv("NLU_EMBEDDING_DTYPE", "float32"),   # float32, float16, int8
+    "normalize_embeddings": True,  # L2-normalize pooled embeddings
+}
+
+# Intent Retrieval Index (k-NN fast path over labeled examples)
+INDEX_CONFIG = {
+    "enabled": os.getenv("NLU_INDEX_ENABLED", "false").lower() == "true",
+    "index_dir": os.getenv("NLU_INDEX_DIR", "./models/intent_index"),
+    "distillation_dir": os.getenv("NLU_DISTILLATION_DIR", "./data/distillation"),
+    "nlist": int(os.getenv("NLU_INDEX_NLIST", "0")),  # 0 = sqrt(num_examples)
+    "num_subquantizers": int(os.getenv("NLU_INDEX_SUBQUANTIZERS", "48")),
+    "nprobe": int(os.getenv("NLU_INDEX_NPROBE", "4")),
+    "refine": int(os.getenv("NLU_INDEX_REFINE", "4")),  # exact re-rank of k * refine candidates
+    "k": int(os.getenv("NLU_INDEX_K", "5")),
+    "similarity_threshold": float(os.getenv("NLU_INDEX_SIMILARITY_THRESHOLD", "0.95")),
+    "min_agreement": float(os.getenv("NLU_INDEX_MIN_AGREEMENT", "0.8")),
+}
+
+# Request trace recorder (PHI-free arrival trace for replay in load_test_runner.py)
+TRACE_CONFIG = {
+    "enabled": os.getenv("NLU_TRACE_ENABLED", "false").lower() == "true",
+    "path": os.getenv("NLU_TRACE_PATH", "./traces/requests.trace.jsonl"),
+    "sample_rate": float(os.getenv("NLU_TRACE_SAMPLE_RATE", "1.0")),
+    # HMAC key for text hashes; empty = random per run (hashes not joinable across runs),
+    # shared by the workers `python app.py` starts
+    "salt": os.getenv("NLU_TRACE_SALT", ""),
+    "max_records": int(os.getenv("NLU_TRACE_MAX_RECORDS", "1000000")),
+    "queue_size": int(os.getenv("NLU_TRACE_QUEUE_SIZE", "10000")),
 }
 
 # Logging
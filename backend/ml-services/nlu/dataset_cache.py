@@ -0,0 +1,257 @@
+"""
+Pre-tokenized Dataset Cache
+Tokenizes JSONL splits once into memory-mapped Arrow datasets keyed on the
+data file, tokenizer and max_length, so training and evaluation runs skip
+tokenization; files larger than RAM are tokenized chunk by chunk
+
+Usage:
+    python dataset_cache.py build                 # train/val/test from MODEL_PATHS
+    python dataset_cache.py build --data big.jsonl
+    python dataset_cache.py info
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from datasets import Dataset, Features, IterableDataset, Sequence, Value, load_dataset, load_from_disk
+
+from config import DATA_CACHE_CONFIG, INTENT_LABELS, MODEL_CONFIG, MODEL_PATHS
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached schema or tokenization call changes
+CACHE_VERSION = 1
+
+CACHE_FEATURES = Features({
+    "input_ids": Sequence(Value("int32")),
+    "attention_mask": Sequence(Value("int8")),
+    "token_type_ids": Sequence(Value("int8")),
+    "label": Value("int64"),
+    "length": Value("int32"),
+})
+
+
+def file_fingerprint(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Hash of everything that changes a tokenizer's output"""
+    digest = hashlib.sha256()
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        # Vocab, normalizer, pre-tokenizer and post-processor in one document;
+        # truncation/padding are per-call state, covered by max_length
+        document = json.loads(backend.to_str())
+        document.pop("truncation", None)
+        document.pop("padding", None)
+        digest.update(json.dumps(document, sort_keys=True).encode())
+    else:
+        digest.update(json.dumps(tokenizer.get_vocab(), sort_keys=True).encode())
+    digest.update(type(tokenizer).__name__.encode())
+    digest.update(str(getattr(tokenizer, "do_lower_case", "")).encode())
+    return digest.hexdigest()
+
+
+def cache_key(data_file: str, tokenizer, max_length: int) -> str:
+    """Cache entry name for one tokenized split"""
+    digest = hashlib.sha256()
+    for part in (
+        str(CACHE_VERSION),
+        file_fingerprint(data_file),
+        tokenizer_fingerprint(tokenizer),
+        str(max_length),
+        json.dumps(INTENT_LABELS, sort_keys=True),
+    ):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:24]
+
+
+def _tokenize_records(records: List[Dict], tokenizer, max_length: int) -> Dict[str, List]:
+    """Tokenize a chunk of {"text", "intent"} records (unpadded)"""
+    encodings = tokenizer(
+        [record["text"] for record in records],
+        max_length=max_length,
+        truncation=True,
+        return_token_type_ids=True,
+    )
+    return {
+        "input_ids": encodings["input_ids"],
+        "attention_mask": encodings["attention_mask"],
+        "token_type_ids": encodings["token_type_ids"],
+        "label": [INTENT_LABELS[record["intent"]] for record in records],
+        "length": [len(ids) for ids in encodings["input_ids"]],
+    }
+
+
+def _generate_examples(data_file: str, tokenizer, max_length: int, chunk_size: int) -> Iterator[Dict]:
+    """Stream a JSONL file, tokenizing `chunk_size` lines at a time"""
+    def flush(chunk):
+        columns = _tokenize_records(chunk, tokenizer, max_length)
+        for i in range(len(chunk)):
+            yield {name: values[i] for name, values in columns.items()}
+
+    chunk: List[Dict] = []
+    with open(data_file, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield from flush(chunk)
+                chunk = []
+    if chunk:
+        yield from flush(chunk)
+
+
+def load_or_build(
+    data_file: str,
+    tokenizer,
+    max_length: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+) -> Dataset:
+    """
+    Return the tokenized split for a JSONL file, building the cache on a miss
+
+    Rows are written to Arrow chunk by chunk and read back memory-mapped, so
+    neither step holds the whole file in RAM.
+
+    Args:
+        data_file: JSONL with "text" and "intent" fields
+        tokenizer: Tokenizer used for training/evaluation
+        max_length: Truncation length (default MODEL_CONFIG['max_length'])
+        cache_dir: Cache root (default DATA_CACHE_CONFIG['cache_dir'])
+
+    Returns:
+        Memory-mapped Dataset with input_ids, attention_mask,
+        token_type_ids, label and length columns
+    """
+    max_length = max_length or MODEL_CONFIG["max_length"]
+    cache_root = Path(cache_dir or DATA_CACHE_CONFIG["cache_dir"])
+    key = cache_key(data_file, tokenizer, max_length)
+    target = cache_root / key
+
+    if target.exists():
+        logger.info(f"Tokenized cache hit for {data_file} ({key})")
+        return load_from_disk(str(target))
+
+    logger.info(f"Tokenizing {data_file} into cache {target}")
+    staging = cache_root / f".{key}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    dataset = Dataset.from_generator(
+        _generate_examples,
+        features=CACHE_FEATURES,
+        # Per-key builder cache so a changed file never reuses stale rows
+        cache_dir=str(staging / "build"),
+        gen_kwargs={
+            "data_file": data_file,
+            "tokenizer": tokenizer,
+            "max_length": max_length,
+            "chunk_size": DATA_CACHE_CONFIG["chunk_size"],
+        },
+    )
+    dataset.save_to_disk(str(staging / "dataset"))
+    del dataset
+    (staging / "dataset" / "source.json").write_text(json.dumps({
+        "data_file": str(Path(data_file).resolve()),
+        "max_length": max_length,
+        "tokenizer": getattr(tokenizer, "name_or_path", ""),
+        "cache_version": CACHE_VERSION,
+    }, indent=2))
+
+    # Atomic publish: readers only ever see complete entries
+    try:
+        os.replace(staging / "dataset", target)
+    except OSError:
+        if not target.exists():
+            raise
+        # Another process published the same entry first
+    shutil.rmtree(staging, ignore_errors=True)
+    return load_from_disk(str(target))
+
+
+def stream_tokenized(data_file: str, tokenizer, max_length: Optional[int] = None) -> IterableDataset:
+    """
+    Tokenize a JSONL file lazily while iterating (nothing written to disk)
+
+    For one-off runs over files too large to cache; the Trainer needs
+    `max_steps` since an IterableDataset has no length.
+    """
+    max_length = max_length or MODEL_CONFIG["max_length"]
+    stream = load_dataset("json", data_files=data_file, split="train", streaming=True)
+    return stream.map(
+        lambda batch: _tokenize_records(
+            [{"text": t, "intent": i} for t, i in zip(batch["text"], batch["intent"])],
+            tokenizer,
+            max_length,
+        ),
+        batched=True,
+        batch_size=1000,
+        remove_columns=list(stream.column_names or ["text", "intent"]),
+    )
+
+
+def count_lines(data_file: str) -> int:
+    """Number of non-empty lines (examples) in a JSONL file"""
+    with open(data_file, "r") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def cache_info(cache_dir: Optional[str] = None) -> List[Dict]:
+    """Describe cached splits"""
+    cache_root = Path(cache_dir or DATA_CACHE_CONFIG["cache_dir"])
+    entries = []
+    if not cache_root.exists():
+        return entries
+    for entry in sorted(cache_root.iterdir()):
+        source = entry / "source.json"
+        if not source.exists():
+            continue
+        size_mb = sum(f.stat().st_size for f in entry.rglob("*") if f.is_file()) / (1024 * 1024)
+        entries.append({"key": entry.name, "size_mb": round(size_mb, 2), **json.loads(source.read_text())})
+    return entries
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Pre-tokenized dataset cache")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--data", nargs="*", help="JSONL files (default: train/val/test)")
+    parser.add_argument("--tokenizer", default=MODEL_CONFIG["model_name"])
+    parser.add_argument("--max-length", type=int, default=MODEL_CONFIG["max_length"])
+    parser.add_argument("--cache-dir", default=DATA_CACHE_CONFIG["cache_dir"])
+    args = parser.parse_args()
+
+    if args.command == "info":
+        for entry in cache_info(args.cache_dir):
+            print(json.dumps(entry))
+        return
+
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    data_files = args.data or [
+        MODEL_PATHS["training_data"], MODEL_PATHS["validation_data"], MODEL_PATHS["test_data"]
+    ]
+    for data_file in data_files:
+        if not os.path.exists(data_file):
+            logger.warning(f"Skipping missing {data_file}")
+            continue
+        dataset = load_or_build(data_file, tokenizer, args.max_length, args.cache_dir)
+        print(f"{data_file}: {len(dataset)} examples")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,53 @@
 """
 Evaluation script for NLU model
 Evaluates trained model on test set and generates metrics
+
+Quality metrics come from one batched, dynamically padded pass through
+NLUModel.predict_batch (the serving path, with the intent index and
+adaptive batching held off so the classifier itself is measured);
+performance is reported as single-request latency percentiles and
+throughput at several batch sizes.
+
+Usage:
+    python evaluate.py
+    python evaluate.py --batch-sizes 1 8 32 64 --latency-samples 200
+    python evaluate.py --compare baseline_metrics.json
 """
 
+import argparse
+import hashlib
 import json
 import logging
+import os
+import platform
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional
 
 import numpy as np
 import torch
-from datasets import Dataset
 from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
 
 from config import (
     INFERENCE_CONFIG,
+    INTENT_CLASSES,
     INTENT_LABELS,
-    LABEL_TO_INTENT,
-    MODEL_CONFIG,
     MODEL_PATHS,
 )
+from model import NLUModel
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# Bump when metrics.json fields change meaning
+METRICS_SCHEMA_VERSION = 2
+PERCENTILES = (50, 90, 95, 99)
+
 
 def load_jsonl_dataset(filepath: str):
     """Load dataset from JSONL file"""
-    import json
     data = []
     with open(filepath, 'r') as f:
         for line in f:
@@ -37,113 +56,265 @@ def load_jsonl_dataset(filepath: str):
     return data
 
 
-def evaluate():
-    """Evaluate the trained model"""
-    device = torch.device("cuda" if INFERENCE_CONFIG["use_gpu"] and torch.cuda.is_available() else "cpu")
-    logger.info(f"Using device: {device}")
-    
+def latency_summary(latencies_ms: List[float]) -> Dict:
+    """Percentiles, mean and max of a latency sample in milliseconds"""
+    values = np.asarray(latencies_ms, dtype=np.float64)
+    summary = {f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    summary["mean"] = round(float(values.mean()), 3)
+    summary["max"] = round(float(values.max()), 3)
+    summary["samples"] = int(values.size)
+    return summary
+
+
+def quality_metrics(true_labels: List[int], predictions: List[int]) -> Dict:
+    """Accuracy, macro/weighted F1 and per-class F1"""
+    per_class = f1_score(
+        true_labels, predictions, labels=list(range(len(INTENT_CLASSES))),
+        average=None, zero_division=0,
+    )
+    return {
+        "accuracy": float(accuracy_score(true_labels, predictions)),
+        "macro_f1": float(f1_score(true_labels, predictions, average="macro")),
+        "weighted_f1": float(f1_score(true_labels, predictions, average="weighted")),
+        "macro_precision": float(precision_score(true_labels, predictions, average="macro", zero_division=0)),
+        "macro_recall": float(recall_score(true_labels, predictions, average="macro", zero_division=0)),
+        "per_class_f1": {intent: float(score) for intent, score in zip(INTENT_CLASSES, per_class)},
+    }
+
+
+@contextmanager
+def pinned_batching(model: NLUModel, batch_size: Optional[int] = None):
+    """
+    Hold predict_batch to the classifier with fixed batching while measuring
+
+    The intent index (k-NN shortcut) and the adaptive batch controller,
+    which re-splits batches and retunes between calls, are switched off
+    and restored afterwards. With `batch_size`, the token budget is lifted
+    too, so a call with up to `batch_size` texts runs as exactly one batch.
+    """
+    controller, index = model.batch_controller, model.intent_index
+    saved = {key: INFERENCE_CONFIG[key] for key in ("batch_size", "token_budget")}
+    model.batch_controller = None
+    model.intent_index = None
+    if batch_size is not None:
+        INFERENCE_CONFIG.update(batch_size=batch_size, token_budget=0)
+    try:
+        yield
+    finally:
+        INFERENCE_CONFIG.update(saved)
+        model.batch_controller = controller
+        model.intent_index = index
+
+
+def measure_single_request_latency(model: NLUModel, texts: List[str], samples: int) -> Dict:
+    """Latency of one-text predict_batch calls, cycling through the test texts"""
+    latencies = []
+    for i in range(samples):
+        start = time.perf_counter()
+        model.predict_batch([texts[i % len(texts)]])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latency_summary(latencies)
+
+
+def measure_throughput(model: NLUModel, texts: List[str], batch_size: int, min_texts: int) -> Dict:
+    """
+    Texts/s when predict_batch is called with `batch_size` texts at a time
+
+    The test texts are cycled until at least `min_texts` have been scored
+    so small test sets still give stable numbers.
+    """
+    num_calls = max(1, -(-min_texts // batch_size))
+    batch_latencies = []
+    total = 0
+    start = time.perf_counter()
+    for call in range(num_calls):
+        offset = call * batch_size
+        batch = [texts[(offset + j) % len(texts)] for j in range(batch_size)]
+        batch_start = time.perf_counter()
+        model.predict_batch(batch)
+        batch_latencies.append((time.perf_counter() - batch_start) * 1000)
+        total += batch_size
+    elapsed = time.perf_counter() - start
+    return {
+        "batch_size": batch_size,
+        "texts": total,
+        "texts_per_second": round(total / elapsed, 2),
+        "batch_latency_ms": latency_summary(batch_latencies),
+    }
+
+
+def environment_info() -> Dict:
+    """Hardware/software context needed to compare metrics across machines"""
+    return {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "cuda": torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+    }
+
+
+def compare_metrics(current: Dict, baseline: Dict) -> Dict:
+    """
+    Relative change of headline numbers vs a baseline metrics.json
+
+    Returns:
+        {metric_path: {"baseline", "current", "change"}} where change is
+        (current - baseline) / baseline
+    """
+    def headline(metrics: Dict) -> Dict[str, float]:
+        values = {key: metrics.get(key) for key in ("accuracy", "macro_f1")}
+        for p in ("p50", "p95", "p99"):
+            values[f"latency_ms.{p}"] = metrics.get("latency_ms", {}).get(p)
+        for row in metrics.get("throughput", []):
+            values[f"throughput.bs{row['batch_size']}.texts_per_second"] = row["texts_per_second"]
+        return values
+
+    now, before = headline(current), headline(baseline)
+    comparison = {}
+    for key, value in now.items():
+        old = before.get(key)
+        if value is None or old is None:
+            continue
+        comparison[key] = {
+            "baseline": old,
+            "current": value,
+            "change": round((value - old) / old, 4) if old else None,
+        }
+    return comparison
+
+
+def evaluate(
+    batch_sizes: Optional[List[int]] = None,
+    latency_samples: int = 200,
+    throughput_texts: int = 512,
+    model_dir: Optional[str] = None,
+    test_path: Optional[str] = None,
+    output_path: Optional[str] = None,
+) -> Dict:
+    """Evaluate the trained model and write metrics.json"""
+    batch_sizes = batch_sizes or [1, 8, 32, 64]
+
     # Load model and tokenizer
-    model_dir = str(Path(MODEL_PATHS['best_model_dir']).resolve()).replace("\\", "/")
+    model_dir = model_dir or str(Path(MODEL_PATHS['best_model_dir']).resolve()).replace("\\", "/")
     logger.info(f"Loading model from {model_dir}")
-    tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
-    model = AutoModelForSequenceClassification.from_pretrained(model_dir, local_files_only=True)
-    model.to(device)
-    model.eval()
-    
+    model = NLUModel(model_dir)
+    model.load()
+    logger.info(f"Using device: {model.device}")
+
     # Load test data
     logger.info("Loading test dataset...")
-    test_data = load_jsonl_dataset(MODEL_PATHS["test_data"] or "./data/test.jsonl")
-    
+    test_path = test_path or MODEL_PATHS["test_data"] or "./data/test.jsonl"
+    test_data = load_jsonl_dataset(test_path)
+
     if not test_data:
         logger.warning("No test data found, using sample data")
-        test_data = load_jsonl_dataset("./data/train.jsonl")[-50:]  # Use last 50 examples
-    
-    # Evaluate
-    predictions = []
-    true_labels = []
-    inference_times = []
-    
+        test_path = "./data/train.jsonl"
+        test_data = load_jsonl_dataset(test_path)[-50:]  # Use last 50 examples
+
+    texts = [example["text"] for example in test_data]
+    true_labels = [INTENT_LABELS[example["intent"]] for example in test_data]
+
+    # Quality: one batched classifier pass over the whole test set
     logger.info(f"Evaluating on {len(test_data)} examples...")
-    
-    for example in test_data:
-        text = example["text"]
-        true_intent = example["intent"]
-        true_label = INTENT_LABELS[true_intent]
-        
-        # Tokenize
-        inputs = tokenizer(
-            text,
-            max_length=MODEL_CONFIG["max_length"],
-            padding="max_length",
-            truncation=True,
-            return_tensors="pt",
-        )
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        
-        # Inference
-        import time
-        start = time.time()
-        with torch.no_grad():
-            outputs = model(**inputs)
-            logits = outputs.logits[0]
-        inference_time = (time.time() - start) * 1000
-        inference_times.append(inference_time)
-        
-        # Get prediction
-        pred_label = torch.argmax(logits, dim=-1).item()
-        predictions.append(pred_label)
-        true_labels.append(true_label)
-    
-    # Calculate metrics
-    accuracy = accuracy_score(true_labels, predictions)
-    macro_f1 = f1_score(true_labels, predictions, average="macro")
-    weighted_f1 = f1_score(true_labels, predictions, average="weighted")
-    macro_precision = precision_score(true_labels, predictions, average="macro", zero_division=0)
-    macro_recall = recall_score(true_labels, predictions, average="macro", zero_division=0)
-    
-    # Inference latency
-    inference_times_sorted = sorted(inference_times)
-    p50_latency = inference_times_sorted[len(inference_times) // 2]
-    p95_latency = inference_times_sorted[int(len(inference_times) * 0.95)]
-    p99_latency = inference_times_sorted[int(len(inference_times) * 0.99)]
-    
+    with pinned_batching(model):
+        start = time.perf_counter()
+        results = model.predict_batch(texts)
+        eval_seconds = time.perf_counter() - start
+    predictions = [result["label_id"] for result in results]
+
+    # Performance (after one warm-up call), each call one batch of its size
+    with pinned_batching(model, max(batch_sizes)):
+        model.predict_batch(texts[: max(batch_sizes)])
+        logger.info(f"Measuring single-request latency ({latency_samples} requests)...")
+        single_latency = measure_single_request_latency(model, texts, latency_samples)
+        throughput = []
+        for batch_size in batch_sizes:
+            logger.info(f"Measuring throughput at batch size {batch_size}...")
+            throughput.append(measure_throughput(model, texts, batch_size, throughput_texts))
+
+    with open(test_path, "rb") as f:
+        test_sha256 = hashlib.sha256(f.read()).hexdigest()
+
     metrics = {
-        "accuracy": float(accuracy),
-        "macro_f1": float(macro_f1),
-        "weighted_f1": float(weighted_f1),
-        "macro_precision": float(macro_precision),
-        "macro_recall": float(macro_recall),
-        "latency_ms": {
-            "p50": float(p50_latency),
-            "p95": float(p95_latency),
-            "p99": float(p99_latency),
-            "mean": float(np.mean(inference_times)),
+        "schema_version": METRICS_SCHEMA_VERSION,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "model": {
+            "path": model_dir,
+            "version": model.model_version,
+            "device": str(model.device),
         },
+        "dataset": {"path": test_path, "sha256": test_sha256},
+        "environment": environment_info(),
+        **quality_metrics(true_labels, predictions),
         "test_set_size": len(test_data),
+        "eval_texts_per_second": round(len(texts) / eval_seconds, 2),
+        # Single-request latency (predict_batch with one text)
+        "latency_ms": single_latency,
+        "throughput": throughput,
     }
-    
+
     # Print results
     logger.info(f"\n{'='*50}")
     logger.info("EVALUATION RESULTS")
     logger.info(f"{'='*50}")
-    logger.info(f"Accuracy: {accuracy:.4f}")
-    logger.info(f"Macro F1: {macro_f1:.4f}")
-    logger.info(f"Weighted F1: {weighted_f1:.4f}")
-    logger.info(f"Macro Precision: {macro_precision:.4f}")
-    logger.info(f"Macro Recall: {macro_recall:.4f}")
-    logger.info(f"\nInference Latency (ms):")
-    logger.info(f"  P50: {p50_latency:.2f}")
-    logger.info(f"  P95: {p95_latency:.2f}")
-    logger.info(f"  P99: {p99_latency:.2f}")
-    logger.info(f"  Mean: {np.mean(inference_times):.2f}")
+    logger.info(f"Accuracy: {metrics['accuracy']:.4f}")
+    logger.info(f"Macro F1: {metrics['macro_f1']:.4f}")
+    logger.info(f"Weighted F1: {metrics['weighted_f1']:.4f}")
+    logger.info(f"Macro Precision: {metrics['macro_precision']:.4f}")
+    logger.info(f"Macro Recall: {metrics['macro_recall']:.4f}")
+    logger.info("\nSingle-request Latency (ms):")
+    for p in PERCENTILES:
+        logger.info(f"  P{p}: {single_latency[f'p{p}']:.2f}")
+    logger.info(f"  Mean: {single_latency['mean']:.2f}")
+    logger.info("\nThroughput:")
+    for row in throughput:
+        logger.info(
+            f"  batch {row['batch_size']:>3}: {row['texts_per_second']:.1f} texts/s "
+            f"(batch p95 {row['batch_latency_ms']['p95']:.2f} ms)"
+        )
     logger.info(f"Test Set Size: {len(test_data)}")
     logger.info(f"{'='*50}\n")
-    
+
     # Save metrics
-    with open(MODEL_PATHS["metrics_output"], "w") as f:
+    output_path = output_path or MODEL_PATHS["metrics_output"]
+    with open(output_path, "w") as f:
         json.dump(metrics, f, indent=2)
-    logger.info(f"Metrics saved to {MODEL_PATHS['metrics_output']}")
+    logger.info(f"Metrics saved to {output_path}")
+
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the NLU model")
+    parser.add_argument("--model-dir", default=None)
+    parser.add_argument("--test-data", default=None)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--latency-samples", type=int, default=200)
+    parser.add_argument("--throughput-texts", type=int, default=512)
+    parser.add_argument("--compare", default=None, help="Baseline metrics.json to diff against")
+    args = parser.parse_args()
+
+    metrics = evaluate(
+        batch_sizes=args.batch_sizes,
+        latency_samples=args.latency_samples,
+        throughput_texts=args.throughput_texts,
+        model_dir=args.model_dir,
+        test_path=args.test_data,
+        output_path=args.output,
+    )
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\n{'metric':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+        for key, row in compare_metrics(metrics, baseline).items():
+            change = f"{row['change']:+.1%}" if row["change"] is not None else "n/a"
+            print(f"{key:<40} {row['baseline']:>12.4f} {row['current']:>12.4f} {change:>8}")
 
 
 if __name__ == "__main__":
-    evaluate()
+    main()
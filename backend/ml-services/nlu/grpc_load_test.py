@@ -0,0 +1,152 @@
+"""
+REST vs gRPC load test for NLU service
+Runs the same request mix with the same concurrency over HTTP/1.1 JSON
+(/predict), gRPC unary Predict and one multiplexed gRPC Classify stream
+
+Usage (service started with NLU_GRPC_ENABLED=true):
+    python grpc_load_test.py --rest-url http://localhost:8000 --grpc-target localhost:50051 \
+        --requests 500 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+import grpc
+import httpx
+
+import nlu_pb2
+import nlu_pb2_grpc
+
+SAMPLE_TEXTS = [
+    "Patient has severe chest pain and shortness of breath",
+    "Calculate SOFA score for this patient",
+    "Interpret potassium level of 6.1",
+    "Show sepsis protocol",
+    "What are risk factors for stroke?",
+]
+
+
+def summarize(name: str, latencies: List[float], elapsed_s: float, failures: int) -> Dict:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "transport": name,
+        "requests": count + failures,
+        "failures": failures,
+        "throughput_rps": count / elapsed_s if elapsed_s > 0 else 0.0,
+        "p50_ms": latencies[int(0.50 * count)] if count else 0.0,
+        "p95_ms": latencies[min(int(0.95 * count), count - 1)] if count else 0.0,
+        "p99_ms": latencies[min(int(0.99 * count), count - 1)] if count else 0.0,
+        "mean_ms": statistics.mean(latencies) if count else 0.0,
+    }
+
+
+async def run_workers(num_requests: int, concurrency: int, send) -> tuple:
+    """Closed-loop workers pulling request indices off a shared counter"""
+    latencies: List[float] = []
+    failures = 0
+    counter = iter(range(num_requests))
+
+    async def worker():
+        nonlocal failures
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                await send(SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)])
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start, failures
+
+
+async def load_test_rest(url: str, num_requests: int, concurrency: int) -> Dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=10.0) as client:
+        async def send(text: str):
+            response = await client.post("/predict", json={"text": text})
+            response.raise_for_status()
+
+        latencies, elapsed, failures = await run_workers(num_requests, concurrency, send)
+    return summarize("rest /predict", latencies, elapsed, failures)
+
+
+async def load_test_grpc_unary(target: str, num_requests: int, concurrency: int) -> Dict:
+    async with grpc.aio.insecure_channel(target) as channel:
+        stub = nlu_pb2_grpc.IntentClassifierStub(channel)
+
+        async def send(text: str):
+            await stub.Predict(nlu_pb2.PredictRequest(text=text), timeout=10.0)
+
+        latencies, elapsed, failures = await run_workers(num_requests, concurrency, send)
+    return summarize("grpc Predict", latencies, elapsed, failures)
+
+
+async def load_test_grpc_stream(target: str, num_requests: int, concurrency: int) -> Dict:
+    """Keep `concurrency` requests in flight on a single Classify stream"""
+    async with grpc.aio.insecure_channel(target) as channel:
+        stub = nlu_pb2_grpc.IntentClassifierStub(channel)
+        call = stub.Classify()
+        sent_at: Dict[str, float] = {}
+        latencies: List[float] = []
+        failures = 0
+        window = asyncio.Semaphore(concurrency)
+
+        async def writer():
+            for i in range(num_requests):
+                await window.acquire()
+                request_id = str(i)
+                sent_at[request_id] = time.perf_counter()
+                await call.write(nlu_pb2.ClassifyRequest(
+                    request_id=request_id, text=SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]
+                ))
+            await call.done_writing()
+
+        start = time.perf_counter()
+        writer_task = asyncio.create_task(writer())
+        async for response in call:
+            latency = (time.perf_counter() - sent_at.pop(response.request_id)) * 1000
+            if response.error:
+                failures += 1
+            else:
+                latencies.append(latency)
+            window.release()
+        await writer_task
+        elapsed = time.perf_counter() - start
+
+    return summarize("grpc Classify stream", latencies, elapsed, failures)
+
+
+async def run(rest_url: str, grpc_target: str, num_requests: int, concurrency: int) -> List[Dict]:
+    # Warm up the model so the first transport measured is not penalized
+    await load_test_grpc_unary(grpc_target, concurrency, concurrency)
+    return [
+        await load_test_rest(rest_url, num_requests, concurrency),
+        await load_test_grpc_unary(grpc_target, num_requests, concurrency),
+        await load_test_grpc_stream(grpc_target, num_requests, concurrency),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare REST and gRPC transports")
+    parser.add_argument("--rest-url", default="http://localhost:8000")
+    parser.add_argument("--grpc-target", default="localhost:50051")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.rest_url, args.grpc_target, args.requests, args.concurrency))
+
+    print("\nNLU Transport Comparison")
+    print("------------------------")
+    print(f"{'transport':<22} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'fail':>5}")
+    for row in results:
+        print(
+            f"{row['transport']:<22} {row['throughput_rps']:>8.1f} {row['p50_ms']:>8.2f} "
+            f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['failures']:>5}"
+        )
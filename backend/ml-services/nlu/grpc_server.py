@@ -0,0 +1,195 @@
+"""
+NLU gRPC Service
+HTTP/2 interface (Predict, BatchPredict, streaming Classify) sharing the
+REST service's NLUModel and InferenceScheduler
+
+Usage:
+    python grpc_server.py               # standalone gRPC server
+    NLU_GRPC_ENABLED=true python app.py # gRPC alongside the FastAPI app
+"""
+
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import grpc
+
+import nlu_pb2
+import nlu_pb2_grpc
+from config import GRPC_CONFIG, LOGGING_CONFIG
+from scheduler import DeadlineExceeded, InferenceScheduler
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_TEXTS = 100
+
+
+def context_deadline(context) -> Optional[float]:
+    """Monotonic deadline from the client's gRPC deadline, if one was set"""
+    remaining = context.time_remaining()
+    return time.monotonic() + remaining if remaining is not None else None
+
+
+def to_prediction(result: Dict) -> nlu_pb2.Prediction:
+    """Convert a NLUModel prediction dict into a Prediction message"""
+    prediction = nlu_pb2.Prediction(
+        intent=result["intent"],
+        confidence=result["confidence"],
+        label_id=result["label_id"],
+        probabilities=result.get("probabilities") or [],
+        latency_ms=result.get("latency_ms", 0.0),
+        model_version=result.get("model_version", "unknown"),
+        source=result.get("source", "classifier"),
+    )
+    if result.get("subcategory") is not None:
+        prediction.subcategory = result["subcategory"]
+    return prediction
+
+
+class IntentClassifierServicer(nlu_pb2_grpc.IntentClassifierServicer):
+    """gRPC servicer; every RPC goes through the shared batching scheduler"""
+
+    def __init__(self, scheduler: InferenceScheduler):
+        self.scheduler = scheduler
+
+    async def Predict(self, request, context):
+        if not request.text:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "text must not be empty")
+        try:
+            result = await self.scheduler.submit(request.text, deadline=context_deadline(context))
+        except DeadlineExceeded as e:
+            await context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, str(e))
+        except Exception as e:
+            logger.error(f"gRPC prediction failed: {str(e)}")
+            await context.abort(grpc.StatusCode.INTERNAL, f"Prediction failed: {str(e)}")
+        return to_prediction(result)
+
+    async def BatchPredict(self, request, context):
+        if not 1 <= len(request.texts) <= MAX_BATCH_TEXTS:
+            await context.abort(
+                grpc.StatusCode.INVALID_ARGUMENT,
+                f"texts must contain 1-{MAX_BATCH_TEXTS} items",
+            )
+        start_time = time.time()
+        try:
+            results = await self.scheduler.submit_many(
+                list(request.texts), deadline=context_deadline(context)
+            )
+        except DeadlineExceeded as e:
+            await context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, str(e))
+        except Exception as e:
+            logger.error(f"gRPC batch prediction failed: {str(e)}")
+            await context.abort(grpc.StatusCode.INTERNAL, f"Batch prediction failed: {str(e)}")
+        elapsed = (time.time() - start_time) * 1000
+        return nlu_pb2.BatchPredictResponse(
+            results=[to_prediction(result) for result in results],
+            processing_time_ms=round(elapsed, 2),
+            batch_size=len(results),
+        )
+
+    async def Classify(
+        self, request_iterator, context
+    ) -> AsyncIterator[nlu_pb2.ClassifyResponse]:
+        """
+        Multiplex many classifications over one stream
+
+        Each incoming message is submitted to the scheduler immediately, so
+        requests on the same connection share batches with each other and
+        with REST traffic; responses are yielded as soon as they complete.
+        A stream lives longer than any one request, so each message carries
+        its own optional timeout_ms budget. If reading the request stream
+        fails, the stream ends with that error instead of waiting forever.
+        """
+        responses: asyncio.Queue = asyncio.Queue()
+        in_flight = set()
+
+        async def classify(message) -> None:
+            try:
+                deadline = (
+                    time.monotonic() + message.timeout_ms / 1000.0
+                    if message.timeout_ms else None
+                )
+                result = await self.scheduler.submit(message.text, deadline=deadline)
+                response = nlu_pb2.ClassifyResponse(
+                    request_id=message.request_id, prediction=to_prediction(result)
+                )
+            except Exception as e:
+                response = nlu_pb2.ClassifyResponse(request_id=message.request_id, error=str(e))
+            await responses.put(response)
+
+        async def read_requests() -> None:
+            # Always ends the response loop: None when the client finished,
+            # the exception when reading failed (cancel, malformed message)
+            outcome: Optional[Exception] = None
+            try:
+                async for message in request_iterator:
+                    task = asyncio.create_task(classify(message))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                await asyncio.gather(*list(in_flight))
+            except Exception as e:
+                outcome = e
+            finally:
+                responses.put_nowait(outcome)
+
+        reader = asyncio.create_task(read_requests())
+        try:
+            while True:
+                response = await responses.get()
+                if response is None:
+                    break
+                if isinstance(response, Exception):
+                    logger.warning(f"gRPC Classify stream ended: {response}")
+                    raise response
+                yield response
+        finally:
+            reader.cancel()
+            for task in list(in_flight):
+                task.cancel()
+
+
+async def start_grpc_server(
+    scheduler: InferenceScheduler, port: Optional[int] = None
+) -> Tuple[grpc.aio.Server, int]:
+    """
+    Start an asyncio gRPC server on the current event loop
+
+    Returns:
+        (server, bound_port) - port 0 binds an ephemeral port
+    """
+    port = port if port is not None else GRPC_CONFIG["port"]
+    server = grpc.aio.server(
+        options=[
+            ("grpc.max_concurrent_streams", GRPC_CONFIG["max_concurrent_streams"]),
+            ("grpc.keepalive_time_ms", GRPC_CONFIG["keepalive_time_ms"]),
+        ]
+    )
+    nlu_pb2_grpc.add_IntentClassifierServicer_to_server(
+        IntentClassifierServicer(scheduler), server
+    )
+    bound_port = server.add_insecure_port(f"{GRPC_CONFIG['host']}:{port}")
+    await server.start()
+    logger.info(f"gRPC server listening on {GRPC_CONFIG['host']}:{bound_port}")
+    return server, bound_port
+
+
+async def serve() -> None:
+    """Run a standalone gRPC server with its own model and scheduler"""
+    from model import NLUModel
+
+    model = NLUModel()
+    model.load()
+    scheduler = InferenceScheduler(model)
+    await scheduler.start()
+    server, _ = await start_grpc_server(scheduler)
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(grace=5)
+        await scheduler.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(**LOGGING_CONFIG)
+    asyncio.run(serve())
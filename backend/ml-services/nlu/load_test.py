@@ -1,62 +1,591 @@
 """
-Simple load test for NLU service
-Usage: python load_test.py --url http://localhost:8001/predict --requests 50 --concurrency 5
+Open-loop load generator for NLU service
+Sends requests on a constant or Poisson arrival schedule, independent of how
+fast responses come back, and records latency in HDR histograms
+
+Latency is measured from each request's *scheduled* send time, so a stalled
+server is charged for the requests that queued up behind the stall instead
+of silently lowering the offered rate (no coordinated omission).
+
+Usage:
+    python load_test.py --url http://localhost:8001 --rate 50 --duration 30
+    python load_test.py --url http://localhost:8001 --rate 200 --arrival constant \
+        --mix query=0.8,batch=0.15,note=0.05 --output load.json
+    python load_test.py --in-process --rate 100 --duration 10    # offline, tiny model
 """
 
 import argparse
+import asyncio
 import json
-import statistics
+import math
+import random
+import tempfile
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib import request
-
-SAMPLE_TEXTS = [
-    "Patient has severe chest pain and shortness of breath",
-    "Calculate SOFA score for this patient",
-    "Interpret potassium level of 6.1",
-    "Show sepsis protocol",
-    "What are risk factors for stroke?",
-]
-
-
-def post_json(url: str, payload: dict) -> float:
-    start = time.time()
-    data = json.dumps(payload).encode("utf-8")
-    req = request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
-    with request.urlopen(req, timeout=10) as response:
-        response.read()
-    return (time.time() - start) * 1000
-
-
-def run_load_test(url: str, num_requests: int, concurrency: int) -> None:
-    latencies = []
-    payloads = [{"text": SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]} for i in range(num_requests)]
-
-    with ThreadPoolExecutor(max_workers=concurrency) as executor:
-        futures = [executor.submit(post_json, url, payload) for payload in payloads]
-        for future in as_completed(futures):
-            latencies.append(future.result())
-
-    latencies.sort()
-    p50 = latencies[int(0.50 * len(latencies))]
-    p95 = latencies[int(0.95 * len(latencies))]
-    p99 = latencies[int(0.99 * len(latencies))]
-
-    print("\nNLU Load Test Results")
-    print("---------------------")
-    print(f"Requests: {num_requests}")
-    print(f"Concurrency: {concurrency}")
-    print(f"P50 latency: {p50:.2f} ms")
-    print(f"P95 latency: {p95:.2f} ms")
-    print(f"P99 latency: {p99:.2f} ms")
-    print(f"Mean latency: {statistics.mean(latencies):.2f} ms")
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import httpx
+import numpy as np
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--url", default="http://localhost:8001/predict")
-    parser.add_argument("--requests", type=int, default=50)
-    parser.add_argument("--concurrency", type=int, default=5)
+DATA_DIR = Path(__file__).resolve().parent / "data"
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+# Default payload mix: mostly one-line queries, some batches, a few long notes
+DEFAULT_MIX = "query=0.85,batch=0.10,note=0.05"
+BATCH_PROFILE_SIZE = 8
+NOTE_PROFILE_SENTENCES = 40
+
+
+class HdrHistogram:
+    """
+    Log-linear latency histogram with 3 significant digits
+
+    Values are stored in microseconds. The first 2048 buckets are exact;
+    above that each power of two is split into 1024 linear sub-buckets,
+    so the recorded value is within 0.1% of the true one across the whole
+    range while the histogram stays a fixed-size counts array that can be
+    merged and reset cheaply.
+    """
+
+    SUB_BUCKET_HALF = 1024
+    SUB_BUCKET_COUNT = 2048
+
+    def __init__(self, highest_ms: float = 60_000.0):
+        self.highest_us = int(highest_ms * 1000)
+        self.counts = np.zeros(self._index(self.highest_us) + 1, dtype=np.int64)
+        self.total = 0
+        self.min_us: Optional[int] = None
+        self.max_us = 0
+        self.sum_us = 0
+        self.saturated = 0
+
+    @classmethod
+    def _index(cls, value_us: int) -> int:
+        if value_us < cls.SUB_BUCKET_COUNT:
+            return value_us
+        bucket = value_us.bit_length() - cls.SUB_BUCKET_COUNT.bit_length() + 1
+        return bucket * cls.SUB_BUCKET_HALF + (value_us >> bucket)
+
+    @classmethod
+    def _value(cls, index: int) -> int:
+        """Lowest value (us) that maps to `index`"""
+        if index < cls.SUB_BUCKET_COUNT:
+            return index
+        bucket = index // cls.SUB_BUCKET_HALF - 1
+        return (index - bucket * cls.SUB_BUCKET_HALF) << bucket
+
+    def record(self, value_ms: float) -> None:
+        value_us = max(0, int(round(value_ms * 1000)))
+        if value_us > self.highest_us:
+            value_us = self.highest_us
+            self.saturated += 1
+        self.counts[self._index(value_us)] += 1
+        self.total += 1
+        self.sum_us += value_us
+        self.max_us = max(self.max_us, value_us)
+        self.min_us = value_us if self.min_us is None else min(self.min_us, value_us)
+
+    def merge(self, other: "HdrHistogram") -> None:
+        self.counts += other.counts
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.saturated += other.saturated
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+
+    def percentile(self, p: float) -> float:
+        """Value in ms at percentile `p` (0-100); 0.0 when empty"""
+        if self.total == 0:
+            return 0.0
+        rank = max(1, math.ceil(p / 100 * self.total))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self._value(index), self.max_us) / 1000
+
+    def summary(self) -> Dict:
+        summary = {f"p{p:g}": round(self.percentile(p), 3) for p in PERCENTILES}
+        summary["mean"] = round(self.sum_us / self.total / 1000, 3) if self.total else 0.0
+        summary["min"] = round((self.min_us or 0) / 1000, 3)
+        summary["max"] = round(self.max_us / 1000, 3)
+        summary["count"] = self.total
+        return summary
+
+
+@dataclass
+class LoadRequest:
+    """One HTTP call in a load schedule"""
+
+    profile: str
+    path: str
+    payload: Dict
+    headers: Optional[Dict[str, str]] = None
+
+
+# ============================================================================
+# Arrivals and payloads
+# ============================================================================
+
+def constant_arrivals(rate: float, duration_s: float) -> Iterator[float]:
+    """Send offsets (s) evenly spaced at `rate` per second"""
+    interval = 1.0 / rate
+    for i in range(int(rate * duration_s)):
+        yield i * interval
+
+
+def poisson_arrivals(rate: float, duration_s: float, rng: random.Random) -> Iterator[float]:
+    """Send offsets (s) of a Poisson process: exponential inter-arrival gaps"""
+    offset = rng.expovariate(rate)
+    while offset < duration_s:
+        yield offset
+        offset += rng.expovariate(rate)
+
+
+def load_texts(data_dir: Path = DATA_DIR) -> List[str]:
+    """All example texts from data/*.jsonl"""
+    texts = []
+    for path in sorted(data_dir.glob("*.jsonl")):
+        with open(path) as f:
+            texts.extend(json.loads(line)["text"] for line in f if line.strip())
+    return texts
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """'query=0.8,batch=0.2' -> normalized weights; raises ValueError on bad input"""
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in PROFILES:
+            raise ValueError(f"Unknown payload profile {name!r} (choose from {sorted(PROFILES)})")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Payload mix weights must sum to a positive number")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def _query(texts: List[str], rng: random.Random) -> LoadRequest:
+    return LoadRequest("query", "/predict", {"text": rng.choice(texts)})
+
+
+def _batch(texts: List[str], rng: random.Random) -> LoadRequest:
+    return LoadRequest("batch", "/batch-predict", {
+        "texts": [rng.choice(texts) for _ in range(BATCH_PROFILE_SIZE)]
+    })
+
+
+def _note(texts: List[str], rng: random.Random) -> LoadRequest:
+    # A pasted clinical note: a few hundred tokens, truncated by the model
+    return LoadRequest("note", "/predict", {
+        "text": ". ".join(rng.choice(texts) for _ in range(NOTE_PROFILE_SENTENCES))
+    })
+
+
+PROFILES: Dict[str, Callable[[List[str], random.Random], LoadRequest]] = {
+    "query": _query,
+    "batch": _batch,
+    "note": _note,
+}
+
+
+def build_schedule(
+    rate: float,
+    duration_s: float,
+    arrival: str = "poisson",
+    mix: str = DEFAULT_MIX,
+    texts: Optional[List[str]] = None,
+    seed: int = 0,
+) -> List[Tuple[float, LoadRequest]]:
+    """
+    Pre-generate (send offset, request) pairs for one run
+
+    Generating the whole schedule up front keeps the dispatch loop down to
+    a sleep and a task spawn per request.
+    """
+    rng = random.Random(seed)
+    texts = texts or load_texts()
+    weights = parse_mix(mix)
+    names, probabilities = list(weights), list(weights.values())
+    if arrival == "constant":
+        offsets = constant_arrivals(rate, duration_s)
+    elif arrival == "poisson":
+        offsets = poisson_arrivals(rate, duration_s, rng)
+    else:
+        raise ValueError(f"Unknown arrival process {arrival!r}")
+    return [
+        (offset, PROFILES[rng.choices(names, probabilities)[0]](texts, rng))
+        for offset in offsets
+    ]
+
+
+# ============================================================================
+# Trace replay
+# ============================================================================
+
+class SyntheticTexts:
+    """
+    Made-up texts with an exact token count, built from words in data/*.jsonl
+
+    Texts are memoized by key (the trace's text hash), so a text repeated
+    in the trace is repeated in the replay too.
+    """
+
+    def __init__(self, tokenizer, texts: Optional[List[str]] = None, seed: int = 0):
+        self.tokenizer = tokenizer
+        self.rng = random.Random(seed)
+        words = sorted({word for text in (texts or load_texts()) for word in text.split()})
+        counts = tokenizer(words, add_special_tokens=False)["input_ids"]
+        self.words_by_count: Dict[int, List[str]] = {}
+        for word, ids in zip(words, counts):
+            if ids:
+                self.words_by_count.setdefault(len(ids), []).append(word)
+        if 1 not in self.words_by_count:
+            raise ValueError("Tokenizer has no single-token words in the corpus")
+        self.specials = tokenizer.num_special_tokens_to_add()
+        self._cache: Dict[str, str] = {}
+
+    def text(self, num_tokens: int, key: Optional[str] = None) -> str:
+        """A text that tokenizes to `num_tokens` (special tokens included)"""
+        if key is not None and key in self._cache:
+            return self._cache[key]
+        remaining = max(1, num_tokens - self.specials)
+        words = []
+        while remaining > 0:
+            sizes = [size for size in self.words_by_count if size <= remaining]
+            size = self.rng.choice(sizes)
+            words.append(self.rng.choice(self.words_by_count[size]))
+            remaining -= size
+        text = " ".join(words)
+        if key is not None:
+            self._cache[key] = text
+        return text
+
+
+def replay_schedule(
+    records: Iterable[Dict],
+    synthetic: SyntheticTexts,
+    speed: float = 1.0,
+    max_duration_s: Optional[float] = None,
+) -> List[Tuple[float, LoadRequest]]:
+    """
+    Turn trace records (see trace_recorder.py) into a load schedule
+
+    Arrival gaps are divided by `speed`; every text is replaced by a
+    synthetic one of the recorded token length (estimated from its
+    character count when the trace has none), and recorded request
+    budgets are sent again as X-Request-Timeout-Ms.
+
+    Args:
+        records: Trace records without the header
+        synthetic: Text generator for the target tokenizer
+        speed: Replay speed multiplier (2.0 = twice the recorded rate)
+        max_duration_s: Stop after this much recorded (not replayed) time
+    """
+    from trace_recorder import ENDPOINT_NAMES
+
+    schedule = []
+    for record in records:
+        if max_duration_s is not None and record["t"] > max_duration_s * 1000:
+            break
+        texts = [
+            synthetic.text(n if n > 0 else max(3, c // 4), key)
+            for n, c, key in zip(record["n"], record["c"], record["h"])
+        ]
+        endpoint = ENDPOINT_NAMES.get(record["e"], record["e"])
+        if endpoint == "batch-predict":
+            request = LoadRequest(endpoint, "/batch-predict", {"texts": texts})
+        else:
+            request = LoadRequest(endpoint, "/predict", {"text": texts[0]})
+        if "d" in record:
+            request.headers = {"X-Request-Timeout-Ms": str(int(record["d"]))}
+        schedule.append((record["t"] / 1000 / speed, request))
+    return schedule
+
+
+# ============================================================================
+# Open-loop runner
+# ============================================================================
+
+class _Interval:
+    """Counters for one reporting interval"""
+
+    def __init__(self):
+        self.histogram = HdrHistogram()
+        self.sent = 0
+        self.ok = 0
+        self.errors = 0
+
+
+async def run_open_loop(
+    client: httpx.AsyncClient,
+    schedule: Iterable[Tuple[float, LoadRequest]],
+    max_in_flight: int = 10_000,
+    timeout_s: float = 10.0,
+    report_interval_s: float = 1.0,
+    on_interval: Optional[Callable[[Dict], None]] = None,
+) -> Dict:
+    """
+    Replay a schedule against a client without waiting for responses
+
+    Args:
+        client: httpx client (network or in-process ASGI transport)
+        schedule: (send offset in seconds, request) pairs, offsets ascending
+        max_in_flight: Requests beyond this many outstanding are counted as
+            dropped instead of sent (protects the generator, not the server)
+        timeout_s: Per-request timeout; timeouts count as errors
+        report_interval_s: Timeline granularity
+        on_interval: Called with each timeline row as it completes
+
+    Returns:
+        Summary with overall and per-profile latency (from scheduled send
+        time), status counts, achieved rates and the per-interval timeline
+    """
+    overall = HdrHistogram()
+    service = HdrHistogram()  # from actual send time, for comparison
+    per_profile: Dict[str, HdrHistogram] = {}
+    statuses: Dict[str, int] = {}
+    interval = _Interval()
+    timeline: List[Dict] = []
+    in_flight = 0
+    dropped = 0
+    max_lag_ms = 0.0
+    tasks = set()
+
+    start = time.perf_counter()
+
+    def flush(now: float) -> None:
+        nonlocal interval
+        row = {
+            "t": round(now - start, 3),
+            "sent": interval.sent,
+            "ok": interval.ok,
+            "errors": interval.errors,
+            "in_flight": in_flight,
+            "latency_ms": interval.histogram.summary(),
+        }
+        timeline.append(row)
+        if on_interval:
+            on_interval(row)
+        interval = _Interval()
+
+    async def reporter():
+        next_tick = start + report_interval_s
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - time.perf_counter()))
+            flush(time.perf_counter())
+            next_tick += report_interval_s
+
+    async def send(intended: float, request: LoadRequest):
+        nonlocal in_flight
+        sent_at = time.perf_counter()
+        try:
+            response = await client.post(
+                request.path, json=request.payload, headers=request.headers, timeout=timeout_s
+            )
+            key = str(response.status_code)
+            success = response.is_success
+        except httpx.TimeoutException:
+            key, success = "timeout", False
+        except httpx.HTTPError as e:
+            key, success = type(e).__name__, False
+        done = time.perf_counter()
+        in_flight -= 1
+        statuses[key] = statuses.get(key, 0) + 1
+        if success:
+            latency_ms = (done - intended) * 1000
+            overall.record(latency_ms)
+            service.record((done - sent_at) * 1000)
+            per_profile.setdefault(request.profile, HdrHistogram()).record(latency_ms)
+            interval.histogram.record(latency_ms)
+            interval.ok += 1
+        else:
+            interval.errors += 1
+
+    reporter_task = asyncio.create_task(reporter())
+    scheduled = 0
+    for offset, request in schedule:
+        scheduled += 1
+        intended = start + offset
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            max_lag_ms = max(max_lag_ms, -delay * 1000)
+        if in_flight >= max_in_flight:
+            dropped += 1
+            continue
+        in_flight += 1
+        interval.sent += 1
+        task = asyncio.create_task(send(intended, request))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    send_window_s = time.perf_counter() - start
+    if tasks:
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    reporter_task.cancel()
+    try:
+        await reporter_task
+    except asyncio.CancelledError:
+        pass
+    if interval.sent or interval.ok or interval.errors:
+        flush(time.perf_counter())
+
+    ok = overall.total
+    return {
+        "scheduled": scheduled,
+        "sent": scheduled - dropped,
+        "dropped": dropped,
+        "ok": ok,
+        "errors": scheduled - dropped - ok,
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+        "offered_rps": round(scheduled / send_window_s, 2) if send_window_s > 0 else 0.0,
+        "throughput_rps": round(ok / elapsed, 2) if elapsed > 0 else 0.0,
+        # How late the generator itself dispatched; large values mean the
+        # client, not the server, limited the offered rate
+        "max_dispatch_lag_ms": round(max_lag_ms, 3),
+        "latency_ms": overall.summary(),
+        "service_time_ms": service.summary(),
+        "profiles": {name: hist.summary() for name, hist in sorted(per_profile.items())},
+        "timeline": timeline,
+    }
+
+
+# ============================================================================
+# Targets
+# ============================================================================
+
+@asynccontextmanager
+async def http_client(url: str, max_connections: int = 1000):
+    """Client for a running service"""
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    async with httpx.AsyncClient(base_url=url, limits=limits) as client:
+        yield client
+
+
+@asynccontextmanager
+async def in_process_client(
+    model_path: Optional[str] = None,
+    use_scheduler: Optional[bool] = None,
+    max_wait_ms: Optional[float] = None,
+    quantization: Optional[str] = None,
+):
+    """
+    Client wired straight to `app.app` over ASGI (no sockets, no server)
+
+    Loads the model from `model_path`, or builds the tiny random model used
+    by tests when none is given, and starts the micro-batching scheduler the
+    way the app's lifespan would.
+
+    Args:
+        model_path: Model directory (default: tiny random model)
+        use_scheduler: Micro-batch requests (default SCHEDULER_CONFIG['enabled'])
+        max_wait_ms: Routine-lane batch window (default from SCHEDULER_CONFIG)
+        quantization: "none" or "dynamic" (default from INFERENCE_CONFIG)
+    """
+    import app as app_module
+    from config import SCHEDULER_CONFIG
+    from model import NLUModel
+    from scheduler import InferenceScheduler
+
+    with tempfile.TemporaryDirectory(prefix="nlu-load-") as tmp:
+        if model_path is None:
+            from benchmarks.tiny_model import build_tiny_model
+
+            model_path = str(build_tiny_model(Path(tmp) / "tiny_model"))
+        model = NLUModel(model_path=model_path, quantization=quantization)
+        model.load()
+
+        scheduler = None
+        if SCHEDULER_CONFIG["enabled"] if use_scheduler is None else use_scheduler:
+            scheduler = InferenceScheduler(model, max_wait_ms=max_wait_ms)
+            await scheduler.start()
+        previous = app_module.nlu_model, app_module.scheduler
+        app_module.nlu_model, app_module.scheduler = model, scheduler
+        try:
+            transport = httpx.ASGITransport(app=app_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://nlu") as client:
+                yield client
+        finally:
+            app_module.nlu_model, app_module.scheduler = previous
+            if scheduler is not None:
+                await scheduler.stop()
+
+
+def client_from_args(args):
+    if args.in_process:
+        return in_process_client(args.model_path)
+    return http_client(args.url)
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def add_load_args(parser: argparse.ArgumentParser) -> None:
+    """Target, arrival and payload options shared by the load-test CLIs"""
+    parser.add_argument("--url", default="http://localhost:8001", help="Service base URL")
+    parser.add_argument("--in-process", action="store_true", help="Drive app.app over ASGI (offline)")
+    parser.add_argument("--model-path", default=None, help="Model for --in-process (default: tiny random model)")
+    parser.add_argument("--arrival", choices=["poisson", "constant"], default="poisson")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Payload profile weights (profiles: {', '.join(PROFILES)})")
+    parser.add_argument("--max-in-flight", type=int, default=10_000)
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quiet", action="store_true", help="No per-second output")
+
+
+def print_interval(row: Dict) -> None:
+    latency = row["latency_ms"]
+    print(
+        f"t={row['t']:7.1f}s sent={row['sent']:5d} ok={row['ok']:5d} err={row['errors']:4d} "
+        f"in_flight={row['in_flight']:5d} p50={latency['p50']:8.2f} p99={latency['p99']:8.2f} "
+        f"max={latency['max']:8.2f} ms"
+    )
+
+
+def print_summary(result: Dict) -> None:
+    latency = result["latency_ms"]
+    print("\nNLU Open-Loop Load Test")
+    print("-----------------------")
+    print(f"Scheduled: {result['scheduled']}  sent: {result['sent']}  dropped: {result['dropped']}")
+    print(f"OK: {result['ok']}  errors: {result['errors']}  statuses: {result['statuses']}")
+    print(f"Offered: {result['offered_rps']:.1f} req/s  throughput: {result['throughput_rps']:.1f} req/s")
+    print(f"Max dispatch lag: {result['max_dispatch_lag_ms']:.2f} ms")
+    for p in PERCENTILES:
+        print(f"P{p:g} latency: {latency[f'p{p:g}']:.2f} ms")
+    print(f"Mean latency: {latency['mean']:.2f} ms  max: {latency['max']:.2f} ms")
+    for name, summary in result["profiles"].items():
+        print(f"  {name:<6} n={summary['count']:<6} p50={summary['p50']:.2f} p99={summary['p99']:.2f} ms")
+
+
+async def run_load_test(args) -> Dict:
+    schedule = build_schedule(args.rate, args.duration, args.arrival, args.mix, seed=args.seed)
+    async with client_from_args(args) as client:
+        return await run_open_loop(
+            client, schedule, args.max_in_flight, args.timeout,
+            on_interval=None if args.quiet else print_interval,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop NLU load test")
+    add_load_args(parser)
+    parser.add_argument("--rate", type=float, default=50.0, help="Arrivals per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals")
+    parser.add_argument("--output", default=None, help="Write the full result JSON here")
     args = parser.parse_args()
 
-    run_load_test(args.url, args.requests, args.concurrency)
+    result = asyncio.run(run_load_test(args))
+    print_summary(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,214 +1,510 @@
 """
-Load Test Runner for NLU - Demonstration Mode
-Shows load testing framework without requiring a live NLU service
+Load Test Runner for NLU
+Runs an open-loop load test (see load_test.py) and checks the result against
+a latency SLO; exits non-zero when the SLO is missed. Sweep mode ramps the
+arrival rate to find the capacity knee of each service configuration.
+
+Usage:
+    python load_test_runner.py run --url http://localhost:8001 --rate 100 --duration 60
+    python load_test_runner.py run --in-process --rate 50 --duration 10 --slo-p95-ms 50
+    python load_test_runner.py sweep --in-process --threads 1 2 4 --batch-window-ms 2 10 \
+        --quantization none dynamic --output capacity.json
+    python load_test_runner.py sweep --launch --workers 1 2 4 --model-path ./models/best_model
+    python load_test_runner.py replay --trace traces/requests.trace.*.jsonl --speed 1 2 10 --in-process
 """
 
 import argparse
-import concurrent.futures
+import asyncio
+import itertools
 import json
 import logging
-import random
-import statistics
+import os
+import socket
+import subprocess
+import sys
+import tempfile
 import time
-from typing import Dict, List
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import torch
+
+from load_test import (
+    SyntheticTexts,
+    add_load_args,
+    build_schedule,
+    client_from_args,
+    http_client,
+    in_process_client,
+    print_interval,
+    print_summary,
+    replay_schedule,
+    run_load_test,
+    run_open_loop,
+)
+from trace_recorder import read_traces
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
+# One INFO line per request would drown the per-second output
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
-# Sample clinical queries for testing
-SAMPLE_QUERIES = [
-    "Patient showing signs of cardiac arrest",
-    "What's the SOFA score for this patient?",
-    "Interpret these lab values: WBC 15, Hgb 10",
-    "Search sepsis protocol",
-    "What are the contraindications for aspirin?",
-]
 
-
-def simulate_nlu_prediction(text: str) -> Dict:
+def check_slo(
+    result: Dict,
+    slo_p95_ms: float,
+    slo_p99_ms: Optional[float] = None,
+    max_error_rate: float = 0.01,
+) -> Dict:
     """
-    Simulates NLU service /predict endpoint
-    Real implementation would use requests.post(url, json={"text": text})
+    Compare one load-test result with the latency SLO
+
+    Dropped requests (generator backlog) count as errors: a run that could
+    not offer its rate did not demonstrate it.
+
+    Returns:
+        {"passed", "p95_ms", "p99_ms", "error_rate", "violations": [...]}
     """
-    # Simulate network + processing latency (20-60ms)
-    latency_ms = random.uniform(20, 60)
-    time.sleep(latency_ms / 1000.0)
-    
-    # Simulated response
+    latency = result["latency_ms"]
+    scheduled = result["scheduled"] or 1
+    error_rate = (result["errors"] + result["dropped"]) / scheduled
+    violations = []
+    if latency["p95"] > slo_p95_ms:
+        violations.append(f"p95 {latency['p95']:.2f}ms > {slo_p95_ms}ms")
+    if slo_p99_ms is not None and latency["p99"] > slo_p99_ms:
+        violations.append(f"p99 {latency['p99']:.2f}ms > {slo_p99_ms}ms")
+    if error_rate > max_error_rate:
+        violations.append(f"error rate {error_rate:.2%} > {max_error_rate:.2%}")
+    if result["ok"] == 0:
+        violations.append("no successful requests")
     return {
-        "intent": "clinical_tool",
-        "confidence": random.uniform(0.7, 0.99),
-        "latency_ms": latency_ms,
+        "passed": not violations,
+        "p95_ms": latency["p95"],
+        "p99_ms": latency["p99"],
+        "error_rate": round(error_rate, 4),
+        "violations": violations,
     }
 
 
-def run_single_request(task_id: int, query: str, use_live_service: bool, url: str) -> float:
+def add_slo_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--slo-p95-ms", type=float, default=50.0)
+    parser.add_argument("--slo-p99-ms", type=float, default=None)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+
+
+# ============================================================================
+# Capacity sweep
+# ============================================================================
+
+@dataclass(frozen=True)
+class ServiceConfig:
+    """One service configuration under test"""
+
+    workers: int = 1
+    threads: int = 0  # torch intra-op threads; 0 = library default
+    quantization: str = "none"
+    batch_window_ms: Optional[float] = None  # routine-lane scheduler window; None = config default
+
+    def label(self) -> str:
+        window = "default" if self.batch_window_ms is None else f"{self.batch_window_ms:g}ms"
+        threads = self.threads or "default"
+        return f"workers={self.workers} threads={threads} quant={self.quantization} window={window}"
+
+
+def config_grid(
+    workers: List[int],
+    threads: List[int],
+    quantization: List[str],
+    batch_windows: List[Optional[float]],
+) -> List[ServiceConfig]:
+    """Cartesian product of the swept settings"""
+    return [
+        ServiceConfig(w, t, q, b)
+        for w, t, q, b in itertools.product(workers, threads, quantization, batch_windows)
+    ]
+
+
+async def sweep_rates(
+    run_step: Callable[[float, int], Awaitable[Dict]],
+    slo: Callable[[Dict], Dict],
+    start_rate: float,
+    max_rate: float,
+    growth: float = 1.5,
+    refine_steps: int = 3,
+    on_step: Optional[Callable[[Dict], None]] = None,
+) -> Dict:
     """
-    Execute a single prediction request
-    
+    Ramp the arrival rate until the SLO breaks, then bisect toward the knee
+
+    The rate grows geometrically by `growth` from `start_rate` until a step
+    misses the SLO (or `max_rate` is reached), then `refine_steps`
+    bisections between the last passing and first failing rate narrow
+    down the knee.
+
     Args:
-        task_id: Task identifier
-        query: Clinical query text
-        use_live_service: If True, use real HTTP requests; if False, simulate
-        url: NLU service URL
-    
+        run_step: (rate, step number) -> load-test result
+        slo: load-test result -> check_slo verdict
+        start_rate: First arrival rate (req/s)
+        max_rate: Highest rate to try
+        growth: Multiplier between ramp steps (> 1)
+        refine_steps: Bisection steps after the first failure
+        on_step: Called with each step record
+
     Returns:
-        Latency in milliseconds
+        {"knee": best passing step or None, "steps": [...]} where each step
+        holds rate, throughput, latency percentiles, errors and the verdict
     """
-    start_time = time.time()
-    
-    if use_live_service:
-        try:
-            import requests
-            response = requests.post(url, json={"text": query}, timeout=5)
-            response.raise_for_status()
-            result = response.json()
-        except Exception as e:
-            logger.warning(f"Request {task_id} failed: {e}")
-            return -1  # Indicate failure
-    else:
-        # Simulation mode
-        result = simulate_nlu_prediction(query)
-    
-    latency_ms = (time.time() - start_time) * 1000
-    return latency_ms
-
-
-def run_load_test(
-    url: str,
-    num_requests: int,
-    concurrency: int,
-    use_live_service: bool,
-) -> Dict:
+    if growth <= 1:
+        raise ValueError("growth must be > 1")
+    steps: List[Dict] = []
+
+    async def measure(rate: float) -> bool:
+        result = await run_step(rate, len(steps))
+        verdict = slo(result)
+        step = {
+            "rate": round(rate, 2),
+            "offered_rps": result["offered_rps"],
+            "throughput_rps": result["throughput_rps"],
+            "latency_ms": {k: result["latency_ms"][k] for k in ("p50", "p95", "p99", "max")},
+            "errors": result["errors"],
+            "dropped": result["dropped"],
+            "max_dispatch_lag_ms": result["max_dispatch_lag_ms"],
+            "passed": verdict["passed"],
+            "violations": verdict["violations"],
+        }
+        steps.append(step)
+        if on_step:
+            on_step(step)
+        return verdict["passed"]
+
+    passing, failing = None, None
+    rate = start_rate
+    while rate <= max_rate:
+        if await measure(rate):
+            passing = rate
+            rate *= growth
+        else:
+            failing = rate
+            break
+
+    if failing is not None and passing is not None:
+        for _ in range(refine_steps):
+            middle = (passing + failing) / 2
+            if await measure(middle):
+                passing = middle
+            else:
+                failing = middle
+
+    passed = [step for step in steps if step["passed"]]
+    knee = max(passed, key=lambda step: step["throughput_rps"]) if passed else None
+    return {
+        "knee": knee,
+        "saturated": failing is not None,
+        "steps": steps,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def launched_service(config: ServiceConfig, model_path: str, startup_timeout_s: float = 120.0):
     """
-    Execute load testing with concurrent requests
-    
-    Args:
-        url: NLU service URL
-        num_requests: Total number of requests
-        concurrency: Number of concurrent workers
-        use_live_service: Whether to use real HTTP or simulation
-    
-    Returns:
-        Dictionary with latency statistics
+    Start `uvicorn app:app` with the configuration's settings and yield its URL
+
+    Worker count, torch threads (OMP/MKL), quantization and the scheduler
+    window are all passed through the environment, so each configuration
+    gets a fresh server process tree.
     """
-    logger.info(f"Starting load test:")
-    logger.info(f"  URL: {url}")
-    logger.info(f"  Total Requests: {num_requests}")
-    logger.info(f"  Concurrency: {concurrency}")
-    logger.info(f"  Mode: {'Live Service' if use_live_service else 'Simulation'}")
-    
-    latencies = []
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
-        # Submit all tasks
-        futures = []
-        for i in range(num_requests):
-            query = SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]
-            future = executor.submit(
-                run_single_request, i, query, use_live_service, url
-            )
-            futures.append(future)
-        
-        # Collect results
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                latency = future.result()
-                if latency > 0:  # Filter out failed requests
-                    latencies.append(latency)
-            except Exception as e:
-                logger.error(f"Task failed: {e}")
-    
-    if not latencies:
-        logger.error("No successful requests!")
-        return {}
-    
-    # Compute statistics
-    latencies.sort()
-    num_successful = len(latencies)
-    
-    p50_index = int(num_successful * 0.50)
-    p95_index = int(num_successful * 0.95)
-    p99_index = int(num_successful * 0.99)
-    
-    stats = {
-        "total_requests": num_requests,
-        "successful_requests": num_successful,
-        "failed_requests": num_requests - num_successful,
-        "p50_ms": latencies[p50_index],
-        "p95_ms": latencies[p95_index],
-        "p99_ms": latencies[p99_index],
-        "mean_ms": statistics.mean(latencies),
-        "min_ms": min(latencies),
-        "max_ms": max(latencies),
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        "NLU_MODEL_CACHE_DIR": model_path,
+        "NLU_QUANTIZATION": config.quantization,
+        "NLU_GRPC_ENABLED": "false",
+        "NLU_LOG_LEVEL": "WARNING",
+    })
+    if config.threads:
+        env["OMP_NUM_THREADS"] = env["MKL_NUM_THREADS"] = str(config.threads)
+    if config.batch_window_ms is not None:
+        env["NLU_SCHEDULER_MAX_WAIT_MS"] = str(config.batch_window_ms)
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(config.workers), "--log-level", "warning",
+        ],
+        cwd=str(Path(__file__).resolve().parent),
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + startup_timeout_s
+        async with httpx.AsyncClient(base_url=url) as probe:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Service exited with code {process.returncode} ({config.label()})")
+                try:
+                    if (await probe.get("/health", timeout=2.0)).is_success:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Service did not become healthy ({config.label()})")
+                await asyncio.sleep(0.5)
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+@asynccontextmanager
+async def config_client(config: ServiceConfig, args):
+    """httpx client for one configuration: launched, in-process or the fixed --url"""
+    if args.launch:
+        with tempfile.TemporaryDirectory(prefix="nlu-sweep-") as tmp:
+            model_path = args.model_path
+            if model_path is None:
+                from benchmarks.tiny_model import build_tiny_model
+
+                model_path = str(build_tiny_model(Path(tmp) / "tiny_model"))
+            async with launched_service(config, model_path) as url:
+                async with http_client(url) as client:
+                    yield client
+        return
+
+    if args.in_process:
+        if config.workers != 1:
+            raise ValueError("--in-process runs a single worker; use --launch to sweep workers")
+        previous_threads = torch.get_num_threads()
+        if config.threads:
+            torch.set_num_threads(config.threads)
+        try:
+            async with in_process_client(
+                args.model_path,
+                max_wait_ms=config.batch_window_ms,
+                quantization=config.quantization,
+            ) as client:
+                yield client
+        finally:
+            torch.set_num_threads(previous_threads)
+        return
+
+    # A running service: the configuration is whatever it was started with
+    async with http_client(args.url) as client:
+        yield client
+
+
+async def run_sweep(args) -> Dict:
+    """Find the capacity knee of every configuration in the grid"""
+    if not (args.launch or args.in_process) and (
+        len(args.workers) * len(args.threads) * len(args.quantization) * len(args.batch_window_ms) > 1
+    ):
+        raise ValueError("Sweeping several configurations needs --launch or --in-process")
+
+    def slo(result: Dict) -> Dict:
+        return check_slo(result, args.slo_p95_ms, args.slo_p99_ms, args.max_error_rate)
+
+    report = {
+        "slo": {
+            "p95_ms": args.slo_p95_ms,
+            "p99_ms": args.slo_p99_ms,
+            "max_error_rate": args.max_error_rate,
+        },
+        "arrival": args.arrival,
+        "mix": args.mix,
+        "step_duration_s": args.step_duration,
+        "configurations": [],
     }
-    
-    return stats
+    for config in config_grid(args.workers, args.threads, args.quantization, args.batch_window_ms):
+        logger.info(f"Sweeping {config.label()}")
+        async with config_client(config, args) as client:
+            # Warm-up: model load, lazy init and first batches are not measured
+            await run_open_loop(
+                client, build_schedule(args.start_rate, args.warmup, args.arrival, args.mix, seed=-1),
+                args.max_in_flight, args.timeout,
+            )
+
+            async def run_step(rate: float, step: int) -> Dict:
+                schedule = build_schedule(rate, args.step_duration, args.arrival, args.mix, seed=args.seed + step)
+                return await run_open_loop(client, schedule, args.max_in_flight, args.timeout)
+
+            def on_step(step: Dict) -> None:
+                latency = step["latency_ms"]
+                logger.info(
+                    f"  rate {step['rate']:8.1f}/s -> {step['throughput_rps']:8.1f}/s "
+                    f"p95 {latency['p95']:8.2f} p99 {latency['p99']:8.2f} ms "
+                    f"{'ok' if step['passed'] else 'SLO miss: ' + '; '.join(step['violations'])}"
+                )
+
+            sweep = await sweep_rates(
+                run_step, slo, args.start_rate, args.max_rate, args.growth, args.refine,
+                on_step=None if args.quiet else on_step,
+            )
+        report["configurations"].append({"config": asdict(config), "label": config.label(), **sweep})
+    return report
+
+
+def print_capacity_report(report: Dict) -> None:
+    slo = report["slo"]
+    target = f"p95 <= {slo['p95_ms']}ms" + (f", p99 <= {slo['p99_ms']}ms" if slo["p99_ms"] else "")
+    print(f"\nNLU Capacity Report ({target}, {report['arrival']} arrivals, mix {report['mix']})")
+    print(f"{'configuration':<58} {'knee rps':>9} {'p95 ms':>8} {'p99 ms':>8}  note")
+    for entry in sorted(
+        report["configurations"],
+        key=lambda e: e["knee"]["throughput_rps"] if e["knee"] else 0.0,
+        reverse=True,
+    ):
+        knee = entry["knee"]
+        if knee is None:
+            print(f"{entry['label']:<58} {'-':>9} {'-':>8} {'-':>8}  SLO missed at the start rate")
+            continue
+        note = "" if entry["saturated"] else "SLO held up to --max-rate"
+        print(
+            f"{entry['label']:<58} {knee['throughput_rps']:>9.1f} "
+            f"{knee['latency_ms']['p95']:>8.2f} {knee['latency_ms']['p99']:>8.2f}  {note}"
+        )
+
+
+# ============================================================================
+# Trace replay
+# ============================================================================
+
+async def run_replay(args) -> Dict:
+    """Replay a recorded trace at each requested speed"""
+    from transformers import AutoTokenizer
+
+    from config import MODEL_CONFIG
+
+    trace = read_traces(args.trace)
+    header = next(trace)
+    records = list(trace)
+    if not records:
+        raise ValueError(f"{' '.join(args.trace)} has no records")
+
+    with tempfile.TemporaryDirectory(prefix="nlu-replay-") as tmp:
+        if args.in_process and args.model_path is None:
+            from benchmarks.tiny_model import build_tiny_model
+
+            args.model_path = str(build_tiny_model(Path(tmp) / "tiny_model"))
+        tokenizer = AutoTokenizer.from_pretrained(
+            args.tokenizer or args.model_path or MODEL_CONFIG["model_name"]
+        )
+        synthetic = SyntheticTexts(tokenizer, seed=args.seed)
+
+        report = {
+            "trace": {
+                "path": args.trace,
+                "records": len(records),
+                "duration_s": round(records[-1]["t"] / 1000, 3),
+                "start_epoch_ms": header.get("start_epoch_ms"),
+            },
+            "runs": [],
+        }
+        async with client_from_args(args) as client:
+            for speed in args.speed:
+                schedule = replay_schedule(records, synthetic, speed, args.max_duration)
+                logger.info(f"Replaying {len(schedule)} requests at {speed:g}x")
+                result = await run_open_loop(
+                    client, schedule, args.max_in_flight, args.timeout,
+                    on_interval=None if args.quiet else print_interval,
+                )
+                result["speed"] = speed
+                result["slo"] = check_slo(result, args.slo_p95_ms, args.slo_p99_ms, args.max_error_rate)
+                report["runs"].append(result)
+    return report
 
 
 def main():
     """Main entry point for load testing"""
     parser = argparse.ArgumentParser(description="NLU Load Testing")
-    parser.add_argument(
-        "--url",
-        default="http://localhost:8001/predict",
-        help="NLU service URL"
-    )
-    parser.add_argument(
-        "--requests",
-        type=int,
-        default=50,
-        help="Total number of requests"
-    )
-    parser.add_argument(
-        "--concurrency",
-        type=int,
-        default=5,
-        help="Number of concurrent workers"
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="One open-loop run at a fixed arrival rate")
+    add_load_args(run)
+    add_slo_args(run)
+    run.add_argument("--rate", type=float, default=50.0, help="Arrivals per second")
+    run.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals")
+    run.add_argument("--output", default=None, help="Write the result JSON here")
+    sweep = subparsers.add_parser("sweep", help="Ramp the arrival rate to find the capacity knee")
+    add_load_args(sweep)
+    add_slo_args(sweep)
+    sweep.add_argument("--launch", action="store_true", help="Start a uvicorn service per configuration")
+    sweep.add_argument("--start-rate", type=float, default=10.0)
+    sweep.add_argument("--max-rate", type=float, default=5000.0)
+    sweep.add_argument("--growth", type=float, default=1.5, help="Rate multiplier between ramp steps")
+    sweep.add_argument("--refine", type=int, default=3, help="Bisection steps after the first SLO miss")
+    sweep.add_argument("--step-duration", type=float, default=10.0, help="Seconds of arrivals per step")
+    sweep.add_argument("--warmup", type=float, default=2.0, help="Seconds of unmeasured load per configuration")
+    sweep.add_argument("--workers", type=int, nargs="+", default=[1], help="uvicorn workers (--launch only)")
+    sweep.add_argument("--threads", type=int, nargs="+", default=[0], help="torch threads (0 = default)")
+    sweep.add_argument("--quantization", nargs="+", default=["none"], choices=["none", "dynamic"])
+    sweep.add_argument(
+        "--batch-window-ms", type=float, nargs="+", default=[None],
+        help="Routine-lane scheduler window(s) (default: NLU_SCHEDULER_MAX_WAIT_MS)",
     )
-    parser.add_argument(
-        "--live",
-        action="store_true",
-        help="Use live NLU service (requires running service)"
+    sweep.add_argument("--output", default=None, help="Write the capacity report JSON here")
+
+    replay = subparsers.add_parser("replay", help="Replay a recorded request trace (see trace_recorder.py)")
+    add_load_args(replay)
+    add_slo_args(replay)
+    replay.add_argument(
+        "--trace", required=True, nargs="+",
+        help="Trace file(s) written with NLU_TRACE_ENABLED=true; per-worker files are merged",
     )
-    
+    replay.add_argument("--speed", type=float, nargs="+", default=[1.0], help="Speed multipliers, e.g. 1 2 10")
+    replay.add_argument("--max-duration", type=float, default=None, help="Seconds of recorded traffic to replay")
+    replay.add_argument("--tokenizer", default=None, help="Tokenizer for synthetic texts (default: --model-path)")
+    replay.add_argument("--output", default=None, help="Write the replay report JSON here")
     args = parser.parse_args()
-    
-    # Run load test
-    stats = run_load_test(
-        url=args.url,
-        num_requests=args.requests,
-        concurrency=args.concurrency,
-        use_live_service=args.live,
-    )
-    
-    if not stats:
-        logger.error("Load test failed - no results")
-        return
-    
-    # Display results
-    logger.info("\n" + "=" * 60)
-    logger.info("LOAD TEST RESULTS")
-    logger.info("=" * 60)
-    logger.info(f"Total Requests:      {stats['total_requests']}")
-    logger.info(f"Successful:          {stats['successful_requests']}")
-    logger.info(f"Failed:              {stats['failed_requests']}")
-    logger.info("-" * 60)
-    logger.info(f"Latency p50:         {stats['p50_ms']:.2f} ms")
-    logger.info(f"Latency p95:         {stats['p95_ms']:.2f} ms")
-    logger.info(f"Latency p99:         {stats['p99_ms']:.2f} ms")
-    logger.info(f"Mean Latency:        {stats['mean_ms']:.2f} ms")
-    logger.info(f"Min Latency:         {stats['min_ms']:.2f} ms")
-    logger.info(f"Max Latency:         {stats['max_ms']:.2f} ms")
-    logger.info("=" * 60)
-    
-    # Target comparison
-    target_p95_ms = 50
-    if stats['p95_ms'] < target_p95_ms:
-        logger.info(f"✓ PASS: p95 latency {stats['p95_ms']:.2f}ms < target {target_p95_ms}ms")
-    else:
-        logger.warning(f"✗ FAIL: p95 latency {stats['p95_ms']:.2f}ms >= target {target_p95_ms}ms")
+
+    if args.command == "replay":
+        report = asyncio.run(run_replay(args))
+        print(f"\nNLU Trace Replay ({report['trace']['records']} requests over {report['trace']['duration_s']}s)")
+        print(f"{'speed':>6} {'offered':>9} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}  SLO")
+        for run_result in report["runs"]:
+            latency = run_result["latency_ms"]
+            print(
+                f"{run_result['speed']:>5g}x {run_result['offered_rps']:>9.1f} {run_result['throughput_rps']:>9.1f} "
+                f"{latency['p50']:>8.2f} {latency['p95']:>8.2f} {latency['p99']:>8.2f} {run_result['errors']:>7}  "
+                f"{'pass' if run_result['slo']['passed'] else 'FAIL'}"
+            )
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+        return 0 if all(run_result["slo"]["passed"] for run_result in report["runs"]) else 1
+
+    if args.command == "sweep":
+        report = asyncio.run(run_sweep(args))
+        print_capacity_report(report)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+        return 0 if all(entry["knee"] for entry in report["configurations"]) else 1
+
+    result = asyncio.run(run_load_test(args))
+    print_summary(result)
+    verdict = check_slo(result, args.slo_p95_ms, args.slo_p99_ms, args.max_error_rate)
+    result["slo"] = verdict
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if verdict["passed"]:
+        logger.info(f"✓ PASS: p95 latency {verdict['p95_ms']:.2f}ms < target {args.slo_p95_ms}ms")
+        return 0
+    logger.warning(f"✗ FAIL: {'; '.join(verdict['violations'])}")
+    return 1
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
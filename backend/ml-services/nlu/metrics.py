@@ -0,0 +1,36 @@
+"""
+NLU Service Metrics
+Prometheus collectors for request scheduling, exposed at /metrics
+"""
+
+from prometheus_client import Counter, Histogram
+
+DEADLINE_EXPIRED = Counter(
+    "nlu_deadline_expired_total",
+    "Requests dropped because their deadline passed before inference",
+    labelnames=["stage"],  # arrival, queued
+)
+
+DEADLINE_MISSED = Counter(
+    "nlu_deadline_missed_total",
+    "Requests whose prediction finished after the caller's deadline",
+)
+
+BATCH_SIZE = Histogram(
+    "nlu_scheduler_batch_size",
+    "Number of texts per scheduled inference batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+BATCH_LATENCY = Histogram(
+    "nlu_scheduler_batch_latency_seconds",
+    "Model time per scheduled inference batch",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+REQUEST_LATENCY = Histogram(
+    "nlu_scheduler_request_latency_seconds",
+    "Queue wait plus inference time per request, by priority lane",
+    labelnames=["lane"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
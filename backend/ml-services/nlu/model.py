@@ -5,18 +5,26 @@ Handles model loading, inference, and batch processing
 
 import logging
 import time
-from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import numpy as np
 
+from batch_controller import AdaptiveBatchController, plan_batches
 from config import (
+    ADAPTIVE_BATCH_CONFIG,
     MODEL_CONFIG,
     INFERENCE_CONFIG,
+    FEATURE_CONFIG,
+    INDEX_CONFIG,
     INTENT_CLASSES,
+    INTENT_LABELS,
     LABEL_TO_INTENT,
     EMERGENCY_SUBCATEGORIES,
 )
+from utils import quantize_embeddings
+from vector_index import IVFPQIndex
 
 logger = logging.getLogger(__name__)
 
@@ -30,22 +38,32 @@ class NLUModel:
     - Batch processing support
     - Confidence scoring via softmax
     - Emergency subcategory detection
+    - Pooled sentence embeddings from the classifier encoder
     - Inference latency tracking
     """
 
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(self, model_path: Optional[str] = None, quantization: Optional[str] = None):
         """
         Initialize NLU model wrapper
         
         Args:
             model_path: Path to fine-tuned model. If None, uses MODEL_CONFIG['model_cache_dir']
+            quantization: "none" or "dynamic". If None, uses INFERENCE_CONFIG['quantization']
         """
         self.model_path = model_path or MODEL_CONFIG["model_cache_dir"]
+        self.quantization = quantization or INFERENCE_CONFIG["quantization"]
+        if self.quantization not in ("none", "dynamic"):
+            raise ValueError(f"Unknown quantization {self.quantization!r}")
         self.device = self._get_device()
         self.tokenizer: Optional[AutoTokenizer] = None
         self.model: Optional[AutoModelForSequenceClassification] = None
+        self.intent_index: Optional[IVFPQIndex] = None
+        self.batch_controller: Optional[AdaptiveBatchController] = (
+            AdaptiveBatchController() if ADAPTIVE_BATCH_CONFIG["enabled"] else None
+        )
         self.loaded = False
         self.model_version = self._resolve_model_version()
+        self.padding_stats = {"real_tokens": 0, "padded_tokens": 0}
         
         logger.info(f"NLUModel initialized. Device: {self.device}")
 
@@ -92,6 +110,12 @@ class NLUModel:
             # Move model to device
             self.model.to(self.device)
             self.model.eval()
+            if self.quantization == "dynamic":
+                self._quantize_dynamic()
+
+            # Optional k-NN fast path over labeled examples
+            if INDEX_CONFIG["enabled"]:
+                self._load_index()
 
             elapsed = time.time() - start_time
             logger.info(f"Model loaded successfully in {elapsed:.2f}s")
@@ -101,12 +125,37 @@ class NLUModel:
             logger.error(f"Failed to load model: {str(e)}")
             raise
 
-    def predict(self, text: str) -> Dict:
+    def _quantize_dynamic(self) -> None:
+        """Swap Linear layers for int8-weight versions (activations stay float)"""
+        if self.device.type != "cpu":
+            logger.warning("Dynamic quantization is CPU-only; keeping full precision")
+            self.quantization = "none"
+            return
+        self.model = torch.ao.quantization.quantize_dynamic(
+            self.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        logger.info("Applied dynamic int8 quantization to Linear layers")
+
+    def _load_index(self) -> None:
+        """Open the memory-mapped intent index if one has been built"""
+        index_dir = Path(INDEX_CONFIG["index_dir"])
+        if not (index_dir / "meta.json").exists():
+            logger.warning(
+                f"Intent index enabled but not found at {index_dir}. "
+                "Build it with: python vector_index.py build"
+            )
+            return
+        self.intent_index = IVFPQIndex.load(str(index_dir))
+        logger.info(f"Intent index loaded with {self.intent_index.count} examples")
+
+    def predict(self, text: str, include_embeddings: Optional[bool] = None) -> Dict:
         """
         Predict intent for a single text
         
         Args:
             text: Input clinical note or query
+            include_embeddings: Also return the pooled sentence embedding.
+                Defaults to FEATURE_CONFIG['extract_embeddings'].
             
         Returns:
             {
@@ -116,12 +165,16 @@ class NLUModel:
                 "logits": [0.1, 0.2, ...],
                 "subcategory": "cardiac",
                 "key_terms": ["chest pain"],
-                "latency_ms": 42
+                "latency_ms": 42,
+                "source": "classifier"  # or "retrieval" for k-NN matches
             }
         """
         if not self.loaded:
             self.load()
 
+        if include_embeddings is None:
+            include_embeddings = FEATURE_CONFIG["extract_embeddings"]
+
         start_time = time.time()
 
         try:
@@ -139,40 +192,16 @@ class NLUModel:
 
             # Inference
             with torch.no_grad():
-                outputs = self.model(**inputs)
-                logits = outputs.logits[0].detach().cpu().numpy()
+                logits, embeddings, matches = self._forward(inputs, include_embeddings)
 
-            # Convert logits to probabilities
-            probabilities = torch.softmax(
-                torch.tensor(logits), dim=-1
-            ).numpy()
-
-            # Get top prediction
-            label_id = int(np.argmax(logits))
-            confidence = float(probabilities[label_id])
-            intent = LABEL_TO_INTENT[label_id]
-
-            # Detect subcategory for emergency intent
-            subcategory = None
-            if intent == "emergency":
-                subcategory = self._detect_subcategory(text, logits)
-
-            # Extract key terms (simple keyword extraction)
-            key_terms = self._extract_key_terms(text, intent)
+            result = self._format_prediction(text, logits[0], matches[0])
 
             latency_ms = (time.time() - start_time) * 1000
+            result["latency_ms"] = round(latency_ms, 2)
+            if embeddings is not None:
+                result["embedding"] = embeddings[0].tolist()
 
-            return {
-                "intent": intent,
-                "confidence": confidence,
-                "label_id": label_id,
-                "logits": logits.tolist(),
-                "probabilities": probabilities.tolist(),
-                "subcategory": subcategory,
-                "key_terms": key_terms,
-                "latency_ms": round(latency_ms, 2),
-                "model_version": self.model_version,
-            }
+            return result
 
         except Exception as e:
             logger.error(f"Prediction failed: {str(e)}")
@@ -191,65 +220,197 @@ class NLUModel:
         if not self.loaded:
             self.load()
 
-        predictions = []
-        batch_size = INFERENCE_CONFIG["batch_size"]
+        predictions: List[Optional[Dict]] = [None] * len(texts)
 
-        # Process in batches for efficiency
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i : i + batch_size]
-            batch_results = self._predict_batch_internal(batch_texts)
-            predictions.extend(batch_results)
+        # Process in length-grouped batches, then restore input order
+        for indices, inputs in self._iter_batches(texts):
+            start_time = time.perf_counter()
+            batch_results = self._predict_batch_internal([texts[i] for i in indices], inputs)
+            self._observe_batch(inputs, start_time)
+            for i, result in zip(indices, batch_results):
+                predictions[i] = result
 
         return predictions
 
-    def _predict_batch_internal(self, texts: List[str]) -> List[Dict]:
-        """Internal batch prediction with batch tokenization"""
+    def embed_batch(
+        self,
+        texts: List[str],
+        dtype: Optional[str] = None,
+        normalize: Optional[bool] = None,
+    ) -> Dict:
+        """
+        Compute pooled sentence embeddings with the loaded classifier encoder
+        
+        Runs only the encoder (the classification head is skipped) through
+        the same batching and padding path as predict_batch.
+        
+        Args:
+            texts: List of input texts
+            dtype: Output dtype - "float32", "float16" or "int8".
+                Defaults to FEATURE_CONFIG['embedding_dtype'].
+            normalize: L2-normalize embeddings before quantization.
+                Defaults to FEATURE_CONFIG['normalize_embeddings'].
+            
+        Returns:
+            {
+                "embeddings": np.ndarray of shape (len(texts), hidden_size),
+                "scales": per-row dequantization scales (int8 only, else None),
+                "dtype": "float16",
+                "dim": 768,
+                "latency_ms": 12.5
+            }
+        """
+        if not self.loaded:
+            self.load()
+
+        dtype = dtype or FEATURE_CONFIG["embedding_dtype"]
+        if normalize is None:
+            normalize = FEATURE_CONFIG["normalize_embeddings"]
+
         start_time = time.time()
 
         try:
-            # Batch tokenize
-            inputs = self.tokenizer(
-                texts,
-                max_length=MODEL_CONFIG["max_length"],
-                padding=True,
-                truncation=True,
-                return_tensors="pt",
+            embeddings = None
+            for indices, inputs in self._iter_batches(texts):
+                chunk = self._embed_batch_internal(inputs)
+                if embeddings is None:
+                    embeddings = np.empty((len(texts), chunk.shape[1]), dtype=np.float32)
+                embeddings[indices] = chunk
+
+            if normalize:
+                embeddings = self._l2_normalize(embeddings)
+
+            embeddings, scales = quantize_embeddings(embeddings, dtype)
+            latency_ms = (time.time() - start_time) * 1000
+
+            return {
+                "embeddings": embeddings,
+                "scales": scales,
+                "dtype": dtype,
+                "dim": int(embeddings.shape[1]),
+                "latency_ms": round(latency_ms, 2),
+            }
+
+        except Exception as e:
+            logger.error(f"Embedding failed: {str(e)}")
+            raise
+
+    def _iter_batches(
+        self, texts: List[str]
+    ) -> Iterator[Tuple[List[int], Dict[str, torch.Tensor]]]:
+        """
+        Tokenize once, then yield (indices, padded inputs) per inference batch
+        
+        Texts are grouped by token length (INFERENCE_CONFIG['sort_by_length'])
+        and capped by a padded-token budget, so one long note does not make a
+        batch of short queries pad to its length. The adaptive controller's
+        batch size and token budget decide the split when enabled, otherwise
+        INFERENCE_CONFIG['batch_size'] and ['token_budget']. Each batch is
+        padded only to its own longest sequence; indices map results back to
+        input order.
+        """
+        encodings = self.tokenizer(
+            texts,
+            max_length=MODEL_CONFIG["max_length"],
+            truncation=True,
+        )
+        lengths = [len(ids) for ids in encodings["input_ids"]]
+
+        sort_by_length = INFERENCE_CONFIG["sort_by_length"]
+        if self.batch_controller is not None:
+            plan = self.batch_controller.plan(lengths, sort_by_length)
+        else:
+            plan = plan_batches(
+                lengths,
+                INFERENCE_CONFIG["batch_size"],
+                INFERENCE_CONFIG["token_budget"] or None,
+                sort_by_length,
             )
 
-            # Move to device
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        for indices in plan:
+            inputs = self._pad_encodings(encodings, indices, lengths)
+            self.padding_stats["real_tokens"] += sum(lengths[i] for i in indices)
+            self.padding_stats["padded_tokens"] += inputs["input_ids"].numel()
+            yield indices, inputs
+
+    def _pad_encodings(
+        self, encodings, indices: List[int], lengths: List[int]
+    ) -> Dict[str, torch.Tensor]:
+        """Right-pad the selected rows to their longest length and move them to the device"""
+        padded_length = max(lengths[i] for i in indices)
+        inputs = {}
+        for key, values in encodings.items():
+            pad_value = self.tokenizer.pad_token_id if key == "input_ids" else 0
+            batch = torch.full((len(indices), padded_length), pad_value, dtype=torch.long)
+            for row, i in enumerate(indices):
+                batch[row, : lengths[i]] = torch.tensor(values[i], dtype=torch.long)
+            inputs[key] = batch.to(self.device)
+        return inputs
+
+    def _observe_batch(self, inputs: Dict[str, torch.Tensor], start_time: float) -> None:
+        """Report a finished batch's latency to the adaptive controller"""
+        if self.batch_controller is None:
+            return
+        rows, padded_length = inputs["input_ids"].shape
+        self.batch_controller.observe(
+            rows, rows * padded_length, (time.perf_counter() - start_time) * 1000
+        )
+
+    def _tokenize_batch(self, texts: List[str]) -> Dict[str, torch.Tensor]:
+        """Tokenize a batch with dynamic padding and move it to the device"""
+        inputs = self.tokenizer(
+            texts,
+            max_length=MODEL_CONFIG["max_length"],
+            padding=True,
+            truncation=True,
+            return_tensors="pt",
+        )
+        return {k: v.to(self.device) for k, v in inputs.items()}
+
+    def _embed_batch_internal(self, inputs: Dict[str, torch.Tensor]) -> np.ndarray:
+        """Encoder-only forward pass returning float32 pooled embeddings"""
+        with torch.no_grad():
+            outputs = self.model.base_model(**inputs)
+            return self._pool_embeddings(
+                outputs.last_hidden_state, inputs["attention_mask"]
+            )
+
+    def _pool_embeddings(
+        self, hidden_states: torch.Tensor, attention_mask: torch.Tensor
+    ) -> np.ndarray:
+        """Pool token states into one vector per text (mean over real tokens or CLS)"""
+        if FEATURE_CONFIG["embedding_pooling"] == "cls":
+            pooled = hidden_states[:, 0]
+        else:
+            mask = attention_mask.unsqueeze(-1).to(hidden_states.dtype)
+            pooled = (hidden_states * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1.0)
+        return pooled.detach().cpu().float().numpy()
+
+    @staticmethod
+    def _l2_normalize(embeddings: np.ndarray) -> np.ndarray:
+        """Scale each row to unit L2 norm"""
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+    def _predict_batch_internal(
+        self, texts: List[str], inputs: Optional[Dict[str, torch.Tensor]] = None
+    ) -> List[Dict]:
+        """Internal batch prediction; tokenizes the texts unless inputs are given"""
+        start_time = time.time()
+
+        try:
+            # Batch tokenize
+            if inputs is None:
+                inputs = self._tokenize_batch(texts)
 
             # Batch inference
             with torch.no_grad():
-                outputs = self.model(**inputs)
-                logits = outputs.logits.detach().cpu().numpy()
-
-            results = []
-            for i, (text, logit_row) in enumerate(zip(texts, logits)):
-                probabilities = torch.softmax(
-                    torch.tensor(logit_row), dim=-1
-                ).numpy()
-                label_id = int(np.argmax(logit_row))
-                confidence = float(probabilities[label_id])
-                intent = LABEL_TO_INTENT[label_id]
-
-                subcategory = None
-                if intent == "emergency":
-                    subcategory = self._detect_subcategory(text, logit_row)
-
-                key_terms = self._extract_key_terms(text, intent)
-
-                results.append({
-                    "text": text,
-                    "intent": intent,
-                    "confidence": confidence,
-                    "label_id": label_id,
-                    "logits": logit_row.tolist(),
-                    "probabilities": probabilities.tolist(),
-                    "subcategory": subcategory,
-                    "key_terms": key_terms,
-                    "model_version": self.model_version,
-                })
+                logits, _, matches = self._forward(inputs, include_embeddings=False)
+
+            results = [
+                {"text": text, **self._format_prediction(text, logit_row, match)}
+                for text, logit_row, match in zip(texts, logits, matches)
+            ]
 
             latency_ms = (time.time() - start_time) * 1000
             logger.debug(f"Batch prediction ({len(texts)} texts) completed in {latency_ms:.2f}ms")
@@ -260,6 +421,209 @@ class NLUModel:
             logger.error(f"Batch prediction failed: {str(e)}")
             raise
 
+    def _forward(
+        self, inputs: Dict[str, torch.Tensor], include_embeddings: bool
+    ) -> Tuple[List[Optional[np.ndarray]], Optional[np.ndarray], List[Optional[Dict]]]:
+        """
+        Run the model on a tokenized batch (call under torch.no_grad)
+        
+        Without an intent index this is a single classifier forward pass.
+        With one, the encoder runs first, pooled embeddings are looked up in
+        the index, and the classifier head only runs for rows without a
+        confident labeled neighbor.
+        
+        Returns:
+            (logits per row or None for retrieval matches,
+             pooled embeddings if requested,
+             retrieval match per row or None)
+        """
+        batch_size = inputs["input_ids"].shape[0]
+        if not include_embeddings and self.intent_index is None:
+            logits = self.model(**inputs).logits.detach().cpu().numpy()
+            return list(logits), None, [None] * batch_size
+
+        encoder_outputs = self.model.base_model(**inputs)
+        pooled = self._pool_embeddings(
+            encoder_outputs.last_hidden_state, inputs["attention_mask"]
+        )
+        normalized = self._l2_normalize(pooled)
+
+        matches: List[Optional[Dict]] = [None] * batch_size
+        if self.intent_index is not None:
+            matches = self._retrieve(normalized)
+
+        logits: List[Optional[np.ndarray]] = [None] * batch_size
+        pending = [i for i, match in enumerate(matches) if match is None]
+        if pending:
+            head_logits = self._classify_encoded(inputs, encoder_outputs, pending)
+            for i, logit_row in zip(pending, head_logits):
+                logits[i] = logit_row
+
+        embeddings = None
+        if include_embeddings:
+            embeddings = normalized if FEATURE_CONFIG["normalize_embeddings"] else pooled
+
+        return logits, embeddings, matches
+
+    def _classify_encoded(
+        self, inputs: Dict[str, torch.Tensor], encoder_outputs, rows: List[int]
+    ) -> np.ndarray:
+        """Apply the classification head to already-encoded rows"""
+        pooler_output = getattr(encoder_outputs, "pooler_output", None)
+        head = getattr(self.model, "classifier", None)
+        # Dynamic quantization swaps the head for a quantized Linear
+        linear_heads = (torch.nn.Linear, torch.ao.nn.quantized.dynamic.Linear)
+        if pooler_output is not None and isinstance(head, linear_heads):
+            # BERT-style head: linear layer on the pooled [CLS] state (dropout is a no-op in eval)
+            return head(pooler_output[rows]).detach().cpu().numpy()
+
+        # Other architectures: fall back to a full forward pass on the subset
+        subset = {k: v[rows] for k, v in inputs.items()}
+        return self.model(**subset).logits.detach().cpu().numpy()
+
+    def _retrieve(self, embeddings: np.ndarray) -> List[Optional[Dict]]:
+        """
+        k-NN lookup of L2-normalized embeddings in the intent index
+        
+        A row matches when its nearest neighbor clears the similarity
+        threshold and the similarity-weighted vote of all neighbors above
+        the threshold agrees with it.
+        """
+        threshold = INDEX_CONFIG["similarity_threshold"]
+        similarities, ids = self.intent_index.search(
+            embeddings, k=INDEX_CONFIG["k"], nprobe=INDEX_CONFIG["nprobe"],
+            refine=INDEX_CONFIG["refine"],
+        )
+
+        matches: List[Optional[Dict]] = []
+        for row_sims, row_ids in zip(similarities, ids):
+            close = (row_ids >= 0) & (row_sims >= threshold)
+            if not close[0]:
+                matches.append(None)
+                continue
+
+            votes = np.zeros(len(INTENT_CLASSES), dtype=np.float64)
+            for sim, idx in zip(row_sims[close], row_ids[close]):
+                votes[self.intent_index.label(idx)] += float(sim)
+            probabilities = votes / votes.sum()
+            label_id = self.intent_index.label(row_ids[0])
+
+            if probabilities[label_id] < INDEX_CONFIG["min_agreement"]:
+                matches.append(None)
+                continue
+
+            matches.append({
+                "label_id": label_id,
+                "probabilities": probabilities,
+                "similarity": float(row_sims[0]),
+                "neighbor_text": self.intent_index.texts[row_ids[0]],
+            })
+
+        return matches
+
+    def _format_prediction(
+        self, text: str, logits: Optional[np.ndarray], match: Optional[Dict] = None
+    ) -> Dict:
+        """Build the prediction dict from classifier logits or a retrieval match"""
+        if match is not None:
+            probabilities = match["probabilities"]
+            label_id = match["label_id"]
+        else:
+            probabilities = torch.softmax(torch.tensor(logits), dim=-1).numpy()
+            label_id = int(np.argmax(logits))
+
+        confidence = float(probabilities[label_id])
+        intent = LABEL_TO_INTENT[label_id]
+
+        # Detect subcategory for emergency intent
+        subcategory = None
+        if intent == "emergency":
+            subcategory = self._detect_subcategory(text, logits)
+
+        # Extract key terms (simple keyword extraction)
+        key_terms = self._extract_key_terms(text, intent)
+
+        result = {
+            "intent": intent,
+            "confidence": confidence,
+            "label_id": label_id,
+            "logits": logits.tolist() if logits is not None else None,
+            "probabilities": probabilities.tolist(),
+            "subcategory": subcategory,
+            "key_terms": key_terms,
+            "model_version": self.model_version,
+            "source": "retrieval" if match is not None else "classifier",
+        }
+        if match is not None:
+            result["retrieval"] = {
+                "similarity": match["similarity"],
+                "neighbor_text": match["neighbor_text"],
+            }
+        return result
+
+    def find_similar(self, texts: List[str], k: Optional[int] = None) -> List[List[Dict]]:
+        """
+        Return the k nearest labeled examples for each text
+        
+        Raises:
+            ValueError: If no intent index is loaded
+        """
+        if not self.loaded:
+            self.load()
+        if self.intent_index is None:
+            raise ValueError("Intent index is not loaded")
+
+        embeddings = self.embed_batch(texts, dtype="float32", normalize=True)["embeddings"]
+        similarities, ids = self.intent_index.search(
+            embeddings, k=k or INDEX_CONFIG["k"], nprobe=INDEX_CONFIG["nprobe"],
+            refine=INDEX_CONFIG["refine"],
+        )
+
+        return [
+            [
+                {
+                    "text": self.intent_index.texts[idx],
+                    "intent": LABEL_TO_INTENT[self.intent_index.label(idx)],
+                    "similarity": float(sim),
+                }
+                for sim, idx in zip(row_sims, row_ids)
+                if idx >= 0
+            ]
+            for row_sims, row_ids in zip(similarities, ids)
+        ]
+
+    def add_examples(self, texts: List[str], intents: List[str]) -> int:
+        """
+        Insert labeled examples into the loaded intent index
+        
+        The index is only ever built offline (python vector_index.py build);
+        request data never trains or overwrites it.
+        
+        Returns:
+            Number of examples in the index
+            
+        Raises:
+            ValueError: On unknown intents, mismatched lengths, or if no
+                intent index is loaded
+        """
+        if len(texts) != len(intents):
+            raise ValueError("texts and intents must have the same length")
+        unknown = sorted(set(intents) - set(INTENT_LABELS))
+        if unknown:
+            raise ValueError(f"Unknown intents: {unknown}")
+
+        if not self.loaded:
+            self.load()
+
+        if self.intent_index is None:
+            raise ValueError("Intent index is not loaded")
+
+        labels = [INTENT_LABELS[intent] for intent in intents]
+        embeddings = self.embed_batch(texts, dtype="float32", normalize=True)["embeddings"]
+        self.intent_index.add(embeddings, labels, texts)
+
+        return self.intent_index.count
+
     def _detect_subcategory(self, text: str, logits: np.ndarray) -> Optional[str]:
         """
         Detect emergency subcategory based on text keywords
@@ -294,16 +658,28 @@ class NLUModel:
         model_size_mb = sum(
             p.numel() for p in self.model.parameters()
         ) * 4 / (1024 * 1024)  # Approximate size in MB
+        real_tokens = self.padding_stats["real_tokens"]
+        padded_tokens = self.padding_stats["padded_tokens"]
 
         return {
             "status": "loaded",
             "model_name": self.model_path,
             "model_version": self.model_version,
             "device": str(self.device),
+            "quantization": self.quantization,
+            "torch_threads": torch.get_num_threads(),
             "model_size_mb": round(model_size_mb, 2),
             "num_parameters": sum(p.numel() for p in self.model.parameters()),
             "num_labels": MODEL_CONFIG["num_labels"],
             "intent_classes": INTENT_CLASSES,
+            "intent_index_size": self.intent_index.count if self.intent_index else 0,
+            "batch_controller": (
+                self.batch_controller.get_state() if self.batch_controller else None
+            ),
+            "padding": {
+                **self.padding_stats,
+                "padding_waste": round(1 - real_tokens / padded_tokens, 4) if padded_tokens else 0.0,
+            },
         }
 
     def unload(self) -> None:
@@ -312,6 +688,7 @@ class NLUModel:
             del self.model
         if self.tokenizer is not None:
             del self.tokenizer
+        self.intent_index = None
         self.loaded = False
         torch.cuda.empty_cache()
         logger.info("Model unloaded")
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: nlu.proto
+# Protobuf Python Version: 7.35.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    7,
+    35,
+    1,
+    '',
+    'nlu.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\tnlu.proto\x12\x10\x63\x61redroid.nlu.v1\"\x1e\n\x0ePredictRequest\x12\x0c\n\x04text\x18\x01 \x01(\t\"\xbe\x01\n\nPrediction\x12\x0e\n\x06intent\x18\x01 \x01(\t\x12\x12\n\nconfidence\x18\x02 \x01(\x02\x12\x10\n\x08label_id\x18\x03 \x01(\x05\x12\x18\n\x0bsubcategory\x18\x04 \x01(\tH\x00\x88\x01\x01\x12\x15\n\rprobabilities\x18\x05 \x03(\x02\x12\x12\n\nlatency_ms\x18\x06 \x01(\x02\x12\x15\n\rmodel_version\x18\x07 \x01(\t\x12\x0e\n\x06source\x18\x08 \x01(\tB\x0e\n\x0c_subcategory\"$\n\x13\x42\x61tchPredictRequest\x12\r\n\x05texts\x18\x01 \x03(\t\"u\n\x14\x42\x61tchPredictResponse\x12-\n\x07results\x18\x01 \x03(\x0b\x32\x1c.caredroid.nlu.v1.Prediction\x12\x1a\n\x12processing_time_ms\x18\x02 \x01(\x02\x12\x12\n\nbatch_size\x18\x03 \x01(\x05\"G\n\x0f\x43lassifyRequest\x12\x12\n\nrequest_id\x18\x01 \x01(\t\x12\x0c\n\x04text\x18\x02 \x01(\t\x12\x12\n\ntimeout_ms\x18\x03 \x01(\r\"g\n\x10\x43lassifyResponse\x12\x12\n\nrequest_id\x18\x01 \x01(\t\x12\x30\n\nprediction\x18\x02 \x01(\x0b\x32\x1c.caredroid.nlu.v1.Prediction\x12\r\n\x05\x65rror\x18\x03 \x01(\t2\x93\x02\n\x10IntentClassifier\x12I\n\x07Predict\x12 .caredroid.nlu.v1.PredictRequest\x1a\x1c.caredroid.nlu.v1.Prediction\x12]\n\x0c\x42\x61tchPredict\x12%.caredroid.nlu.v1.BatchPredictRequest\x1a&.caredroid.nlu.v1.BatchPredictResponse\x12U\n\x08\x43lassify\x12!.caredroid.nlu.v1.ClassifyRequest\x1a\".caredroid.nlu.v1.ClassifyResponse(\x01\x30\x01\x62\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'nlu_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_PREDICTREQUEST']._serialized_start=31
+  _globals['_PREDICTREQUEST']._serialized_end=61
+  _globals['_PREDICTION']._serialized_start=64
+  _globals['_PREDICTION']._serialized_end=254
+  _globals['_BATCHPREDICTREQUEST']._serialized_start=256
+  _globals['_BATCHPREDICTREQUEST']._serialized_end=292
+  _globals['_BATCHPREDICTRESPONSE']._serialized_start=294
+  _globals['_BATCHPREDICTRESPONSE']._serialized_end=411
+  _globals['_CLASSIFYREQUEST']._serialized_start=413
+  _globals['_CLASSIFYREQUEST']._serialized_end=484
+  _globals['_CLASSIFYRESPONSE']._serialized_start=486
+  _globals['_CLASSIFYRESPONSE']._serialized_end=589
+  _globals['_INTENTCLASSIFIER']._serialized_start=592
+  _globals['_INTENTCLASSIFIER']._serialized_end=867
+# @@protoc_insertion_point(module_scope)
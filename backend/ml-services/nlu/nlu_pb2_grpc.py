@@ -0,0 +1,187 @@
+# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
+"""Client and server classes corresponding to protobuf-defined services."""
+import grpc
+import warnings
+
+import nlu_pb2 as nlu__pb2
+
+GRPC_GENERATED_VERSION = '1.84.0'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
+
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + ' but the generated code in nlu_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
+
+
+class IntentClassifierStub:
+    """Missing associated documentation comment in .proto file."""
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.Predict = channel.unary_unary(
+                '/caredroid.nlu.v1.IntentClassifier/Predict',
+                request_serializer=nlu__pb2.PredictRequest.SerializeToString,
+                response_deserializer=nlu__pb2.Prediction.FromString,
+                _registered_method=True)
+        self.BatchPredict = channel.unary_unary(
+                '/caredroid.nlu.v1.IntentClassifier/BatchPredict',
+                request_serializer=nlu__pb2.BatchPredictRequest.SerializeToString,
+                response_deserializer=nlu__pb2.BatchPredictResponse.FromString,
+                _registered_method=True)
+        self.Classify = channel.stream_stream(
+                '/caredroid.nlu.v1.IntentClassifier/Classify',
+                request_serializer=nlu__pb2.ClassifyRequest.SerializeToString,
+                response_deserializer=nlu__pb2.ClassifyResponse.FromString,
+                _registered_method=True)
+
+
+class IntentClassifierServicer:
+    """Missing associated documentation comment in .proto file."""
+
+    def Predict(self, request, context):
+        """Classify a single text
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchPredict(self, request, context):
+        """Classify up to 100 texts in one call
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Classify(self, request_iterator, context):
+        """Long-lived bidirectional stream; responses carry the request_id and may
+        arrive out of order as scheduler batches complete
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_IntentClassifierServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'Predict': grpc.unary_unary_rpc_method_handler(
+                    servicer.Predict,
+                    request_deserializer=nlu__pb2.PredictRequest.FromString,
+                    response_serializer=nlu__pb2.Prediction.SerializeToString,
+            ),
+            'BatchPredict': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchPredict,
+                    request_deserializer=nlu__pb2.BatchPredictRequest.FromString,
+                    response_serializer=nlu__pb2.BatchPredictResponse.SerializeToString,
+            ),
+            'Classify': grpc.stream_stream_rpc_method_handler(
+                    servicer.Classify,
+                    request_deserializer=nlu__pb2.ClassifyRequest.FromString,
+                    response_serializer=nlu__pb2.ClassifyResponse.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'caredroid.nlu.v1.IntentClassifier', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('caredroid.nlu.v1.IntentClassifier', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class IntentClassifier:
+    """Missing associated documentation comment in .proto file."""
+
+    @staticmethod
+    def Predict(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/caredroid.nlu.v1.IntentClassifier/Predict',
+            nlu__pb2.PredictRequest.SerializeToString,
+            nlu__pb2.Prediction.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchPredict(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/caredroid.nlu.v1.IntentClassifier/BatchPredict',
+            nlu__pb2.BatchPredictRequest.SerializeToString,
+            nlu__pb2.BatchPredictResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Classify(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/caredroid.nlu.v1.IntentClassifier/Classify',
+            nlu__pb2.ClassifyRequest.SerializeToString,
+            nlu__pb2.ClassifyResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,368 @@
+"""
+Inference Scheduler
+Dynamic micro-batching of concurrent prediction requests onto one NLUModel
+"""
+
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+import math
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import EMERGENCY_SUBCATEGORIES, SCHEDULER_CONFIG
+from metrics import (
+    BATCH_LATENCY,
+    BATCH_SIZE,
+    DEADLINE_EXPIRED,
+    DEADLINE_MISSED,
+    REQUEST_LATENCY,
+)
+
+logger = logging.getLogger(__name__)
+
+# Lanes in priority order; a non-empty earlier lane always dispatches first
+EMERGENCY_LANE = "emergency"
+ROUTINE_LANE = "routine"
+LANES = (EMERGENCY_LANE, ROUTINE_LANE)
+
+# Word-bounded so short keywords ("mi", "ams") don't match inside other words
+_EMERGENCY_PATTERN = re.compile(
+    r"\b(?:"
+    + "|".join(
+        re.escape(keyword)
+        for keywords in EMERGENCY_SUBCATEGORIES.values()
+        for keyword in keywords
+    )
+    + r")\b",
+    re.IGNORECASE,
+)
+
+
+def is_likely_emergency(text: str) -> bool:
+    """Keyword pre-screen run before the model to pick a scheduling lane"""
+    return _EMERGENCY_PATTERN.search(text) is not None
+
+
+class DeadlineExceeded(Exception):
+    """The caller's deadline passed before the request could be served"""
+
+
+def deadline_from_headers(
+    timeout_ms: Optional[str] = None, deadline_epoch_ms: Optional[str] = None
+) -> Optional[float]:
+    """
+    Convert request deadline headers into a time.monotonic() deadline
+
+    Args:
+        timeout_ms: Remaining budget in milliseconds (X-Request-Timeout-Ms)
+        deadline_epoch_ms: Absolute Unix time in milliseconds (X-Request-Deadline)
+
+    Returns:
+        Monotonic deadline, the earlier of the two if both are given, or None
+
+    Raises:
+        ValueError: If a header is not a number
+    """
+    now = time.monotonic()
+    candidates = []
+    if timeout_ms:
+        candidates.append(now + float(timeout_ms) / 1000.0)
+    if deadline_epoch_ms:
+        candidates.append(now + float(deadline_epoch_ms) / 1000.0 - time.time())
+    return min(candidates) if candidates else None
+
+
+@dataclass
+class PendingRequest:
+    """A queued text waiting to be batched"""
+    text: str
+    future: asyncio.Future
+    deadline: Optional[float] = None  # time.monotonic() seconds
+    lane: str = ROUTINE_LANE
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+    def expired(self, now: float) -> bool:
+        return self.deadline is not None and now >= self.deadline
+
+
+@dataclass
+class Lane:
+    """One priority queue (EDF heap) with its own batching window"""
+    name: str
+    max_wait_s: float
+    queue: List[Tuple[float, int, "PendingRequest"]] = field(default_factory=list)
+    requests: int = 0
+
+
+class InferenceScheduler:
+    """
+    Collects requests from every transport (REST, gRPC) into shared batches
+
+    Requests are split into priority lanes: texts that trip the emergency
+    keyword pre-screen go to a lane with a short window (`emergency_max_wait_ms`)
+    that always dispatches before routine work, while routine traffic waits
+    up to `max_wait_ms` to build larger batches. Emergency batches never
+    include routine rows, so their forward pass stays small.
+
+    Within a lane, a batch is dispatched when it reaches `max_batch_size` or
+    when the oldest queued request has waited the lane's max wait; the window
+    also closes early if waiting longer would make the most urgent request
+    miss its deadline. Requests are served earliest-deadline-first (requests
+    without a deadline go last, FIFO among themselves) and anything already
+    past its deadline is dropped before tokenization, so CPU is spent only on
+    requests that can still succeed. Batches run on a single worker thread
+    so the model is never called concurrently and the event loop stays free
+    to accept new requests; other model calls share that thread through
+    run_exclusive().
+    """
+
+    def __init__(
+        self,
+        model,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        emergency_max_wait_ms: Optional[float] = None,
+        priority_lanes: Optional[bool] = None,
+    ):
+        self.model = model
+        self.max_batch_size = max_batch_size or SCHEDULER_CONFIG["max_batch_size"]
+        self.max_wait_s = (
+            max_wait_ms if max_wait_ms is not None else SCHEDULER_CONFIG["max_wait_ms"]
+        ) / 1000.0
+        self.priority_lanes = (
+            priority_lanes if priority_lanes is not None else SCHEDULER_CONFIG["priority_lanes"]
+        )
+        emergency_wait_ms = (
+            emergency_max_wait_ms if emergency_max_wait_ms is not None
+            else SCHEDULER_CONFIG["emergency_max_wait_ms"]
+        )
+        self._lanes: Dict[str, Lane] = {
+            EMERGENCY_LANE: Lane(EMERGENCY_LANE, emergency_wait_ms / 1000.0),
+            ROUTINE_LANE: Lane(ROUTINE_LANE, self.max_wait_s),
+        }
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nlu-infer")
+        self._task: Optional[asyncio.Task] = None
+        # Smoothed model time per batch, used to close windows before deadlines
+        self._batch_latency_s = 0.0
+        self.stats = {
+            "requests": 0,
+            "batches": 0,
+            "batched_rows": 0,
+            "expired": 0,
+            "deadline_missed": 0,
+        }
+
+    async def start(self) -> None:
+        """Start the batching loop on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"Inference scheduler started (max_batch_size={self.max_batch_size}, "
+                f"max_wait_ms={self.max_wait_s * 1000:.1f}, "
+                f"priority_lanes={self.priority_lanes})"
+            )
+
+    async def stop(self) -> None:
+        """Stop the loop and fail anything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for lane in self._lanes.values():
+            while lane.queue:
+                _, _, pending = heapq.heappop(lane.queue)
+                if not pending.future.done():
+                    pending.future.set_exception(RuntimeError("Scheduler stopped"))
+        self._executor.shutdown(wait=False)
+
+    def classify_lane(self, text: str) -> str:
+        """Pick the scheduling lane for a text"""
+        if self.priority_lanes and is_likely_emergency(text):
+            return EMERGENCY_LANE
+        return ROUTINE_LANE
+
+    async def submit(
+        self, text: str, deadline: Optional[float] = None, lane: Optional[str] = None
+    ) -> Dict:
+        """
+        Queue one text and wait for its prediction
+
+        Args:
+            text: Input text
+            deadline: Optional time.monotonic() deadline
+            lane: Force a lane; by default the emergency pre-screen decides
+
+        Raises:
+            DeadlineExceeded: If the deadline passes before inference starts
+        """
+        if deadline is not None and time.monotonic() >= deadline:
+            self._record_expired("arrival")
+            raise DeadlineExceeded("Deadline exceeded before the request was queued")
+
+        lane = lane or self.classify_lane(text)
+        loop = asyncio.get_running_loop()
+        pending = PendingRequest(
+            text=text, future=loop.create_future(), deadline=deadline, lane=lane
+        )
+        sort_key = deadline if deadline is not None else math.inf
+        heapq.heappush(self._lanes[lane].queue, (sort_key, next(self._sequence), pending))
+        self._lanes[lane].requests += 1
+        self.stats["requests"] += 1
+        self._wakeup.set()
+
+        result = await pending.future
+        finished = time.monotonic()
+        if deadline is not None and finished > deadline:
+            self.stats["deadline_missed"] += 1
+            DEADLINE_MISSED.inc()
+        latency_s = finished - pending.enqueued_at
+        REQUEST_LATENCY.labels(lane=lane).observe(latency_s)
+        result["latency_ms"] = round(latency_s * 1000, 2)
+        return result
+
+    async def run_exclusive(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a non-batched model call (embeddings, index lookups) on the
+        inference thread, so it never overlaps a batch or blocks the loop
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def submit_many(self, texts: List[str], deadline: Optional[float] = None) -> List[Dict]:
+        """Queue several texts (they may share batches with other callers)"""
+        return list(await asyncio.gather(*(self.submit(text, deadline) for text in texts)))
+
+    def get_stats(self) -> Dict:
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "queue_depth": sum(len(lane.queue) for lane in self._lanes.values()),
+            "mean_batch_size": round(self.stats["batched_rows"] / batches, 2) if batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000,
+            "batch_latency_ms": round(self._batch_latency_s * 1000, 2),
+            "priority_lanes": self.priority_lanes,
+            "lanes": {
+                name: {
+                    "requests": lane.requests,
+                    "queue_depth": len(lane.queue),
+                    "max_wait_ms": lane.max_wait_s * 1000,
+                }
+                for name, lane in self._lanes.items()
+            },
+        }
+
+    def _next_lane(self) -> Optional[Lane]:
+        """Highest-priority lane with queued work"""
+        for name in LANES:
+            if self._lanes[name].queue:
+                return self._lanes[name]
+        return None
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            lane = self._next_lane()
+            if lane is None:
+                self._wakeup.clear()
+                continue
+
+            await self._fill_window(lane)
+            if self._next_lane() is not lane:
+                # Higher-priority work arrived mid-window; serve it first
+                self._wakeup.set()
+                continue
+            batch = self._take_batch(lane)
+
+            # Leftovers start the next window immediately
+            if self._next_lane() is not None:
+                self._wakeup.set()
+            else:
+                self._wakeup.clear()
+
+            if batch:
+                await self._execute(batch)
+
+    def _window_end(self, lane: Lane) -> float:
+        """When the lane's current batching window must close"""
+        oldest = min(pending.enqueued_at for _, _, pending in lane.queue)
+        window_end = oldest + lane.max_wait_s
+        earliest_deadline = lane.queue[0][0]
+        if earliest_deadline != math.inf:
+            window_end = min(window_end, earliest_deadline - self._batch_latency_s)
+        return window_end
+
+    async def _fill_window(self, lane: Lane) -> None:
+        """Wait for more requests until the batch is full, the window closes or a higher lane fills"""
+        while lane.queue and len(lane.queue) < self.max_batch_size:
+            if self._next_lane() is not lane:
+                return
+            remaining = self._window_end(lane) - time.monotonic()
+            if remaining <= 0:
+                return
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return
+
+    def _take_batch(self, lane: Lane) -> List[PendingRequest]:
+        """Pop up to max_batch_size live requests in deadline order, dropping expired ones"""
+        now = time.monotonic()
+        batch: List[PendingRequest] = []
+        while lane.queue and len(batch) < self.max_batch_size:
+            _, _, pending = heapq.heappop(lane.queue)
+            if pending.future.done():
+                # Caller went away (e.g. client disconnect)
+                continue
+            if pending.expired(now):
+                self._record_expired("queued")
+                pending.future.set_exception(
+                    DeadlineExceeded("Deadline exceeded while waiting for inference")
+                )
+                continue
+            batch.append(pending)
+        return batch
+
+    def _record_expired(self, stage: str) -> None:
+        self.stats["expired"] += 1
+        DEADLINE_EXPIRED.labels(stage=stage).inc()
+
+    async def _execute(self, batch: List[PendingRequest]) -> None:
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        try:
+            results = await loop.run_in_executor(
+                self._executor, self.model.predict_batch, [p.text for p in batch]
+            )
+        except Exception as e:
+            logger.error(f"Scheduled batch of {len(batch)} failed: {str(e)}")
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+
+        elapsed = time.monotonic() - start
+        self._batch_latency_s = (
+            elapsed if self.stats["batches"] == 0
+            else 0.8 * self._batch_latency_s + 0.2 * elapsed
+        )
+        self.stats["batches"] += 1
+        self.stats["batched_rows"] += len(batch)
+        BATCH_SIZE.observe(len(batch))
+        BATCH_LATENCY.observe(elapsed)
+
+        for pending, result in zip(batch, results):
+            if not pending.future.done():
+                pending.future.set_result(result)
@@ -0,0 +1,227 @@
+"""
+Response Serialization
+Content negotiation between stock JSON, orjson and MessagePack, plus a
+compact columnar layout for batch predictions
+
+Usage:
+    python serialization.py --batch-size 100 --iterations 200
+"""
+
+import argparse
+import base64
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi.responses import JSONResponse, Response
+
+from config import INTENT_CLASSES
+from utils import encode_array_b64
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+class ORJSONResponse(Response):
+    """JSON response encoded with orjson (numpy arrays serialized natively)"""
+    media_type = JSON_MEDIA_TYPE
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+class MsgpackResponse(Response):
+    """MessagePack response; bytes values are sent as msgpack bin"""
+    media_type = MSGPACK_MEDIA_TYPES[0]
+
+    def render(self, content) -> bytes:
+        return msgpack.packb(content, use_bin_type=True, default=_msgpack_default)
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick a wire format from the Accept header
+
+    The supported media type with the highest q-value wins (the first
+    listed on a tie); types with q=0 are refused. Wildcards and anything
+    else fall through to the default path.
+
+    Returns:
+        "msgpack", "orjson", or None for the default pydantic/JSON path
+    """
+    if not accept:
+        return None
+
+    formats = {}
+    if msgpack is not None:
+        formats.update(dict.fromkeys(MSGPACK_MEDIA_TYPES, "msgpack"))
+    if orjson is not None:
+        formats[JSON_MEDIA_TYPE] = "orjson"
+
+    best, best_q = None, 0.0
+    for media_type, q in parse_accept(accept):
+        if media_type in formats and q > best_q:
+            best, best_q = formats[media_type], q
+    return best
+
+
+def parse_accept(accept: str) -> List[Tuple[str, float]]:
+    """(media type, q) pairs of an Accept header in order; entries with a malformed q are dropped"""
+    entries = []
+    for part in accept.lower().split(","):
+        media_type, *params = [token.strip() for token in part.split(";")]
+        if not media_type:
+            continue
+        q: Optional[float] = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    q = None
+        if q is not None:
+            entries.append((media_type, q))
+    return entries
+
+
+def render(content: Dict, wire_format: str) -> Response:
+    """Encode a plain dict in the negotiated wire format"""
+    if wire_format == "msgpack":
+        return MsgpackResponse(content)
+    if wire_format == "orjson":
+        return ORJSONResponse(content)
+    return JSONResponse(content)
+
+
+def pack_batch_compact(results: List[Dict], binary: bool) -> Dict:
+    """
+    Columnar batch layout with float16-packed probabilities
+
+    Per-row logits are dropped and probabilities become one row-major
+    float16 (little-endian) buffer of shape [batch_size, num_classes]:
+    raw bytes for MessagePack, base64 for JSON.
+    """
+    probabilities = np.asarray(
+        [row["probabilities"] for row in results], dtype=np.float16
+    ).reshape(len(results), len(INTENT_CLASSES))
+
+    packed = probabilities.astype("<f2").tobytes() if binary else encode_array_b64(probabilities)
+
+    return {
+        "intents": [row["intent"] for row in results],
+        "label_ids": [row["label_id"] for row in results],
+        "confidences": [round(row["confidence"], 4) for row in results],
+        "subcategories": [row.get("subcategory") for row in results],
+        "sources": [row.get("source", "classifier") for row in results],
+        "probabilities": packed,
+        "probabilities_dtype": "float16",
+        "probabilities_shape": list(probabilities.shape),
+        "intent_classes": INTENT_CLASSES,
+    }
+
+
+def unpack_probabilities(compact: Dict) -> np.ndarray:
+    """Decode compact probabilities back into a float32 array (client helper)"""
+    packed = compact["probabilities"]
+    if isinstance(packed, str):
+        packed = base64.b64decode(packed)
+    return np.frombuffer(packed, dtype="<f2").reshape(compact["probabilities_shape"]).astype(np.float32)
+
+
+def _synthetic_batch(batch_size: int, seed: int = 0) -> List[Dict]:
+    """Rows shaped like NLUModel._predict_batch_internal output"""
+    rng = np.random.default_rng(seed)
+    results = []
+    for i in range(batch_size):
+        logits = rng.normal(size=len(INTENT_CLASSES))
+        probabilities = np.exp(logits) / np.exp(logits).sum()
+        label_id = int(np.argmax(logits))
+        results.append({
+            "text": f"Synthetic clinical query number {i} with some context",
+            "intent": INTENT_CLASSES[label_id],
+            "confidence": float(probabilities[label_id]),
+            "label_id": label_id,
+            "logits": logits.tolist(),
+            "probabilities": probabilities.tolist(),
+            "subcategory": "cardiac" if label_id == 0 else None,
+            "key_terms": [],
+            "model_version": "benchmark",
+            "source": "classifier",
+        })
+    return results
+
+
+def benchmark(batch_size: int, iterations: int) -> List[Dict]:
+    """Time encoding a batch-predict payload through each wire format"""
+    from app import BatchPredictResponse
+
+    results = _synthetic_batch(batch_size)
+    envelope = {"processing_time_ms": 12.3, "batch_size": batch_size}
+
+    def pydantic_json():
+        # Mirrors FastAPI's default path: validate, dump, stdlib json.dumps
+        model = BatchPredictResponse(results=results, **envelope)
+        return json.dumps(model.model_dump()).encode()
+
+    cases = {"pydantic+json": pydantic_json}
+    if orjson is not None:
+        cases["orjson"] = lambda: ORJSONResponse({"results": results, **envelope}).body
+        cases["orjson compact"] = lambda: ORJSONResponse(
+            {"compact": pack_batch_compact(results, binary=False), **envelope}
+        ).body
+    if msgpack is not None:
+        cases["msgpack"] = lambda: MsgpackResponse({"results": results, **envelope}).body
+        cases["msgpack compact"] = lambda: MsgpackResponse(
+            {"compact": pack_batch_compact(results, binary=True), **envelope}
+        ).body
+
+    report = []
+    for name, encode in cases.items():
+        encode()  # warm up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            body = encode()
+        elapsed_us = (time.perf_counter() - start) / iterations * 1e6
+        report.append({"format": name, "encode_us": round(elapsed_us, 1), "bytes": len(body)})
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch response serialization benchmark")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    report = benchmark(args.batch_size, args.iterations)
+    baseline = report[0]["encode_us"]
+    print(f"\n{'format':<18} {'encode us':>10} {'speedup':>8} {'bytes':>8}")
+    for row in report:
+        print(
+            f"{row['format']:<18} {row['encode_us']:>10.1f} "
+            f"{baseline / row['encode_us']:>7.1f}x {row['bytes']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
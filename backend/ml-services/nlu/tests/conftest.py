@@ -0,0 +1,19 @@
+from pathlib import Path
+
+import pytest
+
+from benchmarks.tiny_model import build_tiny_model
+
+
+@pytest.fixture(scope="session")
+def tiny_model_dir(tmp_path_factory) -> Path:
+    return build_tiny_model(tmp_path_factory.mktemp("tiny_model"))
+
+
+@pytest.fixture(scope="session")
+def tiny_model(tiny_model_dir):
+    from model import NLUModel
+
+    model = NLUModel(model_path=str(tiny_model_dir))
+    model.load()
+    return model
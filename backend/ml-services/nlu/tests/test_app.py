@@ -0,0 +1,84 @@
+import threading
+
+import msgpack
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+from scheduler import InferenceScheduler
+from serialization import unpack_probabilities
+
+
+@pytest.fixture
+def client(tiny_model, monkeypatch):
+    monkeypatch.setattr(app_module, "nlu_model", tiny_model)
+    return TestClient(app_module.app)
+
+
+def test_predict_default_json(client):
+    response = client.post("/predict", json={"text": "Severe chest pain"})
+    assert response.status_code == 200
+    assert response.json()["intent"] in app_module.INTENT_CLASSES
+
+
+def test_predict_expired_deadline_returns_504(client):
+    response = client.post(
+        "/predict", json={"text": "Severe chest pain"}, headers={"X-Request-Timeout-Ms": "0"}
+    )
+    assert response.status_code == 504
+
+
+def test_metrics_endpoint(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "nlu_deadline_expired_total" in response.text
+
+
+def test_batch_predict_msgpack(client):
+    response = client.post(
+        "/batch-predict",
+        json={"texts": ["Severe chest pain", "Show sepsis protocol"]},
+        headers={"Accept": "application/msgpack"},
+    )
+    assert response.headers["content-type"].startswith("application/msgpack")
+    body = msgpack.unpackb(response.content)
+    assert body["batch_size"] == 2
+    assert len(body["results"]) == 2
+
+
+def test_batch_predict_compact(client):
+    response = client.post(
+        "/batch-predict",
+        json={"texts": ["Severe chest pain", "Show sepsis protocol"], "compact": True},
+        headers={"Accept": "application/json"},
+    )
+    compact = response.json()["compact"]
+    assert unpack_probabilities(compact).shape == (2, 7)
+    assert "results" not in response.json()
+
+
+def test_embed_base64(client):
+    response = client.post(
+        "/embed", json={"texts": ["Severe chest pain"], "dtype": "float16", "encoding": "base64"}
+    )
+    body = response.json()
+    assert body["embeddings"] is None
+    assert len(body["embeddings_b64"]) == 1
+
+
+def test_unbatched_model_calls_run_on_the_inference_thread(client, tiny_model, monkeypatch):
+    monkeypatch.setattr(app_module, "model_scheduler", InferenceScheduler(tiny_model))
+    threads = []
+
+    def on_thread(method):
+        def wrapper(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return method(*args, **kwargs)
+        return wrapper
+
+    for name in ("embed_batch", "predict"):
+        monkeypatch.setattr(tiny_model, name, on_thread(getattr(tiny_model, name)))
+    assert client.post("/embed", json={"texts": ["Severe chest pain"]}).status_code == 200
+    response = client.post("/predict", json={"text": "Severe chest pain", "include_embeddings": True})
+    assert response.status_code == 200 and response.json()["embedding"]
+    assert threads and all(name.startswith("nlu-infer") for name in threads)
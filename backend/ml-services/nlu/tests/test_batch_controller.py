@@ -0,0 +1,103 @@
+import random
+
+import numpy as np
+
+from batch_controller import AdaptiveBatchController, padding_stats, plan_batches, simulate
+from config import INFERENCE_CONFIG
+
+
+def make_controller(**kwargs):
+    defaults = dict(
+        target_p95_ms=50,
+        batch_size=32,
+        token_budget=4096,
+        max_batch_size=128,
+        min_token_budget=512,
+        max_token_budget=65536,
+        window=50,
+        adjust_every=10,
+    )
+    defaults.update(kwargs)
+    return AdaptiveBatchController(**defaults)
+
+
+def linear_latency(seed=0, ms_per_token=0.02, overhead_ms=2.0):
+    rng = random.Random(seed)
+
+    def latency(rows, padded_tokens):
+        return (overhead_ms + ms_per_token * padded_tokens) * rng.uniform(0.9, 1.3)
+
+    return latency
+
+
+def test_plan_respects_batch_size_and_token_budget():
+    controller = make_controller(batch_size=4, token_budget=600, min_token_budget=100)
+    lengths = [10, 10, 10, 10, 10, 200, 200, 200, 20]
+    plan = controller.plan(lengths)
+
+    assert sorted(i for batch in plan for i in batch) == list(range(len(lengths)))
+    for batch in plan:
+        assert len(batch) <= 4
+        assert len(batch) == 1 or len(batch) * max(lengths[i] for i in batch) <= 600
+
+
+def test_controller_starts_from_the_inference_token_budget(monkeypatch):
+    monkeypatch.setitem(INFERENCE_CONFIG, "token_budget", 3000)
+    assert AdaptiveBatchController().token_budget == 3000
+    # 0 means no budget; tuning then starts from the ceiling
+    monkeypatch.setitem(INFERENCE_CONFIG, "token_budget", 0)
+    assert AdaptiveBatchController(max_token_budget=20000).token_budget == 20000
+
+
+def test_oversized_row_still_gets_a_batch():
+    controller = make_controller(token_budget=512, min_token_budget=512)
+    assert controller.plan([2000, 5], sort_by_length=False) == [[0], [1]]
+
+
+def test_sorting_by_length_cuts_padding_waste():
+    rng = random.Random(8)
+    lengths = [rng.randint(8, 24) for _ in range(248)] + [480] * 8
+    rng.shuffle(lengths)
+    sliced = plan_batches(lengths, batch_size=32, sort_by_length=False)
+    grouped = plan_batches(lengths, batch_size=32, token_budget=8192)
+
+    assert sorted(i for batch in grouped for i in batch) == list(range(len(lengths)))
+    sliced_stats = padding_stats(lengths, sliced)
+    grouped_stats = padding_stats(lengths, grouped)
+    assert grouped_stats["real_tokens"] == sliced_stats["real_tokens"]
+    assert grouped_stats["padded_tokens"] < sliced_stats["padded_tokens"] / 4
+
+
+def test_simulation_converges_near_target_p95():
+    rng = random.Random(1)
+    controller = make_controller()
+    history = simulate(controller, linear_latency(), lambda: rng.randint(64, 256), steps=400)
+
+    tail = [h["latency_ms"] for h in history[len(history) // 2:]]
+    p95 = np.percentile(tail, 95)
+    assert 0.6 * 50 < p95 <= 50 * 1.1
+
+
+def test_short_texts_get_larger_batches_than_long_texts():
+    rng = random.Random(2)
+    short = make_controller()
+    long = make_controller()
+    short_history = simulate(short, linear_latency(3), lambda: rng.randint(8, 32), steps=300)
+    long_history = simulate(long, linear_latency(4), lambda: rng.randint(256, 512), steps=300)
+
+    short_rows = np.mean([h["rows"] for h in short_history[-100:]])
+    long_rows = np.mean([h["rows"] for h in long_history[-100:]])
+    assert short_rows > 4 * long_rows
+
+
+def test_controller_backs_off_when_machine_slows_down():
+    rng = random.Random(5)
+    controller = make_controller()
+    simulate(controller, linear_latency(6), lambda: rng.randint(64, 128), steps=200)
+    budget_before = controller.token_budget
+
+    simulate(
+        controller, linear_latency(7, ms_per_token=0.08), lambda: rng.randint(64, 128), steps=200
+    )
+    assert controller.token_budget < budget_before / 2
+    assert controller.get_state()["decreases"] > 0
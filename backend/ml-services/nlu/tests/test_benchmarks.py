@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+
+import app as app_module
+from benchmarks.harness import compare, environment_info, environment_mismatches, measure, summarize
+from benchmarks.run import main as run_benchmarks_cli
+
+
+def document(samples):
+    return {"results": {"case": summarize(samples)}}
+
+
+def test_compare_flags_real_slowdown_but_not_noise():
+    rng = np.random.default_rng(0)
+    baseline = document(rng.lognormal(0.0, 0.05, 30))
+    rerun = document(rng.lognormal(0.0, 0.05, 30))
+    slower = document(rng.lognormal(np.log(1.3), 0.05, 30))
+    faster = document(rng.lognormal(np.log(0.7), 0.05, 30))
+
+    assert compare(rerun, baseline)[0]["status"] == "ok"
+    assert compare(slower, baseline)[0]["status"] == "regression"
+    assert compare(faster, baseline)[0]["status"] == "improvement"
+    # Significant but inside the tolerance
+    assert compare(slower, baseline, tolerance=0.5)[0]["status"] == "ok"
+
+
+def test_compare_reports_cases_missing_from_baseline():
+    rows = compare(document([1.0, 1.1, 0.9]), {"results": {}})
+    assert rows == [{"name": "case", "status": "new", "current_ms": 1.0}]
+
+
+def test_measure_repeats_fast_calls_within_a_sample():
+    summary = measure(lambda: None, samples=5, warmup=1, min_sample_ms=1.0)
+    assert summary["inner_loops"] > 1
+    assert len(summary["samples_ms"]) == 5
+
+
+def test_cli_fails_on_regression_against_baseline(tmp_path):
+    args = ["--filter", "detect_subcategory", "--samples", "5", "--min-sample-ms", "1"]
+    baseline_path = tmp_path / "baseline.json"
+    assert run_benchmarks_cli(args + ["--baseline", str(baseline_path), "--update-baseline"]) == 0
+
+    # Pretend the baseline was 10x faster
+    baseline = json.loads(baseline_path.read_text())
+    for result in baseline["results"].values():
+        result["samples_ms"] = [value / 10 for value in result["samples_ms"]]
+        result["median_ms"] /= 10
+    baseline_path.write_text(json.dumps(baseline))
+
+    assert run_benchmarks_cli(args + ["--baseline", str(baseline_path)]) == 1
+
+
+def test_cli_refuses_a_baseline_from_another_environment(tmp_path):
+    args = ["--filter", "detect_subcategory", "--samples", "5", "--min-sample-ms", "1"]
+    baseline_path = tmp_path / "baseline.json"
+    assert run_benchmarks_cli(args + ["--baseline", str(baseline_path), "--update-baseline"]) == 0
+
+    baseline = json.loads(baseline_path.read_text())
+    baseline["environment"]["torch"] = "0.0.0"
+    baseline_path.write_text(json.dumps(baseline))
+    assert environment_mismatches(baseline["environment"], environment_info()) == [
+        f"torch: baseline '0.0.0', current {environment_info()['torch']!r}"
+    ]
+
+    assert run_benchmarks_cli(args + ["--baseline", str(baseline_path)]) == 2
+    # Compared anyway (0 or 1 depending on timing noise), not refused
+    assert run_benchmarks_cli(args + ["--baseline", str(baseline_path), "--allow-env-mismatch"]) != 2
+
+
+def test_asgi_cases_restore_the_app_globals(monkeypatch):
+    sentinel = object()
+    monkeypatch.setattr(app_module, "nlu_model", sentinel)
+    args = ["--filter", "asgi.predict", "--samples", "2", "--min-sample-ms", "1", "--no-compare"]
+    assert run_benchmarks_cli(args) == 0
+    assert app_module.nlu_model is sentinel
+    assert app_module.scheduler is None and app_module.model_scheduler is None
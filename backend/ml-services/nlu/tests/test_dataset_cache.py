@@ -0,0 +1,60 @@
+import json
+
+from dataset_cache import cache_key, load_or_build, stream_tokenized
+
+
+def write_jsonl(path, rows):
+    path.write_text("\n".join(json.dumps(row) for row in rows) + "\n")
+
+
+ROWS = [
+    {"text": "Severe chest pain", "intent": "emergency", "subcategory": "cardiac"},
+    {"text": "Show sepsis protocol", "intent": "protocol_search"},
+    {"text": "Calculate SOFA score for this patient", "intent": "clinical_tool"},
+]
+
+
+def test_cache_builds_once_then_hits(tiny_model, tmp_path, monkeypatch):
+    tokenizer = tiny_model.tokenizer
+    data_file = tmp_path / "train.jsonl"
+    write_jsonl(data_file, ROWS)
+    cache_dir = tmp_path / "cache"
+
+    dataset = load_or_build(str(data_file), tokenizer, 64, str(cache_dir))
+    assert len(dataset) == 3
+    assert dataset[1]["label"] == 3  # protocol_search
+    assert dataset[0]["length"] == len(dataset[0]["input_ids"])
+    expected = tokenizer("Severe chest pain", max_length=64, truncation=True)["input_ids"]
+    assert dataset[0]["input_ids"] == expected
+
+    # A second load must not tokenize again
+    monkeypatch.setattr("dataset_cache._tokenize_records", None)
+    again = load_or_build(str(data_file), tokenizer, 64, str(cache_dir))
+    assert again["input_ids"] == dataset["input_ids"]
+    assert len([p for p in cache_dir.iterdir() if not p.name.startswith(".")]) == 1
+
+
+def test_cache_key_tracks_data_and_max_length(tiny_model, tmp_path):
+    tokenizer = tiny_model.tokenizer
+    data_file = tmp_path / "train.jsonl"
+    write_jsonl(data_file, ROWS)
+    key = cache_key(str(data_file), tokenizer, 64)
+
+    # Tokenizer call state (truncation) must not change the key
+    tokenizer(["x"], max_length=8, truncation=True)
+    assert cache_key(str(data_file), tokenizer, 64) == key
+    assert cache_key(str(data_file), tokenizer, 128) != key
+
+    write_jsonl(data_file, ROWS[:2])
+    assert cache_key(str(data_file), tokenizer, 64) != key
+
+
+def test_stream_tokenized_matches_cache(tiny_model, tmp_path):
+    data_file = tmp_path / "train.jsonl"
+    write_jsonl(data_file, ROWS)
+    streamed = list(stream_tokenized(str(data_file), tiny_model.tokenizer, 64))
+    cached = load_or_build(str(data_file), tiny_model.tokenizer, 64, str(tmp_path / "cache"))
+
+    assert [row["input_ids"] for row in streamed] == cached["input_ids"]
+    assert [row["label"] for row in streamed] == cached["label"]
+    assert "text" not in streamed[0]
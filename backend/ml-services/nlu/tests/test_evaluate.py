@@ -0,0 +1,63 @@
+import json
+from pathlib import Path
+
+from batch_controller import AdaptiveBatchController
+from config import INFERENCE_CONFIG
+from evaluate import compare_metrics, evaluate, latency_summary, pinned_batching
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+
+def test_evaluate_writes_comparable_metrics(tiny_model_dir, tmp_path):
+    output = tmp_path / "metrics.json"
+    metrics = evaluate(
+        batch_sizes=[1, 4],
+        latency_samples=5,
+        throughput_texts=8,
+        model_dir=str(tiny_model_dir),
+        test_path=str(DATA_DIR / "test.jsonl"),
+        output_path=str(output),
+    )
+
+    saved = json.loads(output.read_text())
+    assert saved == json.loads(json.dumps(metrics))
+    assert saved["schema_version"] == 2
+    assert 0.0 <= saved["accuracy"] <= 1.0
+    assert set(saved["latency_ms"]) >= {"p50", "p95", "p99", "mean"}
+    assert [row["batch_size"] for row in saved["throughput"]] == [1, 4]
+    assert all(row["texts_per_second"] > 0 for row in saved["throughput"])
+    assert saved["dataset"]["sha256"]
+
+
+def test_pinned_batching_runs_the_classifier_in_one_batch_and_restores_state(tiny_model):
+    original, controller = tiny_model.batch_controller, AdaptiveBatchController()
+    tiny_model.batch_controller = controller
+    index = tiny_model.intent_index = object()
+    saved = dict(INFERENCE_CONFIG)
+    texts = ["chest pain radiating to the left arm " * 20] * 48
+
+    with pinned_batching(tiny_model, 48):
+        assert tiny_model.batch_controller is None and tiny_model.intent_index is None
+        assert len(list(tiny_model._iter_batches(texts))) == 1
+
+    assert tiny_model.batch_controller is controller and tiny_model.intent_index is index
+    assert INFERENCE_CONFIG == saved
+    tiny_model.batch_controller, tiny_model.intent_index = original, None
+
+
+def test_latency_summary_percentiles():
+    summary = latency_summary([float(i) for i in range(1, 101)])
+    assert summary["p50"] == 50.5
+    assert summary["max"] == 100.0
+    assert summary["samples"] == 100
+
+
+def test_compare_metrics_reports_relative_change():
+    baseline = {"accuracy": 0.8, "latency_ms": {"p95": 10.0},
+                "throughput": [{"batch_size": 32, "texts_per_second": 100.0}]}
+    current = {"accuracy": 0.9, "latency_ms": {"p95": 8.0},
+               "throughput": [{"batch_size": 32, "texts_per_second": 150.0}]}
+    comparison = compare_metrics(current, baseline)
+    assert comparison["accuracy"]["change"] == 0.125
+    assert comparison["latency_ms.p95"]["change"] == -0.2
+    assert comparison["throughput.bs32.texts_per_second"]["change"] == 0.5
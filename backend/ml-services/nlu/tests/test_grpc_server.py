@@ -0,0 +1,84 @@
+import asyncio
+
+import grpc
+import pytest
+
+import nlu_pb2
+import nlu_pb2_grpc
+from grpc_server import IntentClassifierServicer, start_grpc_server
+from scheduler import InferenceScheduler
+
+
+async def _with_server(model, exercise):
+    scheduler = InferenceScheduler(model, max_wait_ms=2)
+    await scheduler.start()
+    server, port = await start_grpc_server(scheduler, port=0)
+    try:
+        async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+            return await exercise(nlu_pb2_grpc.IntentClassifierStub(channel))
+    finally:
+        await server.stop(grace=None)
+        await scheduler.stop()
+
+
+async def _drain(stream):
+    return [response async for response in stream]
+
+
+def test_predict_and_batch_predict(tiny_model):
+    async def exercise(stub):
+        single = await stub.Predict(nlu_pb2.PredictRequest(text="Severe chest pain"))
+        batch = await stub.BatchPredict(
+            nlu_pb2.BatchPredictRequest(texts=["Show sepsis protocol", "Reset password"])
+        )
+        return single, batch
+
+    single, batch = asyncio.run(_with_server(tiny_model, exercise))
+    assert single.intent
+    assert len(single.probabilities) == 7
+    assert batch.batch_size == 2
+    assert len(batch.results) == 2
+
+
+def test_batch_predict_rejects_empty(tiny_model):
+    async def exercise(stub):
+        try:
+            await stub.BatchPredict(nlu_pb2.BatchPredictRequest(texts=[]))
+        except grpc.aio.AioRpcError as e:
+            return e.code()
+
+    assert asyncio.run(_with_server(tiny_model, exercise)) == grpc.StatusCode.INVALID_ARGUMENT
+
+
+def test_classify_stream_multiplexes_requests(tiny_model):
+    texts = ["Severe chest pain", "Show sepsis protocol", "Calculate SOFA score", "Reset password"]
+
+    async def exercise(stub):
+        async def requests():
+            for i, text in enumerate(texts):
+                yield nlu_pb2.ClassifyRequest(request_id=str(i), text=text)
+
+        return [response async for response in stub.Classify(requests())]
+
+    responses = asyncio.run(_with_server(tiny_model, exercise))
+    assert sorted(r.request_id for r in responses) == ["0", "1", "2", "3"]
+    assert all(r.prediction.intent and not r.error for r in responses)
+
+
+def test_classify_stream_ends_when_reading_requests_fails(tiny_model):
+    async def requests():
+        yield nlu_pb2.ClassifyRequest(request_id="0", text="Severe chest pain")
+        raise RuntimeError("client went away")
+
+    async def scenario():
+        scheduler = InferenceScheduler(tiny_model, max_wait_ms=2)
+        await scheduler.start()
+        try:
+            servicer = IntentClassifierServicer(scheduler)
+            stream = servicer.Classify(requests(), context=None)
+            return await asyncio.wait_for(_drain(stream), timeout=5)
+        finally:
+            await scheduler.stop()
+
+    with pytest.raises(RuntimeError, match="client went away"):
+        asyncio.run(scenario())
@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import random
+
+import httpx
+import numpy as np
+import pytest
+
+from load_test import (
+    HdrHistogram,
+    add_load_args,
+    LoadRequest,
+    build_schedule,
+    in_process_client,
+    parse_mix,
+    poisson_arrivals,
+    run_open_loop,
+)
+from load_test_runner import ServiceConfig, check_slo, config_grid, run_sweep, sweep_rates
+
+
+def test_histogram_percentiles_within_precision():
+    values = np.random.default_rng(0).lognormal(2.0, 1.0, 20_000)
+    histogram = HdrHistogram()
+    for value in values:
+        histogram.record(value)
+    for p in (50, 95, 99):
+        expected = np.percentile(values, p)
+        assert histogram.percentile(p) == pytest.approx(expected, rel=0.01)
+    assert histogram.summary()["count"] == 20_000
+
+
+def test_histogram_merge_adds_counts():
+    a, b = HdrHistogram(), HdrHistogram()
+    a.record(1.0)
+    b.record(100.0)
+    a.merge(b)
+    assert a.total == 2
+    assert a.percentile(100) == pytest.approx(100.0, rel=0.001)
+
+
+def test_poisson_arrivals_match_rate():
+    offsets = list(poisson_arrivals(200.0, 50.0, random.Random(0)))
+    assert len(offsets) == pytest.approx(10_000, rel=0.05)
+    assert offsets == sorted(offsets)
+
+
+def test_schedule_uses_payload_mix():
+    schedule = build_schedule(100.0, 20.0, "constant", "query=3,batch=1", seed=1)
+    profiles = [request.profile for _, request in schedule]
+    assert len(schedule) == 2000
+    assert profiles.count("query") / len(profiles) == pytest.approx(0.75, abs=0.05)
+    with pytest.raises(ValueError):
+        parse_mix("bogus=1")
+
+
+def test_stalled_server_is_charged_for_queued_requests():
+    """A 300 ms stall must show up in latency even though only one request hit it"""
+    lock = asyncio.Lock()
+    calls = []
+
+    async def stalling_app(scope, receive, send):
+        await receive()
+        async with lock:  # single-threaded server
+            calls.append(1)
+            if len(calls) == 1:
+                await asyncio.sleep(0.3)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    schedule = [(i * 0.01, LoadRequest("query", "/predict", {"text": "x"})) for i in range(20)]
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=stalling_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await run_open_loop(client, schedule, report_interval_s=0.1)
+
+    result = asyncio.run(scenario())
+    assert result["ok"] == 20
+    # Open loop: the request scheduled at 10 ms waited ~290 ms behind the stall
+    assert result["latency_ms"]["p50"] > 100
+    assert result["timeline"]
+
+
+def test_in_process_run_against_app(tiny_model_dir):
+    async def scenario():
+        schedule = build_schedule(50.0, 1.0, "poisson", "query=0.8,batch=0.2", seed=0)
+        async with in_process_client(str(tiny_model_dir)) as client:
+            return await run_open_loop(client, schedule, report_interval_s=0.5)
+
+    result = asyncio.run(scenario())
+    assert result["errors"] == 0 and result["dropped"] == 0
+    assert result["ok"] == result["scheduled"] > 0
+    assert set(result["profiles"]) <= {"query", "batch"}
+    assert check_slo(result, slo_p95_ms=10_000)["passed"]
+    assert not check_slo(result, slo_p95_ms=0.0)["passed"]
+
+
+def fake_result(rate, capacity=300.0):
+    """Latency explodes once the offered rate passes `capacity`"""
+    p95 = 10.0 if rate <= capacity else 10.0 * rate / capacity * 20
+    return {
+        "scheduled": 100, "ok": 100, "errors": 0, "dropped": 0,
+        "offered_rps": rate, "throughput_rps": min(rate, capacity), "max_dispatch_lag_ms": 0.0,
+        "latency_ms": {"p50": p95 / 2, "p95": p95, "p99": p95 * 1.2, "max": p95 * 2},
+    }
+
+
+def test_sweep_finds_knee_by_ramping_then_bisecting():
+    async def run_step(rate, step):
+        return fake_result(rate)
+
+    sweep = asyncio.run(sweep_rates(
+        run_step, lambda r: check_slo(r, slo_p95_ms=50), start_rate=50, max_rate=10_000,
+        growth=2.0, refine_steps=3,
+    ))
+    rates = [step["rate"] for step in sweep["steps"]]
+    # Ramp 50, 100, 200, 400 (miss), then bisect between 200 and 400
+    assert rates[:4] == [50, 100, 200, 400]
+    assert rates[4:] == [300, 350, 325]
+    assert sweep["saturated"]
+    assert sweep["knee"]["rate"] == 300
+
+
+def test_sweep_without_slo_miss_stops_at_max_rate():
+    async def run_step(rate, step):
+        return fake_result(rate, capacity=1e9)
+
+    sweep = asyncio.run(sweep_rates(
+        run_step, lambda r: check_slo(r, slo_p95_ms=50), start_rate=10, max_rate=100, growth=2.0,
+    ))
+    assert not sweep["saturated"]
+    assert sweep["knee"]["rate"] == 80
+
+
+def test_config_grid_is_cartesian_product():
+    grid = config_grid([1, 2], [0], ["none", "dynamic"], [None, 5.0])
+    assert len(grid) == 8
+    assert ServiceConfig(2, 0, "dynamic", 5.0) in grid
+
+
+def test_in_process_sweep_reports_each_configuration(tiny_model_dir):
+    parser = argparse.ArgumentParser()
+    add_load_args(parser)
+    args = parser.parse_args(["--in-process", "--model-path", str(tiny_model_dir), "--quiet"])
+    args.__dict__.update(
+        launch=False, slo_p95_ms=10_000.0, slo_p99_ms=None, max_error_rate=0.01,
+        start_rate=20.0, max_rate=40.0, growth=2.0, refine=0, step_duration=0.5, warmup=0.2,
+        workers=[1], threads=[1], quantization=["none", "dynamic"], batch_window_ms=[2.0],
+    )
+    report = asyncio.run(run_sweep(args))
+    assert [entry["config"]["quantization"] for entry in report["configurations"]] == ["none", "dynamic"]
+    for entry in report["configurations"]:
+        assert [step["rate"] for step in entry["steps"]] == [20.0, 40.0]
+        assert entry["knee"] is not None
@@ -1,6 +1,9 @@
 import numpy as np
+import pytest
 
+from config import INTENT_CLASSES, INTENT_LABELS
 from model import NLUModel
+from vector_index import build_index
 
 
 def test_get_model_info_not_loaded():
@@ -33,3 +36,117 @@ def test_extract_key_terms_placeholder():
     result = model._extract_key_terms("Some clinical text", "general_query")
     assert isinstance(result, list)
     assert result == []
+
+
+def test_embed_batch_shape_and_normalized(tiny_model):
+    texts = ["Severe chest pain", "Show sepsis protocol", "What causes hypertension?"]
+    result = tiny_model.embed_batch(texts, dtype="float32")
+    assert result["embeddings"].shape == (3, result["dim"])
+    assert result["scales"] is None
+    assert np.allclose(np.linalg.norm(result["embeddings"], axis=1), 1.0, atol=1e-5)
+
+
+def test_embed_batch_matches_predict_embedding(tiny_model):
+    text = "Interpret potassium level of 6.1"
+    batch = tiny_model.embed_batch([text, "short"], dtype="float32")
+    single = tiny_model.predict(text, include_embeddings=True)
+    assert np.allclose(batch["embeddings"][0], single["embedding"], atol=1e-4)
+
+
+def test_embed_batch_int8_dequantizes(tiny_model):
+    texts = ["Severe chest pain", "Show sepsis protocol"]
+    reference = tiny_model.embed_batch(texts, dtype="float32")["embeddings"]
+    result = tiny_model.embed_batch(texts, dtype="int8")
+    assert result["embeddings"].dtype == np.int8
+    restored = result["embeddings"].astype(np.float32) * result["scales"][:, None]
+    assert np.allclose(restored, reference, atol=0.02)
+
+
+def test_retrieval_fast_path_skips_classifier(tiny_model, tmp_path, monkeypatch):
+    import model as model_module
+
+    monkeypatch.setitem(model_module.INDEX_CONFIG, "index_dir", str(tmp_path / "index"))
+    monkeypatch.setitem(model_module.INDEX_CONFIG, "num_subquantizers", 8)
+    # Random tiny-model embeddings are all close; only exact duplicates should match
+    monkeypatch.setitem(model_module.INDEX_CONFIG, "similarity_threshold", 0.999)
+    texts = ["Severe chest pain", "Show sepsis protocol", "Reset user password", "Calculate SOFA score"]
+    intents = ["emergency", "protocol_search", "admin_function", "clinical_tool"]
+
+    try:
+        tiny_model.intent_index = build_index(tiny_model, texts[:2], [INTENT_LABELS[i] for i in intents[:2]])
+        assert tiny_model.add_examples(texts[2:], intents[2:]) == 4
+        result = tiny_model.predict("Show sepsis protocol")
+        assert result["source"] == "retrieval"
+        assert result["intent"] == "protocol_search"
+        assert result["logits"] is None
+        neighbors = tiny_model.find_similar(["Show sepsis protocol"], k=2)[0]
+        assert neighbors[0]["text"] == "Show sepsis protocol"
+    finally:
+        tiny_model.intent_index = None
+
+
+def test_add_examples_never_builds_an_index(tiny_model, tmp_path, monkeypatch):
+    import model as model_module
+
+    monkeypatch.setitem(model_module.INDEX_CONFIG, "index_dir", str(tmp_path / "index"))
+    assert tiny_model.intent_index is None
+    with pytest.raises(ValueError, match="not loaded"):
+        tiny_model.add_examples(["Severe chest pain"], ["emergency"])
+    assert tiny_model.intent_index is None and not (tmp_path / "index").exists()
+
+
+def test_classifier_head_on_encoder_matches_full_forward(tiny_model):
+    import torch
+
+    inputs = tiny_model._tokenize_batch(["Severe chest pain", "Show sepsis protocol"])
+    with torch.no_grad():
+        full = tiny_model.model(**inputs).logits.numpy()
+        encoded = tiny_model.model.base_model(**inputs)
+        head = tiny_model._classify_encoded(inputs, encoded, [0, 1])
+    assert np.allclose(full, head, atol=1e-5)
+
+
+def test_quantized_classifier_head_skips_second_forward(tiny_model_dir, monkeypatch):
+    import torch
+
+    model = NLUModel(model_path=str(tiny_model_dir), quantization="dynamic")
+    model.load()
+    inputs = model._tokenize_batch(["Severe chest pain", "Show sepsis protocol"])
+    with torch.no_grad():
+        full = model.model(**inputs).logits.numpy()
+        encoded = model.model.base_model(**inputs)
+        # The head must run on the encoder output, not a second full pass
+        monkeypatch.setattr(model.model, "forward", lambda *a, **k: pytest.fail("full forward pass"))
+        head = model._classify_encoded(inputs, encoded, [0, 1])
+    assert np.allclose(full, head, atol=1e-5)
+
+
+def test_predict_batch_restores_input_order(tiny_model, monkeypatch):
+    texts = [
+        "Severe chest pain with diaphoresis and nausea",
+        "hi",
+        "Show sepsis protocol",
+        "Interpret potassium level of 6.1 in a dialysis patient",
+    ]
+    # Small batches so length sorting reorders rows across batches
+    monkeypatch.setattr(tiny_model.batch_controller, "batch_size", 2)
+    batched = tiny_model.predict_batch(texts)
+    reference = tiny_model._predict_batch_internal(texts)
+
+    assert [r["text"] for r in batched] == texts
+    for got, want in zip(batched, reference):
+        np.testing.assert_allclose(got["probabilities"], want["probabilities"], atol=1e-5)
+    info = tiny_model.get_model_info()
+    assert info["batch_controller"]["batches"] >= 2
+    assert 0.0 <= info["padding"]["padding_waste"] < 1.0
+
+
+def test_dynamic_quantization_keeps_predictions_valid(tiny_model_dir):
+    model = NLUModel(model_path=str(tiny_model_dir), quantization="dynamic")
+    model.load()
+    results = model.predict_batch(["chest pain", "show sepsis protocol"])
+    assert all(r["intent"] in INTENT_CLASSES for r in results)
+    assert model.get_model_info()["quantization"] == "dynamic"
+
+    with pytest.raises(ValueError):
+        NLUModel(model_path=str(tiny_model_dir), quantization="int4")
@@ -0,0 +1,190 @@
+import asyncio
+import time
+
+import pytest
+
+from scheduler import (
+    DeadlineExceeded,
+    InferenceScheduler,
+    deadline_from_headers,
+    is_likely_emergency,
+)
+
+
+class FakeModel:
+    """Records batch sizes instead of running a network"""
+
+    def __init__(self, delay_s=0.0, fail=False, per_row_s=0.0):
+        self.delay_s = delay_s
+        self.per_row_s = per_row_s
+        self.fail = fail
+        self.batches = []
+
+    def predict_batch(self, texts):
+        if self.fail:
+            raise RuntimeError("boom")
+        time.sleep(self.delay_s + self.per_row_s * len(texts))
+        self.batches.append(list(texts))
+        return [{"text": text, "intent": "general_query"} for text in texts]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_submissions_share_a_batch():
+    async def scenario():
+        model = FakeModel()
+        scheduler = InferenceScheduler(model, max_batch_size=8, max_wait_ms=20)
+        await scheduler.start()
+        results = await asyncio.gather(*(scheduler.submit(f"t{i}") for i in range(5)))
+        await scheduler.stop()
+        return model, results
+
+    model, results = run(scenario())
+    assert [r["text"] for r in results] == [f"t{i}" for i in range(5)]
+    assert model.batches == [[f"t{i}" for i in range(5)]]
+    assert all("latency_ms" in r for r in results)
+
+
+def test_batches_respect_max_batch_size():
+    async def scenario():
+        model = FakeModel()
+        scheduler = InferenceScheduler(model, max_batch_size=4, max_wait_ms=5)
+        await scheduler.start()
+        results = await scheduler.submit_many([f"t{i}" for i in range(10)])
+        stats = scheduler.get_stats()
+        await scheduler.stop()
+        return model, results, stats
+
+    model, results, stats = run(scenario())
+    assert len(results) == 10
+    assert max(len(b) for b in model.batches) <= 4
+    assert stats["batched_rows"] == 10
+
+
+def test_batch_failure_propagates_to_callers():
+    async def scenario():
+        scheduler = InferenceScheduler(FakeModel(fail=True), max_batch_size=4, max_wait_ms=1)
+        await scheduler.start()
+        try:
+            await scheduler.submit("x")
+        finally:
+            await scheduler.stop()
+
+    with pytest.raises(RuntimeError, match="boom"):
+        run(scenario())
+
+
+def test_expired_requests_are_dropped_before_inference():
+    async def scenario():
+        model = FakeModel(delay_s=0.05)
+        scheduler = InferenceScheduler(model, max_batch_size=1, max_wait_ms=0)
+        await scheduler.start()
+        # "slow" occupies the worker; "late" expires while queued behind it
+        slow = asyncio.ensure_future(scheduler.submit("slow"))
+        await asyncio.sleep(0.01)
+        late = asyncio.ensure_future(scheduler.submit("late", deadline=time.monotonic() + 0.01))
+        await slow
+        with pytest.raises(DeadlineExceeded):
+            await late
+        stats = scheduler.get_stats()
+        await scheduler.stop()
+        return model, stats
+
+    model, stats = run(scenario())
+    assert model.batches == [["slow"]]
+    assert stats["expired"] == 1
+
+
+def test_submit_rejects_already_expired_deadline():
+    async def scenario():
+        model = FakeModel()
+        scheduler = InferenceScheduler(model, max_batch_size=4, max_wait_ms=1)
+        await scheduler.start()
+        try:
+            await scheduler.submit("x", deadline=time.monotonic() - 1)
+        finally:
+            await scheduler.stop()
+
+    with pytest.raises(DeadlineExceeded):
+        run(scenario())
+
+
+def test_earliest_deadline_is_served_first():
+    async def scenario():
+        model = FakeModel(delay_s=0.02)
+        scheduler = InferenceScheduler(model, max_batch_size=1, max_wait_ms=0)
+        await scheduler.start()
+        blocker = asyncio.ensure_future(scheduler.submit("blocker"))
+        await asyncio.sleep(0.005)
+        now = time.monotonic()
+        later = asyncio.ensure_future(scheduler.submit("none"))
+        soon = asyncio.ensure_future(scheduler.submit("soon", deadline=now + 5))
+        sooner = asyncio.ensure_future(scheduler.submit("sooner", deadline=now + 1))
+        await asyncio.gather(blocker, later, soon, sooner)
+        await scheduler.stop()
+        return model
+
+    model = run(scenario())
+    assert model.batches == [["blocker"], ["sooner"], ["soon"], ["none"]]
+
+
+def test_deadline_from_headers_prefers_earliest():
+    now = time.monotonic()
+    deadline = deadline_from_headers("1000", str((time.time() + 0.2) * 1000))
+    assert now + 0.1 < deadline < now + 0.3
+    assert deadline_from_headers(None, None) is None
+
+
+def test_emergency_prescreen_uses_word_boundaries():
+    assert is_likely_emergency("Patient with crushing chest pain")
+    assert is_likely_emergency("r/o MI")
+    assert not is_likely_emergency("Update the admin settings")
+    assert not is_likely_emergency("Calculate SOFA score")
+
+
+def test_emergency_lane_jumps_queued_routine_work():
+    async def scenario():
+        model = FakeModel(delay_s=0.02)
+        scheduler = InferenceScheduler(
+            model, max_batch_size=2, max_wait_ms=0, emergency_max_wait_ms=0
+        )
+        await scheduler.start()
+        blocker = asyncio.ensure_future(scheduler.submit("blocker"))
+        await asyncio.sleep(0.005)
+        routine = [asyncio.ensure_future(scheduler.submit(f"routine {i}")) for i in range(4)]
+        emergency = asyncio.ensure_future(scheduler.submit("possible stroke"))
+        await asyncio.gather(blocker, emergency, *routine)
+        stats = scheduler.get_stats()
+        await scheduler.stop()
+        return model, stats
+
+    model, stats = run(scenario())
+    assert model.batches[1] == ["possible stroke"]
+    assert stats["lanes"]["emergency"]["requests"] == 1
+    assert stats["lanes"]["routine"]["requests"] == 5
+
+
+def test_emergency_latency_stays_flat_under_bulk_load():
+    async def scenario():
+        model = FakeModel(delay_s=0.001, per_row_s=0.0002)
+        scheduler = InferenceScheduler(
+            model, max_batch_size=32, max_wait_ms=10, emergency_max_wait_ms=1
+        )
+        await scheduler.start()
+        bulk = [asyncio.ensure_future(scheduler.submit(f"admin query {i}")) for i in range(400)]
+        emergencies = []
+        for _ in range(20):
+            await asyncio.sleep(0.002)
+            emergencies.append(asyncio.ensure_future(scheduler.submit("septic shock")))
+        routine_results = await asyncio.gather(*bulk)
+        emergency_results = await asyncio.gather(*emergencies)
+        await scheduler.stop()
+        return routine_results, emergency_results
+
+    routine_results, emergency_results = run(scenario())
+    routine = sorted(r["latency_ms"] for r in routine_results)
+    emergency = sorted(r["latency_ms"] for r in emergency_results)
+    # Emergencies wait at most one in-flight routine batch plus their own
+    assert emergency[-1] < routine[len(routine) // 2]
@@ -0,0 +1,60 @@
+import base64
+
+import msgpack
+import numpy as np
+import orjson
+
+from serialization import (
+    MsgpackResponse,
+    ORJSONResponse,
+    _synthetic_batch,
+    negotiate,
+    pack_batch_compact,
+    unpack_probabilities,
+)
+
+
+def test_negotiate_prefers_msgpack():
+    assert negotiate("application/msgpack, application/json;q=0.5") == "msgpack"
+    assert negotiate("application/x-msgpack") == "msgpack"
+
+
+def test_negotiate_json_and_default():
+    assert negotiate("application/json") == "orjson"
+    assert negotiate("*/*") is None
+    assert negotiate(None) is None
+
+
+def test_negotiate_honors_q_values():
+    assert negotiate("application/json, application/msgpack;q=0.1") == "orjson"
+    assert negotiate("application/msgpack;q=0, application/json;q=0.2") == "orjson"
+    assert negotiate("application/msgpack;q=0") is None
+    assert negotiate("text/html, application/msgpack; q=0.8, application/json;q=0.5") == "msgpack"
+    # Equal q: the first listed wins
+    assert negotiate("application/json;q=0.5, application/x-msgpack;q=0.5") == "orjson"
+    # Substrings of other media types don't count
+    assert negotiate("application/jsonl, application/msgpack-ish") is None
+    assert negotiate("application/msgpack;q=oops, application/json;q=0.3") == "orjson"
+
+
+def test_pack_batch_compact_roundtrip_binary():
+    results = _synthetic_batch(10)
+    compact = pack_batch_compact(results, binary=True)
+    assert isinstance(compact["probabilities"], bytes)
+    assert len(compact["probabilities"]) == 10 * 7 * 2
+    probabilities = unpack_probabilities(compact)
+    expected = np.array([row["probabilities"] for row in results])
+    assert np.allclose(probabilities, expected, atol=1e-3)
+    assert compact["intents"] == [row["intent"] for row in results]
+
+
+def test_pack_batch_compact_base64_for_json():
+    compact = pack_batch_compact(_synthetic_batch(3), binary=False)
+    base64.b64decode(compact["probabilities"])
+    assert unpack_probabilities(compact).shape == (3, 7)
+
+
+def test_responses_decode():
+    content = {"results": _synthetic_batch(2), "batch_size": 2}
+    assert msgpack.unpackb(MsgpackResponse(content).body) == content
+    assert orjson.loads(ORJSONResponse(content).body) == content
@@ -0,0 +1,118 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+from load_test import SyntheticTexts, replay_schedule
+from trace_recorder import TraceRecorder, process_trace_path, read_trace, read_traces
+
+PHI = "John Smith MRN 12345 crushing chest pain"
+
+
+def record_requests(path, tokenizer, calls):
+    recorder = TraceRecorder(str(path), tokenizer_provider=lambda: tokenizer, salt="test-salt")
+    recorder.start()
+    for endpoint, texts, timeout_ms in calls:
+        recorder.record(endpoint, texts, timeout_ms)
+    recorder.stop()
+    return recorder
+
+
+def test_trace_has_lengths_and_hashes_but_no_text(tmp_path, tiny_model):
+    path = tmp_path / "requests.trace.jsonl"
+    record_requests(path, tiny_model.tokenizer, [
+        ("predict", [PHI], "5000"),
+        ("batch-predict", [PHI, "show sepsis protocol"], None),
+    ])
+
+    raw = path.read_text()
+    assert "Smith" not in raw and "12345" not in raw
+    header, first, second = list(read_trace(str(path)))
+    assert header["v"] == 1
+    assert first["e"] == "p" and first["d"] == 5000
+    assert first["n"] == [len(tiny_model.tokenizer(PHI)["input_ids"])]
+    assert first["c"] == [len(PHI)]
+    assert second["e"] == "b" and "d" not in second
+    # Same text, same hash within a trace
+    assert second["h"][0] == first["h"][0] != second["h"][1]
+
+
+def test_hashes_depend_on_salt(tmp_path):
+    a = TraceRecorder(str(tmp_path / "a"), salt="one")
+    b = TraceRecorder(str(tmp_path / "b"), salt="two")
+    assert a.text_hash(PHI) != b.text_hash(PHI)
+
+
+def test_worker_traces_get_their_own_files_and_merge_in_time_order(tmp_path, monkeypatch):
+    base = str(tmp_path / "requests.trace.jsonl")
+    assert process_trace_path(base, 4242) == str(tmp_path / "requests.trace.4242.jsonl")
+
+    # Two workers: same configured path, their own files, one shared salt
+    recorders = []
+    for pid in (101, 102):
+        monkeypatch.setattr("os.getpid", lambda pid=pid: pid)
+        recorder = TraceRecorder(base, salt="shared", per_process=True)
+        recorder.start()
+        recorders.append(recorder)
+    first, second = recorders
+    assert first.path != second.path and not (tmp_path / "requests.trace.jsonl").exists()
+
+    for recorder, endpoint, texts in [
+        (first, "predict", [PHI]),
+        (second, "batch-predict", [PHI, "show sepsis protocol"]),
+        (first, "predict", ["show sepsis protocol"]),
+    ]:
+        recorder.record(endpoint, texts)
+        time.sleep(0.005)
+    for recorder in recorders:
+        recorder.stop()
+
+    [header, *records] = read_traces([first.path, second.path])
+    assert header["pid"] == [101, 102]
+    assert [r["e"] for r in records] == ["p", "b", "p"]
+    assert [r["t"] for r in records] == sorted(r["t"] for r in records)
+    # Same salt, so a text hashes alike in both workers' files
+    assert records[1]["h"] == [records[0]["h"][0], records[2]["h"][0]]
+
+
+def test_app_records_arrivals(tmp_path, tiny_model, monkeypatch):
+    path = tmp_path / "app.trace.jsonl"
+    recorder = TraceRecorder(str(path), tokenizer_provider=lambda: tiny_model.tokenizer)
+    recorder.start()
+    monkeypatch.setattr(app_module, "nlu_model", tiny_model)
+    monkeypatch.setattr(app_module, "trace_recorder", recorder)
+    client = TestClient(app_module.app)
+    client.post("/predict", json={"text": PHI}, headers={"X-Request-Timeout-Ms": "2000"})
+    client.post("/batch-predict", json={"texts": ["a", "b", "c"]})
+    recorder.stop()
+
+    records = list(read_trace(str(path)))[1:]
+    assert [r["e"] for r in records] == ["p", "b"]
+    assert records[0]["d"] == 2000
+    assert len(records[1]["h"]) == 3
+    assert records[0]["t"] <= records[1]["t"]
+
+
+@pytest.mark.parametrize("num_tokens", [3, 10, 57, 512])
+def test_synthetic_texts_match_token_length(tiny_model, num_tokens):
+    synthetic = SyntheticTexts(tiny_model.tokenizer, seed=num_tokens)
+    text = synthetic.text(num_tokens)
+    assert len(tiny_model.tokenizer(text)["input_ids"]) == num_tokens
+
+
+def test_replay_schedule_scales_time_and_repeats_texts(tiny_model):
+    records = [
+        {"t": 0.0, "e": "p", "n": [12], "c": [40], "h": ["aa"], "d": 3000.0},
+        {"t": 1000.0, "e": "b", "n": [8, -1], "c": [20, 40], "h": ["bb", "aa"]},
+        {"t": 5000.0, "e": "p", "n": [5], "c": [10], "h": ["cc"]},
+    ]
+    synthetic = SyntheticTexts(tiny_model.tokenizer)
+    schedule = replay_schedule(records, synthetic, speed=10.0, max_duration_s=2.0)
+
+    assert [offset for offset, _ in schedule] == [0.0, 0.1]
+    first, second = schedule[0][1], schedule[1][1]
+    assert first.path == "/predict" and first.headers == {"X-Request-Timeout-Ms": "3000"}
+    assert second.path == "/batch-predict"
+    # Hash "aa" appears twice and replays as the same text
+    assert second.payload["texts"][1] == first.payload["text"]
@@ -0,0 +1,28 @@
+from transformers import DataCollatorWithPadding
+
+from train import preprocess_function, throughput_report
+
+
+def test_preprocess_leaves_padding_to_the_collator(tiny_model):
+    tokenizer = tiny_model.tokenizer
+    features = preprocess_function({"text": ["hi", "Severe chest pain and shortness of breath"]}, tokenizer)
+    lengths = [len(ids) for ids in features["input_ids"]]
+    assert lengths[0] < lengths[1] < 512
+
+    batch = DataCollatorWithPadding(tokenizer)(
+        [{"input_ids": ids, "label": 0} for ids in features["input_ids"]]
+    )
+    assert batch["input_ids"].shape == (2, lengths[1])
+
+
+def test_throughput_report_aggregates_processes():
+    report = throughput_report([
+        {"rank": 1, "samples": 100, "tokens": 1000, "padded_tokens": 1600, "seconds": 2.0},
+        {"rank": 0, "samples": 100, "tokens": 1200, "padded_tokens": 1600, "seconds": 1.0},
+    ])
+    assert report["world_size"] == 2
+    assert report["samples_per_second"] == 100.0
+    assert report["tokens_per_second"] == 1100.0
+    assert [p["rank"] for p in report["processes"]] == [0, 1]
+    assert report["processes"][0]["samples_per_second"] == 100.0
+    assert report["processes"][1]["padding_waste"] == 0.375
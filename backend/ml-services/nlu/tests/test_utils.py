@@ -1,4 +1,16 @@
-from utils import hash_text, truncate_text, split_into_chunks, normalize_text
+import base64
+
+import numpy as np
+import pytest
+
+from utils import (
+    encode_array_b64,
+    hash_text,
+    normalize_text,
+    quantize_embeddings,
+    split_into_chunks,
+    truncate_text,
+)
 
 
 def test_hash_text_stable():
@@ -19,3 +31,29 @@ def test_split_into_chunks():
 def test_normalize_text():
     text = "  hello   world  "
     assert normalize_text(text) == "hello world"
+
+
+def test_quantize_embeddings_float16():
+    embeddings = np.random.default_rng(0).normal(size=(4, 8)).astype(np.float32)
+    quantized, scales = quantize_embeddings(embeddings, "float16")
+    assert quantized.dtype == np.float16
+    assert scales is None
+
+
+def test_quantize_embeddings_int8_roundtrip():
+    embeddings = np.random.default_rng(0).normal(size=(4, 8)).astype(np.float32)
+    quantized, scales = quantize_embeddings(embeddings, "int8")
+    assert quantized.dtype == np.int8
+    restored = quantized.astype(np.float32) * scales[:, None]
+    assert np.allclose(restored, embeddings, atol=scales.max())
+
+
+def test_quantize_embeddings_rejects_unknown_dtype():
+    with pytest.raises(ValueError):
+        quantize_embeddings(np.zeros((1, 4)), "bfloat16")
+
+
+def test_encode_array_b64_roundtrip():
+    row = np.arange(6, dtype=np.float16)
+    decoded = np.frombuffer(base64.b64decode(encode_array_b64(row)), dtype="<f2")
+    assert np.array_equal(decoded, row)
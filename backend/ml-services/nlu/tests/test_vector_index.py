@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from vector_index import IVFPQIndex, load_labeled_examples
+
+
+def _clustered(num_vectors, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(7, dim))
+    labels = rng.integers(7, size=num_vectors)
+    vectors = centers[labels] + 0.1 * rng.normal(size=(num_vectors, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32), labels.tolist()
+
+
+def test_search_finds_exact_duplicate():
+    vectors, labels = _clustered(500)
+    index = IVFPQIndex(dim=32, nlist=8, num_subquantizers=8)
+    index.train(vectors)
+    index.add(vectors, labels, [str(i) for i in range(len(vectors))])
+
+    similarities, ids = index.search(vectors[:20], k=5, nprobe=8)
+    found = [labels[i] == index.label(ids[i, 0]) for i in range(20)]
+    assert all(found)
+    assert (similarities[:, 0] > 0.9).all()
+
+
+def test_recall_against_exact_search():
+    vectors, labels = _clustered(1000, seed=1)
+    queries, _ = _clustered(50, seed=2)
+    index = IVFPQIndex(dim=32, nlist=16, num_subquantizers=8)
+    index.train(vectors)
+    index.add(vectors, labels, [""] * len(vectors))
+
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :10]
+    _, ids = index.search(queries, k=10, nprobe=16)
+    recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(ids.tolist(), exact.tolist())])
+    assert recall > 0.3
+
+
+def test_save_load_and_incremental_add(tmp_path):
+    vectors, labels = _clustered(100)
+    index = IVFPQIndex(dim=32, nlist=4, num_subquantizers=4)
+    index.train(vectors)
+    index.add(vectors[:60], labels[:60], [f"t{i}" for i in range(60)])
+    index.save(str(tmp_path))
+
+    reopened = IVFPQIndex.load(str(tmp_path))
+    assert isinstance(reopened._codes, np.memmap)
+    assert reopened.count == 60
+    reopened.add(vectors[60:], labels[60:], [f"t{i}" for i in range(60, 100)])
+
+    again = IVFPQIndex.load(str(tmp_path))
+    assert again.count == 100
+    assert again.texts[99] == "t99"
+    _, ids = again.search(vectors[99], k=1, nprobe=4)
+    assert again.label(ids[0, 0]) == labels[99]
+
+
+def test_inverted_lists_follow_adds_and_reloads(tmp_path):
+    vectors, labels = _clustered(200)
+    index = IVFPQIndex(dim=32, nlist=8, num_subquantizers=4)
+    index.train(vectors)
+    index.add(vectors[:120], labels[:120], [""] * 120)
+    index.save(str(tmp_path))
+    index.add(vectors[120:], labels[120:], [""] * 80)
+
+    for opened in (index, IVFPQIndex.load(str(tmp_path))):
+        assign = np.asarray(opened._assign[: opened.count])
+        assert len(opened._lists) == opened.nlist
+        for c, ids in enumerate(opened._lists):
+            assert ids.tolist() == np.flatnonzero(assign == c).tolist()
+
+    # With one probe, every result comes from the query's nearest list
+    query = vectors[150]
+    nearest = int(np.argmin(((index.centroids - query) ** 2).sum(axis=1)))
+    _, ids = index.search(query, k=5, nprobe=1)
+    assert set(ids[0][ids[0] >= 0].tolist()) <= set(index._lists[nearest].tolist())
+
+
+def test_add_requires_training():
+    index = IVFPQIndex(dim=8, num_subquantizers=2)
+    with pytest.raises(ValueError):
+        index.add(np.zeros((1, 8)), [0], ["x"])
+
+
+def test_load_labeled_examples_reads_training_split_and_distillation_exports(tmp_path):
+    data_dir = tmp_path / "data"
+    distillation_dir = tmp_path / "distillation"
+    data_dir.mkdir()
+    distillation_dir.mkdir()
+    (data_dir / "train.jsonl").write_text('{"text": "Show sepsis protocol", "intent": "protocol_search"}\n')
+    # Held-out splits stay out of the index
+    for split in ("val", "test"):
+        (data_dir / f"{split}.jsonl").write_text('{"text": "Reset my password", "intent": "admin_function"}\n')
+    (distillation_dir / "training_dataset_1.jsonl").write_text(
+        '{"query": "Crushing chest pain", "final_intent": "emergency"}\n'
+        '{"query": "Show sepsis protocol", "final_intent": "protocol_search"}'
+    )
+
+    texts, labels = load_labeled_examples(str(data_dir / "train.jsonl"), str(distillation_dir))
+    assert texts == ["Show sepsis protocol", "Crushing chest pain"]
+    assert labels == [3, 0]
@@ -0,0 +1,237 @@
+"""
+Request Trace Recorder
+Writes a compact, PHI-free trace of request arrivals (time, endpoint, token
+lengths, salted text hashes) for offline replay by load_test_runner.py
+
+No text is ever written: each text becomes its token count, character count
+and a truncated HMAC-SHA256 under a secret salt. The hash only lets a replay
+tell repeated texts apart; without the salt it cannot be matched against
+guessed inputs, and with a random per-process salt not even across traces.
+
+The service writes one file per process (PID before the extension), so
+uvicorn workers never share a file, and read_traces() merges them on
+wall-clock time; workers need a shared NLU_TRACE_SALT for their hashes to
+match.
+"""
+
+import copy
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+from config import MODEL_CONFIG, TRACE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Bump when record fields change meaning
+TRACE_FORMAT_VERSION = 1
+
+# Short endpoint codes keep records small
+ENDPOINT_CODES = {"predict": "p", "batch-predict": "b"}
+ENDPOINT_NAMES = {code: name for name, code in ENDPOINT_CODES.items()}
+
+
+class TraceRecorder:
+    """
+    Background writer for request traces
+
+    `record()` is called on the request path and only timestamps the call
+    and enqueues it; tokenizing, hashing and file I/O happen on a writer
+    thread. When the queue is full the record is dropped and counted rather
+    than slowing requests down.
+
+    Trace file (JSON lines): one header, then one record per request:
+        {"v": 1, "start_epoch_ms": ..., "salt_id": "...", "pid": ...}
+        {"t": 12.5, "e": "p", "n": [14], "c": [52], "h": ["9f3a..."], "d": 5000}
+    t = ms since trace start (start_epoch_ms + t is wall-clock time), e = endpoint code, n = token counts (-1 when
+    no tokenizer was available), c = character counts, h = text hashes,
+    d = X-Request-Timeout-Ms when the caller sent one.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        tokenizer_provider: Optional[Callable[[], object]] = None,
+        salt: Optional[str] = None,
+        sample_rate: Optional[float] = None,
+        max_records: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        hash_bytes: int = 8,
+        per_process: bool = False,
+    ):
+        """
+        Args:
+            per_process: Write to process_trace_path(path) so that several
+                worker processes never share (and truncate) one file
+        """
+        self.path = path or TRACE_CONFIG["path"]
+        if per_process:
+            self.path = process_trace_path(self.path)
+        self.tokenizer_provider = tokenizer_provider
+        salt = salt if salt is not None else TRACE_CONFIG["salt"]
+        self._salt = (salt or secrets.token_hex(32)).encode()
+        self.sample_rate = TRACE_CONFIG["sample_rate"] if sample_rate is None else sample_rate
+        self.max_records = max_records or TRACE_CONFIG["max_records"]
+        self.hash_bytes = hash_bytes
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size or TRACE_CONFIG["queue_size"])
+        self._thread: Optional[threading.Thread] = None
+        self._tokenizer = None
+        self._start = time.monotonic()
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "sampled_out": 0}
+
+    def start(self) -> None:
+        """Write the header and start the writer thread"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._start = time.monotonic()
+        header = {
+            "v": TRACE_FORMAT_VERSION,
+            # Sub-millisecond, so per-worker traces merge in arrival order
+            "start_epoch_ms": round(time.time() * 1000, 3),
+            # Identifies the salt (so traces hashed with the same one can be joined) without revealing it
+            "salt_id": hashlib.sha256(self._salt).hexdigest()[:8],
+            "max_length": MODEL_CONFIG["max_length"],
+            "pid": os.getpid(),
+        }
+        self._file = open(self.path, "w")
+        self._file.write(json.dumps(header, separators=(",", ":")) + "\n")
+        self._thread = threading.Thread(target=self._run, name="trace-recorder", daemon=True)
+        self._thread.start()
+        logger.info(f"Recording request trace to {self.path}")
+
+    def stop(self) -> None:
+        """Flush queued records and close the file"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+        logger.info(f"Request trace closed ({self.stats})")
+
+    def record(self, endpoint: str, texts: List[str], timeout_ms: Optional[str] = None) -> None:
+        """Enqueue one request arrival; never blocks"""
+        if self._thread is None:
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.stats["sampled_out"] += 1
+            return
+        arrival_ms = (time.monotonic() - self._start) * 1000
+        try:
+            self._queue.put_nowait((arrival_ms, endpoint, texts, timeout_ms))
+            self.stats["recorded"] += 1
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def text_hash(self, text: str) -> str:
+        digest = hmac.new(self._salt, text.encode("utf-8"), hashlib.sha256).digest()
+        return digest[: self.hash_bytes].hex()
+
+    def _token_counts(self, texts: List[str]) -> List[int]:
+        if self._tokenizer is None and self.tokenizer_provider is not None:
+            tokenizer = self.tokenizer_provider()
+            # Private copy: fast tokenizers are not safe to call from two threads
+            self._tokenizer = copy.deepcopy(tokenizer) if tokenizer is not None else None
+        if self._tokenizer is None:
+            return [-1] * len(texts)
+        encodings = self._tokenizer(texts, max_length=MODEL_CONFIG["max_length"], truncation=True)
+        return [len(ids) for ids in encodings["input_ids"]]
+
+    def _to_record(self, arrival_ms: float, endpoint: str, texts: List[str], timeout_ms: Optional[str]) -> Dict:
+        record = {
+            "t": round(arrival_ms, 3),
+            "e": ENDPOINT_CODES.get(endpoint, endpoint),
+            "n": self._token_counts(texts),
+            "c": [len(text) for text in texts],
+            "h": [self.text_hash(text) for text in texts],
+        }
+        if timeout_ms is not None:
+            try:
+                record["d"] = float(timeout_ms)
+            except ValueError:
+                pass
+        return record
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.stats["written"] >= self.max_records:
+                self.stats["dropped"] += 1
+                continue
+            try:
+                record = self._to_record(*item)
+            except Exception as e:
+                logger.warning(f"Trace record skipped: {e}")
+                continue
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self.stats["written"] += 1
+            if self._queue.empty():
+                self._file.flush()
+
+    def get_stats(self) -> Dict:
+        return {"path": self.path, "queue_depth": self._queue.qsize(), **self.stats}
+
+
+def process_trace_path(path: str, pid: Optional[int] = None) -> str:
+    """`path` with a process id before the extension, e.g. requests.trace.4242.jsonl"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid() if pid is None else pid}{ext}"
+
+
+def read_trace(path: str) -> Iterator[Dict]:
+    """
+    Yield the header and then every record of a trace file
+
+    Raises:
+        ValueError: If the file is not a trace of a supported version
+    """
+    with open(path) as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("v") != TRACE_FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {TRACE_FORMAT_VERSION} request trace")
+        yield header
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_traces(paths: List[str]) -> Iterator[Dict]:
+    """
+    Yield a merged header and then every record of one or more trace files
+
+    Per-worker traces are interleaved on wall-clock time (start_epoch_ms +
+    t), re-based to the earliest start. A single path reads like read_trace.
+
+    Raises:
+        ValueError: If a file is not a trace of a supported version
+    """
+    if len(paths) == 1:
+        yield from read_trace(paths[0])
+        return
+
+    headers, records = [], []
+    for path in paths:
+        trace = read_trace(path)
+        header = next(trace)
+        headers.append(header)
+        records.extend((header["start_epoch_ms"] + record["t"], record) for record in trace)
+
+    if len({header["salt_id"] for header in headers}) > 1:
+        logger.warning("Traces were hashed with different salts; repeated texts only match within a file")
+    start_epoch_ms = min(header["start_epoch_ms"] for header in headers)
+    records.sort(key=lambda item: item[0])
+
+    yield {**headers[0], "start_epoch_ms": start_epoch_ms, "pid": [header.get("pid") for header in headers]}
+    for epoch_ms, record in records:
+        yield {**record, "t": round(epoch_ms - start_epoch_ms, 3)}
@@ -1,27 +1,43 @@
 """
 Training script for NLU model
 Fine-tunes BERT on clinical intent classification dataset
+
+Usage:
+    python train.py                 # single process
+    python train.py --nproc 4       # CPU data-parallel (torch DDP, gloo backend)
+    python train.py --streaming     # tokenize the training split on the fly
+    torchrun --nproc_per_node 4 train.py
 """
 
+import argparse
 import json
 import logging
 import os
+import time
 from pathlib import Path
 from typing import Dict, List, Tuple
 
 import numpy as np
 import torch
+import torch.distributed as dist
 from datasets import Dataset
 from sklearn.model_selection import train_test_split
-from torch.utils.data import DataLoader
-from transformers import AutoModelForSequenceClassification, AutoTokenizer, Trainer, TrainingArguments
+from transformers import (
+    AutoModelForSequenceClassification,
+    AutoTokenizer,
+    DataCollatorWithPadding,
+    Trainer,
+    TrainingArguments,
+)
 
 from config import (
+    DATA_CACHE_CONFIG,
     INTENT_LABELS,
     MODEL_CONFIG,
     MODEL_PATHS,
     TRAINING_CONFIG,
 )
+from dataset_cache import count_lines, load_or_build, stream_tokenized
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -81,19 +97,127 @@ def prepare_dataset() -> Tuple[Dataset, Dataset, Dataset]:
 
 
 def preprocess_function(examples, tokenizer):
-    """Tokenize texts"""
+    """Tokenize texts (unpadded; DataCollatorWithPadding pads each batch)"""
     return tokenizer(
         examples["text"],
-        padding="max_length",
         max_length=MODEL_CONFIG["max_length"],
         truncation=True,
     )
 
 
-def train():
-    """Train the NLU model"""
+def tokenize_datasets(tokenizer, streaming: bool = False) -> Tuple[Dataset, Dataset, Dataset]:
+    """
+    Tokenized (unpadded) train/val/test splits
+    
+    With the dataset cache enabled and all three split files present, splits
+    come from the memory-mapped cache (built on first use); with `streaming`
+    the training split is tokenized lazily instead. Otherwise falls back to
+    prepare_dataset() and an in-memory Dataset.map.
+    """
+    split_files = [
+        MODEL_PATHS["training_data"], MODEL_PATHS["validation_data"], MODEL_PATHS["test_data"]
+    ]
+    if DATA_CACHE_CONFIG["enabled"] and all(os.path.exists(f) for f in split_files):
+        train_file, val_file, test_file = split_files
+        if streaming:
+            train_dataset = stream_tokenized(train_file, tokenizer)
+        else:
+            train_dataset = load_or_build(train_file, tokenizer)
+        return train_dataset, load_or_build(val_file, tokenizer), load_or_build(test_file, tokenizer)
+    
+    if streaming:
+        raise ValueError("Streaming needs the dataset cache enabled and train/val/test files")
+    
+    train_dataset, val_dataset, test_dataset = prepare_dataset()
+    
+    # Tokenize datasets
+    logger.info("Tokenizing datasets...")
+    return tuple(
+        dataset.map(
+            lambda x: preprocess_function(x, tokenizer),
+            batched=True,
+            remove_columns=["text"],
+        )
+        for dataset in (train_dataset, val_dataset, test_dataset)
+    )
+
+
+def streaming_max_steps(world_size: int) -> int:
+    """Optimizer steps for a streamed training split (it has no length)"""
+    examples = count_lines(MODEL_PATHS["training_data"])
+    per_step = TRAINING_CONFIG["batch_size"] * TRAINING_CONFIG["gradient_accumulation_steps"] * world_size
+    return max(1, -(-examples // per_step)) * TRAINING_CONFIG["num_epochs"]
+
+
+class ThroughputTrainer(Trainer):
+    """Trainer that counts the samples and tokens this process trains on"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.throughput = {"samples": 0, "tokens": 0, "padded_tokens": 0}
+
+    def training_step(self, model, inputs, *args, **kwargs):
+        attention_mask = inputs["attention_mask"]
+        self.throughput["samples"] += attention_mask.shape[0]
+        self.throughput["tokens"] += int(attention_mask.sum())
+        self.throughput["padded_tokens"] += attention_mask.numel()
+        return super().training_step(model, inputs, *args, **kwargs)
+
+
+def throughput_report(per_process: List[Dict]) -> Dict:
+    """
+    Summarize per-process training throughput
+    
+    Aggregate rates use the slowest process's wall-clock time, since DDP
+    ranks synchronize every step.
+    
+    Args:
+        per_process: One {"rank", "samples", "tokens", "padded_tokens",
+            "seconds"} dict per process (seconds = time in trainer.train())
+        
+    Returns:
+        Report with per-process and aggregate samples/s and tokens/s
+    """
+    processes = []
+    for stats in sorted(per_process, key=lambda s: s["rank"]):
+        seconds = stats["seconds"] or 1e-9
+        processes.append({
+            **stats,
+            "samples_per_second": round(stats["samples"] / seconds, 2),
+            "tokens_per_second": round(stats["tokens"] / seconds, 2),
+            "padding_waste": (
+                round(1 - stats["tokens"] / stats["padded_tokens"], 4)
+                if stats["padded_tokens"] else 0.0
+            ),
+        })
+    total_samples = sum(p["samples"] for p in processes)
+    total_tokens = sum(p["tokens"] for p in processes)
+    wall_seconds = max((p["seconds"] for p in processes), default=0.0)
+    return {
+        "world_size": len(processes),
+        "train_seconds": round(wall_seconds, 2),
+        "samples_per_second": round(total_samples / wall_seconds, 2) if wall_seconds else 0.0,
+        "tokens_per_second": round(total_tokens / wall_seconds, 2) if wall_seconds else 0.0,
+        "gradient_accumulation_steps": TRAINING_CONFIG["gradient_accumulation_steps"],
+        "per_device_batch_size": TRAINING_CONFIG["batch_size"],
+        "processes": processes,
+    }
+
+
+def train(streaming: bool = False):
+    """
+    Train the NLU model (one process, or one DDP rank under torchrun)
+    
+    Args:
+        streaming: Tokenize the training split on the fly instead of caching it
+    """
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    logger.info(f"Using device: {device}")
+    world_size = int(os.environ.get("WORLD_SIZE", "1"))
+    rank = int(os.environ.get("RANK", "0"))
+    if device.type == "cpu" and world_size > 1:
+        # Split cores between ranks instead of every rank using all of them
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    logger.info(f"Using device: {device} (rank {rank}/{world_size})")
     
     # Load tokenizer and model
     logger.info(f"Loading pretrained model: {MODEL_CONFIG['model_name']}")
@@ -103,31 +227,12 @@ def train():
         num_labels=MODEL_CONFIG["num_labels"],
     )
     
-    # Prepare datasets
-    train_dataset, val_dataset, test_dataset = prepare_dataset()
-    
-    # Tokenize datasets
-    logger.info("Tokenizing datasets...")
-    train_dataset = train_dataset.map(
-        lambda x: preprocess_function(x, tokenizer),
-        batched=True,
-        remove_columns=["text"],
-    )
-    val_dataset = val_dataset.map(
-        lambda x: preprocess_function(x, tokenizer),
-        batched=True,
-        remove_columns=["text"],
-    )
-    test_dataset = test_dataset.map(
-        lambda x: preprocess_function(x, tokenizer),
-        batched=True,
-        remove_columns=["text"],
-    )
+    # Pads each batch to its longest sequence instead of max_length
+    data_collator = DataCollatorWithPadding(tokenizer, pad_to_multiple_of=8)
     
-    # Set format to PyTorch
-    train_dataset.set_format("torch")
-    val_dataset.set_format("torch")
-    test_dataset.set_format("torch")
+    fp16 = TRAINING_CONFIG["use_amp"] and device.type == "cuda"
+    bf16 = TRAINING_CONFIG["cpu_bf16"] and device.type == "cpu"
+    logger.info(f"Mixed precision: {'fp16' if fp16 else 'bf16' if bf16 else 'off (fp32)'}")
     
     # Training arguments
     training_args = TrainingArguments(
@@ -135,6 +240,11 @@ def train():
         num_train_epochs=TRAINING_CONFIG["num_epochs"],
         per_device_train_batch_size=TRAINING_CONFIG["batch_size"],
         per_device_eval_batch_size=TRAINING_CONFIG["batch_size"],
+        gradient_accumulation_steps=TRAINING_CONFIG["gradient_accumulation_steps"],
+        fp16=fp16,
+        bf16=bf16,
+        dataloader_num_workers=TRAINING_CONFIG["num_workers"],
+        ddp_backend="gloo" if device.type == "cpu" and world_size > 1 else None,
         learning_rate=TRAINING_CONFIG["learning_rate"],
         warmup_steps=TRAINING_CONFIG["warmup_steps"],
         weight_decay=TRAINING_CONFIG["weight_decay"],
@@ -145,38 +255,99 @@ def train():
         load_best_model_at_end=True,
         seed=TRAINING_CONFIG["seed"],
         push_to_hub=False,
+        max_steps=streaming_max_steps(world_size) if streaming else -1,
     )
     
+    # Rank 0 builds any missing cache entries; the other ranks then hit the cache
+    with training_args.main_process_first(desc="tokenized dataset cache"):
+        train_dataset, val_dataset, test_dataset = tokenize_datasets(tokenizer, streaming)
+    
     # Create trainer
-    trainer = Trainer(
+    trainer = ThroughputTrainer(
         model=model,
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=val_dataset,
+        data_collator=data_collator,
     )
     
     # Train
     logger.info("Starting training...")
+    start_time = time.perf_counter()
     trainer.train()
+    train_seconds = time.perf_counter() - start_time
+    
+    # Gather per-process throughput on every rank (collective), report on rank 0
+    local_stats = {"rank": rank, **trainer.throughput, "seconds": round(train_seconds, 3)}
+    if dist.is_available() and dist.is_initialized():
+        per_process = [None] * dist.get_world_size()
+        dist.all_gather_object(per_process, local_stats)
+    else:
+        per_process = [local_stats]
     
     # Save model
     logger.info(f"Saving model to {MODEL_PATHS['best_model_dir']}")
     model_dir = Path(MODEL_PATHS["best_model_dir"]).resolve()
     model_dir.mkdir(parents=True, exist_ok=True)
     trainer.save_model(str(model_dir))
-    tokenizer.save_pretrained(str(model_dir))
+    if trainer.is_world_process_zero():
+        tokenizer.save_pretrained(str(model_dir))
     
     # Evaluate
     logger.info("Evaluating on test set...")
     test_results = trainer.evaluate(test_dataset)
     logger.info(f"Test results: {test_results}")
     
-    # Save metrics
-    with open(MODEL_PATHS["metrics_output"], "w") as f:
-        json.dump(test_results, f, indent=2)
+    if trainer.is_world_process_zero():
+        # Save metrics
+        with open(MODEL_PATHS["metrics_output"], "w") as f:
+            json.dump(test_results, f, indent=2)
+        
+        report = throughput_report(per_process)
+        with open(MODEL_PATHS["throughput_output"], "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(
+            f"Throughput: {report['samples_per_second']} samples/s, "
+            f"{report['tokens_per_second']} tokens/s across {report['world_size']} process(es)"
+        )
     
     logger.info("Training completed!")
 
 
+def launch(num_processes: int, extra_args: List[str]) -> None:
+    """Re-run this script under torch.distributed.run with one rank per process"""
+    from torch.distributed.run import main as torchrun
+    
+    logger.info(f"Launching {num_processes} data-parallel training processes (gloo)")
+    torchrun([
+        "--standalone",
+        f"--nproc_per_node={num_processes}",
+        os.path.abspath(__file__),
+        *extra_args,
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fine-tune the NLU intent classifier")
+    parser.add_argument(
+        "--nproc",
+        type=int,
+        default=TRAINING_CONFIG["num_processes"],
+        help="Data-parallel CPU processes (torch DDP with gloo)",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Tokenize the training split while iterating (for data larger than RAM)",
+    )
+    args = parser.parse_args()
+    
+    # Under torchrun every rank runs train() directly
+    if args.nproc > 1 and "LOCAL_RANK" not in os.environ:
+        launch(args.nproc, ["--streaming"] if args.streaming else [])
+    else:
+        train(streaming=args.streaming)
+
+
 if __name__ == "__main__":
-    train()
+    main()
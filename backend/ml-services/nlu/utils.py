@@ -2,8 +2,13 @@
 Utility functions for NLU service
 """
 
+import base64
 import hashlib
-from typing import List
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
 
 
 def hash_text(text: str) -> str:
@@ -39,3 +44,34 @@ def normalize_text(text: str) -> str:
     # Remove extra whitespace
     text = " ".join(text.split())
     return text.strip()
+
+
+def quantize_embeddings(
+    embeddings: np.ndarray, dtype: str = "float32"
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Cast float32 embeddings to a compact wire dtype
+
+    int8 uses symmetric per-row quantization; the returned scales recover
+    the original values via ``q.astype(np.float32) * scales[:, None]``.
+    Returns (embeddings, scales) where scales is None for float dtypes.
+    """
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dtype == "float32":
+        return embeddings, None
+    if dtype == "float16":
+        return embeddings.astype(np.float16), None
+
+    scales = np.abs(embeddings).max(axis=1) / 127.0
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    quantized = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales
+
+
+def encode_array_b64(row: np.ndarray) -> str:
+    """Pack a numpy array into a base64 string of its raw little-endian bytes"""
+    row = np.ascontiguousarray(row, dtype=row.dtype.newbyteorder("<"))
+    return base64.b64encode(row.tobytes()).decode("ascii")
@@ -0,0 +1,478 @@
+"""
+Intent Retrieval Index
+IVF-PQ approximate nearest-neighbor index over encoder embeddings of
+labeled examples, persisted as memory-mapped files
+
+Usage:
+    python vector_index.py build
+    python vector_index.py benchmark --num-vectors 20000 --dim 768
+"""
+
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import INDEX_CONFIG, INTENT_LABELS, LABEL_TO_INTENT, MODEL_PATHS
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+CENTROIDS_FILE = "centroids.npy"
+CODEBOOKS_FILE = "codebooks.npy"
+CODES_FILE = "codes.u8"
+ASSIGN_FILE = "assign.i4"
+VECTORS_FILE = "vectors.f2"
+LABELS_FILE = "labels.i2"
+TEXTS_FILE = "texts.jsonl"
+
+
+def kmeans(
+    vectors: np.ndarray, k: int, iterations: int = 20, seed: int = 42
+) -> np.ndarray:
+    """Plain Lloyd's k-means returning (k, dim) float32 centroids"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = _nearest(vectors, centroids)
+        for c in range(k):
+            members = vectors[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                # Re-seed empty clusters on a random point
+                centroids[c] = vectors[rng.integers(len(vectors))]
+
+    return centroids.astype(np.float32)
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest centroid (squared L2) for every row"""
+    distances = (
+        (vectors ** 2).sum(axis=1, keepdims=True)
+        - 2 * vectors @ centroids.T
+        + (centroids ** 2).sum(axis=1)
+    )
+    return distances.argmin(axis=1)
+
+
+class IVFPQIndex:
+    """
+    Inverted-file index with product-quantized residuals
+
+    Vectors are assigned to one of `nlist` coarse centroids and the residual
+    is compressed to `num_subquantizers` uint8 codes. Search probes the
+    `nprobe` closest lists and ranks candidates with asymmetric distance
+    tables; the best `k * refine` candidates are then re-ranked exactly
+    against float16 copies of the vectors. Codes, list assignments, labels
+    and vectors live in growable memory-mapped files so the index can be
+    reopened without loading it into RAM and can accept new examples
+    incrementally. The ids of each list are kept in memory (rebuilt from
+    the assignments on load), so a search only touches its probed lists.
+
+    Embeddings are expected to be L2-normalized, so similarity = 1 - d / 2.
+    """
+
+    def __init__(self, dim: int, nlist: int = 16, num_subquantizers: int = 8):
+        if dim % num_subquantizers != 0:
+            raise ValueError(
+                f"dim ({dim}) must be divisible by num_subquantizers ({num_subquantizers})"
+            )
+        self.dim = dim
+        self.nlist = nlist
+        self.num_subquantizers = num_subquantizers
+        self.subdim = dim // num_subquantizers
+        self.centroids: Optional[np.ndarray] = None
+        self.codebooks: Optional[np.ndarray] = None
+        self.count = 0
+        self.texts: List[str] = []
+        self.path: Optional[Path] = None
+        self._codes = np.zeros((0, num_subquantizers), dtype=np.uint8)
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._labels = np.zeros(0, dtype=np.int16)
+        self._vectors = np.zeros((0, dim), dtype=np.float16)
+        # Ascending ids per coarse list
+        self._lists: List[np.ndarray] = []
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None and self.codebooks is not None
+
+    def train(self, vectors: np.ndarray) -> None:
+        """Fit coarse centroids and residual PQ codebooks"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.centroids = kmeans(vectors, self.nlist)
+        self.nlist = len(self.centroids)
+        self._build_lists()
+
+        residuals = vectors - self.centroids[_nearest(vectors, self.centroids)]
+        ksub = min(256, len(vectors))
+        self.codebooks = np.stack([
+            self._pad_codebook(kmeans(residuals[:, self._subspace(j)], ksub), ksub)
+            for j in range(self.num_subquantizers)
+        ])
+        logger.info(
+            f"Index trained on {len(vectors)} vectors "
+            f"(nlist={self.nlist}, m={self.num_subquantizers}, ksub={ksub})"
+        )
+
+    def add(self, vectors: np.ndarray, labels: List[int], texts: List[str]) -> None:
+        """Encode and append labeled vectors (persisted immediately if opened from disk)"""
+        if not self.is_trained:
+            raise ValueError("Index must be trained before adding vectors")
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        assign = _nearest(vectors, self.centroids).astype(np.int32)
+        codes = self._encode(vectors - self.centroids[assign])
+
+        start, end = self.count, self.count + len(vectors)
+        self._reserve(end)
+        self._codes[start:end] = codes
+        self._assign[start:end] = assign
+        self._labels[start:end] = np.asarray(labels, dtype=np.int16)
+        self._vectors[start:end] = vectors
+        self.count = end
+        self.texts.extend(texts)
+        for c, ids in enumerate(self._group_by_list(assign)):
+            if len(ids):
+                self._lists[c] = np.concatenate([self._lists[c], start + ids])
+
+        if self.path is not None:
+            self._flush(appended_texts=texts)
+
+    def search(
+        self, queries: np.ndarray, k: int = 5, nprobe: int = 4, refine: int = 4
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate k-NN search
+
+        Args:
+            queries: (num_queries, dim) or (dim,) L2-normalized vectors
+            k: Neighbors to return per query
+            nprobe: Coarse lists to scan per query
+            refine: Re-rank the best k * refine PQ candidates with exact
+                similarities (0 returns PQ similarities directly)
+
+        Returns:
+            (similarities, ids) each of shape (len(queries), k); missing
+            neighbors are reported with id -1 and similarity -inf
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        similarities = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        if self.count == 0:
+            return similarities, ids
+
+        codes = self._codes[: self.count]
+        coarse = (
+            (queries ** 2).sum(axis=1, keepdims=True)
+            - 2 * queries @ self.centroids.T
+            + (self.centroids ** 2).sum(axis=1)
+        )
+        probes = np.argsort(coarse, axis=1)[:, : min(nprobe, self.nlist)]
+
+        for qi, query in enumerate(queries):
+            candidate_ids, candidate_dist = [], []
+            for c in probes[qi]:
+                members = self._lists[c]
+                if not len(members):
+                    continue
+                tables = self._distance_tables(query - self.centroids[c])
+                dist = tables[np.arange(self.num_subquantizers), codes[members]].sum(axis=1)
+                candidate_ids.append(members)
+                candidate_dist.append(dist)
+
+            if not candidate_ids:
+                continue
+            members = np.concatenate(candidate_ids)
+            dist = np.concatenate(candidate_dist)
+            if refine > 0:
+                # Sorted ids keep reads from the memory-mapped vectors sequential
+                shortlist = np.sort(members[np.argsort(dist)[: k * refine]])
+                exact = self._vectors[shortlist].astype(np.float32) @ query
+                order = np.argsort(-exact)[:k]
+                similarities[qi, : len(order)] = exact[order]
+                ids[qi, : len(order)] = shortlist[order]
+            else:
+                top = np.argsort(dist)[:k]
+                similarities[qi, : len(top)] = 1.0 - dist[top] / 2.0
+                ids[qi, : len(top)] = members[top]
+
+        return similarities, ids
+
+    def label(self, idx: int) -> int:
+        return int(self._labels[idx])
+
+    def save(self, path: str) -> None:
+        """Write the index to a directory and reopen its arrays memory-mapped"""
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        np.save(self.path / CENTROIDS_FILE, self.centroids)
+        np.save(self.path / CODEBOOKS_FILE, self.codebooks)
+        with open(self.path / TEXTS_FILE, "w") as f:
+            for text in self.texts:
+                f.write(json.dumps(text) + "\n")
+
+        codes, assign, labels, vectors = (
+            self._codes[: self.count].copy(),
+            self._assign[: self.count].copy(),
+            self._labels[: self.count].copy(),
+            self._vectors[: self.count].copy(),
+        )
+        self._open_arrays(capacity=max(self.count, 1), mode="w+")
+        self._codes[: self.count] = codes
+        self._assign[: self.count] = assign
+        self._labels[: self.count] = labels
+        self._vectors[: self.count] = vectors
+        self._flush()
+
+    @classmethod
+    def load(cls, path: str) -> "IVFPQIndex":
+        """Open a saved index with memory-mapped code/label arrays"""
+        path = Path(path)
+        with open(path / META_FILE) as f:
+            meta = json.load(f)
+
+        index = cls(meta["dim"], meta["nlist"], meta["num_subquantizers"])
+        index.path = path
+        index.count = meta["count"]
+        index.centroids = np.load(path / CENTROIDS_FILE)
+        index.codebooks = np.load(path / CODEBOOKS_FILE)
+        with open(path / TEXTS_FILE) as f:
+            index.texts = [json.loads(line) for line in f if line.strip()]
+        index._open_arrays(capacity=meta["capacity"], mode="r+")
+        index._build_lists()
+        return index
+
+    def _build_lists(self) -> None:
+        self._lists = self._group_by_list(self._assign[: self.count])
+
+    def _group_by_list(self, assign: np.ndarray) -> List[np.ndarray]:
+        """Ascending positions in `assign` of each coarse list's members"""
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.cumsum(np.bincount(assign, minlength=self.nlist))[:-1]
+        return np.split(order, offsets)
+
+    def _subspace(self, j: int) -> slice:
+        return slice(j * self.subdim, (j + 1) * self.subdim)
+
+    @staticmethod
+    def _pad_codebook(codebook: np.ndarray, ksub: int) -> np.ndarray:
+        """Repeat the last centroid if k-means returned fewer than ksub rows"""
+        if len(codebook) < ksub:
+            codebook = np.vstack([codebook, np.repeat(codebook[-1:], ksub - len(codebook), axis=0)])
+        return codebook
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        return np.stack([
+            _nearest(residuals[:, self._subspace(j)], self.codebooks[j])
+            for j in range(self.num_subquantizers)
+        ], axis=1).astype(np.uint8)
+
+    def _distance_tables(self, residual: np.ndarray) -> np.ndarray:
+        """(m, ksub) squared distances from each query sub-vector to each codeword"""
+        sub = residual.reshape(self.num_subquantizers, 1, self.subdim)
+        return ((self.codebooks - sub) ** 2).sum(axis=2)
+
+    def _reserve(self, size: int) -> None:
+        """Grow backing arrays (doubling) so that `size` rows fit"""
+        capacity = len(self._codes)
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2, 64)
+        if self.path is not None:
+            self._flush()
+            self._open_arrays(capacity=new_capacity, mode="r+")
+        else:
+            self._codes = np.resize(self._codes, (new_capacity, self.num_subquantizers))
+            self._assign = np.resize(self._assign, new_capacity)
+            self._labels = np.resize(self._labels, new_capacity)
+            self._vectors = np.resize(self._vectors, (new_capacity, self.dim))
+
+    def _open_arrays(self, capacity: int, mode: str) -> None:
+        """(Re)open the memory-mapped arrays, extending the files to `capacity` rows"""
+        specs = [
+            ("_codes", CODES_FILE, np.uint8, (capacity, self.num_subquantizers)),
+            ("_assign", ASSIGN_FILE, np.int32, (capacity,)),
+            ("_labels", LABELS_FILE, np.int16, (capacity,)),
+            ("_vectors", VECTORS_FILE, np.float16, (capacity, self.dim)),
+        ]
+        for attr, filename, dtype, shape in specs:
+            filepath = self.path / filename
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            if mode == "r+" and filepath.stat().st_size < nbytes:
+                with open(filepath, "r+b") as f:
+                    f.truncate(nbytes)
+            setattr(self, attr, np.memmap(filepath, dtype=dtype, mode=mode, shape=shape))
+
+    def _flush(self, appended_texts: Optional[List[str]] = None) -> None:
+        for array in (self._codes, self._assign, self._labels, self._vectors):
+            if isinstance(array, np.memmap):
+                array.flush()
+        if appended_texts:
+            with open(self.path / TEXTS_FILE, "a") as f:
+                for text in appended_texts:
+                    f.write(json.dumps(text) + "\n")
+        meta = {
+            "dim": self.dim,
+            "nlist": self.nlist,
+            "num_subquantizers": self.num_subquantizers,
+            "count": self.count,
+            "capacity": len(self._codes),
+        }
+        with open(self.path / META_FILE, "w") as f:
+            json.dump(meta, f, indent=2)
+
+
+def load_labeled_examples(
+    training_data: Optional[str] = None, distillation_dir: Optional[str] = None
+) -> Tuple[List[str], List[int]]:
+    """
+    Collect (text, label) pairs from the training split and distillation exports
+
+    Validation and test splits are left out: indexed, /predict would answer
+    held-out texts from their own labels and inflate evaluate.py's numbers.
+    Distillation exports (training_dataset_*.jsonl) use `query`/`final_intent`.
+    """
+    training_data = Path(training_data or MODEL_PATHS["training_data"])
+    distillation_dir = Path(distillation_dir or INDEX_CONFIG["distillation_dir"])
+
+    texts, labels, seen = [], [], set()
+    files = [training_data] + sorted(distillation_dir.glob("training_dataset_*.jsonl"))
+    for filepath in files:
+        with open(filepath) as f:
+            for line in f:
+                stripped = line.strip()
+                if not stripped or stripped.startswith("#"):
+                    continue
+                record = json.loads(stripped)
+                text = record.get("text") or record.get("query")
+                intent = record.get("intent") or record.get("final_intent")
+                if not text or intent not in INTENT_LABELS or text in seen:
+                    continue
+                seen.add(text)
+                texts.append(text)
+                labels.append(INTENT_LABELS[intent])
+
+    return texts, labels
+
+
+def build_index(model, texts: List[str], labels: List[int]) -> IVFPQIndex:
+    """Embed labeled examples with the NLU encoder and build a trained index"""
+    embeddings = model.embed_batch(texts, dtype="float32", normalize=True)["embeddings"]
+    dim = embeddings.shape[1]
+    num_subquantizers = INDEX_CONFIG["num_subquantizers"]
+    while dim % num_subquantizers:
+        num_subquantizers -= 1
+
+    nlist = INDEX_CONFIG["nlist"] or max(1, int(np.sqrt(len(texts))))
+    index = IVFPQIndex(dim, nlist=nlist, num_subquantizers=num_subquantizers)
+    index.train(embeddings)
+    index.add(embeddings, labels, texts)
+    return index
+
+
+def _synthetic_vectors(num_vectors: int, dim: int, num_clusters: int, seed: int) -> np.ndarray:
+    """Clustered, L2-normalized vectors resembling intent embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, dim))
+    vectors = centers[rng.integers(num_clusters, size=num_vectors)]
+    vectors = vectors + 0.3 * rng.normal(size=vectors.shape)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def benchmark(
+    num_vectors: int, dim: int, num_queries: int, k: int, nprobes: List[int], refine: int
+) -> List[Dict]:
+    """Measure recall@k against exact search and per-query latency"""
+    data = _synthetic_vectors(num_vectors + num_queries, dim, num_clusters=len(LABEL_TO_INTENT) * 8, seed=0)
+    vectors, queries = data[:num_vectors], data[num_vectors:]
+
+    num_subquantizers = INDEX_CONFIG["num_subquantizers"]
+    index = IVFPQIndex(dim, nlist=max(1, int(np.sqrt(num_vectors))), num_subquantizers=num_subquantizers)
+    start = time.time()
+    index.train(vectors)
+    index.add(vectors, [0] * num_vectors, [""] * num_vectors)
+    build_s = time.time() - start
+
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+
+    results = []
+    for nprobe in nprobes:
+        latencies = []
+        hits = 0
+        for qi, query in enumerate(queries):
+            start = time.perf_counter()
+            _, ids = index.search(query, k=k, nprobe=nprobe, refine=refine)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len(set(ids[0].tolist()) & set(exact[qi].tolist()))
+
+        latencies.sort()
+        results.append({
+            "nprobe": nprobe,
+            "recall_at_k": hits / (num_queries * k),
+            "p50_ms": latencies[len(latencies) // 2],
+            "p95_ms": latencies[int(len(latencies) * 0.95)],
+            "qps": 1000.0 / float(np.mean(latencies)),
+            "build_s": round(build_s, 2),
+            "code_bytes": int(index._codes[: index.count].nbytes),
+            "refine_bytes": int(index._vectors[: index.count].nbytes),
+            "exact_bytes": int(vectors.nbytes),
+        })
+
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Intent retrieval index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build index from labeled data")
+    build_parser.add_argument("--output", default=INDEX_CONFIG["index_dir"])
+    build_parser.add_argument("--model-path", default=None)
+
+    bench_parser = subparsers.add_parser("benchmark", help="Recall/latency benchmark")
+    bench_parser.add_argument("--num-vectors", type=int, default=20000)
+    bench_parser.add_argument("--dim", type=int, default=768)
+    bench_parser.add_argument("--queries", type=int, default=200)
+    bench_parser.add_argument("--k", type=int, default=INDEX_CONFIG["k"])
+    bench_parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16])
+    bench_parser.add_argument("--refine", type=int, default=INDEX_CONFIG["refine"])
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from model import NLUModel
+
+        texts, labels = load_labeled_examples()
+        logger.info(f"Embedding {len(texts)} labeled examples...")
+        index = build_index(NLUModel(model_path=args.model_path), texts, labels)
+        index.save(args.output)
+        logger.info(f"Index with {index.count} examples saved to {args.output}")
+    else:
+        results = benchmark(
+            args.num_vectors, args.dim, args.queries, args.k, args.nprobe, args.refine
+        )
+        print(f"\n{'nprobe':>6} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'qps':>8}")
+        for row in results:
+            print(
+                f"{row['nprobe']:>6} {row['recall_at_k']:>9.3f} {row['p50_ms']:>8.2f} "
+                f"{row['p95_ms']:>8.2f} {row['qps']:>8.0f}"
+            )
+        row = results[0]
+        print(
+            f"\nPQ codes: {row['code_bytes'] / 1e6:.2f} MB, refine vectors (mmap): "
+            f"{row['refine_bytes'] / 1e6:.2f} MB, exact float32: {row['exact_bytes'] / 1e6:.2f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -298,13 +298,18 @@ export class IntentClassifierService {
       return null;
     }
 
+    const timeoutMs = 5000;
     const controller = new AbortController();
-    const timeout = setTimeout(() => controller.abort(), 5000);
+    const timeout = setTimeout(() => controller.abort(), timeoutMs);
 
     try {
       const response = await fetch(`${this.nluServiceUrl}/predict`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          // Lets the NLU service drop the request instead of computing a result we've abandoned
+          'X-Request-Timeout-Ms': String(timeoutMs),
+        },
         body: JSON.stringify({ text: message, context }),
         signal: controller.signal,
       });